@@ -0,0 +1,54 @@
+# bench_batch.py
+
+import argparse
+import time
+
+from src.batch import Batch, BATCH_CHUNK
+from src.connection import connect_proxy
+from src.discovery import OBJECT_NAME
+
+
+def timed(label, players, function):
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {players:>7} players  {elapsed:8.3f} s  {players / elapsed:10.0f} ops/s")
+
+
+def main(argv=None):
+    """
+    Compares the registration of many test players one call at a time and in batches. The single calls exceed the
+    write budget of a connection, so the server should run without rate limiting (--no-rate-limit) unless only the
+    batches are timed (--batches-only), which run within the bulk budget of the default limits.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the batched calls.")
+    parser.add_argument("--uri", default=f"PYRO:{OBJECT_NAME}@localhost:55894", help="URI of the game server")
+    parser.add_argument("--players", type=int, default=10000, help="number of test players")
+    parser.add_argument("--chunk", type=int, default=BATCH_CHUNK, help="operations per batch call")
+    parser.add_argument("--batches-only", action="store_true", help="time only the batches")
+    args = parser.parse_args(argv)
+
+    server = connect_proxy(args.uri)
+    names = [f"bench-batch-{i}" for i in range(args.players)]
+
+    def sequential(method):
+        for name in names:
+            getattr(server, method)(name)
+
+    def batched(method):
+        batch = Batch(server, args.chunk)
+        for name in names:
+            batch.add(method, name)
+        errors = [result for result in batch.execute() if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+
+    if not args.batches_only:
+        timed("register, one call each", args.players, lambda: sequential("register_player"))
+        timed("unregister, one call each", args.players, lambda: sequential("unregister_player"))
+    timed(f"register, batches of {args.chunk}", args.players, lambda: batched("register_player"))
+    timed(f"unregister, batches of {args.chunk}", args.players, lambda: batched("unregister_player"))
+
+
+if __name__ == "__main__":
+    main()
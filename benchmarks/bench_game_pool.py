@@ -0,0 +1,63 @@
+# bench_game_pool.py
+
+import argparse
+import contextlib
+import gc
+import io
+import time
+
+from src.game import GamePool, POOL_SIZE
+from src.gameserver import GameServer
+
+
+def churn(pool_size, pairs, cycles):
+    """
+    Registers pairs of players on an in-process server and makes them leave and come back: every cycle both players
+    of a pair unregister, which removes their game, and register again, which creates a new one.
+
+    Args:
+        pool_size (int): The maximum number of idle games of the pool, 0 to allocate every game.
+        pairs (int): The number of pairs of players.
+        cycles (int): The number of cycles.
+
+    Returns:
+        dict: The microseconds per cycle and the number of games allocated and reused.
+    """
+    server = GameServer()
+    server.game_pool = GamePool(pool_size)
+    with contextlib.redirect_stdout(io.StringIO()):
+        names = [(f"bench-{i}-a", f"bench-{i}-b") for i in range(pairs)]
+        for pair in names:
+            for name in pair:
+                server.register_player(name)
+        gc.collect()
+        started = time.perf_counter()
+        for cycle in range(cycles):
+            pair = names[cycle % pairs]
+            for name in pair:
+                server.unregister_player(name)
+            for name in pair:
+                server.register_player(name)
+        elapsed = time.perf_counter() - started
+    return {"us_per_cycle": elapsed / cycles * 1e6,
+            "created": server.game_pool.created,
+            "reused": server.game_pool.reused}
+
+
+def main(argv=None):
+    """
+    Compares the churn of the games with and without the pool of the removed games.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the pool of the games.")
+    parser.add_argument("--pairs", type=int, default=100, help="pairs of registered players")
+    parser.add_argument("--cycles", type=int, default=20000, help="leave and register cycles of a pair")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE, help="maximum idle games of the pool")
+    args = parser.parse_args(argv)
+
+    for case, pool_size in (("no pool", 0), ("pool", args.pool_size)):
+        r = churn(pool_size, args.pairs, args.cycles)
+        print(f"{case:<8} {r['us_per_cycle']:7.1f} us/cycle  {r['created']:6} games allocated  {r['reused']:6} reused")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# bench_gui_latency.py
+
+import argparse
+import contextlib
+import io
+import os
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # no display needed
+
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+
+from benchmarks.bench_server import percentile
+from src.gameclient import GameClient
+from src.gameserver import GameServer
+from src.rpcworker import RpcWorker
+
+FRAME_INTERVAL = 16  # Milliseconds between two frames of the measuring timer
+
+
+class SlowServer:
+    """
+    Stand-in for the proxy of an in-process GameServer that waits a fixed round-trip time before every call.
+    """
+
+    def __init__(self, server, rtt):
+        self.server = server
+        self.rtt = rtt
+
+    def __getattr__(self, name):
+        method = getattr(self.server, name)
+
+        def remote_call(*args, **kwargs):
+            time.sleep(self.rtt)
+            return method(*args, **kwargs)
+
+        return remote_call
+
+
+class InlineWorker:
+    """
+    The calls of the client run on the GUI thread, as before the RpcWorker: the baseline of the benchmark.
+    """
+    calls = coalesced = 0
+
+    def submit(self, function, *args, key=None, callback=None):
+        try:
+            result, error = function(*args), None
+        except Exception as e:
+            result, error = None, e
+        self.calls += 1
+        if callback is not None:
+            callback(result, error)
+        return True
+
+    def stop(self):
+        return True
+
+
+def run_case(app, case, args):
+    """
+    Plays pairs of GUI clients against an in-process server with a simulated round-trip time, clicking a move as
+    soon as the buttons are enabled, and records the delay of a timer firing every FRAME_INTERVAL ms on the GUI thread.
+
+    Returns:
+        dict: The frame delays and the counters of the clients.
+    """
+    game_server = GameServer()
+    server = SlowServer(game_server, args.rtt)
+    with contextlib.redirect_stdout(io.StringIO()):
+        names = [f"bench-gui-{case}-{i}" for i in range(2 * args.pairs)]
+        clients = [GameClient(name, server, game_server.register_player(name),
+                              worker=InlineWorker() if case == "gui thread" else RpcWorker()) for name in names]
+        for client in clients:
+            client.gui.show()
+
+        def click_moves():
+            for client in clients:
+                enabled = [button for button in client.gui.buttons if button.isEnabled()]
+                if enabled:
+                    enabled[0].click()
+
+        frames = []
+        last = [time.perf_counter()]
+
+        def frame():
+            now = time.perf_counter()
+            frames.append(now - last[0] - FRAME_INTERVAL / 1000)
+            last[0] = now
+            click_moves()
+
+        frame_timer = QTimer()
+        frame_timer.timeout.connect(frame)
+        frame_timer.start(FRAME_INTERVAL)
+        QTimer.singleShot(int(args.duration * 1000), lambda: app.exit(0))  # quit() would close the windows
+        app.exec()
+        frame_timer.stop()
+        for client in clients:
+            client.polling_timer.stop()
+            client.worker.stop()
+            client.gui.hide()
+    frames.sort()
+    return {"frames": len(frames),
+            "p50_ms": percentile(frames, 0.50) * 1000,
+            "p99_ms": percentile(frames, 0.99) * 1000,
+            "max_ms": frames[-1] * 1000,
+            "calls": sum(client.worker.calls for client in clients),
+            "coalesced": sum(client.worker.coalesced for client in clients)}
+
+
+def main(argv=None):
+    """
+    Measures the responsiveness of the GUI client while the server answers slowly: the delay of the frames of the Qt
+    event loop when the calls run on the GUI thread, as the client used to, and on the RpcWorker.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the GUI responsiveness with a slow server.")
+    parser.add_argument("--rtt", type=float, default=0.5, help="simulated round-trip time of a call in seconds")
+    parser.add_argument("--pairs", type=int, default=1, help="pairs of GUI clients playing against each other")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of play per case")
+    args = parser.parse_args(argv)
+
+    app = QApplication([])
+    print(f"{'calls run on':<12} {'frames':>7} {'lag p50':>9} {'p99':>9} {'max':>9} {'calls':>6} {'coalesced':>10}")
+    for case in ("gui thread", "worker"):
+        r = run_case(app, case, args)
+        print(f"{case:<12} {r['frames']:>7} {r['p50_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms {r['max_ms']:>7.1f}ms "
+              f"{r['calls']:>6} {r['coalesced']:>10}")
+
+
+if __name__ == "__main__":
+    main()
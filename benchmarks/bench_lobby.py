@@ -0,0 +1,149 @@
+# bench_lobby.py
+
+import argparse
+import contextlib
+import heapq
+import io
+import random
+import time
+
+from benchmarks.bench_server import percentile
+from src.errors import LobbyFullError
+from src.gameserver import GameServer
+from src.matchmaking import PairingRate, WaitingIndex, BOT, REJECT, MATCH_INTERVAL
+
+TICK = 0.01  # Simulated seconds between two steps of the simulation
+
+
+class LobbyServer(GameServer):
+    """
+    In-process server noting the players seated with an opponent, to measure their waits.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seated = []
+
+    def _seat(self, game, player_id):
+        super()._seat(game, player_id)
+        self.seated.extend((game.players[0], player_id))
+
+
+def run_case(policy, args):
+    """
+    Simulates the arrivals of rated players on a simulated clock, with a spike of arrivals in the middle: the players
+    wait in the lobby until paired (the matchmaker runs every MATCH_INTERVAL seconds), play for a while and leave. The
+    players rejected by a full lobby come back after the delay they are given.
+
+    Returns:
+        dict: The counters, the largest lobby and server, the cost of the calls and the waits.
+    """
+    rng = random.Random(args.seed)
+    now = [0.0]
+    clock = lambda: now[0]
+    lobby_size = None if policy == "unbounded" else args.lobby_size
+    waiting = WaitingIndex(base_gap=args.gap, growth=args.growth, clock=clock)
+    server = LobbyServer(waiting=waiting, lobby_size=lobby_size,
+                         lobby_overflow=BOT if policy == BOT else REJECT, max_bots=args.lobby_bots)
+    server.pairing_rate = PairingRate(clock=clock)
+    expected = int(2 * (args.duration * args.rate + args.spike_length * args.spike_rate))  # beyond, the initial rating
+    server.ratings.load({f"bench-lobby-{i}": [rng.gauss(1500, args.spread), 20] for i in range(1, expected + 1)})
+    retries, departures = [], []  # heaps of (time, name) and (time, player id)
+    arrived, estimates = {}, {}
+    waits, errors, register_times, pass_times = [], [], [], []
+    counters = {"arrivals": 0, "rejected": 0, "largest_lobby": 0, "largest_server": 0}
+    next_arrival = rng.expovariate(args.rate)
+    next_pass = MATCH_INTERVAL
+
+    def register(name):
+        started = time.perf_counter()
+        try:
+            player_id = server.register_player(name)
+        except LobbyFullError as e:
+            register_times.append(time.perf_counter() - started)
+            counters["rejected"] += 1
+            heapq.heappush(retries, (now[0] + e.retry_after, name))
+            return
+        register_times.append(time.perf_counter() - started)
+        status = server.get_lobby_status(player_id)
+        if status["position"] is not None:
+            arrived[player_id] = now[0]
+            estimates[player_id] = status["estimated_wait"]
+
+    def seat_players():
+        for player_id in server.seated:
+            if player_id in server.bots:
+                continue
+            started = arrived.pop(player_id, None)
+            if started is not None:
+                waits.append(now[0] - started)
+                estimate = estimates.pop(player_id)
+                if estimate is not None:
+                    errors.append(abs(estimate - (now[0] - started)))
+            heapq.heappush(departures, (now[0] + args.play_time, player_id))
+        server.seated.clear()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        while now[0] < args.duration:
+            now[0] += TICK
+            spiking = args.spike_start <= now[0] < args.spike_start + args.spike_length
+            while next_arrival <= now[0]:
+                counters["arrivals"] += 1
+                register(f"bench-lobby-{counters['arrivals']}")
+                next_arrival += rng.expovariate(args.spike_rate if spiking else args.rate)
+            while retries and retries[0][0] <= now[0]:
+                register(heapq.heappop(retries)[1])
+            if next_pass <= now[0]:
+                started = time.perf_counter()
+                server._pair_waiting()
+                pass_times.append(time.perf_counter() - started)
+                next_pass += MATCH_INTERVAL
+            seat_players()
+            while departures and departures[0][0] <= now[0]:
+                player_id = heapq.heappop(departures)[1]
+                if player_id in server.players:
+                    server.unregister_player(player_id)
+            counters["largest_lobby"] = max(counters["largest_lobby"], len(server.waiting))
+            counters["largest_server"] = max(counters["largest_server"], len(server.players))
+    register_times.sort()
+    waits.sort()
+    errors.sort()
+    return {**counters, "bot_games": server.metrics.snapshot()["counters"].get("lobby.bot_games", 0),
+            "register_p99_us": percentile(register_times, 0.99) * 1e6,
+            "pass_max_ms": max(pass_times) * 1000,
+            "wait_p50": percentile(waits, 0.50), "wait_p99": percentile(waits, 0.99),
+            "estimate_error_p50": percentile(errors, 0.50)}
+
+
+def main(argv=None):
+    """
+    Compares an unbounded lobby with a bounded one rejecting the overflow or seating it against bots, under a spike
+    of arrivals faster than the pairings: the size of the lobby and of the server, the cost of the registrations and
+    of the matchmaker passes, the waits and the error of the wait estimates.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the admission control of the lobby.")
+    parser.add_argument("--rate", type=float, default=20, help="arrivals per second outside the spike")
+    parser.add_argument("--spike-rate", type=float, default=300, help="arrivals per second during the spike")
+    parser.add_argument("--spike-start", type=float, default=10, help="second at which the spike starts")
+    parser.add_argument("--spike-length", type=float, default=20, help="seconds of the spike")
+    parser.add_argument("--duration", type=float, default=60, help="simulated seconds")
+    parser.add_argument("--spread", type=float, default=600, help="standard deviation of the ratings")
+    parser.add_argument("--gap", type=float, default=5, help="rating gap accepted at once")
+    parser.add_argument("--growth", type=float, default=0.2, help="widening of the accepted gap per second of wait")
+    parser.add_argument("--play-time", type=float, default=30, help="seconds a paired player plays before leaving")
+    parser.add_argument("--lobby-size", type=int, default=50, help="players admitted to wait")
+    parser.add_argument("--lobby-bots", type=int, default=2000, help="games against a bot open at most")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the simulation")
+    args = parser.parse_args(argv)
+
+    print(f"{'lobby':<10} {'arrivals':>8} {'rejected':>8} {'bots':>6} {'lobby max':>9} {'players max':>11} "
+          f"{'register p99':>12} {'pass max':>9} {'wait p50':>9} {'wait p99':>9} {'estimate err':>12}")
+    for policy in ("unbounded", REJECT, BOT):
+        r = run_case(policy, args)
+        print(f"{policy:<10} {r['arrivals']:>8} {r['rejected']:>8} {r['bot_games']:>6} {r['largest_lobby']:>9} "
+              f"{r['largest_server']:>11} {r['register_p99_us']:>10.0f}us {r['pass_max_ms']:>7.1f}ms "
+              f"{r['wait_p50']:>8.1f}s {r['wait_p99']:>8.1f}s {r['estimate_error_p50']:>11.1f}s")
+
+
+if __name__ == "__main__":
+    main()
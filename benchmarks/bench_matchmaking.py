@@ -0,0 +1,115 @@
+# bench_matchmaking.py
+
+import argparse
+import random
+import time
+
+from src.matchmaking import WaitingIndex, BASE_GAP, GAP_GROWTH, MATCH_INTERVAL
+
+
+class FifoIndex:
+    """
+    The matchmaking before the ratings: the first waiting game is taken, whatever the rating of its player.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._entries = {}
+
+    def add(self, game_id, rating):
+        self._entries[game_id] = rating
+
+    def claim(self, rating, exclude=()):
+        for game_id, other in self._entries.items():
+            del self._entries[game_id]
+            return game_id, abs(other - rating)
+        return None, None
+
+    def pairs(self):
+        return []
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float("nan")
+
+
+def simulate(kind, rate, args):
+    """
+    Simulates the arrivals of players with normally distributed ratings (a Poisson process at the given rate per
+    second) on a simulated clock; the players left waiting are paired every MATCH_INTERVAL seconds.
+
+    Returns:
+        dict: The wait until the match is found, the rating gaps of the pairs and the CPU time per arrival.
+    """
+    rng = random.Random(args.seed)
+    now = [0.0]
+    if kind == "fifo":
+        index = FifoIndex(lambda: now[0])
+    else:
+        index = WaitingIndex(base_gap=args.gap, growth=args.growth, clock=lambda: now[0])
+    arrived = {}
+    waits, gaps = [], []
+    cpu = 0.0
+    arrivals = 0
+    next_sweep = MATCH_INTERVAL
+    while now[0] < args.duration:
+        now[0] += rng.expovariate(rate)
+        while next_sweep <= now[0]:
+            clock, now[0] = now[0], next_sweep
+            for game_id, other_id, gap in index.pairs():
+                waits.append(now[0] - arrived.pop(other_id))
+                waits.append(now[0] - arrived.pop(game_id))
+                gaps.append(gap)
+            now[0] = clock
+            next_sweep += MATCH_INTERVAL
+        arrivals += 1
+        rating = rng.gauss(1500, args.spread)
+        started = time.perf_counter()
+        game_id, gap = index.claim(rating)
+        if game_id is None:
+            index.add(arrivals, rating)
+        cpu += time.perf_counter() - started
+        if game_id is None:
+            arrived[arrivals] = now[0]
+        else:
+            waits.append(now[0] - arrived.pop(game_id))
+            waits.append(0.0)
+            gaps.append(gap)
+    waits.sort()
+    gaps.sort()
+    return {
+        "kind": kind, "rate": rate, "arrivals": arrivals, "paired": 2 * len(gaps), "waiting": len(index),
+        "wait_p50": percentile(waits, 0.5), "wait_p95": percentile(waits, 0.95), "wait_max": percentile(waits, 1.0),
+        "gap_mean": sum(gaps) / len(gaps) if gaps else float("nan"), "gap_p95": percentile(gaps, 0.95),
+        "us_per_arrival": cpu / arrivals * 1e6,
+    }
+
+
+def main(argv=None):
+    """
+    Compares the rated matchmaking with the first-come pairing: time until a match is found and rating gap of the
+    pairs under synthetic arrival rates.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the matchmaking.")
+    parser.add_argument("--rates", default="0.5,5,50,500", help="comma separated arrivals per second")
+    parser.add_argument("--duration", type=float, default=600, help="simulated seconds")
+    parser.add_argument("--spread", type=float, default=300, help="standard deviation of the ratings")
+    parser.add_argument("--gap", type=float, default=BASE_GAP, help="rating gap accepted at once")
+    parser.add_argument("--growth", type=float, default=GAP_GROWTH, help="widening of the gap per second of wait")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the arrivals")
+    args = parser.parse_args(argv)
+
+    print(f"{'index':<6} {'rate/s':>7} {'arrivals':>9} {'wait p50':>9} {'p95':>7} {'max':>7} "
+          f"{'gap mean':>9} {'p95':>6} {'us/arrival':>11}")
+    for rate in map(float, args.rates.split(",")):
+        for kind in ("fifo", "rated"):
+            r = simulate(kind, rate, args)
+            print(f"{r['kind']:<6} {r['rate']:>7g} {r['arrivals']:>9} {r['wait_p50']:>8.2f}s {r['wait_p95']:>6.2f}s "
+                  f"{r['wait_max']:>6.2f}s {r['gap_mean']:>9.0f} {r['gap_p95']:>6.0f} {r['us_per_arrival']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_memory.py
+
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from src.enums import Move
+from src.gameserver import GameServer
+from src.memory import MemoryProfiler
+
+MOVES = [move.value for move in Move]
+
+
+def churn(server, cycle, pairs, rounds, rng):
+    """
+    Registers pairs of players, plays rounds and unregisters them, as the players coming and going on a long-running
+    server.
+
+    Returns:
+        float: The seconds per move.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        players = [tuple(server.register_player(f"bench-mem-{cycle}-{i}-{side}") for side in "ab")
+                   for i in range(pairs)]
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for pair in players:
+                for player in pair:
+                    server.make_choice(player, rng.choice(MOVES))
+                for player in pair:
+                    server.rematch(player) if server.get_match_status(player) == "SERIES_OVER" else \
+                        server.reset_state_after_single_match(player)
+        elapsed = time.perf_counter() - started
+        for pair in players:
+            for player in pair:
+                server.unregister_player(player)
+    return elapsed / (rounds * pairs * 2)
+
+
+def main(argv=None):
+    """
+    Churns players on an in-process server, with and without tracing the allocations: prints the cost of tracemalloc
+    on the moves, the size of the server structures after every cycle, and the source lines that grew the most.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the memory instrumentation of the server.")
+    parser.add_argument("--pairs", type=int, default=200, help="pairs of players registered by every cycle")
+    parser.add_argument("--rounds", type=int, default=10, help="rounds played by every pair")
+    parser.add_argument("--cycles", type=int, default=5, help="cycles of registrations and departures")
+    parser.add_argument("--top", type=int, default=5, help="lines of the snapshot diff printed")
+    args = parser.parse_args(argv)
+
+    for tracing in (False, True):
+        server = GameServer()
+        server.memory = MemoryProfiler(server)
+        rng = random.Random(1)
+        first = server.take_memory_snapshot() if tracing else None
+        print(f"tracemalloc {'on' if tracing else 'off'}")
+        for cycle in range(args.cycles):
+            per_move = churn(server, cycle, args.pairs, args.rounds, rng)
+            structures = server.get_memory_report()["structures"]
+            games, players_game = structures["games"], structures["players_game"]
+            print(f"  cycle {cycle}: {per_move * 1e6:7.1f} us/move  games {games['count']:5} "
+                  f"({games['bytes'] / 1024:8.1f} KiB)  players_game {players_game['count']:5}  "
+                  f"players_score {structures['players_score']['count']:5}  analytics {len(server.analytics):6}")
+        if tracing:
+            for row in server.diff_memory_snapshots(first, top=args.top):
+                print(f"  {row['size_diff'] / 1024:+9.1f} KiB {row['count_diff']:+7} blocks  "
+                      f"{row['file']}:{row['line']}")
+            server.stop_memory_tracing()
+
+
+if __name__ == "__main__":
+    main()
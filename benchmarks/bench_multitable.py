@@ -0,0 +1,94 @@
+# bench_multitable.py
+
+import argparse
+import tempfile
+import time
+
+from benchmarks.bench_server import TimedServer, start_server
+from src.batch import Batch
+from src.clientcore import ClientCore, TablePoller
+from src.connection import ProxyPool
+from src.headlessclient import BotListener
+
+
+def seat_bots(server, prefix, seats):
+    """
+    Registers bot players in one batch and builds their cores.
+
+    Returns:
+        list: The cores of the bots.
+    """
+    cores = []
+    batch = Batch(server)
+    names = [f"{prefix} #{i + 1}" for i in range(seats)]
+    for name in names:
+        batch.register_player(name)
+    for name, player_id in zip(names, batch.execute()):
+        listener = BotListener(verbose=False)
+        core = ClientCore(name, server, listener, reset_delay=0)
+        listener.core = core
+        core.player_id = player_id
+        core.registered = True
+        cores.append(core)
+    return cores
+
+
+def run_cycles(uri, case, seats, cycles):
+    """
+    Plays bots on one connection for a number of poll cycles, either ticking every core on its own or through a
+    shared TablePoller.
+
+    Returns:
+        dict: The requests per cycle and the time per cycle and per seat.
+    """
+    server = TimedServer(ProxyPool(uri, 1))
+    cores = seat_bots(server, f"bench-{case}-{seats}", seats)
+    poller = TablePoller(server)
+    for core in cores:
+        poller.add(core)
+    server.recording.set()
+    started = time.perf_counter()
+    for _ in range(cycles):
+        if case == "shared":
+            poller.poll()
+        else:
+            for core in cores:
+                core.tick()
+    elapsed = time.perf_counter() - started
+    server.recording.clear()
+    batch = Batch(server)
+    for core in cores:
+        batch.unregister_player(core.player)
+    batch.execute()
+    return {"requests_per_cycle": len(server.latencies) / cycles,
+            "ms_per_cycle": elapsed / cycles * 1000,
+            "us_per_seat": elapsed / cycles / seats * 1e6}
+
+
+def main(argv=None):
+    """
+    Compares the poll cycle of a multi-table client that ticks every seat on its own with the shared poll loop that
+    refreshes all the seats in one batch request. The bots play without pausing between the rounds.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the shared poll loop of the multi-table client.")
+    parser.add_argument("--seats", default="8,32,64", help="comma separated numbers of seats")
+    parser.add_argument("--cycles", type=int, default=100, help="poll cycles per case")
+    parser.add_argument("--mode", default="multiplex", help="server mode (see bench_server)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        process, uri = start_server(args.mode, workdir)
+        try:
+            print(f"{'seats':>5} {'poll':<9} {'requests/cycle':>15} {'ms/cycle':>9} {'us/seat':>8}")
+            for seats in map(int, args.seats.split(",")):
+                for case in ("per seat", "shared"):
+                    r = run_cycles(uri, case, seats, args.cycles)
+                    print(f"{seats:>5} {case:<9} {r['requests_per_cycle']:>15.1f} {r['ms_per_cycle']:>9.1f} "
+                          f"{r['us_per_seat']:>8.0f}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
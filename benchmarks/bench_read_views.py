@@ -0,0 +1,119 @@
+# bench_read_views.py
+
+import argparse
+import contextlib
+import io
+import random
+import threading
+import time
+
+from benchmarks.bench_server import percentile
+from src.enums import Move
+from src.errors import GameNotFoundError
+from src.gameserver import GameServer
+
+MOVES = [move.value for move in Move]
+
+
+def locked_read(server, player_id):
+    """
+    The read of a server whose reads take the lock of the writers, as the baseline.
+    """
+    with server.lobby_lock:
+        return server._game_of(player_id).get_changes_since(player_id, 0)
+
+
+def view_read(server, player_id):
+    """
+    The read of the published view, without any lock.
+    """
+    return server.get_changes_since(player_id, 0)
+
+
+def writer(server, players, stop, writes, seed):
+    """
+    Body of a writer thread: makes moves, resets the rounds and asks for new matches, which move the players between
+    the games under the lock of the lobby.
+
+    """
+    rng = random.Random(seed)
+    while not stop.is_set():
+        player_id = rng.choice(players)
+        try:
+            if rng.random() < 0.2:
+                server.new_match(player_id)
+            elif server.make_choice(player_id, rng.choice(MOVES)):
+                server.reset_state_after_single_match(player_id)
+        except GameNotFoundError:
+            pass
+        writes.append(player_id)
+
+
+def reader(read, server, players, stop, latencies, errors, seed):
+    """
+    Body of a reader thread: reads the state of random players and records the latency of every read.
+    """
+    rng = random.Random(seed)
+    while not stop.is_set():
+        player_id = rng.choice(players)
+        started = time.perf_counter()
+        try:
+            read(server, player_id)
+        except GameNotFoundError:
+            errors.append(player_id)
+        latencies.append(time.perf_counter() - started)
+
+
+def run(read, writers, args):
+    """
+    Runs the reader threads, and the writer threads if any, on an in-process server for a while.
+
+    Returns:
+        dict: The reads and writes per second, the latency percentiles of the reads and the reads that did not find
+        the game.
+    """
+    server = GameServer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        players = [server.register_player(f"bench-{i}") for i in range(args.players)]
+        stop = threading.Event()
+        latencies, errors, writes = [], [], []
+        threads = [threading.Thread(target=reader, args=(read, server, players, stop, latencies, errors, i))
+                   for i in range(args.readers)]
+        threads += [threading.Thread(target=writer, args=(server, players, stop, writes, 100 + i))
+                    for i in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    latencies.sort()
+    return {"reads_per_s": len(latencies) / args.duration, "writes_per_s": len(writes) / args.duration,
+            "p50_us": percentile(latencies, 0.50) * 1e6, "p99_us": percentile(latencies, 0.99) * 1e6,
+            "p999_us": percentile(latencies, 0.999) * 1e6, "errors": len(errors)}
+
+
+def main(argv=None):
+    """
+    Measures the latency of the reads of the players' state on an in-process server, alone and while writer threads
+    play and move the players between the games: reading the published views, and taking the lock of the writers
+    as the baseline.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the reads of the published views.")
+    parser.add_argument("--players", type=int, default=200, help="registered players")
+    parser.add_argument("--readers", type=int, default=4, help="reader threads")
+    parser.add_argument("--writers", type=int, default=2, help="writer threads")
+    parser.add_argument("--duration", type=float, default=3, help="seconds per case")
+    args = parser.parse_args(argv)
+
+    print(f"{'reads':<8} {'writers':>7} {'writes/s':>9} {'reads/s':>9} {'p50':>8} {'p99':>9} {'p99.9':>9} "
+          f"{'not found':>9}")
+    for name, read in (("locked", locked_read), ("views", view_read)):
+        for writers in (0, args.writers):
+            r = run(read, writers, args)
+            print(f"{name:<8} {writers:>7} {r['writes_per_s']:>9.0f} {r['reads_per_s']:>9.0f} {r['p50_us']:>6.1f}us "
+                  f"{r['p99_us']:>7.1f}us {r['p999_us']:>7.1f}us {r['errors']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# bench_replication.py
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import Pyro5.api
+import Pyro5.errors
+
+from benchmarks.bench_server import free_port
+from src.connection import connect_proxy
+from src.discovery import OBJECT_NAME
+from src.enums import Move
+from src.gameserver import GameServer
+from src.replication import Replicator, FAILOVER_TIMEOUT
+
+MOVES = [move.value for move in Move]
+
+
+def start_standby(address, port, failover_timeout):
+    command = [sys.executable, "-m", "src.gameserver", "--no-rate-limit", "--port", str(port),
+               "--standby", address, "--failover-timeout", str(failover_timeout)]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def play_rounds(server, pairs, rounds, rng):
+    """
+    Plays rounds on an in-process server.
+
+    Returns:
+        float: The seconds per move, the resets between the rounds included.
+    """
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for pair in pairs:
+            for player in pair:
+                server.make_choice(player, rng.choice(MOVES))
+            for player in pair:
+                server.rematch(player) if server.get_match_status(player) == "SERIES_OVER" else \
+                    server.reset_state_after_single_match(player)
+    return (time.perf_counter() - started) / (rounds * len(pairs) * 2)
+
+
+def overhead(args, workdir):
+    """
+    Measures the time per move of an in-process server without replication, with a replicator but no standby and
+    with a standby process connected.
+
+    Returns:
+        dict: The microseconds per move of each case.
+    """
+    results = {}
+    for case in ("off", "no standby", "standby"):
+        server = GameServer()
+        replicator = standby = None
+        with contextlib.redirect_stdout(io.StringIO()):
+            pairs = [tuple(server.register_player(f"bench-{i}-{side}") for side in "ab") for i in range(args.pairs)]
+            if case != "off":
+                address = os.path.join(workdir, f"replication-{len(results)}.sock")
+                replicator = Replicator(server, address).start()
+                if case == "standby":
+                    standby = start_standby(address, free_port(), args.failover_timeout)
+                    while replicator.batches < 3:  # the full synchronization
+                        time.sleep(0.01)
+            try:
+                per_move = play_rounds(server, pairs, args.rounds, random.Random(1))
+            finally:
+                if replicator is not None:
+                    replicator.stop()
+                if standby is not None:
+                    standby.kill()
+                    standby.wait()
+        results[case] = {"us_per_move": per_move * 1e6,
+                         "batches": replicator.batches if replicator else 0,
+                         "kb_sent": replicator.sent_bytes / 1024 if replicator else 0}
+    return results
+
+
+def failover(args, workdir):
+    """
+    Kills a primary server process (SIGKILL) while its standby follows it, and measures the time until a client
+    call succeeds on the standby and finds the player's state.
+
+    Returns:
+        dict: The seconds from the kill to the first successful call, and the check of the state.
+    """
+    address = os.path.join(workdir, "failover.sock")
+    port = free_port()
+    uri = f"PYRO:{OBJECT_NAME}@localhost:{port}"
+    primary = subprocess.Popen([sys.executable, "-m", "src.gameserver", "--no-rate-limit", "--port", str(port),
+                                "--replication-listen", address],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    standby = None
+    try:
+        server = connect_proxy(uri)
+        standby = start_standby(address, port, args.failover_timeout)
+        rng = random.Random(2)
+        pairs = [tuple(server.register_player(f"failover-{i}-{side}") for side in "ab") for i in range(args.pairs)]
+        for _ in range(3):
+            for pair in pairs:
+                for player in pair:
+                    server.make_choice(player, rng.choice(MOVES))
+                for player in pair:
+                    server.reset_state_after_single_match(player)
+        expected = {player: server.get_score(player) for pair in pairs for player in pair}
+        server._pyroRelease()
+        time.sleep(0.5)  # the standby is connected and has received the last batch
+
+        killed = time.perf_counter()
+        primary.send_signal(signal.SIGKILL)
+        primary.wait()
+        while True:
+            try:
+                with Pyro5.api.Proxy(uri) as proxy:
+                    proxy._pyroTimeout = 1
+                    scores = {player: proxy.get_score(player) for player in expected}
+                break
+            except Pyro5.errors.CommunicationError:
+                time.sleep(0.005)
+        return {"seconds": time.perf_counter() - killed, "players": len(expected), "state_kept": scores == expected}
+    finally:
+        for process in (primary, standby):
+            if process is not None and process.poll() is None:
+                process.terminate()
+                process.wait()
+
+
+def main(argv=None):
+    """
+    Measures the cost of the replication to a warm standby on the moves of the primary, and the failover time when
+    the primary is killed.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the warm standby replication.")
+    parser.add_argument("--pairs", type=int, default=50, help="pairs of players")
+    parser.add_argument("--rounds", type=int, default=200, help="rounds played by every pair")
+    parser.add_argument("--failover-timeout", type=float, default=FAILOVER_TIMEOUT,
+                        help="seconds without the primary after which the standby takes over")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for case, result in overhead(args, workdir).items():
+            print(f"replication {case:<11} {result['us_per_move']:8.1f} us/move  {result['batches']:6} batches  "
+                  f"{result['kb_sent']:9.1f} KiB")
+        result = failover(args, workdir)
+        print(f"failover after SIGKILL: {result['seconds']:.2f} s to the first call served by the standby "
+              f"(timeout {args.failover_timeout} s), state of {result['players']} players kept: "
+              f"{result['state_kept']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# bench_server.py
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from src.connection import ProxyPool, PooledServer, connect_proxy
+from src.discovery import OBJECT_NAME
+from src.headlessclient import BotListener, HeadlessClient
+
+DEFAULT_MODES = "thread:8,thread:80,multiplex,thread:80@unix,multiplex@unix"
+
+
+class TimedServer(PooledServer):
+    """
+    PooledServer that records the round-trip time of every call made during the measurement.
+
+    Attributes:
+        latencies (list): The round-trip times in seconds.
+        recording (threading.Event): Set while the calls are recorded.
+    """
+
+    def __init__(self, pool):
+        super().__init__(pool)
+        self.latencies = []
+        self.recording = threading.Event()
+
+    def __getattr__(self, name):
+        remote_call = super().__getattr__(name)
+
+        def timed_call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return remote_call(*args, **kwargs)
+            finally:
+                if self.recording.is_set():
+                    self.latencies.append(time.perf_counter() - started)
+
+        return timed_call
+
+
+def parse_mode(mode):
+    """
+    Parses a server mode: servertype[:threads][@unix], e.g. "thread:80", "multiplex@unix".
+
+    Args:
+        mode (str): The mode.
+
+    Returns:
+        tuple: The server type, the number of threads (None for the default) and the unix socket flag.
+    """
+    mode, _, transport = mode.partition("@")
+    servertype, _, threads = mode.partition(":")
+    return servertype, int(threads) if threads else None, transport == "unix"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, workdir):
+    """
+    Starts a game server process in the given mode, without rate limiting.
+
+    Returns:
+        tuple: The server process and its URI.
+    """
+    servertype, threads, unix = parse_mode(mode)
+    command = [sys.executable, "-m", "src.gameserver", "--no-rate-limit", "--servertype", servertype]
+    if threads is not None:
+        command += ["--threads", str(threads), "--threads-min", str(threads)]
+    if unix:
+        path = os.path.join(workdir, f"server-{servertype}-{threads}.sock")
+        command += ["--unix-socket", path]
+        uri = f"PYRO:{OBJECT_NAME}@./u:{path}"
+    else:
+        port = free_port()
+        command += ["--port", str(port)]
+        uri = f"PYRO:{OBJECT_NAME}@localhost:{port}"
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    connect_proxy(uri)._pyroRelease()  # waits until the server accepts connections
+    return process, uri
+
+
+def run_bots(uri, names, warmup, duration, interval):
+    """
+    Body of a load process: runs bots sharing one pool and records the round-trip times after the warmup. The bots
+    do not pause between the rounds.
+
+    Returns:
+        list: The round-trip times in seconds.
+    """
+    server = TimedServer(ProxyPool(uri, len(names)))
+    clients = [HeadlessClient(name, server, BotListener(verbose=False), interval, reset_delay=0) for name in names]
+    for client in clients:
+        client.start()
+    time.sleep(warmup)
+    server.recording.set()
+    time.sleep(duration)
+    server.recording.clear()
+    for client in clients:
+        client.stop()
+    return server.latencies
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float("nan")
+
+
+def bench_mode(mode, args, workdir):
+    """
+    Measures the throughput and the latency of a server mode.
+
+    Returns:
+        dict: The results of the mode.
+    """
+    process, uri = start_server(mode, workdir)
+    try:
+        names = [f"bench-{mode}-{i}" for i in range(args.bots)]
+        chunks = [names[i::args.procs] for i in range(args.procs)]
+        with multiprocessing.Pool(args.procs) as pool:
+            results = pool.starmap(run_bots, [(uri, chunk, args.warmup, args.duration, args.interval)
+                                              for chunk in chunks if chunk])
+    finally:
+        process.terminate()
+        process.wait()
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        "mode": mode,
+        "calls": len(latencies),
+        "throughput": len(latencies) / args.duration,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else float("nan")) * 1000,
+    }
+
+
+def main(argv=None):
+    """
+    Compares the throughput and the tail latency of the server modes under the load of headless bots.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the game server modes.")
+    parser.add_argument("--modes", default=DEFAULT_MODES,
+                        help="comma separated modes: servertype[:threads][@unix] (default: %(default)s)")
+    parser.add_argument("--bots", type=int, default=40, help="number of bots")
+    parser.add_argument("--procs", type=int, default=4, help="number of load processes running the bots")
+    parser.add_argument("--interval", type=float, default=0.01, help="polling interval of the bots in seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of load before measuring")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of measurement per mode")
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in args.modes.split(","):
+            results.append(bench_mode(mode, args, workdir))
+            result = results[-1]
+            print(f"{result['mode']:<20} {result['throughput']:>10.0f} calls/s  p50 {result['p50_ms']:7.2f} ms  "
+                  f"p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  max {result['max_ms']:8.2f} ms")
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# bench_shm.py
+
+import argparse
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_server import free_port, percentile
+from src.connection import connect_proxy
+from src.discovery import OBJECT_NAME
+from src.enums import MatchStatus, Move
+from src.shmtransport import ShmClient
+
+MOVES = [move.value for move in Move]
+
+
+def start_server(shm_name, channels):
+    """
+    Starts a game server process serving both Pyro5 on loopback TCP and the shared-memory segment, without rate
+    limiting.
+
+    Returns:
+        tuple: The server process and its URI.
+    """
+    port = free_port()
+    command = [sys.executable, "-m", "src.gameserver", "--no-rate-limit", "--port", str(port),
+               "--shm", shm_name, "--shm-channels", str(channels)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    uri = f"PYRO:{OBJECT_NAME}@localhost:{port}"
+    connect_proxy(uri)._pyroRelease()  # waits until the server accepts connections
+    return process, uri
+
+
+def play(transport, target, channel, pairs, warmup, duration, seed):
+    """
+    Body of a load process: plays the rounds of its pairs of players one after the other, as fast as the transport
+    allows, and records the time of every move and state query after the warmup.
+
+    Args:
+        transport (str): "pyro" or "shm".
+        target (str): The URI of the server or the name of the segment.
+        channel (int): The channel of the segment.
+        pairs (list): The (player_id, opponent_id) pairs, each seated in the same game.
+        warmup (float): Seconds of play before recording.
+        duration (float): Seconds of recording.
+        seed (int): Seed of the moves.
+
+    Returns:
+        tuple: The move times and the state query times, in seconds.
+    """
+    server = connect_proxy(target) if transport == "pyro" else ShmClient(target, channel)
+    rng = random.Random(seed)
+    moves, states = [], []
+    started = time.perf_counter()
+    record_from, record_until = started + warmup, started + warmup + duration
+    while True:
+        now = time.perf_counter()
+        if now >= record_until:
+            break
+        recording = now >= record_from
+        for pair in pairs:
+            for player in pair:
+                before = time.perf_counter()
+                server.make_choice(player, rng.choice(MOVES))
+                if recording:
+                    moves.append(time.perf_counter() - before)
+            before = time.perf_counter()
+            state = server.get_changes_since(pair[0], 0)
+            if recording:
+                states.append(time.perf_counter() - before)
+            if state["changes"]["match_status"] == MatchStatus.SERIES_OVER.value:
+                for player in pair:
+                    server.rematch(player)
+            else:
+                for player in pair:
+                    server.reset_state_after_single_match(player)
+    if transport == "shm":
+        server.close()
+    return moves, states
+
+
+def bench_transport(transport, target, pairs, args):
+    """
+    Measures the per-move latency and the throughput of a transport.
+
+    Returns:
+        dict: The results of the transport.
+    """
+    chunks = [pairs[i::args.procs] for i in range(args.procs)]
+    with multiprocessing.Pool(args.procs) as pool:
+        results = pool.starmap(play, [(transport, target, channel, chunk, args.warmup, args.duration, channel)
+                                      for channel, chunk in enumerate(chunks) if chunk])
+    moves = sorted(latency for result in results for latency in result[0])
+    states = sorted(latency for result in results for latency in result[1])
+    return {
+        "transport": transport,
+        "moves": len(moves),
+        "moves_per_s": len(moves) / args.duration,
+        "move_p50_us": percentile(moves, 0.50) * 1e6,
+        "move_p99_us": percentile(moves, 0.99) * 1e6,
+        "state_p50_us": percentile(states, 0.50) * 1e6,
+        "state_p99_us": percentile(states, 0.99) * 1e6,
+    }
+
+
+def main(argv=None):
+    """
+    Compares the shared-memory transport with Pyro5 on loopback TCP: per-move latency and move throughput of bots
+    on the same host as the server. Every load process plays its own pairs of players; the players are registered
+    and seated through Pyro5 before the measurement.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the shared-memory transport.")
+    parser.add_argument("--pairs", type=int, default=8, help="pairs of players")
+    parser.add_argument("--procs", type=int, default=4, help="number of load processes")
+    parser.add_argument("--warmup", type=float, default=1, help="seconds of load before measuring")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of measurement per transport")
+    parser.add_argument("--transports", default="pyro,shm", help="comma separated transports to measure")
+    args = parser.parse_args(argv)
+
+    shm_name = f"morra-bench-{os.getpid()}"
+    process, uri = start_server(shm_name, args.procs)
+    try:
+        server = connect_proxy(uri)
+        # registered one after the other, so every player joins the game of the previous one
+        pairs = [tuple(server.register_player(f"bench-shm-{i}-{side}") for side in "ab") for i in range(args.pairs)]
+        print(f"{'transport':<10} {'moves/s':>9} {'move p50':>10} {'p99':>10} {'state p50':>10} {'p99':>10}")
+        for transport in args.transports.split(","):
+            target = uri if transport == "pyro" else shm_name
+            r = bench_transport(transport, target, pairs, args)
+            print(f"{r['transport']:<10} {r['moves_per_s']:>9.0f} {r['move_p50_us']:>8.0f}us "
+                  f"{r['move_p99_us']:>8.0f}us {r['state_p50_us']:>8.0f}us {r['state_p99_us']:>8.0f}us")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
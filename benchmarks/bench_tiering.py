@@ -0,0 +1,91 @@
+# bench_tiering.py
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from src.enums import Move
+from src.gameserver import GameServer
+from src.tiering import ColdStore
+
+MOVES = [move.value for move in Move]
+
+
+def fill(server, games, rng):
+    """
+    Seats two players in each game and plays a round of every game.
+
+    Returns:
+        list: The ids of the players.
+    """
+    players = [server.register_player(f"bench-{i}") for i in range(2 * games)]
+    for player_id in players:
+        server.make_choice(player_id, rng.choice(MOVES))
+    return players
+
+
+def measure(case, args, workdir):
+    """
+    Fills a server with games, lets all of them become idle and evicts them unless the case is "no eviction", then
+    reads the state of random players.
+
+    Returns:
+        dict: The memory allocated by the server, the games left hot, the bytes of the evicted games and the time of
+        the reads.
+    """
+    now = [0.0]
+    store = ColdStore(os.path.join(workdir, "cold") if case == "disk" else None)
+    server = GameServer(cold_store=store, hot_games=args.hot_games, idle_timeout=60)
+    server.games.clock = lambda: now[0]
+    rng = random.Random(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        players = fill(server, args.games, rng)
+        now[0] += 120
+        if case != "no eviction":
+            server._evict_idle_games()
+        memory = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        hot, cold_size = server.games.hot_count(), store.size
+
+        sample = rng.sample(players, min(args.reads, len(players)))
+        started = time.perf_counter()
+        for player_id in sample:
+            server.get_changes_since(player_id, 0)
+        first_read = (time.perf_counter() - started) / len(sample)
+        started = time.perf_counter()
+        for player_id in sample:
+            server.get_changes_since(player_id, 0)
+        second_read = (time.perf_counter() - started) / len(sample)
+    store.close()
+    return {"mb": memory / 2 ** 20, "hot": hot, "cold_mb": cold_size / 2 ** 20,
+            "first_read_us": first_read * 1e6, "second_read_us": second_read * 1e6}
+
+
+def main(argv=None):
+    """
+    Measures the memory held by a server whose games have all become idle, with and without the eviction to the
+    cold store, and the time of the first read of an evicted game (which faults it back in) and of the next one.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of the tiered storage of the games.")
+    parser.add_argument("--games", type=int, default=20000, help="games created")
+    parser.add_argument("--hot-games", type=int, default=1000, help="games kept as objects")
+    parser.add_argument("--reads", type=int, default=2000, help="players read after the eviction")
+    args = parser.parse_args(argv)
+
+    print(f"{'case':<12} {'memory':>9} {'hot games':>9} {'cold data':>9} {'first read':>11} {'next read':>10}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for case in ("no eviction", "memory", "disk"):
+            r = measure(case, args, workdir)
+            print(f"{case:<12} {r['mb']:>7.1f}MB {r['hot']:>9} {r['cold_mb']:>7.1f}MB {r['first_read_us']:>9.1f}us "
+                  f"{r['second_read_us']:>8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+# stress_server.py
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import threading
+
+from src.enums import Move
+from src.game import BEST_OF_FIVE
+from src.gameserver import GameServer
+from src.matchmaking import WaitingIndex
+from src.readviews import GameSnapshot
+
+# operations of a simulated player, with their weights; "tick" lets the simulated time pass and runs a pass of the
+# matchmaker
+OPERATIONS = {
+    "register_player": 2,
+    "make_choice": 6,
+    "reset_state_after_single_match": 3,
+    "rematch": 2,
+    "new_match": 2,
+    "update_general_score": 2,
+    "reset_after_left": 1,
+    "unregister_player": 1,
+    "get_changes_since": 2,
+    "tick": 1,
+}
+MOVES = [move.value for move in Move]
+TICK_SECONDS = (0.5, 5.0)  # Range of the simulated seconds of a tick
+HOT_GAMES = 2  # Hot-set size of the server under test, small so the games are evicted and faulted in often
+IDLE_TIMEOUT = 4.0  # Simulated seconds without access after which a game is evicted
+CHECK_EVERY = 50  # Steps of each thread between two checks of the invariants in the multi-threaded mode
+SWITCH_INTERVAL = 1e-5  # Thread switch interval of the multi-threaded mode, short to vary the interleavings
+
+
+class InvariantError(Exception):
+    """
+    Raised when the state of the server breaks an invariant, or a call fails in an unexpected way.
+    """
+
+
+class Harness:
+    """
+    In-process GameServer driven step by step: every step is one call of a simulated player, so an interleaving is
+    the order of the steps and a trace replays it exactly. The simulated time of the matchmaker and of the eviction of
+    the idle games only moves with the "tick" steps, which run one at a time like the Matchmaker and Sweeper threads.
+
+    Attributes:
+        server (GameServer): The server under test.
+        now (float): The simulated time.
+        trace (list): The steps run, each a [player_name, operation, args] list.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.server = GameServer(waiting=WaitingIndex(clock=lambda: self.now), hot_games=HOT_GAMES,
+                                 idle_timeout=IDLE_TIMEOUT)
+        self.server.games.clock = lambda: self.now
+        self.trace = []
+        self._tick_lock = threading.Lock()
+
+    def step(self, player_name, operation, args, check=True):
+        """
+        Runs a step and checks the invariants.
+
+        Args:
+            player_name (str): The simulated player.
+            operation (str): The operation, a method of the server or "tick".
+            args (list): The arguments following the player.
+            check (bool, optional): Flag to silence the server and check the invariants after the step. Defaults to
+                True; False for the threads of run_threaded, which share one redirection and check at their barriers.
+
+        Raises:
+            InvariantError: If the call failed unexpectedly or the state breaks an invariant.
+        """
+        self.trace.append([player_name, operation, list(args)])
+        registered = self.server.is_registered(player_name)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()) if check else contextlib.nullcontext():
+                if operation == "tick":
+                    with self._tick_lock:
+                        self.now += args[0]
+                        self.server._pair_waiting()
+                        self.server._evict_idle_games()
+                else:
+                    getattr(self.server, operation)(player_name, *args)
+        except KeyError as e:
+            if registered:
+                raise InvariantError(f"{operation} of a registered player failed: KeyError {e}") from e
+        except ValueError as e:
+            if operation != "register_player" or not registered:
+                raise InvariantError(f"{operation} failed: ValueError {e}") from e
+        except Exception as e:
+            raise InvariantError(f"{operation} failed: {type(e).__name__} {e}") from e
+        if check:
+            self.check()
+
+    def check(self):
+        """
+        Checks the invariants of the server state.
+
+        Raises:
+            InvariantError: If an invariant does not hold.
+        """
+        server = self.server
+        seats = {}
+        for key, game in server.games.items():
+            if str(game.game_id) != key:
+                raise InvariantError(f"game {game.game_id} stored under the key {key}")
+            if not 1 <= len(game.players) <= 2:
+                raise InvariantError(f"game {key} has {len(game.players)} players")
+            if len(set(game.players)) != len(game.players):
+                raise InvariantError(f"game {key} has the same player twice: {game.players}")
+            for player_id in game.players:
+                if player_id in seats:
+                    raise InvariantError(f"player {player_id} is in games {seats[player_id]} and {key}")
+                seats[player_id] = game.game_id
+            extra = {name: set(values) - set(game.players) for name, values in
+                     (("moves", game.moves), ("results", game.results), ("scores", game.scores))}
+            for name, players in extra.items():
+                if players:
+                    raise InvariantError(f"game {key} keeps the {name} of players not in it: {players}")
+            if list(game.moves) != game.players:
+                # determine_winner pairs the moves with the players by position
+                raise InvariantError(f"game {key} has the moves of {list(game.moves)} for the players {game.players}")
+            for player_id in game.players:
+                score = game.scores[player_id]
+                if not 0 <= score <= BEST_OF_FIVE // 2 + 1:
+                    raise InvariantError(f"score {score} of player {player_id} in game {key}")
+            if sum(game.scores[player_id] for player_id in game.players) > BEST_OF_FIVE:
+                raise InvariantError(f"game {key} has more wins than matches: {dict(game.scores)}")
+            if not 0 <= game.rematch_counter < 2 or not 0 <= game.ready_to_play_again < 2:
+                raise InvariantError(f"game {key} counters: rematch {game.rematch_counter}, "
+                                     f"ready {game.ready_to_play_again}")
+            if (len(game.players) == 1) != (game.game_id in server.waiting):
+                raise InvariantError(f"game {key} with {len(game.players)} players, waiting: "
+                                     f"{game.game_id in server.waiting}")
+
+        if seats != server.players_game:
+            raise InvariantError(f"players_game {server.players_game} does not match the seats {seats}")
+        registered = {player_id for player_id, _ in server.players.items()}
+        if registered != set(server.players_game) or registered != set(server.players_score):
+            raise InvariantError(f"registered {registered}, seated {set(server.players_game)}, scored "
+                                 f"{set(server.players_score)}")
+        if len(server.waiting) != sum(len(game.players) == 1 for game in server.games.values()):
+            raise InvariantError(f"{len(server.waiting)} waiting games indexed")
+        if any(score < 0 for score in server.players_score.values()):
+            raise InvariantError(f"negative general score: {dict(server.players_score)}")
+        games = dict(server.games.items())  # without faulting the evicted games in
+        for player_id, game_id in server.players_game.items():
+            view = server.read_views.get(player_id)
+            if view is None and server.games.is_hot(str(game_id)):
+                raise InvariantError(f"player {player_id} of the hot game {game_id} has no view")
+            if view is not None and (view.game != GameSnapshot.of(games[str(game_id)])
+                                     or view.general_score != server.players_score[player_id]):
+                raise InvariantError(f"the view of player {player_id} does not match game {game_id}: {view}")
+
+
+def random_steps(seed, players, steps, prefix=""):
+    """
+    Generates a seeded random interleaving of the calls of the simulated players.
+
+    Args:
+        seed (int or str): The seed.
+        players (int): The number of simulated players.
+        steps (int): The number of steps.
+        prefix (str, optional): Prefix of the names of the players, to tell the players of the threads apart.
+
+    Yields:
+        tuple: The player name, the operation and its arguments.
+    """
+    rng = random.Random(seed)
+    names = [f"{prefix}P{i}" for i in range(players)]
+    operations, weights = zip(*OPERATIONS.items())
+    for _ in range(steps):
+        player_name = rng.choice(names)
+        operation = rng.choices(operations, weights)[0]
+        if operation == "make_choice":
+            args = [rng.choice(MOVES)]
+        elif operation == "get_changes_since":
+            args = [0]
+        elif operation == "tick":
+            args = [round(rng.uniform(*TICK_SECONDS), 3)]
+        else:
+            args = []
+        yield player_name, operation, args
+
+
+def run(steps):
+    """
+    Runs steps on a new harness.
+
+    Returns:
+        tuple: The harness and the InvariantError raised, None if every step passed.
+    """
+    harness = Harness()
+    try:
+        for player_name, operation, args in steps:
+            harness.step(player_name, operation, args)
+    except InvariantError as e:
+        return harness, e
+    return harness, None
+
+
+def run_threaded(seed, players, steps, threads, check_every=CHECK_EVERY):
+    """
+    Runs seeded steps from several threads at once on a new harness, as the Pyro5 worker threads of a server do:
+    every thread drives its own players, and the ticks of any thread run the matchmaker and the eviction. The threads
+    meet every check_every steps, and the invariants are checked while they all wait. The interleaving depends on the
+    scheduler, so a failure cannot be replayed from its seed.
+
+    Args:
+        seed (int): The seed.
+        players (int): The number of simulated players of each thread.
+        steps (int): The number of steps of each thread.
+        threads (int): The number of threads.
+        check_every (int, optional): Steps of each thread between two checks. Defaults to CHECK_EVERY.
+
+    Returns:
+        tuple: The harness and the first InvariantError raised, None if every step passed.
+    """
+    harness = Harness()
+    errors = []
+    barrier = threading.Barrier(threads, action=harness.check)
+
+    def drive(thread):
+        try:
+            for count, (player_name, operation, args) in enumerate(
+                    random_steps(f"{seed}-{thread}", players, steps, prefix=f"T{thread}"), 1):
+                harness.step(player_name, operation, args, check=False)
+                if count % check_every == 0:
+                    barrier.wait()
+            barrier.wait()
+        except InvariantError as e:
+            errors.append(e)
+            barrier.abort()
+        except threading.BrokenBarrierError:
+            pass  # another thread failed
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(SWITCH_INTERVAL)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            workers = [threading.Thread(target=drive, args=(thread,)) for thread in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    return harness, errors[0] if errors else None
+
+
+def shrink(trace):
+    """
+    Removes the steps of a failing trace that are not needed to reproduce a failure, one at a time.
+
+    Returns:
+        list: The shorter trace.
+    """
+    position = len(trace) - 2  # the last step is the failing one
+    while position >= 0:
+        harness, error = run(trace[:position] + trace[position + 1:])
+        if error is not None:
+            trace = harness.trace
+        position -= 1
+    return trace
+
+
+def main(argv=None):
+    """
+    Drives simulated players against an in-process GameServer with seeded random interleavings, checking the
+    invariants after every step; a failing trace is written to a file and can be replayed with --replay.
+    """
+    parser = argparse.ArgumentParser(description="Stress and replay harness of the GameServer.")
+    parser.add_argument("--seeds", type=int, default=100, help="number of seeds to run")
+    parser.add_argument("--first-seed", type=int, default=0, help="first seed")
+    parser.add_argument("--players", type=int, default=6, help="simulated players per run (per thread)")
+    parser.add_argument("--steps", type=int, default=2000, help="steps per run (per thread)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="threads calling the server at once; their interleavings cannot be replayed")
+    parser.add_argument("--trace", default="failing-trace.json", help="file of the first failing trace")
+    parser.add_argument("--shrink", action="store_true", help="shrink the failing trace before writing it")
+    parser.add_argument("--replay", default=None, help="replay a trace file instead of running seeds")
+    args = parser.parse_args(argv)
+
+    if args.replay is not None:
+        with open(args.replay) as file:
+            trace = json.load(file)["steps"]
+        harness, error = run(trace)
+        if error is None:
+            print(f"{len(trace)} steps replayed, every invariant holds.")
+        else:
+            print(f"Step {len(harness.trace)} of {len(trace)} ({harness.trace[-1]}) fails: {error}")
+        return 1 if error is not None else 0
+
+    if args.threads > 1:
+        for seed in range(args.first_seed, args.first_seed + args.seeds):
+            harness, error = run_threaded(seed, args.players, args.steps, args.threads)
+            if error is not None:
+                print(f"Seed {seed} with {args.threads} threads fails after {len(harness.trace)} steps: {error}")
+                return 1
+        print(f"{args.seeds} seeds of {args.steps} steps on {args.threads} threads with {args.players} players each: "
+              f"every invariant holds.")
+        return 0
+
+    for seed in range(args.first_seed, args.first_seed + args.seeds):
+        harness, error = run(random_steps(seed, args.players, args.steps))
+        if error is None:
+            continue
+        trace = shrink(harness.trace) if args.shrink else harness.trace
+        with open(args.trace, "w") as file:
+            json.dump({"seed": seed, "players": args.players, "error": str(error), "steps": trace}, file, indent=1)
+        print(f"Seed {seed} fails at step {len(harness.trace)}: {error}")
+        print(f"Trace of {len(trace)} steps written to {args.trace}; replay with --replay {args.trace}")
+        return 1
+    print(f"{args.seeds} seeds of {args.steps} steps with {args.players} players: every invariant holds.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
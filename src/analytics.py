@@ -0,0 +1,213 @@
+# analytics.py
+
+import threading
+from collections import deque
+
+from src.enums import Move, Result
+from src.history import ROUND, SERIES
+
+WINDOW = 20  # Number of recent rounds of the rolling rates of a player
+DRAW = "Draw"  # Winner of a drawn series
+
+MOVES = tuple(move.value for move in Move)
+RESULTS = tuple(result.value for result in Result)
+
+
+class PlayerStats:
+    """
+    The aggregates of a player, updated in O(1) per round and of bounded size: the counters of the moves and of the
+    results, the record of the series, the current streak and the results of the last WINDOW rounds.
+
+    Attributes:
+        moves (dict): Number of times each move was played.
+        results (dict): Number of rounds won ("Winner"), lost ("Loser") and drawn ("Draw").
+        series (dict): Number of series "won", "lost" and "drawn".
+        streak_result (str or None): The result of the current streak.
+        streak (int): Number of consecutive rounds with streak_result.
+        best_win_streak (int): The longest streak of won rounds.
+        recent (deque): The results of the last WINDOW rounds, oldest first.
+        recent_results (dict): Number of each result in recent.
+    """
+
+    def __init__(self, window=WINDOW):
+        """
+        Initialize the PlayerStats of a player who has not played yet.
+
+        Args:
+            window (int, optional): Number of rounds of the rolling rates. Defaults to WINDOW.
+        """
+        self.moves = dict.fromkeys(MOVES, 0)
+        self.results = dict.fromkeys(RESULTS, 0)
+        self.series = {"won": 0, "lost": 0, "drawn": 0}
+        self.streak_result = None
+        self.streak = 0
+        self.best_win_streak = 0
+        self.recent = deque(maxlen=window)
+        self.recent_results = dict.fromkeys(RESULTS, 0)
+
+    def add_round(self, move, result):
+        """
+        Counts a decided round.
+
+        Args:
+            move (str): The move of the player.
+            result (str): The result of the player ("Winner", "Loser", "Draw").
+        """
+        self.moves[move] = self.moves.get(move, 0) + 1
+        self.results[result] += 1
+        if result == self.streak_result:
+            self.streak += 1
+        else:
+            self.streak_result, self.streak = result, 1
+        if result == Result.WIN.value:
+            self.best_win_streak = max(self.best_win_streak, self.streak)
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_results[self.recent[0]] -= 1  # the oldest result leaves the window
+        self.recent.append(result)
+        self.recent_results[result] += 1
+
+    def add_series(self, outcome):
+        """
+        Counts a finished series.
+
+        Args:
+            outcome (str): "won", "lost" or "drawn".
+        """
+        self.series[outcome] += 1
+
+    def to_dict(self):
+        """
+        Gets the aggregates and the rates derived from them.
+
+        Returns:
+            dict: The "rounds" played, the "moves", "results" and "series" counters, the "move_frequencies", the
+            "win_rate", the current "streak" and its "streak_result", the "best_win_streak" and the "recent_rounds"
+            of the rolling window with their "recent_win_rate".
+        """
+        rounds = sum(self.results.values())
+        recent = len(self.recent)
+        return {
+            "rounds": rounds,
+            "moves": dict(self.moves),
+            "results": dict(self.results),
+            "series": dict(self.series),
+            "move_frequencies": {move: count / rounds for move, count in self.moves.items()} if rounds else {},
+            "win_rate": self.results[Result.WIN.value] / rounds if rounds else None,
+            "streak": self.streak,
+            "streak_result": self.streak_result,
+            "best_win_streak": self.best_win_streak,
+            "recent_rounds": recent,
+            "recent_win_rate": self.recent_results[Result.WIN.value] / recent if recent else None,
+        }
+
+
+class Analytics:
+    """
+    Incremental aggregator of the statistics of the players, fed with the same round and series records as the
+    history (see history.round_record and history.series_record), so the aggregates can be rebuilt from the history
+    at any time. The players are identified by name, as in the records: the statistics of a player outlive their
+    registration.
+
+    Attributes:
+        window (int): Number of recent rounds of the rolling rates.
+        rounds (int): Number of round records counted.
+        series (int): Number of series records counted.
+    """
+
+    def __init__(self, window=WINDOW):
+        """
+        Initialize an empty Analytics.
+
+        Args:
+            window (int, optional): Number of recent rounds of the rolling rates. Defaults to WINDOW.
+        """
+        self.window = window
+        self.rounds = 0
+        self.series = 0
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _player(self, player_name):
+        stats = self._stats.get(player_name)
+        if stats is None:
+            stats = self._stats[player_name] = PlayerStats(self.window)
+        return stats
+
+    def record(self, record):
+        """
+        Counts a round or series record.
+
+        Args:
+            record (dict): The record, as stored in the history.
+        """
+        with self._lock:
+            if record["type"] == ROUND:
+                self.rounds += 1
+                for player_name in record["players"]:
+                    self._player(player_name).add_round(record["moves"][player_name], record["results"][player_name])
+            elif record["type"] == SERIES:
+                self.series += 1
+                for player_name in record["players"]:
+                    if record["winner"] == DRAW:
+                        outcome = "drawn"
+                    else:
+                        outcome = "won" if record["winner"] == player_name else "lost"
+                    self._player(player_name).add_series(outcome)
+
+    def rebuild(self, records):
+        """
+        Replaces the aggregates with the ones of a sequence of records, e.g. HistoryStore.records().
+
+        Args:
+            records (iterable): The records, in sequence order.
+
+        Returns:
+            int: The number of records counted.
+        """
+        with self._lock:
+            self._stats = {}
+            self.rounds = self.series = 0
+        count = 0
+        for record in records:
+            self.record(record)
+            count += 1
+        return count
+
+    def state(self):
+        """
+        Gets the aggregates, e.g. to save them in a snapshot. The PlayerStats are not copied: the aggregator must not
+        be counting records until they are saved.
+
+        Returns:
+            dict: The "rounds" and "series" counted and the PlayerStats of each player ("stats"), keyed by name.
+        """
+        with self._lock:
+            return {"rounds": self.rounds, "series": self.series, "stats": dict(self._stats)}
+
+    def load(self, state):
+        """
+        Replaces the aggregates with the ones returned by state().
+
+        Args:
+            state (dict): The aggregates.
+        """
+        with self._lock:
+            self.rounds, self.series = state["rounds"], state["series"]
+            self._stats = dict(state["stats"])
+
+    def get(self, player_name):
+        """
+        Gets the statistics of a player.
+
+        Args:
+            player_name (str): The name of the player.
+
+        Returns:
+            dict or None: The statistics (see PlayerStats.to_dict), None if the player has never finished a round.
+        """
+        with self._lock:
+            stats = self._stats.get(player_name)
+            return stats.to_dict() if stats is not None else None
+
+    def __len__(self):
+        return len(self._stats)
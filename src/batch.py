@@ -0,0 +1,184 @@
+# batch.py
+
+import builtins
+import time
+
+from src.errors import ERROR_CLASSES, MorraCineseError, RateLimitExceeded
+
+MAX_BATCH_OPS = 10000  # Maximum number of operations of a batch accepted by the server
+BATCH_CHUNK = 1000  # Number of operations sent in one call by a Batch
+# Methods that cannot run in a batch: the batch itself, the streams, and the steps of the registration, which would
+# seat a player who already has a game a second time
+NOT_BATCHABLE = {"execute_batch", "export_history", "create_game", "add_player_to_game"}
+
+
+def is_batchable(server, method):
+    """
+    Tells if a method of the GameServer can run in a batch: the exposed (rate limited) methods can, except the ones
+    in NOT_BATCHABLE.
+
+    Args:
+        server (GameServer): The game server.
+        method (str): The name of the method.
+
+    Returns:
+        bool: True if the method can run in a batch, False otherwise.
+    """
+    if method.startswith("_") or method in NOT_BATCHABLE:
+        return False
+    return hasattr(getattr(type(server), method, None), "rate_limit_kind")
+
+
+def run_batch(server, ops, stop_on_error=False):
+    """
+    Runs a batch of operations on the server, in order. Every operation is a regular call of the method, nested in
+    the batch, which the rate limiter has admitted as a whole against the bulk budget of the connection.
+
+    Args:
+        server (GameServer): The game server.
+        ops (list): The operations, each a [method, args] or [method, args, kwargs] list.
+        stop_on_error (bool, optional): Flag to stop at the first failed operation. Defaults to False.
+
+    Raises:
+        ValueError: If the batch has more than MAX_BATCH_OPS operations.
+
+    Returns:
+        list: The outcome of each operation run, a {"result": value} or {"error": name, "args": list} dictionary.
+        With stop_on_error the list ends at the failed operation.
+    """
+    if len(ops) > MAX_BATCH_OPS:
+        raise ValueError(f"A batch can have at most {MAX_BATCH_OPS} operations, got {len(ops)}.")
+    outcomes = []
+    for op in ops:
+        method, args = op[0], op[1] if len(op) > 1 else []
+        kwargs = op[2] if len(op) > 2 else {}
+        try:
+            if not is_batchable(server, method):
+                raise ValueError(f"Method {method} cannot run in a batch.")
+            outcomes.append({"result": getattr(server, method)(*args, **kwargs)})
+        except Exception as e:
+            outcomes.append({"error": type(e).__name__, "args": list(e.args)})
+            if stop_on_error:
+                break
+    return outcomes
+
+
+def error_from_outcome(outcome):
+    """
+    Rebuilds the exception of a failed operation: the errors of the game server and the builtin exceptions keep
+    their type, the others become a MorraCineseError.
+
+    Args:
+        outcome (dict): The outcome of the operation.
+
+    Returns:
+        Exception: The exception.
+    """
+    name, args = outcome["error"], outcome["args"]
+    for error_class in ERROR_CLASSES:
+        if error_class.__name__ == name:
+            return error_class(*args)
+    error_class = getattr(builtins, name, None)
+    if isinstance(error_class, type) and issubclass(error_class, Exception):
+        return error_class(*args)
+    return MorraCineseError(f"{name}: {', '.join(map(str, args))}")
+
+
+def unpack(outcome):
+    """
+    Gets the result of an operation, raising its exception if it failed.
+
+    Args:
+        outcome (dict): The outcome of the operation.
+
+    Returns:
+        The value returned by the operation.
+    """
+    if "error" in outcome:
+        raise error_from_outcome(outcome)
+    return outcome["result"]
+
+
+class Batch:
+    """
+    Client-side builder of a batch of GameServer operations: the calls made on the batch are recorded and sent
+    together by execute(), in chunks of chunk_size operations per round trip.
+
+    Example:
+        batch = Batch(server)
+        for i in range(10000):
+            batch.register_player(f"player {i}")
+        results = batch.execute()
+
+    Attributes:
+        server (Pyro5.api.Proxy or PooledServer): The game server object.
+        chunk_size (int): Number of operations sent in one call.
+        ops (list): The recorded operations.
+    """
+
+    def __init__(self, server, chunk_size=BATCH_CHUNK):
+        """
+        Initialize an empty Batch.
+
+        Args:
+            server (Pyro5.api.Proxy or PooledServer): The game server object.
+            chunk_size (int, optional): Number of operations sent in one call. Defaults to BATCH_CHUNK.
+        """
+        self.server = server
+        self.chunk_size = min(chunk_size, MAX_BATCH_OPS)
+        self.ops = []
+
+    def add(self, method, *args, **kwargs):
+        """
+        Records an operation.
+
+        Args:
+            method (str): The name of the server method.
+            *args: The positional arguments of the method.
+            **kwargs: The keyword arguments of the method.
+
+        Returns:
+            Batch: The batch itself.
+        """
+        self.ops.append([method, list(args), kwargs] if kwargs else [method, list(args)])
+        return self
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def record(*args, **kwargs):
+            return self.add(name, *args, **kwargs)
+
+        return record
+
+    def __len__(self):
+        return len(self.ops)
+
+    def execute(self, stop_on_error=False):
+        """
+        Sends the recorded operations and empties the batch. A chunk rejected by the rate limiter has not run, so
+        it is sent again after the delay the server suggests.
+
+        Args:
+            stop_on_error (bool, optional): Flag to stop at the first failed operation; the operations after it are
+                not run. Defaults to False.
+
+        Returns:
+            list: The result of each operation run, in order; a failed operation has its exception in place of the
+            result.
+        """
+        ops, self.ops = self.ops, []
+        results = []
+        for start in range(0, len(ops), self.chunk_size):
+            while True:
+                try:
+                    outcomes = self.server.execute_batch(ops[start:start + self.chunk_size], stop_on_error)
+                    break
+                except RateLimitExceeded as e:
+                    time.sleep(e.retry_after)
+            results.extend(error_from_outcome(outcome) if "error" in outcome else outcome["result"]
+                           for outcome in outcomes)
+            if stop_on_error and outcomes and "error" in outcomes[-1]:
+                break
+        return results
@@ -0,0 +1,596 @@
+# clientcore.py
+
+import time
+
+from src.batch import unpack, BATCH_CHUNK
+from src.enums import MatchStatus
+from src.errors import RateLimitExceeded
+
+TIME_TO_MOVE = 120  # Time to make a move in seconds
+RESET_DELAY = 1  # Delay in seconds before a new round starts after a single match is over
+MAX_RETRY_DELAY = 5  # Upper bound in seconds of the back off after the server rejected a call
+LOBBY_POLL_INTERVAL = 5  # Interval in seconds between two reads of the place in the lobby while waiting
+
+
+class ClientListener:
+    """
+    Base class for the front-ends driven by a ClientCore. Every hook is a no-op, so a front-end only overrides the
+    events it is interested in (the GUI updates its widgets, a bot picks a move, a CLI prints a line, ...).
+    """
+
+    def on_match_started(self, opponent_name):
+        """
+        Called when a match is ongoing and the player has not made a move yet.
+
+        Args:
+            opponent_name (str or None): The name of the opponent.
+        """
+
+    def on_move_made(self, choice):
+        """
+        Called after the player's move has been sent to the server.
+
+        Args:
+            choice (str): The move made by the player.
+        """
+
+    def on_round_over(self, result, winner_of_series):
+        """
+        Called when a single match or the whole series is over.
+
+        Args:
+            result (str or None): The result of the match for the player ("Winner", "Loser", "Draw").
+            winner_of_series (str or None): The winner of the series, None if the series is not over yet.
+        """
+
+    def on_rematch_available(self):
+        """
+        Called when the series is over and the player can ask for a rematch or a new match.
+        """
+
+    def on_rematch_unavailable(self):
+        """
+        Called when the player is waiting for an opponent and a rematch cannot be requested.
+        """
+
+    def on_waiting(self, position, estimated_wait):
+        """
+        Called every LOBBY_POLL_INTERVAL seconds while the player is waiting for an opponent.
+
+        Args:
+            position (int): The place of the player in the lobby, 1 for the player waiting longest.
+            estimated_wait (float or None): The estimated seconds to wait, None if the server cannot estimate it.
+        """
+
+    def on_opponent_left(self, opponent_name, awarded_win):
+        """
+        Called when the opponent has left the game.
+
+        Args:
+            opponent_name (str or None): The name of the opponent, if still known.
+            awarded_win (bool): True if the player has been awarded the win of the interrupted series.
+        """
+
+    def on_new_round(self, num_of_match, new_match, score):
+        """
+        Called when the client is ready for a new round of the series.
+
+        Args:
+            num_of_match (int): The number of the match in the series.
+            new_match (bool): True if the round belongs to a new match against a new opponent.
+            score (int or None): The score of the series, only provided for a new match.
+        """
+
+    def on_score_changed(self, score):
+        """
+        Called when the score of the current series has been refreshed.
+
+        Args:
+            score (int): The score of the series.
+        """
+
+    def on_general_score_changed(self, general_score):
+        """
+        Called when the general score of the player has been refreshed.
+
+        Args:
+            general_score (int): The general score of the player.
+        """
+
+    def on_rematch_started(self):
+        """
+        Called when both players have accepted a rematch.
+        """
+
+    def on_unregistered(self, timed_out):
+        """
+        Called after the player has been unregistered from the server.
+
+        Args:
+            timed_out (bool): True if the player was unregistered because the time to make a move expired.
+        """
+
+
+class ClientCore:
+    """
+    The ClientCore class holds the client-side logic of the game without any dependency on a user interface: player
+    registration, move submission, status transitions, rematch and new match flow. A front-end (the Qt GUI, a CLI,
+    a bot running in a thread or in an asyncio loop) drives the core by calling tick() periodically and reacts to the
+    events notified to its ClientListener.
+
+    The fields seen by the player are kept in a local cache, refreshed once per tick with the changes since the last
+    version received (GameServer.get_changes_since), and again only after a call that changes the state.
+
+    Attributes:
+        player_name (str): The player's name.
+        player_id (int or None): The id handed out by the server at the registration, None before it.
+        server (Pyro5.api.Proxy): The game server object that the client interacts with.
+        listener (ClientListener): The object notified of every state transition.
+        made_move (bool): Flag to track if the client has made a move.
+        series_over (bool): Flag to track if the series has ended.
+        registered (bool): Flag to track if the player is registered on the server.
+        phase (str): Which status the core is polling, either GAME_PHASE or MATCH_PHASE.
+        cache (dict): The last known value of the fields seen by the player.
+        version (int): The version of the cache, 0 if the cache is empty.
+        stale (bool): Flag to track if the cache must be refreshed before the next read.
+        reset_delay (float): Delay in seconds before a new round starts after a single match is over.
+    """
+    GAME_PHASE = "game"  # Polling the game state while the match is played
+    MATCH_PHASE = "match"  # Polling the match status between two matches
+
+    def __init__(self, player_name, server, listener=None, clock=time.monotonic, reset_delay=RESET_DELAY):
+        """
+        Initialize the ClientCore with a player's name and the server object.
+
+        Args:
+            player_name (str): The name of the player.
+            server (Pyro5.api.Proxy): The game server object.
+            listener (ClientListener, optional): The listener of the core events. Defaults to a no-op listener.
+            clock (callable, optional): Monotonic clock used for the move and reset deadlines.
+            reset_delay (float, optional): Delay in seconds before a new round starts after a single match is over,
+                for the player to see the result. Defaults to RESET_DELAY.
+        """
+        self.player_name = player_name
+        self.player_id = None
+        self.server = server
+        self.listener = listener if listener is not None else ClientListener()
+        self.clock = clock
+        self.reset_delay = reset_delay
+        self.made_move = False
+        self.series_over = False
+        self.registered = False
+        self.phase = self.GAME_PHASE
+        self.move_deadline = None  # Deadline to make a move, None if no move is awaited
+        self.reset_at = None  # Time at which the next round starts, None if no round is pending
+        self.retry_at = None  # Time before which the server asked not to call it again, None if no limit applies
+        self.rejections = 0  # Number of consecutive ticks rejected by the server
+        self.lobby_read_at = None  # Time of the last read of the place in the lobby, None before the first one
+        self.cache = {}
+        self.version = 0
+        self.stale = True
+
+    @property
+    def player(self):
+        """
+        The player as sent to the server: the id once registered, the name before.
+        """
+        return self.player_id if self.player_id is not None else self.player_name
+
+    def refresh(self):
+        """
+        Applies to the cache the fields changed on the server since the cached version.
+        """
+        self.apply_changes(self.server.get_changes_since(self.player, self.version))
+
+    def refresh_op(self):
+        """
+        The batch operation reading the changes since the cached version, for a caller refreshing many cores in one
+        request (see TablePoller).
+
+        Returns:
+            list: The [method, args] operation.
+        """
+        return ["get_changes_since", [self.player, self.version]]
+
+    def apply_changes(self, delta):
+        """
+        Applies to the cache the changes returned by GameServer.get_changes_since.
+
+        Args:
+            delta (dict): The new "version" and the "changes".
+        """
+        self.cache.update(delta["changes"])
+        self.version = delta["version"]
+        self.stale = False
+
+    def fetch(self, field):
+        """
+        Reads a field from the cache, refreshing it first if it is stale.
+
+        Args:
+            field (str): The name of the field, e.g. "match_status" or "general_score".
+
+        Returns:
+            The value of the field.
+        """
+        if self.stale:
+            self.refresh()
+        return self.cache[field]
+
+    def update(self, method, *args):
+        """
+        Calls a server method that changes the state of the game. The call and the refresh of the cache are sent
+        in one batch, so the changes are read without another round trip.
+
+        Args:
+            method (str): The name of the server method.
+            *args: The arguments following the player.
+
+        Returns:
+            The value returned by the server.
+        """
+        outcomes = self.server.execute_batch([[method, [self.player, *args]],
+                                              ["get_changes_since", [self.player, self.version]]], True)
+        self.stale = True
+        result = unpack(outcomes[0])
+        if len(outcomes) > 1 and "error" not in outcomes[1]:
+            self.apply_changes(outcomes[1]["result"])
+        return result
+
+    def clear_cache(self):
+        """
+        Empties the cache, e.g. when the player is registered again on a server that may have a different clock.
+        """
+        self.cache = {}
+        self.version = 0
+        self.stale = True
+
+    def register(self):
+        """
+        Registers the player on the server.
+
+        Raises:
+            ValueError: If a player with the same name already exists.
+        """
+        self.player_id = self.server.register_player(self.player_name)
+        self.registered = True
+        self.clear_cache()
+
+    def resume_session(self):
+        """
+        Restores the player's session after the connection to the server has been re-established: if the server no
+        longer knows the player (e.g. it has been restarted), the player is registered again and waits for a new match.
+        The check is made by name: a server restarted without a snapshot may have handed out the old id to another
+        player.
+
+        Returns:
+            bool: True if the player has been registered again, False if the session was still alive.
+        """
+        if self.registered and not self.server.is_registered(self.player_name):
+            print(f"Session of {self.player_name} lost, registering again...")
+            self.player_id = self.server.register_player(self.player_name)
+            self.clear_cache()
+            self.made_move = False
+            self.series_over = False
+            self.move_deadline = None
+            self.reset_at = None
+            self.phase = self.GAME_PHASE
+            return True
+        return False
+
+    def due(self):
+        """
+        Tells if the next tick will poll the server, i.e. the player is registered and the server is not asking the
+        client to back off.
+
+        Returns:
+            bool: True if the next tick polls the server.
+        """
+        return self.registered and (self.retry_at is None or self.clock() >= self.retry_at)
+
+    def tick(self, refreshed=False):
+        """
+        Advances the client state machine: checks the move deadline, starts a pending round and polls the server.
+        Front-ends call this function every POLLING_INTERVAL seconds.
+
+        Args:
+            refreshed (bool, optional): Flag set by a caller that has just refreshed the cache (see TablePoller), so
+                the tick reads it without another request. Defaults to False.
+        """
+        if not self.registered:
+            return
+
+        now = self.clock()
+        if self.retry_at is not None:
+            if now < self.retry_at:
+                return
+            self.retry_at = None
+
+        self.stale = not refreshed
+        try:
+            self._advance(now)
+            self.rejections = 0
+        except RateLimitExceeded as e:
+            # the call has been rejected by the server without any effect: back off and repeat it later. A tick makes
+            # several calls, so the delay doubles while the ticks keep being rejected, until the budget covers them
+            print(f"{self.player_name}: {e}")
+            self.retry_at = self.clock() + min(e.retry_after * 2 ** self.rejections, MAX_RETRY_DELAY)
+            self.rejections += 1
+
+    def _advance(self, now):
+        """
+        Body of tick(), run when the server is not asking the client to back off.
+
+        Args:
+            now (float): The current time.
+        """
+        if self.move_deadline is not None and now >= self.move_deadline:
+            self.unregister(timed_out=True)
+            return
+
+        if self.reset_at is not None:
+            if now < self.reset_at:
+                return  # the single match acknowledgement has already been sent, wait for the next round
+            self.reset_at = None
+            self.reset_game_state()
+
+        if self.phase == self.GAME_PHASE:
+            self.poll_game_state()
+        else:
+            self.poll_match_status()
+
+    def make_choice(self, choice):
+        """
+        Makes a move in the game.
+
+        Args:
+            choice (str): The move of the player.
+
+        Returns:
+            bool: True if the move has been sent, False if a move was already made.
+        """
+        if self.made_move:
+            return False
+
+        self.update("make_choice", choice)
+        self.made_move = True
+        self.move_deadline = None
+        self.listener.on_move_made(choice)
+        return True
+
+    def show_winner(self, winner, winner_of_series=None):
+        """
+        Handles the end of a single match or of the series. All the calls to the server are made before the
+        listener is notified, so if one of them is rejected the whole handling is repeated on the next tick.
+
+        Args:
+            winner (str): The result of the match for the player.
+            winner_of_series (str): The name of the player who won the series (optional).
+        """
+        general_score = None
+        if winner_of_series is not None:
+            self.update("update_general_score")
+            general_score = self.fetch("general_score")
+        score = self.fetch("score")
+        match_status = MatchStatus(self.fetch("match_status"))
+
+        self.phase = self.MATCH_PHASE
+        if general_score is not None:
+            self.listener.on_general_score_changed(general_score)
+        self.listener.on_round_over(winner, winner_of_series)
+        self.listener.on_score_changed(score)
+
+        if match_status == MatchStatus.SERIES_OVER:
+            self.made_move = False
+            self.listener.on_rematch_available()
+
+    def update_score(self):
+        """
+        Refreshes the score of the current game series.
+        """
+        self.listener.on_score_changed(self.fetch("score"))
+
+    def handle_opponent_left(self):
+        """
+        Handles the opponent leaving the game: the player is awarded the series if it was still in progress.
+        """
+        self.made_move = False
+        self.move_deadline = None
+        self.phase = self.MATCH_PHASE
+
+        awarded_win = not self.series_over
+        if awarded_win:
+            self.update("update_general_score")
+
+        opponent_name = self.fetch("opponent_name")
+        general_score = self.fetch("general_score")
+        self.update("reset_after_left")
+
+        # the listener is notified last, since it may leave the game (e.g. a bot that has finished playing)
+        self.listener.on_general_score_changed(general_score)
+        self.listener.on_opponent_left(opponent_name, awarded_win)
+
+    def poll_game_state(self):
+        """
+        Polls the game state from the server while a match is being played.
+        """
+        game_state = self.fetch("game_state")
+        match_status = MatchStatus(self.fetch("match_status"))
+        winner_of_series = self.fetch("winner_of_series")
+
+        if match_status == MatchStatus.NONE:
+            self.poll_lobby()
+
+        if match_status == MatchStatus.LEFT:
+            self.handle_opponent_left()
+
+        if match_status == MatchStatus.ONGOING and not self.made_move:
+            if self.move_deadline is None:
+                self.move_deadline = self.clock() + TIME_TO_MOVE
+            self.listener.on_match_started(self.fetch("opponent_name"))
+
+        if game_state and match_status == MatchStatus.OVER:
+            self.show_winner(game_state)
+            self.series_over = False
+
+        if match_status == MatchStatus.SERIES_OVER:
+            self.show_winner(game_state, winner_of_series)
+            self.series_over = True
+
+    def poll_match_status(self):
+        """
+        Polls the match status from the server between two matches.
+        """
+        # match_status is a string instead of a MatchStatus enum.
+        # this is a workaround because Pyro cannot serialize the MatchStatus enum
+        match_status = MatchStatus(self.fetch("match_status"))
+
+        if match_status == MatchStatus.NONE:
+            self.listener.on_rematch_unavailable()
+            self.poll_lobby()
+
+        if match_status == MatchStatus.LEFT:
+            self.handle_opponent_left()
+
+        if match_status == MatchStatus.ONGOING and not self.made_move:
+            self.reset_game_state(new_match=True)
+            self.listener.on_match_started(self.fetch("opponent_name"))
+        if match_status == MatchStatus.OVER:
+            self.made_move = False
+            self.update("reset_state_after_single_match")
+            self.reset_at = self.clock() + self.reset_delay
+        elif match_status == MatchStatus.REMATCH:
+            self.reset_game_state()
+            self.update_score()
+            self.listener.on_rematch_started()
+
+    def poll_lobby(self):
+        """
+        Reads the place of the player in the lobby while waiting for an opponent, every LOBBY_POLL_INTERVAL seconds.
+        """
+        now = self.clock()
+        if self.lobby_read_at is not None and now - self.lobby_read_at < LOBBY_POLL_INTERVAL:
+            return
+        self.lobby_read_at = now
+        status = self.server.get_lobby_status(self.player)
+        if status["position"] is not None:
+            self.listener.on_waiting(status["position"], status["estimated_wait"])
+
+    def request_rematch(self):
+        """
+        Requests a rematch at the end of the game series.
+
+        Returns:
+            bool: True if the rematch was requested, False if the opponent is no longer in the game.
+        """
+        result = self.update("rematch")
+        if result is None:
+            return False
+        self.made_move = False
+        return True
+
+    def request_new_match(self):
+        """
+        Requests a new match against a different opponent.
+        """
+        self.update("new_match")
+        self.made_move = False
+
+    def reset_game_state(self, new_match=False):
+        """
+        Resets the client state in preparation for a new match or rematch.
+
+        Args:
+            new_match (bool): Flag to indicate if this is a new match.
+        """
+        num_of_match = self.fetch("num_of_match")
+        self.made_move = False
+        self.series_over = False
+        self.phase = self.GAME_PHASE
+        score = self.fetch("score") if new_match else None
+        self.listener.on_new_round(num_of_match, new_match, score)
+
+    def unregister(self, timed_out=False):
+        """
+        Unregisters the player from the server.
+
+        Args:
+            timed_out (bool): True if the player is unregistered because the time to make a move expired.
+        """
+        if not self.registered:
+            return
+        print(f"Unregistering player {self.player_name}...")
+        self.server.unregister_player(self.player)
+        self.registered = False
+        self.move_deadline = None
+        self.reset_at = None
+        self.listener.on_unregistered(timed_out)
+
+
+class TablePoller:
+    """
+    Shared poll loop of many ClientCores using the same server connection, e.g. the seats of a multi-table client.
+    Every poll refreshes the caches of all the due cores with one batch of get_changes_since operations, then ticks
+    each core on its fresh cache: the seats cost one operation each in a single request, instead of a request each.
+
+    Attributes:
+        server (Pyro5.api.Proxy or PooledServer): The game server object shared by the cores.
+        cores (list): The polled cores.
+        on_error (callable or None): Function called with the core and the exception when the tick of a core fails,
+            so a failing seat does not stop the others; None to raise the exception.
+        requests (int): The number of batch requests sent.
+    """
+
+    def __init__(self, server, on_error=None):
+        """
+        Initialize the TablePoller.
+
+        Args:
+            server (Pyro5.api.Proxy or PooledServer): The game server object shared by the cores.
+            on_error (callable, optional): Function called with the core and the exception of a failed tick.
+                Defaults to None (the exception is raised).
+        """
+        self.server = server
+        self.cores = []
+        self.on_error = on_error
+        self.requests = 0
+
+    def add(self, core):
+        """
+        Adds a core to the poll loop.
+
+        Args:
+            core (ClientCore): The core, sharing the server object of the poller.
+        """
+        self.cores.append(core)
+
+    def remove(self, core):
+        """
+        Removes a core from the poll loop.
+
+        Args:
+            core (ClientCore): The core.
+        """
+        self.cores.remove(core)
+
+    def poll(self):
+        """
+        Refreshes the due cores in one batch request (in chunks of BATCH_CHUNK operations) and ticks them. A core
+        whose refresh failed, e.g. rejected by the rate limiter, is ticked without it and makes its own calls.
+        """
+        cores = [core for core in self.cores if core.due()]
+        outcomes = []
+        for start in range(0, len(cores), BATCH_CHUNK):
+            chunk = cores[start:start + BATCH_CHUNK]
+            outcomes.extend(self.server.execute_batch([core.refresh_op() for core in chunk]))
+            self.requests += 1
+        for core, outcome in zip(cores, outcomes):
+            refreshed = "error" not in outcome
+            if refreshed:
+                core.apply_changes(outcome["result"])
+            try:
+                core.tick(refreshed)
+            except Exception as e:
+                if self.on_error is None:
+                    raise
+                self.on_error(core, e)
@@ -0,0 +1,498 @@
+# connection.py
+
+import random
+import threading
+import time
+import weakref
+
+import Pyro5.api
+import Pyro5.errors
+
+from src.tracing import current_trace, RTT
+
+CONNECT_ATTEMPTS = 8  # Number of attempts to connect to the server before giving up
+INITIAL_BACKOFF = 0.1  # Delay in seconds before the second attempt
+MAX_BACKOFF = 5.0  # Upper bound in seconds of the delay between two attempts
+MAX_CONNECTIONS = 32  # Maximum number of connections opened by a ProxyPool
+
+# errors that mean the server cannot be reached (yet): refused connection, unknown name in the name server, ...
+CONNECT_ERRORS = (Pyro5.errors.CommunicationError, Pyro5.errors.NamingError)
+# methods of the server that only read its state, so a call lost with the connection can be sent again
+READ_CALLS = frozenset({"is_registered", "get_load", "find_available_game", "get_lobby_status", "get_game_state",
+                        "get_match_status", "get_score", "get_game", "get_winner_of_series", "get_general_score",
+                        "get_changes_since", "get_num_of_match", "get_opponent_name", "get_games", "get_player_stats",
+                        "get_server_metrics", "get_memory_report"})
+
+
+def backoff_delays(attempts=CONNECT_ATTEMPTS, initial=INITIAL_BACKOFF, maximum=MAX_BACKOFF, rng=random):
+    """
+    Generates the delays to wait between two connection attempts: an exponential backoff with jitter.
+
+    Args:
+        attempts (int, optional): Number of attempts. Defaults to CONNECT_ATTEMPTS.
+        initial (float, optional): Delay before the second attempt. Defaults to INITIAL_BACKOFF.
+        maximum (float, optional): Upper bound of the delay. Defaults to MAX_BACKOFF.
+        rng (random.Random, optional): Random generator used for the jitter.
+
+    Yields:
+        float: The delay in seconds to wait before the next attempt.
+    """
+    delay = initial
+    for _ in range(attempts - 1):
+        yield delay * (0.5 + rng.random() / 2)
+        delay = min(delay * 2, maximum)
+
+
+def describe(uri):
+    """
+    Describes a server URI, or a function resolving it, for the log messages.
+
+    Args:
+        uri (str or callable): The URI of the game server, or a function returning it.
+
+    Returns:
+        str: The description.
+    """
+    return "<name server lookup>" if callable(uri) else str(uri)
+
+
+def connect_proxy(uri, attempts=CONNECT_ATTEMPTS, initial=INITIAL_BACKOFF, maximum=MAX_BACKOFF, stop=None):
+    """
+    Creates a proxy and connects it to the server, retrying with an exponential backoff while the server is not up.
+
+    Args:
+        uri (str or callable): The URI of the game server, or a function returning it (e.g. a resolver built by
+            discovery.make_resolver), called at every attempt.
+        attempts (int, optional): Number of attempts. Defaults to CONNECT_ATTEMPTS.
+        initial (float, optional): Delay before the second attempt. Defaults to INITIAL_BACKOFF.
+        maximum (float, optional): Upper bound of the delay. Defaults to MAX_BACKOFF.
+        stop (threading.Event, optional): Event that interrupts the retries when set.
+
+    Raises:
+        Pyro5.errors.CommunicationError: If the server cannot be reached after all the attempts.
+        Pyro5.errors.NamingError: If the URI cannot be resolved after all the attempts.
+
+    Returns:
+        Pyro5.api.Proxy: A proxy with an open connection to the server.
+    """
+    delays = backoff_delays(attempts, initial, maximum)
+    while True:
+        proxy = None
+        try:
+            proxy = Pyro5.api.Proxy(uri() if callable(uri) else uri)
+            proxy._pyroBind()
+            return proxy
+        except CONNECT_ERRORS:
+            if proxy is not None:
+                proxy._pyroRelease()
+            delay = next(delays, None)
+            if delay is None or (stop is not None and stop.is_set()):
+                raise
+            print(f"Server {describe(uri)} not reachable, retrying in {delay:.2f} s...")
+            if stop is not None:
+                stop.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+class ProxyWarmer:
+    """
+    Connects a proxy to the server in a background thread, so the connection setup overlaps with the start of the
+    user interface. The thread that needs the proxy takes it with result(), which claims its ownership: Pyro5 proxies
+    can only be used by the thread that owns them.
+
+    Attributes:
+        uri (str or callable): The URI of the game server, or a function returning it.
+        started_at (float): Time at which the warm up started (time.perf_counter).
+        connected_at (float or None): Time at which the connection was ready, None if not connected yet.
+        error (Exception or None): The error raised by the last connection attempt, if any.
+    """
+
+    def __init__(self, uri, attempts=CONNECT_ATTEMPTS):
+        """
+        Initialize the ProxyWarmer.
+
+        Args:
+            uri (str or callable): The URI of the game server, or a function returning it.
+            attempts (int, optional): Number of connection attempts. Defaults to CONNECT_ATTEMPTS.
+        """
+        self.uri = uri
+        self.attempts = attempts
+        self.started_at = None
+        self.connected_at = None
+        self.error = None
+        self._proxy = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._connect, name="proxy-warmer", daemon=True)
+
+    def start(self):
+        """
+        Starts connecting in the background.
+
+        Returns:
+            ProxyWarmer: The warmer itself.
+        """
+        self.started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _connect(self):
+        """
+        Body of the background thread.
+        """
+        try:
+            self._proxy = connect_proxy(self.uri, self.attempts, stop=self._stop)
+            self.connected_at = time.perf_counter()
+        except CONNECT_ERRORS as e:
+            self.error = e
+
+    def ready(self):
+        """
+        Tells if the warm up has ended, successfully or not.
+
+        Returns:
+            bool: True if the warm up has ended, False otherwise.
+        """
+        return not self._thread.is_alive()
+
+    def result(self, timeout=None):
+        """
+        Waits for the connection and hands the proxy over to the calling thread.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to None (no limit).
+
+        Raises:
+            Pyro5.errors.CommunicationError: If the server could not be reached or the timeout expired.
+            Pyro5.errors.NamingError: If the URI could not be resolved.
+
+        Returns:
+            Pyro5.api.Proxy: The connected proxy, owned by the calling thread.
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise Pyro5.errors.CommunicationError(f"timed out while connecting to {describe(self.uri)}")
+        if self.error is not None:
+            raise self.error
+        self._proxy._pyroClaimOwnership()
+        return self._proxy
+
+    def cancel(self):
+        """
+        Interrupts the connection attempts.
+        """
+        self._stop.set()
+
+    def connect_time(self):
+        """
+        Gets the time spent to connect to the server.
+
+        Returns:
+            float or None: The connection time in seconds, None if not connected.
+        """
+        if self.connected_at is None:
+            return None
+        return self.connected_at - self.started_at
+
+
+def is_connection_lost(error):
+    """
+    Tells if an error raised by a remote call means that the connection is lost and the call can be retried on a
+    new connection. Protocol errors (for instance serialization errors) are not connection problems.
+
+    Args:
+        error (Exception): The error raised by the call.
+
+    Returns:
+        bool: True if the connection is lost, False otherwise.
+    """
+    return isinstance(error, Pyro5.errors.CommunicationError) and not isinstance(error, Pyro5.errors.ProtocolError)
+
+
+def is_retriable(method, args, kwargs):
+    """
+    Tells if a call lost with the connection can be sent again on a new one: the reads and the batches of reads can,
+    while a write may have run on the server before the connection dropped (e.g. a rematch request counted twice).
+
+    Args:
+        method (str): The name of the remote method.
+        args (tuple): The positional arguments of the call.
+        kwargs (dict): The keyword arguments of the call.
+
+    Returns:
+        bool: True if the call can be retried, False otherwise.
+    """
+    if method == "execute_batch":
+        ops = args[0] if args else kwargs.get("ops", [])
+        return all(op[0] in READ_CALLS for op in ops)
+    return method in READ_CALLS
+
+
+class _ThreadConnection:
+    """
+    The connection held by a thread of a ProxyPool. When the thread ends, its thread-local data is collected and
+    the connection slot is given back to the pool by a finalizer.
+
+    Attributes:
+        proxy (Pyro5.api.Proxy or None): The proxy of the thread, None if not connected.
+        session_hooks (list): Functions called after the connection is re-established.
+        resuming (bool): Flag set while the session hooks are running.
+        slot (list): One-element list, True while the connection holds one of the pool's slots.
+    """
+
+    def __init__(self, give_back_slot):
+        self.proxy = None
+        self.session_hooks = []
+        self.resuming = False
+        self.slot = [False]
+        weakref.finalize(self, give_back_slot, self.slot)
+
+
+class ProxyPool:
+    """
+    A pool of Pyro5 proxies, one per thread, since a proxy cannot be shared across threads. When a call fails because
+    the connection dropped, a new connection is opened with an exponential backoff; then the session hooks of the
+    thread (e.g. ClientCore.resume_session) are invoked, so the player's session is restored. A read is retried on the
+    new connection, unless the session had to be replaced; a write is not, and the error is raised. The total number
+    of open connections of the process is bounded.
+
+    Attributes:
+        uri (str or callable): The URI of the game server, or a function returning it.
+        max_connections (int): Maximum number of open connections.
+        attempts (int): Number of attempts when (re)connecting.
+        reconnections (int): Number of reconnections performed so far.
+        tracer (Tracer or None): The tracer recording the round-trip time of every call, None to disable it.
+    """
+
+    def __init__(self, uri, max_connections=MAX_CONNECTIONS, attempts=CONNECT_ATTEMPTS, acquire_timeout=None,
+                 tracer=None):
+        """
+        Initialize the ProxyPool.
+
+        Args:
+            uri (str or callable): The URI of the game server, or a function returning it.
+            max_connections (int, optional): Maximum number of open connections. Defaults to MAX_CONNECTIONS.
+            attempts (int, optional): Number of attempts when (re)connecting. Defaults to CONNECT_ATTEMPTS.
+            acquire_timeout (float, optional): Maximum time a thread waits for a free connection slot.
+                Defaults to None (wait forever).
+            tracer (Tracer, optional): The tracer of the calls. Defaults to None (no tracing).
+        """
+        self.uri = uri
+        self.max_connections = max_connections
+        self.attempts = attempts
+        self.acquire_timeout = acquire_timeout
+        self.reconnections = 0
+        self.tracer = tracer
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = 0
+
+    @property
+    def server(self):
+        """
+        Gets an object that forwards every method call to the server through the pool.
+
+        Returns:
+            PooledServer: The server object.
+        """
+        return PooledServer(self)
+
+    def open_connections(self):
+        """
+        Gets the number of connections currently held by the threads of the process.
+
+        Returns:
+            int: The number of open connections.
+        """
+        return self._open
+
+    def _connection(self):
+        """
+        Gets the connection record of the calling thread, creating it if needed.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = _ThreadConnection(self._give_back_slot)
+        return connection
+
+    def _take_slot(self, connection):
+        """
+        Reserves one of the pool's connection slots for the calling thread.
+
+        Raises:
+            Pyro5.errors.CommunicationError: If no slot is freed within acquire_timeout.
+        """
+        if connection.slot[0]:
+            return
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise Pyro5.errors.CommunicationError(f"too many open connections (max {self.max_connections})")
+        connection.slot[0] = True
+        with self._lock:
+            self._open += 1
+
+    def _give_back_slot(self, slot):
+        """
+        Gives back a connection slot to the pool.
+
+        Args:
+            slot (list): The slot flag of the connection that is closed.
+        """
+        if slot[0]:
+            slot[0] = False
+            with self._lock:
+                self._open -= 1
+            self._slots.release()
+
+    def proxy(self):
+        """
+        Gets the proxy of the calling thread, connecting it if needed.
+
+        Returns:
+            Pyro5.api.Proxy: The proxy owned by the calling thread.
+        """
+        connection = self._connection()
+        if connection.proxy is None:
+            self._take_slot(connection)
+            try:
+                connection.proxy = connect_proxy(self.uri, self.attempts)
+            except CONNECT_ERRORS:
+                self._give_back_slot(connection.slot)
+                raise
+        return connection.proxy
+
+    def adopt(self, proxy):
+        """
+        Makes an already connected proxy (e.g. the one warmed up by a ProxyWarmer) the proxy of the calling thread.
+
+        Args:
+            proxy (Pyro5.api.Proxy): The proxy, owned by the calling thread.
+        """
+        connection = self._connection()
+        self._take_slot(connection)
+        if connection.proxy is not None and connection.proxy is not proxy:
+            connection.proxy._pyroRelease()
+        connection.proxy = proxy
+
+    def add_session_hook(self, hook):
+        """
+        Registers a function called, in the calling thread, every time its connection is re-established.
+
+        Args:
+            hook (callable): Function without arguments, e.g. ClientCore.resume_session, returning True if it changed
+                the session (e.g. the player has been registered again under a new id).
+        """
+        self._connection().session_hooks.append(hook)
+
+    def reconnect(self):
+        """
+        Replaces the proxy of the calling thread with a new connection and resumes the sessions of the thread.
+
+        Raises:
+            Pyro5.errors.CommunicationError: If the server cannot be reached after all the attempts.
+
+        Returns:
+            bool: True if a session hook changed the session, False otherwise.
+        """
+        connection = self._connection()
+        if connection.proxy is not None:
+            connection.proxy._pyroRelease()
+            connection.proxy = None
+        self.proxy()
+        with self._lock:
+            self.reconnections += 1
+        print(f"Reconnected to {describe(self.uri)}.")
+
+        if connection.resuming:
+            return False  # a session hook lost the connection again, the outer reconnect runs the hooks
+        connection.resuming = True
+        try:
+            changed = [hook() for hook in connection.session_hooks]
+        finally:
+            connection.resuming = False
+        return any(changed)
+
+    def call(self, method, *args, **kwargs):
+        """
+        Calls a method of the server on the calling thread's connection, reconnecting once if the connection is lost.
+        The call is sent again on the new connection only if it is a read (see is_retriable) and no session hook
+        changed the session: its arguments may name a player id the server no longer gives to the same player. With a
+        tracer, the round-trip time is recorded in the active trace of the thread, whose correlation id the call
+        carries, or in a trace of its own.
+
+        Args:
+            method (str): The name of the remote method.
+            *args: The positional arguments of the method.
+            **kwargs: The keyword arguments of the method.
+
+        Returns:
+            The value returned by the remote method.
+        """
+        if self.tracer is None:
+            return self._call(method, *args, **kwargs)
+        trace = current_trace()
+        if trace is not None:
+            return self._timed_call(trace, method, *args, **kwargs)
+        trace = self.tracer.begin()
+        with self.tracer.activate(trace):
+            try:
+                return self._timed_call(trace, method, *args, **kwargs)
+            finally:
+                self.tracer.finish(trace)
+
+    def _timed_call(self, trace, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._call(method, *args, **kwargs)
+        finally:
+            trace.span(RTT, method, started, time.perf_counter() - started)
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return getattr(self.proxy(), method)(*args, **kwargs)
+        except Pyro5.errors.CommunicationError as e:
+            if not is_connection_lost(e):
+                raise
+            print(f"Connection to {describe(self.uri)} lost while calling {method}: {e}")
+            if self.reconnect() or not is_retriable(method, args, kwargs):
+                raise  # the arguments belong to the lost session, or the write may have run
+        return getattr(self.proxy(), method)(*args, **kwargs)
+
+    def release(self):
+        """
+        Closes the connection of the calling thread and gives its slot back to the pool.
+        """
+        connection = self._connection()
+        if connection.proxy is not None:
+            connection.proxy._pyroRelease()
+            connection.proxy = None
+        self._give_back_slot(connection.slot)
+
+
+class PooledServer:
+    """
+    Stand-in for a Pyro5 proxy of the game server that routes every call through a ProxyPool, so the same object can
+    be used from any thread and survives dropped connections.
+
+    Attributes:
+        pool (ProxyPool): The pool the calls are routed through.
+    """
+
+    def __init__(self, pool):
+        """
+        Initialize the PooledServer.
+
+        Args:
+            pool (ProxyPool): The pool the calls are routed through.
+        """
+        self.pool = pool
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def remote_call(*args, **kwargs):
+            return self.pool.call(name, *args, **kwargs)
+
+        remote_call.__name__ = name
+        return remote_call
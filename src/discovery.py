@@ -0,0 +1,298 @@
+# discovery.py
+
+import bisect
+import hashlib
+import random
+import threading
+
+import Pyro5.api
+import Pyro5.errors
+
+OBJECT_NAME = "MorraCinese.game"  # Pyro object id of the game server, also the prefix of the name server entries
+SERVER_METADATA = "morracinese.game"  # Metadata tag shared by all the game server instances
+LOAD_PREFIX = "load:"  # Prefix of the metadata tag carrying the current load of an instance
+LOAD_UPDATE_INTERVAL = 2  # Interval in seconds between two updates of the load in the name server
+
+
+class ServerInstance:
+    """
+    A game server instance registered in the name server.
+
+    Attributes:
+        name (str): The name of the instance in the name server.
+        uri (str): The URI of the instance.
+        load (int): The load of the instance (number of registered players) at the last update.
+    """
+
+    def __init__(self, name, uri, load):
+        """
+        Initialize the ServerInstance.
+
+        Args:
+            name (str): The name of the instance in the name server.
+            uri (str): The URI of the instance.
+            load (int): The load of the instance.
+        """
+        self.name = name
+        self.uri = uri
+        self.load = load
+
+    def __repr__(self):
+        return f"ServerInstance({self.name!r}, {self.uri!r}, load={self.load})"
+
+
+def instance_metadata(load):
+    """
+    Builds the metadata tags of a game server instance.
+
+    Args:
+        load (int): The current load of the instance.
+
+    Returns:
+        set: The metadata tags.
+    """
+    return {SERVER_METADATA, f"{LOAD_PREFIX}{load}"}
+
+
+def parse_load(metadata):
+    """
+    Extracts the load of an instance from its metadata tags.
+
+    Args:
+        metadata (set): The metadata tags.
+
+    Returns:
+        int: The load, 0 if not present.
+    """
+    for tag in metadata:
+        if tag.startswith(LOAD_PREFIX):
+            return int(tag[len(LOAD_PREFIX):])
+    return 0
+
+
+class ServerRegistration:
+    """
+    Keeps a game server instance registered in the name server, periodically updating the load in its metadata.
+
+    Attributes:
+        name (str): The name of the instance in the name server.
+        uri (Pyro5.core.URI): The URI of the instance.
+        load (callable): Function returning the current load of the instance.
+        interval (float): Interval in seconds between two updates.
+    """
+
+    def __init__(self, name, uri, load, ns_host=None, ns_port=None, interval=LOAD_UPDATE_INTERVAL):
+        """
+        Initialize the ServerRegistration.
+
+        Args:
+            name (str): The name of the instance in the name server.
+            uri (Pyro5.core.URI): The URI of the instance.
+            load (callable): Function returning the current load of the instance.
+            ns_host (str, optional): Host of the name server. Defaults to None (broadcast lookup).
+            ns_port (int, optional): Port of the name server. Defaults to None.
+            interval (float, optional): Interval in seconds between two updates. Defaults to LOAD_UPDATE_INTERVAL.
+        """
+        self.name = name
+        self.uri = uri
+        self.load = load
+        self.ns_host = ns_host
+        self.ns_port = ns_port
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._update_loop, name="ns-registration", daemon=True)
+
+    def start(self):
+        """
+        Registers the instance and starts updating its load.
+
+        Returns:
+            ServerRegistration: The registration itself.
+        """
+        with Pyro5.api.locate_ns(self.ns_host, self.ns_port) as ns:
+            ns.register(self.name, self.uri, metadata=instance_metadata(self.load()))
+        print(f"Istanza {self.name} registrata nel name server.")
+        self._thread.start()
+        return self
+
+    def _update_loop(self):
+        """
+        Body of the background thread: publishes the load whenever it changes.
+        """
+        published = None
+        ns = None
+        while not self._stop.wait(self.interval):
+            load = self.load()
+            if load == published:
+                continue
+            try:
+                if ns is None:
+                    ns = Pyro5.api.locate_ns(self.ns_host, self.ns_port)
+                ns.set_metadata(self.name, instance_metadata(load))
+                published = load
+            except (Pyro5.errors.CommunicationError, Pyro5.errors.NamingError) as e:
+                print(f"Impossibile aggiornare il carico nel name server: {e}")
+                ns = None
+        if ns is not None:
+            ns._pyroRelease()
+
+    def stop(self):
+        """
+        Stops the updates and removes the instance from the name server.
+        """
+        self._stop.set()
+        self._thread.join()
+        try:
+            with Pyro5.api.locate_ns(self.ns_host, self.ns_port) as ns:
+                ns.remove(self.name)
+        except (Pyro5.errors.CommunicationError, Pyro5.errors.NamingError):
+            pass
+
+
+def find_instances(ns_host=None, ns_port=None):
+    """
+    Looks up the game server instances registered in the name server.
+
+    Args:
+        ns_host (str, optional): Host of the name server. Defaults to None (broadcast lookup).
+        ns_port (int, optional): Port of the name server. Defaults to None.
+
+    Returns:
+        list: The ServerInstance objects, sorted by name.
+    """
+    with Pyro5.api.locate_ns(ns_host, ns_port) as ns:
+        entries = ns.yplookup(meta_all=[SERVER_METADATA], return_metadata=True)
+    return [ServerInstance(name, uri, parse_load(metadata)) for name, (uri, metadata) in sorted(entries.items())]
+
+
+class LeastLoadedPolicy:
+    """
+    Picks the instance with the lowest load.
+    """
+    uses_player_name = False
+
+    def choose(self, instances, player_name=None):
+        """
+        Picks an instance.
+
+        Args:
+            instances (list): The available ServerInstance objects.
+            player_name (str, optional): The name of the player, unused.
+
+        Returns:
+            ServerInstance: The chosen instance.
+        """
+        return min(instances, key=lambda instance: (instance.load, instance.name))
+
+
+class RandomPolicy:
+    """
+    Picks an instance at random.
+    """
+    uses_player_name = False
+
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else random.Random()
+
+    def choose(self, instances, player_name=None):
+        """
+        Picks an instance.
+
+        Args:
+            instances (list): The available ServerInstance objects.
+            player_name (str, optional): The name of the player, unused.
+
+        Returns:
+            ServerInstance: The chosen instance.
+        """
+        return self.rng.choice(instances)
+
+
+class ConsistentHashPolicy:
+    """
+    Picks an instance by consistent hashing of the player's name, so a player always lands on the same instance
+    and only the players of an instance move when the instance is added or removed.
+
+    Attributes:
+        replicas (int): Number of points of each instance on the hash ring.
+    """
+    uses_player_name = True
+
+    def __init__(self, replicas=64):
+        """
+        Initialize the ConsistentHashPolicy.
+
+        Args:
+            replicas (int, optional): Number of points of each instance on the hash ring. Defaults to 64.
+        """
+        self.replicas = replicas
+        self._ring_names = None
+        self._ring = []
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def _build_ring(self, names):
+        """
+        Builds the hash ring of the given instance names, if not already built.
+        """
+        if names == self._ring_names:
+            return
+        self._ring = sorted((self._hash(f"{name}#{i}"), name) for name in names for i in range(self.replicas))
+        self._ring_names = names
+
+    def choose(self, instances, player_name=None):
+        """
+        Picks an instance.
+
+        Args:
+            instances (list): The available ServerInstance objects.
+            player_name (str, optional): The name of the player. Without a name the first instance is chosen.
+
+        Returns:
+            ServerInstance: The chosen instance.
+        """
+        if player_name is None:
+            return instances[0]
+        by_name = {instance.name: instance for instance in instances}
+        self._build_ring(tuple(sorted(by_name)))
+        index = bisect.bisect(self._ring, (self._hash(player_name),)) % len(self._ring)
+        return by_name[self._ring[index][1]]
+
+
+POLICIES = {
+    "least-loaded": LeastLoadedPolicy,
+    "hash": ConsistentHashPolicy,
+    "random": RandomPolicy,
+}
+
+
+def make_resolver(policy, player_name=None, ns_host=None, ns_port=None):
+    """
+    Builds a function that resolves the URI of the game server instance to use, looking the instances up in the
+    name server every time it is called. It can be passed wherever a server URI is expected (connect_proxy,
+    ProxyWarmer, ProxyPool), so every (re)connection picks an instance that is alive.
+
+    Args:
+        policy (str or object): The balancing policy, a key of POLICIES or an object with a choose() method.
+        player_name (str, optional): The name of the player, used by the policies that need it.
+        ns_host (str, optional): Host of the name server. Defaults to None (broadcast lookup).
+        ns_port (int, optional): Port of the name server. Defaults to None.
+
+    Returns:
+        callable: Function without arguments returning the URI of the chosen instance.
+    """
+    if isinstance(policy, str):
+        policy = POLICIES[policy]()
+
+    def resolve():
+        instances = find_instances(ns_host, ns_port)
+        if not instances:
+            raise Pyro5.errors.NamingError("no game server instance registered in the name server")
+        instance = policy.choose(instances, player_name)
+        print(f"Chosen server instance: {instance}")
+        return instance.uri
+
+    resolve.policy = policy
+    return resolve
@@ -0,0 +1,86 @@
+# errors.py
+
+import Pyro5.api
+from Pyro5.serializers import SerializerBase
+
+
+class MorraCineseError(Exception):
+    """
+    Base class of the errors raised by the game server that the clients can recognize by type. Pyro5 only rebuilds
+    builtin and Pyro5 exceptions on the client side, so every subclass must be listed in ERROR_CLASSES.
+    """
+
+
+class RateLimitExceeded(MorraCineseError):
+    """
+    Raised when a call is rejected because the caller has exceeded its budget of calls.
+
+    Attributes:
+        retry_after (float): Number of seconds after which the call is expected to be admitted.
+    """
+
+    def __init__(self, message, retry_after):
+        """
+        Initialize the RateLimitExceeded error.
+
+        Args:
+            message (str): The description of the error.
+            retry_after (float): Number of seconds after which the call is expected to be admitted.
+        """
+        super().__init__(message, retry_after)
+        self.message = message
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return f"{self.message} (retry after {self.retry_after:.2f} s)"
+
+
+class LobbyFullError(RateLimitExceeded):
+    """
+    Raised when a registration is turned away because the lobby, the players waiting for an opponent, is full and no
+    waiting player accepts the newcomer. It is a RateLimitExceeded: the player is not registered, and the call can
+    be repeated after retry_after, the time expected for a waiting player to be paired.
+    """
+
+
+class GameNotFoundError(MorraCineseError, KeyError):
+    """
+    Raised when a call refers to a game that does not exist, e.g. a stale game id, or a call racing the
+    unregister_player or the new_match that removed the game of the player. It is also a KeyError, the error of the
+    lookups of a player who is not registered.
+
+    Attributes:
+        game_id (int or None): The identifier of the game, None if the player has no game.
+    """
+
+    def __init__(self, message, game_id=None):
+        """
+        Initialize the GameNotFoundError error.
+
+        Args:
+            message (str): The description of the error.
+            game_id (int, optional): The identifier of the game. Defaults to None.
+        """
+        super().__init__(message, game_id)
+        self.message = message
+        self.game_id = game_id
+
+    def __str__(self):
+        return self.message
+
+
+ERROR_CLASSES = [RateLimitExceeded, LobbyFullError, GameNotFoundError]
+
+
+def register_error_classes():
+    """
+    Registers the error classes with the Pyro5 serializers, so a client receives them with their own type instead
+    of a SerializeError. Called when this module is imported.
+    """
+    for error_class in ERROR_CLASSES:
+        classname = f"{error_class.__module__}.{error_class.__name__}"
+        Pyro5.api.register_dict_to_class(
+            classname, lambda _, data, error_class=error_class: SerializerBase.make_exception(error_class, data))
+
+
+register_error_classes()
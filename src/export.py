@@ -0,0 +1,154 @@
+# export.py
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import Pyro5.api
+
+from src.history import HistoryStore, KINDS
+
+CSV_FIELDS = ["seq", "type", "time", "game_id", "num_of_match", "player_1", "player_2", "move_1", "move_2",
+              "result_1", "result_2", "score_1", "score_2", "winner"]
+
+
+def flatten(record):
+    """
+    Flattens a record into a CSV row: the per-player values are spread over one column per player.
+
+    Args:
+        record (dict): The record.
+
+    Returns:
+        dict: The row, keyed by CSV_FIELDS.
+    """
+    row = {field: record.get(field) for field in ("seq", "type", "time", "game_id", "num_of_match", "winner")}
+    for i, player in enumerate(record["players"][:2], start=1):
+        row[f"player_{i}"] = player
+        row[f"move_{i}"] = record.get("moves", {}).get(player)
+        row[f"result_{i}"] = record.get("results", {}).get(player)
+        row[f"score_{i}"] = record.get("scores", {}).get(player)
+    return row
+
+
+def last_cursor(path, output_format):
+    """
+    Reads the cursor of an earlier export, i.e. the "seq" of the last record of the output file, reading the file
+    backwards from the end.
+
+    Args:
+        path (str): The output file.
+        output_format (str): "ndjson" or "csv".
+
+    Returns:
+        int: The cursor, 0 if the file does not exist or has no records.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as file:
+        end = file.seek(0, os.SEEK_END)
+        block = b""
+        position = end
+        while position > 0 and block.count(b"\n") < 2:
+            step = min(4096, position)
+            position -= step
+            file.seek(position)
+            block = file.read(step) + block
+    lines = [line for line in block.splitlines() if line.strip()]
+    if not lines:
+        return 0
+    last = lines[-1].decode("utf-8")
+    if output_format == "ndjson":
+        return json.loads(last)["seq"]
+    value = last.split(",", 1)[0]
+    return int(value) if value.isdigit() else 0  # the header only
+
+
+def write_records(records, output, output_format, header=True):
+    """
+    Writes records as NDJSON or CSV, one at a time.
+
+    Args:
+        records (iterable): The records.
+        output (file): The text file to write to.
+        output_format (str): "ndjson" or "csv".
+        header (bool, optional): Flag to write the CSV header. Defaults to True.
+
+    Returns:
+        int: The cursor of the last record written, None if no record was written.
+    """
+    cursor = None
+    writer = None
+    if output_format == "csv":
+        writer = csv.DictWriter(output, CSV_FIELDS, lineterminator="\n")
+        if header:
+            writer.writeheader()
+    for record in records:
+        if writer is not None:
+            writer.writerow(flatten(record))
+        else:
+            output.write(json.dumps(record, separators=(",", ":")) + "\n")
+        cursor = record["seq"]
+    return cursor
+
+
+def remote_records(uri, after, kinds):
+    """
+    Reads the records from a game server, which streams them a batch at a time.
+
+    Args:
+        uri (str): The URI of the game server.
+        after (int): The cursor.
+        kinds (list): The kinds of records to read.
+
+    Yields:
+        dict: The next record.
+    """
+    with Pyro5.api.Proxy(uri) as server:
+        for batch in server.export_history(after, kinds):
+            yield from batch
+
+
+def main(argv=None):
+    """
+    Main function to export the finished rounds and series, from a game server or from a history file.
+    """
+    parser = argparse.ArgumentParser(description="Export the history of the Morra Cinese games.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--uri", default="PYRO:MorraCinese.game@localhost:55894", help="URI of the game server")
+    source.add_argument("--file", default=None, help="history file of a game server (--history), read directly")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson", help="output format")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="kinds of records to export (round,series)")
+    parser.add_argument("--after", type=int, default=0, help="export the records following this cursor (seq)")
+    parser.add_argument("--output", default=None, help="output file (default: standard output)")
+    parser.add_argument("--resume", action="store_true",
+                        help="append to the output file, starting after its last record")
+    args = parser.parse_args(argv)
+
+    kinds = [kind for kind in args.kinds.split(",") if kind]
+    after = args.after
+    header = True
+    if args.resume:
+        if args.output is None:
+            parser.error("--resume needs --output")
+        after = max(after, last_cursor(args.output, args.format))
+        header = not os.path.exists(args.output) or os.path.getsize(args.output) == 0
+
+    if args.file is not None:
+        store = HistoryStore(args.file, read_only=True)
+        records = store.records(after, kinds)
+    else:
+        records = remote_records(args.uri, after, kinds)
+
+    if args.output is None:
+        cursor = write_records(records, sys.stdout, args.format, header)
+    else:
+        with open(args.output, "a" if args.resume else "w", newline="") as output:
+            cursor = write_records(records, output, args.format, header)
+    print(f"Cursor: {cursor if cursor is not None else after}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,57 @@
 # game.py
 
-from collections import defaultdict
+import itertools
+import threading
+from collections import defaultdict, deque
 
 from src.enums import Move, Result, MatchStatus
 
 BEST_OF_FIVE = 5
+POOL_SIZE = 1024  # Maximum number of idle games kept by a GamePool
+
+# fields of the game seen by a player, whose changes are versioned (see Game.touch)
+PLAYER_FIELDS = ("game_state", "score")  # fields with a value for each player
+GAME_FIELDS = ("match_status", "winner_of_series", "num_of_match", "opponent_name")  # fields shared by the players
+
+
+class VersionClock:
+    """
+    A monotonic counter shared by all the games of a server: every change of a versioned field takes the next
+    version, so a client can ask for the changes that happened after the last version it has seen.
+
+    Attributes:
+        current (int): The last version handed out.
+    """
+
+    def __init__(self):
+        """
+        Initialize the VersionClock.
+        """
+        self._counter = itertools.count(1)
+        self.current = 0
+
+    def tick(self):
+        """
+        Hands out a new version.
+
+        Returns:
+            int: The new version.
+        """
+        self.current = next(self._counter)
+        return self.current
+
+    def restore(self, current):
+        """
+        Moves the clock past the last version handed out before a restart, and hands out a new version.
+
+        Args:
+            current (int): The last version handed out before the restart.
+
+        Returns:
+            int: The new version.
+        """
+        self._counter = itertools.count(max(current, self.current) + 1)
+        return self.tick()
 
 
 class Game:
@@ -13,6 +60,8 @@ class Game:
     It also controls the state of the match and processes rematch requests. The game can be part of a series,
     where the winner is determined by the "best of five" rule.
 
+    The players are identified by their ids (see PlayerTable); their names are only used for display.
+
     Attributes:
         game_id (int): Unique identifier for the game.
         players (list): List of players in the game.
@@ -21,16 +70,29 @@ class Game:
         scores (dict): Dictionary storing players' scores.
         rematch_counter (int): Counter for how many players have requested a rematch.
         game_series (int): Number of games played in the series.
-        winner (str): The winner of the game. Initially, this is set to None.
+        winner (str): The name of the winner of the game, or "Draw". Initially, this is set to None.
+        winner_rewarded (bool): Flag set once the general score of the winner has been updated for this win.
         match_status (MatchStatus): The status of the match (ongoing, over, series over, rematch, none).
         ready_to_play_again (int): Counter for how many players are ready to play again.
+        clock (VersionClock): The clock used to version the changes of the fields seen by the players.
+        versions (dict): The version of the last change of each field, keyed by (field, player_id); player_id
+            is None for the fields shared by the players.
+        version (int): The version of the last change of any field of the game.
+        last_round (dict or None): The moves, results, scores (keyed by player name) and number of the last decided
+            match.
+        names (PlayerTable or None): The table of the player names, None if the players are their own names.
 
     Note:
         In a game series, a player must win three out of five games (best of five) to be declared the series winner.
     """
-    def __init__(self):
+    def __init__(self, clock=None, names=None):
         """
         Initializes the game.
+
+        Args:
+            clock (VersionClock, optional): The clock shared with the other games. Defaults to a new clock.
+            names (PlayerTable, optional): The table of the player names. Defaults to None (the players are
+                their own names).
         """
         self.game_id = 0  # Identificatore della partita
         self.players = []  # Elenco dei giocatori nella partita
@@ -40,15 +102,134 @@ class Game:
         self.rematch_counter = 0  # Flag per indicare se è stata richiesta una rematch
         self.game_series = 1  # Numero di partite giocate nella serie
         self.winner = None  # Vincitore della partita
+        self.winner_rewarded = False  # Flag per indicare se il punteggio generale del vincitore è già stato aggiornato
         self.match_status = MatchStatus.NONE  # Stato del match
         self.ready_to_play_again = 0  # Flag per indicare se i giocatori sono pronti a giocare di nuovo
+        self.clock = clock if clock is not None else VersionClock()  # Orologio delle versioni dei campi
+        self.versions = {}  # Versione dell'ultima modifica di ogni campo
+        self.version = 0  # Versione dell'ultima modifica della partita
+        self.last_round = None  # Ultimo match deciso
+        self.names = names  # Tabella dei nomi dei giocatori
+
+    def reset(self):
+        """
+        Brings the game back to the state of a new game, emptying its containers instead of allocating new ones.
+        """
+        self.game_id = 0
+        self.players.clear()
+        self.moves.clear()
+        self.results.clear()
+        self.scores.clear()
+        self.rematch_counter = 0
+        self.game_series = 1
+        self.winner = None
+        self.winner_rewarded = False
+        self.match_status = MatchStatus.NONE
+        self.ready_to_play_again = 0
+        self.versions.clear()
+        self.version = 0
+        self.last_round = None
+
+    def name_of(self, player):
+        """
+        Gets the name of a player of the game, for display.
+
+        Args:
+            player (int): The id of the player.
+
+        Returns:
+            str: The name of the player.
+        """
+        return self.names.name(player) if self.names is not None else player
+
+    def player_names(self):
+        """
+        Gets the names of the players of the game.
 
-    def register_player(self, player_name):
+        Returns:
+            list: The names of the players.
+        """
+        return [self.name_of(player) for player in self.players]
+
+    def touch(self, field, player_id=None):
+        """
+        Records that a field seen by the players has changed.
+
+        Args:
+            field (str): The field, one of PLAYER_FIELDS or GAME_FIELDS.
+            player_id (int, optional): The player the field belongs to, None for the fields shared by the players.
+        """
+        self.version = self.versions[(field, player_id)] = self.clock.tick()
+
+    def get_field(self, field, player_id):
+        """
+        Gets the value of a versioned field as seen by a player.
+
+        Args:
+            field (str): The field, one of PLAYER_FIELDS or GAME_FIELDS.
+            player_id (int): Id of the player.
+
+        Returns:
+            The value of the field.
+        """
+        if field == "game_state":
+            return self.get_player_state(player_id)
+        if field == "score":
+            return self.get_score(player_id)
+        if field == "match_status":
+            return self.get_match_status()
+        if field == "winner_of_series":
+            return self.get_winner_of_series()
+        if field == "num_of_match":
+            return self.get_num_of_match()
+        return self.get_opponent_name(player_id)
+
+    def get_changes_since(self, player_id, version):
+        """
+        Gets the fields seen by a player that changed after a version.
+
+        Args:
+            player_id (int): Id of the player.
+            version (int): The last version seen by the player, 0 to get all the fields.
+
+        Returns:
+            dict: The changed fields and their values.
+        """
+        if version == 0:
+            return {field: self.get_field(field, player_id) for field in PLAYER_FIELDS + GAME_FIELDS}
+        return {field: self.get_field(field, player_id)
+                for (field, owner), changed in list(self.versions.items())
+                if changed > version and (owner is None or owner == player_id)}
+
+    def spectator_view(self):
+        """
+        Gets the state of the game as seen by a spectator. The moves are only shown once the match is decided, so a
+        spectator cannot pass a move to the opponent.
+
+        Returns:
+            dict: The game id, the version, the players with their scores and results, the moves of the decided
+            match, the match status, the number of the match and the winner of the series.
+        """
+        decided = bool(self.players) and all(self.results[player] is not None for player in self.players)
+        names = self.player_names()
+        return {
+            "game_id": self.game_id,
+            "version": self.version,
+            "players": names,
+            "scores": {name: self.scores[player] for name, player in zip(names, self.players)},
+            "results": {name: self.results[player] for name, player in zip(names, self.players)},
+            "moves": {name: self.moves[player] for name, player in zip(names, self.players)} if decided else {},
+            "match_status": self.match_status,
+            "num_of_match": self.game_series,
+            "winner_of_series": self.winner,
+        }
+
+    def register_player(self, player_id):
         """
         Registers a player to the game.
 
         Args:
-            player_name (str): Name of the player to be registered.
+            player_id (int): Id of the player to be registered.
 
         Raises:
             ValueError: If a player with the same name already exists or the game is full.
@@ -58,41 +239,49 @@ class Game:
         """
 
         # controllo se il giocatore è già registrato e se si ritorno errore. Il nome del giocatore è univoco
-        if player_name in self.players:
+        if player_id in self.players:
             raise ValueError(
-                f'E\' già presente un giocatore con il nome {player_name}. Perfavore scegli un altro nome.')
+                f'E\' già presente il giocatore {self.name_of(player_id)}. Perfavore scegli un altro nome.')
 
-        if len(self.players) < 2 and player_name not in self.players:
-            self.players.append(player_name)
-            self.moves[player_name] = None
+        if len(self.players) < 2 and player_id not in self.players:
+            self.players.append(player_id)
+            self.moves[player_id] = None
+            self.touch("opponent_name")
             return True
         else:
             raise ValueError(f'La partita è già al completo. Non è possibile aggiungere un nuovo giocatore.')
 
-    def make_choice(self, player_name, choice):
+    def make_choice(self, player_id, choice):
         """
         Registers a player's move in the game.
 
         Args:
-            player_name (str): Name of the player.
+            player_id (int): Id of the player.
             choice (str): Player's move.
 
+        Returns:
+            bool: True if the move decided the match, False otherwise.
+
         Notes:
             The game state and series status are updated based on the moves. The winner is determined if all players made their moves.
+            A move made before the opponent is ready for the next match (the match or the series is over) is kept
+            and decided against the opponent's next move, not against the move of the match already decided.
         """
-        # print player_name, choice and self.moves.values()
-        print(f'player_name: {player_name}, choice: {choice}')
+        # print player_id, choice and self.moves.values()
+        print(f'player_name: {self.name_of(player_id)}, choice: {choice}')
         print(f'players: {self.players}')
         print(f'moves: {self.moves}')
 
         if all(move is None for move in self.moves.values()):
             # print("(None, None) in self.moves.values()")
             self.match_status = MatchStatus.ONGOING
+            self.touch("match_status")
 
-        if player_name in self.players and self.moves[player_name] is None:
-            self.moves[player_name] = choice
-            print(f'{player_name} ha scelto {choice}.')
-            if len(self.moves) == 2 and None not in self.moves.values():
+        if player_id in self.players and self.moves[player_id] is None:
+            self.moves[player_id] = choice
+            print(f'{self.name_of(player_id)} ha scelto {choice}.')
+            if len(self.moves) == 2 and None not in self.moves.values() and \
+                    self.match_status not in (MatchStatus.OVER, MatchStatus.SERIES_OVER):
 
                 self.determine_winner()
 
@@ -104,8 +293,12 @@ class Game:
                 else:
                     self.game_series += 1
                     self.match_status = MatchStatus.OVER
+                self.touch("match_status")
+                self.touch("num_of_match")
+                return True
 
             # print(f'all moves: {self.moves}')
+        return False
 
     def determine_winner(self):
         """
@@ -133,53 +326,75 @@ class Game:
             self.results[self.players[1]] = "Loser"
             self.scores[self.players[0]] += 1
 
-    def reset_state_after_single_match(self, player_name):
+        for player in self.players:
+            self.touch("game_state", player)
+            self.touch("score", player)
+        names = self.player_names()
+        self.last_round = {
+            "num_of_match": self.game_series,
+            "moves": {name: self.moves[player] for name, player in zip(names, self.players)},
+            "results": {name: self.results[player] for name, player in zip(names, self.players)},
+            "scores": {name: self.scores[player] for name, player in zip(names, self.players)},
+        }
+
+    def reset_state_after_single_match(self, player_id):
         """
         Resets the state of the game after a single match.
 
         Args:
-            player_name (str): Name of the player.
+            player_id (int): Id of the player.
 
         Notes:
-            The game's status is updated to ongoing if all players are ready to play again.
+            The game's status is updated to ongoing if all players are ready to play again. The call only counts
+            once per player after a match is over: a repeated call, or a call once the series is over (the next
+            series starts only with a rematch or a new match, which reset the scores), is ignored.
         """
 
+        if self.match_status != MatchStatus.OVER or self.results.get(player_id) is None:
+            return  # no match to leave behind, or the player is already ready
         self.ready_to_play_again += 1
-        self.moves[player_name] = None
-        self.results[player_name] = None
+        self.moves[player_id] = None
+        self.results[player_id] = None
+        self.touch("game_state", player_id)
 
         if self.ready_to_play_again == 2:
             self.match_status = MatchStatus.ONGOING
             self.ready_to_play_again = 0
+            self.touch("match_status")
 
-    def get_game_state(self, player_name):
+    def get_game_state(self, player_id):
         """
         Gets the current state of the game for a specific player.
 
         Args:
-            player_name (str): Name of the player.
+            player_id (int): Id of the player.
 
         Returns:
             str or None: Current state of the game ("Winner", "Loser", "Draw") if available, None otherwise.
         """
-        return self.results[player_name]
+        return self.results[player_id]
 
-    def request_rematch(self, player_name):
+    def request_rematch(self, player_id):
         """
         Handles a player's rematch request.
 
         Args:
-            player_name (str): Name of the player requesting a rematch.
+            player_id (int): Id of the player requesting a rematch.
 
         Notes:
-            The game's status is updated to rematch if both players request a rematch.
+            The game's status is updated to rematch if both players request a rematch. The request only counts once
+            per player after the series is over: a repeated request, or one in the middle of a series, is ignored.
         """
 
+        if self.match_status != MatchStatus.SERIES_OVER or self.results.get(player_id) is None:
+            return  # no series to play again, or the player has already asked
         self.rematch_counter += 1
-        print(f'{player_name} ha richiesto un rematch.')
-        self.moves[player_name] = None
-        self.results[player_name] = None
-        self.scores[player_name] = 0
+        print(f'{self.name_of(player_id)} ha richiesto un rematch.')
+        self.moves[player_id] = None
+        self.results[player_id] = None
+        self.scores[player_id] = 0
+        self.touch("game_state", player_id)
+        self.touch("score", player_id)
 
         if self.rematch_counter == 2:
             print(f'Entrambi i giocatori hanno richiesto un rematch.')
@@ -188,13 +403,15 @@ class Game:
             self.match_status = MatchStatus.REMATCH
             self.rematch_counter = 0
             self.winner = None
+            self.touch("match_status")
+            self.touch("winner_of_series")
 
-    def request_new_match(self, player_name):
+    def request_new_match(self, player_id):
         """
         Handles a player's request to start a new match.
 
         Args:
-            player_name (str): Name of the player requesting a new match.
+            player_id (int): Id of the player requesting a new match.
 
         Notes:
             The game's status is updated to none.
@@ -203,49 +420,57 @@ class Game:
             self.moves[player] = None
             self.results[player] = None
             self.scores[player] = 0
-        self.moves.pop(player_name)
-        self.scores.pop(player_name)
-        self.results.pop(player_name)
+            self.touch("game_state", player)
+            self.touch("score", player)
+        self.moves.pop(player_id)
+        self.scores.pop(player_id)
+        self.results.pop(player_id)
 
-        self.players.remove(player_name)
+        self.players.remove(player_id)
         self.winner = None
         self.match_status = MatchStatus.NONE
+        self.versions = {key: version for key, version in self.versions.items() if key[1] != player_id}
+        for field in GAME_FIELDS:
+            self.touch(field)
 
-    def reset_after_left(self, player_name):
+    def reset_after_left(self, player_id):
         """
         Resets the game state after a player has left.
 
         Args:
-            player_name (str): Name of the player who left.
+            player_id (int): Id of the player who left.
         """
-        self.moves[player_name] = None
-        self.results[player_name] = None
-        self.scores[player_name] = 0
+        self.moves[player_id] = None
+        self.results[player_id] = None
+        self.scores[player_id] = 0
         self.winner = None
+        self.touch("game_state", player_id)
+        self.touch("score", player_id)
+        self.touch("winner_of_series")
 
-    def get_score(self, player_name):
+    def get_score(self, player_id):
         """
         Gets a player's score.
 
         Args:
-            player_name (str): Name of the player.
+            player_id (int): Id of the player.
 
         Returns:
             int: The player's score.
         """
-        return self.scores[player_name]
+        return self.scores[player_id]
 
-    def get_player_state(self, player_name):
+    def get_player_state(self, player_id):
         """
         Gets a player's state.
 
         Args:
-            player_name (str): Name of the player.
+            player_id (int): Id of the player.
 
         Returns:
             str or None: Current state of the player ("Winner", "Loser", "Draw") if available, None otherwise.
         """
-        return self.results[player_name]
+        return self.results[player_id]
 
     def determine_series_winner(self):
         """
@@ -255,12 +480,14 @@ class Game:
             The winner is determined based on the comparison of the scores.
         """
 
+        self.winner_rewarded = False
         if self.scores[self.players[0]] == self.scores[self.players[1]]:
             self.winner = "Draw"
         elif self.scores[self.players[0]] > self.scores[self.players[1]]:
-            self.winner = self.players[0]
+            self.winner = self.name_of(self.players[0])
         else:
-            self.winner = self.players[1]
+            self.winner = self.name_of(self.players[1])
+        self.touch("winner_of_series")
 
         print(f'Winner of the series: {self.winner}')
 
@@ -291,12 +518,12 @@ class Game:
         """
         return self.game_series
 
-    def get_opponent_name(self, player_name):
+    def get_opponent_name(self, player_id):
         """
         Gets the name of the opponent.
 
         Args:
-            player_name (str): Name of the player.
+            player_id (int): Id of the player.
 
         Returns:
             str or None: The name of the opponent if available, None otherwise.
@@ -304,32 +531,101 @@ class Game:
         if len(self.players) == 1:
             return None
         else:
-            if player_name == self.players[0]:
-                return self.players[1]
-            elif player_name == self.players[1]:
-                return self.players[0]
+            if player_id == self.players[0]:
+                return self.name_of(self.players[1])
+            elif player_id == self.players[1]:
+                return self.name_of(self.players[0])
 
 
 
-    def remove_player(self, player_name):
+    def remove_player(self, player_id):
         """
         Removes a player from the game.
 
         Args:
-            player_name (str): Name of the player to be removed.
+            player_id (int): Id of the player to be removed.
 
         Notes:
             The game's status is updated to left. If the game has no winner, the remaining player is set as the winner.
         """
-        self.players.remove(player_name)
-        self.moves.pop(player_name)
-        self.results.pop(player_name)
-        self.scores.pop(player_name)
+        self.players.remove(player_id)
+        self.moves.pop(player_id, None)
+        self.results.pop(player_id, None)  # no result if the player leaves before any match is decided
+        self.scores.pop(player_id, None)
         self.match_status = MatchStatus.LEFT
         for player in self.players:
-            if player != player_name:
+            if player != player_id:
                 if self.winner is None:
-                    self.winner = player
+                    self.winner = self.name_of(player)
+                    self.winner_rewarded = False
+        self.versions = {key: version for key, version in self.versions.items() if key[1] != player_id}
+        for field in GAME_FIELDS:
+            self.touch(field)
+
+        print(f'player {self.name_of(player_id)} ha abbandonato la partita.')
 
-        print(f'player {player_name} ha abbandonato la partita.')
 
+class GamePool:
+    """
+    The idle games of a server, reused by the new games instead of allocating a Game with its containers each time.
+    A released game is reset and queued at the end: the game handed out is the one released longest ago, so a call
+    still holding a removed game is unlikely to see it reused.
+
+    Attributes:
+        max_size (int): The maximum number of idle games kept; the others are left to the garbage collector.
+        created (int): The number of games allocated.
+        reused (int): The number of games taken from the pool.
+    """
+
+    def __init__(self, max_size=POOL_SIZE):
+        """
+        Initializes the pool.
+
+        Args:
+            max_size (int, optional): The maximum number of idle games kept. Defaults to POOL_SIZE; 0 disables the
+                pool.
+        """
+        self.max_size = max_size
+        self.created = 0
+        self.reused = 0
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, clock, names):
+        """
+        Hands out an empty game.
+
+        Args:
+            clock (VersionClock): The clock shared with the other games.
+            names (PlayerTable): The table of the player names.
+
+        Returns:
+            Game: The game, with game_id 0.
+        """
+        with self._lock:
+            if self._idle:
+                game = self._idle.popleft()
+                self.reused += 1
+            else:
+                game = None
+                self.created += 1
+        if game is None:
+            return Game(clock, names)
+        game.clock = clock
+        game.names = names
+        return game
+
+    def release(self, game):
+        """
+        Resets a game removed from the server and keeps it for a new one.
+
+        Args:
+            game (Game): The game; it must no longer be reachable from the server.
+        """
+        game.reset()
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append(game)
+
+    def __len__(self):
+        return len(self._idle)
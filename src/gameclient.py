@@ -1,54 +1,70 @@
 # gameclient.py
 
-import Pyro5.api
+import Pyro5.errors
+import argparse
 import sys
+import time
 from PyQt6 import QtWidgets, QtGui
 from PyQt6.QtWidgets import QApplication, QMessageBox, QInputDialog
 from PyQt6.QtCore import QTimer
 import random
 from src.gamegui import GameGUI
-from src.enums import Move, Result, MatchStatus
+from src.clientcore import ClientCore, ClientListener
+from src.connection import ProxyWarmer, ProxyPool, CONNECT_ERRORS
+from src.discovery import POLICIES, make_resolver
+from src.errors import LobbyFullError, RateLimitExceeded
+from src.rpcworker import RpcWorker, ListenerBridge
+from src.tracing import Tracer, SAMPLE_RATE, SLOW_MS
 
 MARGIN = 50
 WINDOW_WIDTH = 260
 WINDOW_HEIGHT = 250
 WINDOW_TITLE = "Morra Cinese"
-TIME_TO_MOVE = 120  # Time to make a move in seconds
+SERVER_URI = "PYRO:MorraCinese.game@localhost:55894"
 
 
-class GameClient:
+class GameClient(ClientListener):
     """
-    The GameClient class handles the client-side interactions of the game. It manages the user interface, player moves,
-    game state polling, match status, and player unregistration. The client communicates with the game server,
-    manages the game GUI, processes player choices, and handles rematch and new match requests.
+    The GameClient class is the Qt front-end of the game. The game logic (registration, moves, status transitions,
+    rematch and new match flow) lives in a ClientCore; the GameClient drives it with a QTimer and reflects the events
+    it notifies on the game GUI.
+
+    The core and its calls to the server run on an RpcWorker, never on the GUI thread: the slots only submit the
+    calls, the events of the core come back through a ListenerBridge and at most one refresh is in flight, so the
+    window stays responsive however slow the server is.
 
     Attributes:
         server (Pyro5.api.Proxy): The game server object that the client interacts with.
         player_name (str): The player's name.
         game_id (int): Unique identifier for the game. Initially, this is set to None.
-        made_move (bool): Flag to track if the client has made a move. Initially, this is set to False.
-        series_over (bool): Flag to track if the match has ended. Initially, this is set to False.
+        core (ClientCore): The user interface independent client logic, driven on the worker thread.
+        worker (RpcWorker): The thread running the calls to the server.
         gui (GameGUI): The GUI object for the game.
-        polling_timer (QTimer): Timer object to periodically check the game state.
-        rematch_polling_timer (QTimer): Timer object to periodically check the match status.
-        timer (QTimer): Timer object to manage the time allotted for a player to make a move.
+        polling_timer (QTimer or None): Timer object that periodically advances the client core, None if the core
+            is advanced by a shared poll loop (see MultiTableClient).
     """
     POLLING_INTERVAL = 1  # Polling interval in seconds
-    REMATCH_POLLING_INTERVAL = 1  # Polling interval in seconds for rematch state
 
-    def __init__(self, player_name, server):
+    def __init__(self, player_name, server, player_id=None, polling=True, worker=None):
         """
-        Initialize the GameClient with a player's name, the server object, and a position for the game window.
+        Initialize the GameClient with a player's name and the server object.
 
         Args:
             player_name (str): The name of the player.
-            server (Pyro5.api.Proxy): The game server object.
+            server (Pyro5.api.Proxy or PooledServer): The game server object.
+            player_id (int, optional): The id returned by the registration. Defaults to None (the calls send the
+                name).
+            polling (bool, optional): Flag to advance the core with a timer of its own. Defaults to True.
+            worker (RpcWorker, optional): The worker shared with other clients. Defaults to None (a worker of its
+                own).
         """
         self.player_name = player_name
         self.server = server
         self.game_id = None
-        self.made_move = False  # Flag to track if the client has made a move
-        self.series_over = False  # Flag to track if the match has ended
+        self.worker = worker if worker is not None else RpcWorker()
+        self.core = ClientCore(player_name, server, ListenerBridge(self))
+        self.core.registered = True  # the player is registered by main() through the name dialog
+        self.core.player_id = player_id
 
         self.gui = GameGUI(player_name)
         for btn in self.gui.buttons:
@@ -57,180 +73,135 @@ class GameClient:
         self.gui.rematch_button.clicked.connect(self.request_rematch)
         self.gui.new_match_button.clicked.connect(self.request_new_match)
 
-        self.polling_timer = QTimer()
-        self.polling_timer.timeout.connect(self.poll_game_state)
-        self.polling_timer.start(self.POLLING_INTERVAL * 1000)
-
-        self.rematch_polling_timer = QTimer()
-        self.rematch_polling_timer.timeout.connect(self.poll_match_status)
+        self.polling_timer = None
+        if polling:
+            self.polling_timer = QTimer()
+            self.polling_timer.timeout.connect(self.poll)
+            self.polling_timer.start(self.POLLING_INTERVAL * 1000)
 
         self.gui.closeEvent = self.handle_close_event
 
-        # Set the timer for the time to make a move
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.unregister_player)
-
-    def make_choice(self):
+    def poll(self):
         """
-        Function to make a move in the game.
+        Function to advance the client core on the worker. The poll is skipped while the previous one is still
+        running, so a slow server delays the refreshes instead of queueing them.
         """
-        print("Making choice...")
-        if not self.made_move:
-            print("Choice made...")
-            sender = self.gui.sender()
-            choice = sender.text()
-
-            print(f'player_name: {self.player_name}, choice: {choice}')
+        self.worker.submit(self.core.tick, key=self.core, callback=self.tick_done)
 
-            self.server.make_choice(self.player_name, choice)
-            self.made_move = True
-            self.gui.move_label.setText(f"Your move: {choice}")
-            print("Stopping timer...")
-            self.timer.stop()
-
-            for button in self.gui.buttons:
-                button.setEnabled(False)
-
-    def show_winner(self, winner, winner_of_series=None):
+    def tick_done(self, result, error):
         """
-        Function to show the winner of the game.
+        Callback of a tick run on the worker.
 
         Args:
-            winner (str): The name of the player who won.
-            winner_of_series (str): The name of the player who won the series (optional).
+            result (None): The result of the tick.
+            error (Exception or None): The exception raised by the tick, None if it succeeded.
         """
-        print("Showing winner...")
-
-        if winner_of_series is not None:
-            self.server.update_general_score(self.player_name)
-            self.gui.general_score_label.setText(
-                f"General score: {self.server.get_general_score(self.player_name)}")
-
-        self.gui.show_winner(winner, winner_of_series)
-        self.polling_timer.stop()
-        self.rematch_polling_timer.start(self.REMATCH_POLLING_INTERVAL * 1000)
+        if error is not None:
+            self.tick_failed(error)
 
-        self.update_score()
+    def tick_failed(self, error):
+        """
+        Reports a failed tick on the GUI instead of raising it into the Qt event loop; the next poll tries again.
 
-        # only if the state of the match is REMATCH, then enable the rematch button
-        if MatchStatus(self.server.get_match_status(self.player_name)) == MatchStatus.SERIES_OVER:
-            self.gui.rematch_button.setEnabled(True)  # Enable the rematch button
-            self.gui.new_match_button.setEnabled(True)  # Enable the new match button
-            self.made_move = False
+        Args:
+            error (Exception): The exception raised by the tick.
+        """
+        if isinstance(error, Pyro5.errors.CommunicationError):
+            self.connection_lost(error)
+        else:
+            print(f"{self.player_name}: {type(error).__name__} {error}")
+            self.gui.result_label.setText(f"Error: {error}")
 
-    def update_score(self):
+    def connection_lost(self, error):
         """
-        Function to update the score of the current game series.
+        Reports on the GUI that the server cannot be reached.
+
+        Args:
+            error (Pyro5.errors.CommunicationError): The error of the last call.
         """
-        score = self.server.get_score(self.player_name)
-        self.gui.score_label.setText(f"Score of the series: {score}")
+        print(f"Cannot reach the game server: {error}")
+        self.gui.result_label.setText("Connection to the server lost, retrying...")
 
-    def poll_game_state(self):
+    def make_choice(self):
         """
-        Function to poll the game state from the server and update the GUI.
+        Function to make a move in the game. The buttons are disabled at once, while the move is sent by the worker.
         """
-        game_state = self.server.get_game_state(self.player_name)
-        match_status = MatchStatus(self.server.get_match_status(self.player_name))
-        winner_of_series = self.server.get_winner_of_series(self.player_name)
-        # print("Winner of series: ", winner_of_series)
-        # print(f'game_state: {game_state}, match_status: {match_status}')
-
-        if match_status == MatchStatus.LEFT:
-            self.gui.disable_buttons()
-            self.gui.playing_against_label.setText(
-                f"Playing against: {self.server.get_opponent_name(self.player_name)}")
-            # self.gui.result_label.setText("Your opponent left the match. You win!")
-            self.gui.move_label.clear()
-            self.gui.rematch_button.setEnabled(False)
-            self.gui.new_match_button.setEnabled(True)
-            self.made_move = False
-            self.polling_timer.stop()
-            self.rematch_polling_timer.start(self.REMATCH_POLLING_INTERVAL * 1000)
-
-            print("Self.series_over: ", self.series_over)
-            if not self.series_over:
-                print("GAME-STATE LEFT: Updating general score")
-                self.gui.result_label.setText("Your opponent left the match. You win!")
-                self.server.update_general_score(self.player_name)
-
-            self.gui.general_score_label.setText(
-                f"General score: {self.server.get_general_score(self.player_name)}")
-            self.server.reset_after_left(self.player_name)
-
-        if match_status == MatchStatus.ONGOING and not self.made_move:
-            if not self.timer.isActive():
-                print("Starting timer...")
-                self.timer.start(TIME_TO_MOVE * 1000)
-            # print("[POLL GAME STATE]: Match is ongoing - move not made yet")
-            self.gui.enable_buttons()
-            self.gui.disable_list_of_buttons(self.gui.rematch_button, self.gui.new_match_button)
-            self.gui.playing_against_label.setText(
-                f"Playing against: {self.server.get_opponent_name(self.player_name)}")
-
-        if game_state and match_status == MatchStatus.OVER:
-            self.show_winner(game_state)
-            self.series_over = False
-
-        if match_status == MatchStatus.SERIES_OVER:
-            self.show_winner(game_state, winner_of_series)
-            self.server.get_general_score(self.player_name)
-            self.series_over = True
-            # if not self.series_over:
-            #     self.server.update_general_score(self.player_name)
-            #     self.gui.general_score_label.setText(
-            #         f"General score: {self.server.get_general_score(self.player_name)}")
-
-    def poll_match_status(self):
+        sender = self.gui.sender()
+        self.gui.disable_buttons()
+        self.worker.submit(self.core.make_choice, sender.text(), callback=self.choice_sent)
+
+    def choice_sent(self, sent, error):
         """
-        Function to poll the match status from the server and update the GUI.
+        Callback of a move sent by the worker: the buttons are enabled again if the move was rejected.
+
+        Args:
+            sent (bool or None): True if the move has been sent, False if a move was already made.
+            error (Exception or None): The exception raised by the call, None if it succeeded.
         """
-        match_status = self.server.get_match_status(self.player_name)
-        # match_status is a string instead of a MatchStatus enum.
-        # this is a workaround because Pyro cannot serialize the MatchStatus enum
-        match_status = MatchStatus(match_status)
+        if error is None:
+            return
+        self.gui.enable_buttons()
+        if isinstance(error, RateLimitExceeded):
+            self.gui.result_label.setText(f"Too many requests, retry in {error.retry_after:.0f} s.")
+        else:
+            self.tick_failed(error)
 
-        print(f'match_status: {match_status}')
-        # print(f'made_move: {self.made_move}')
+    def on_move_made(self, choice):
+        self.gui.move_label.setText(f"Your move: {choice}")
+        self.gui.disable_buttons()
 
-        if match_status == MatchStatus.NONE:
-            self.gui.rematch_button.setEnabled(False)
+    def on_match_started(self, opponent_name):
+        self.gui.enable_buttons()
+        self.gui.disable_list_of_buttons(self.gui.rematch_button, self.gui.new_match_button)
+        self.gui.playing_against_label.setText(f"Playing against: {opponent_name}")
 
-        if match_status == MatchStatus.LEFT:
-            self.gui.disable_buttons()
-            self.gui.playing_against_label.setText(
-                f"Playing against: {self.server.get_opponent_name(self.player_name)}")
-            self.gui.move_label.clear()
-            self.gui.rematch_button.setEnabled(False)
-            self.gui.new_match_button.setEnabled(True)
-            self.made_move = False
+    def on_round_over(self, result, winner_of_series):
+        self.gui.show_winner(result, winner_of_series)
+
+    def on_rematch_available(self):
+        self.gui.rematch_button.setEnabled(True)
+        self.gui.new_match_button.setEnabled(True)
+
+    def on_rematch_unavailable(self):
+        self.gui.rematch_button.setEnabled(False)
+
+    def on_waiting(self, position, estimated_wait):
+        estimate = f", about {estimated_wait:.0f} s" if estimated_wait is not None else ""
+        self.gui.playing_against_label.setText(f"Waiting for an opponent: #{position} in the queue{estimate}")
+
+    def on_opponent_left(self, opponent_name, awarded_win):
+        self.gui.disable_buttons()
+        self.gui.playing_against_label.setText(f"Playing against: {opponent_name}")
+        self.gui.move_label.clear()
+        self.gui.rematch_button.setEnabled(False)
+        self.gui.new_match_button.setEnabled(True)
+        if awarded_win:
+            self.gui.result_label.setText("Your opponent left the match. You win!")
+
+    def on_new_round(self, num_of_match, new_match, score):
+        self.gui.num_of_matches_label.setText(f"Match {num_of_match} of 5")
+        self.gui.enable_buttons()
+        self.gui.clear_labels(self.gui.move_label, self.gui.result_label)
+        if new_match:
+            self.gui.playing_against_label.clear()
+            self.gui.score_label.setText(f"Score of the series: {score}")
+
+    def on_score_changed(self, score):
+        self.gui.score_label.setText(f"Score of the series: {score}")
+
+    def on_general_score_changed(self, general_score):
+        self.gui.general_score_label.setText(f"General score: {general_score}")
+
+    def on_rematch_started(self):
+        self.gui.disable_list_of_buttons(self.gui.rematch_button, self.gui.new_match_button)
+
+    def on_unregistered(self, timed_out):
+        if self.polling_timer is not None:
             self.polling_timer.stop()
-            self.rematch_polling_timer.start(self.REMATCH_POLLING_INTERVAL * 1000)
-            print("[MS]Self.series_over: ", self.series_over)
-            if not self.series_over:
-                print("MATCH-STATUS LEFT: Updating general score")
-                self.gui.result_label.setText("Your opponent left the match. You win!")
-                self.server.update_general_score(self.player_name)
-
-            self.gui.general_score_label.setText(
-                f"General score: {self.server.get_general_score(self.player_name)}")
-            self.server.reset_after_left(self.player_name)
-
-        if match_status == MatchStatus.ONGOING and not self.made_move:
-            print("[POLL GAME STATUS]: Match is ongoing - move not made yet")
-            self.reset_game_state(new_match=True)
-            self.gui.enable_buttons()
-            self.gui.playing_against_label.setText(
-                f"Playing against: {self.server.get_opponent_name(self.player_name)}")
-        if match_status == MatchStatus.OVER:
-            print("Match is over")
-            self.made_move = False
-            self.server.reset_state_after_single_match(self.player_name)
-            QTimer.singleShot(1000, self.reset_game_state)
-        elif match_status == MatchStatus.REMATCH:
-            self.reset_game_state()
-            self.update_score()
-            self.gui.rematch_button.setEnabled(False)
-            self.gui.new_match_button.setEnabled(False)
+        self.gui.disable_buttons()
+        self.gui.disable_list_of_buttons(self.gui.rematch_button, self.gui.new_match_button)
+        if timed_out:
+            self.gui.result_label.setText("Time to make a move is over.")
 
     def request_rematch(self):
         """
@@ -240,11 +211,22 @@ class GameClient:
         reply = QMessageBox.question(self.gui, "Rematch", "Do you want to request a rematch?",
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
-            result = self.server.rematch(self.player_name)
-            if result is not None:
-                self.gui.rematch_button.setEnabled(False)
-                self.gui.new_match_button.setEnabled(False)
-                self.made_move = False
+            self.worker.submit(self.core.request_rematch, callback=self.rematch_requested)
+
+    def rematch_requested(self, requested, error):
+        """
+        Callback of a rematch requested by the worker.
+
+        Args:
+            requested (bool or None): True if the rematch was requested, False if the opponent is no longer in the
+                game.
+            error (Exception or None): The exception raised by the call, None if it succeeded.
+        """
+        if error is not None:
+            self.tick_failed(error)
+        elif requested:
+            self.gui.rematch_button.setEnabled(False)
+            self.gui.new_match_button.setEnabled(False)
 
     def request_new_match(self):
         """
@@ -253,32 +235,28 @@ class GameClient:
         print("Requesting new match...")
         reply = QMessageBox.question(self.gui, "New match", "Do you want to request a new match?")
         if reply == QMessageBox.StandardButton.Yes:
-            self.server.new_match(self.player_name)
+            self.worker.submit(self.core.request_new_match, callback=self.new_match_requested)
             self.gui.rematch_button.setEnabled(False)
             self.gui.new_match_button.setEnabled(False)
-            self.made_move = False
 
-    def reset_game_state(self, new_match=False):
+    def new_match_requested(self, result, error):
         """
-        Function to reset the game state in preparation for a new match or rematch.
+        Callback of a new match requested by the worker: the new match button is enabled again if the request was
+        rejected, e.g. because the lobby is full.
 
         Args:
-            new_match (bool): Flag to indicate if this is a new match.
+            result (None): The result of the call.
+            error (Exception or None): The exception raised by the call, None if it succeeded.
         """
-        print("Resetting game state...")
-        num_of_match = self.server.get_num_of_match(self.player_name)
-        self.gui.num_of_matches_label.setText(f"Match {num_of_match} of 5")
-        self.gui.enable_buttons()
-        self.gui.move_label.clear()
-        self.gui.result_label.clear()
-        self.made_move = False
-        self.series_over = False
-        self.polling_timer.start(self.POLLING_INTERVAL * 1000)
-        self.rematch_polling_timer.stop()
-        if new_match:
-            self.gui.score_label.clear()
-            self.gui.playing_against_label.clear()
-            self.gui.score_label.setText(f"Score of the series: {self.server.get_score(self.player_name)}")
+        if error is None:
+            return
+        self.gui.new_match_button.setEnabled(True)
+        if isinstance(error, LobbyFullError):
+            self.gui.result_label.setText(f"Too many players waiting, retry in {error.retry_after:.0f} s.")
+        elif isinstance(error, RateLimitExceeded):
+            self.gui.result_label.setText(f"Too many requests, retry in {error.retry_after:.0f} s.")
+        else:
+            self.tick_failed(error)
 
     def handle_close_event(self, event):
         """
@@ -291,49 +269,114 @@ class GameClient:
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         if reply == QMessageBox.StandardButton.Yes:
             # Unregister the player before closing the window
-            print(f"Unregistering player {self.player_name}...")
-            self.server.unregister_player(self.player_name)
+            self.unregister_player()
             event.accept()
         else:
             event.ignore()
 
     def unregister_player(self):
         """
-        Function to unregister the player from the server.
+        Function to unregister the player from the server. The call is queued on the worker, which runs it before
+        stopping (see RpcWorker.stop).
         """
-        print(f"Unregistering player {self.player_name}...")
-        self.server.unregister_player(self.player_name)
+        self.worker.submit(self.core.unregister)
+
 
+def report_startup(started_at, warmer, dialog_shown_at, registered_at):
+    """
+    Prints how long the client took to become interactive and to connect to the server.
 
-def main():
+    Args:
+        started_at (float): Time at which main() started (time.perf_counter).
+        warmer (ProxyWarmer): The warmer that connected the proxy.
+        dialog_shown_at (float or None): Time at which the name dialog was shown.
+        registered_at (float): Time at which the player was registered.
+    """
+    def ms(t):
+        return f"{(t - started_at) * 1000:.1f} ms" if t is not None else "n/a"
+
+    print(f"Time to first interaction (name dialog shown): {ms(dialog_shown_at)}")
+    print(f"Server connection ready: {ms(warmer.connected_at)}")
+    print(f"Player registered: {ms(registered_at)}")
+
+
+def main(argv=None):
     """
     Main function to start the application.
     """
+    started_at = time.perf_counter()
+
+    parser = argparse.ArgumentParser(description="Morra Cinese client.")
+    parser.add_argument("--uri", default=SERVER_URI, help="URI of the game server")
+    parser.add_argument("--ns", action="store_true", help="pick a server instance registered in the name server")
+    parser.add_argument("--ns-host", default=None, help="host of the name server (default: broadcast lookup)")
+    parser.add_argument("--ns-port", type=int, default=None, help="port of the name server")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="least-loaded",
+                        help="policy used to pick a server instance")
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="write sampled traces of the calls (queue, round trip, delivery) to this NDJSON file")
+    parser.add_argument("--trace-sample", type=float, default=SAMPLE_RATE, help="fraction of the calls traced")
+    parser.add_argument("--trace-slow", type=float, default=SLOW_MS,
+                        help="milliseconds over which a call is traced even if not sampled")
+    args = parser.parse_args(argv)
+    tracer = Tracer(args.trace, "client", args.trace_sample, args.trace_slow) if args.trace is not None else None
+
+    def server_target(player_name=None):
+        if not args.ns:
+            return args.uri
+        return make_resolver(args.policy, player_name, args.ns_host, args.ns_port)
+
+    # the connection to the server is set up in the background while the user types the player name, unless the
+    # server instance depends on the player name (consistent hashing)
+    warm_up_early = not args.ns or not POLICIES[args.policy].uses_player_name
+    warmer = ProxyWarmer(server_target()).start() if warm_up_early else None
+
     app = QApplication([])
+    dialog_shown_at = None
 
-    game_server = Pyro5.api.Proxy("PYRO:MorraCinese.game@localhost:55894")
+    def mark_dialog_shown():
+        nonlocal dialog_shown_at
+        if dialog_shown_at is None:
+            dialog_shown_at = time.perf_counter()
 
-    # player_name = f'Player {random.randint(1, 100)}'
-    # game_id = game_server.register_player(player_name)
+    game_server = None
 
     while True:
+        QTimer.singleShot(0, mark_dialog_shown)  # runs as soon as the dialog's event loop starts
         player_name, ok = QInputDialog.getText(QtWidgets.QWidget(), "Player Registration", "Enter player name:")
         if not ok:
             print("Player registration cancelled.")
+            if warmer is not None:
+                warmer.cancel()
             sys.exit()
         if player_name == "" or player_name.upper().strip() == "NONE" or player_name.isspace():
             QMessageBox.critical(None, "Registration Error", "Player name cannot be empty or None or whitespace.")
             continue
         if ok and player_name:
             try:
-                game_server.register_player(player_name)
+                if game_server is None:
+                    if warmer is None:
+                        warmer = ProxyWarmer(server_target(player_name)).start()
+                    game_server = warmer.result()
+                player_id = game_server.register_player(player_name)
                 break
+            except CONNECT_ERRORS as e:
+                QMessageBox.critical(None, "Connection Error", f"Cannot reach the game server: {e}")
+                game_server = None
+                warmer = ProxyWarmer(server_target()).start() if warm_up_early else None
+            except LobbyFullError as e:
+                QMessageBox.warning(None, "Server Busy", f"Too many players waiting, retry in {e.retry_after:.0f} s.")
             except ValueError as e:
                 QMessageBox.critical(None, "Registration Error", str(e))
         else:
             print("Player registration cancelled.")
             sys.exit()
 
+    report_startup(started_at, warmer, dialog_shown_at, time.perf_counter())
+
+    # from now on the calls go through a pool, which reconnects and resumes the session if the connection drops
+    pool = ProxyPool(warmer.uri, max_connections=1, tracer=tracer)
+
     screen_resolution = QtGui.QGuiApplication.primaryScreen().availableGeometry()
 
     screen_width = screen_resolution.width()
@@ -343,7 +386,18 @@ def main():
     y_range = (MARGIN, screen_height - WINDOW_HEIGHT - MARGIN)
     position = (random.randint(*x_range), random.randint(*y_range))
 
-    client = GameClient(player_name, game_server)
+    client = GameClient(player_name, pool.server, player_id, worker=RpcWorker(tracer))
+
+    def adopt_connection():
+        # the connection used for the registration is handed over to the worker thread, which makes all the calls
+        game_server._pyroClaimOwnership()
+        pool.adopt(game_server)
+        pool.add_session_hook(client.core.resume_session)
+
+    client.worker.submit(adopt_connection)
+    app.aboutToQuit.connect(client.worker.stop)
+    if tracer is not None:
+        app.aboutToQuit.connect(tracer.close)  # after the worker has stopped
     #game_id = None
     #client.game_id = game_id
     client.gui.setGeometry(*position, WINDOW_WIDTH, WINDOW_HEIGHT)
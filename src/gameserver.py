@@ -1,10 +1,82 @@
 # gameserver.py
 
+import argparse
+import functools
+import json
+import os
+import random
+import signal
+import threading
 import Pyro5.api
 from collections import defaultdict
-from src.game import Game
+from src.analytics import Analytics
+from src.batch import run_batch
+from src.discovery import OBJECT_NAME, ServerRegistration
+from src.errors import GameNotFoundError, LobbyFullError
+from src.history import HistoryStore, round_record, series_record, EXPORT_BATCH
+from src.matchmaking import EloRatings, Matchmaker, PairingRate, WaitingIndex, estimated_wait, BASE_GAP, BOT, \
+    BOT_PREFIX, GAP_GROWTH, LOBBY_BOTS, LOBBY_RETRY, LOBBY_SIZE, MATCH_INTERVAL, OVERFLOW_POLICIES, REJECT
+from src.memory import MemoryProfiler, MemoryReporter, DIFF_TOP, REPORT_INTERVAL, TRACE_FRAMES
+from src.metrics import Metrics
+from src.players import IdCounter, PlayerTable
+from src.ratelimit import RateLimiter, rate_limited, READ, WRITE, BULK
+from src.readviews import ReadViews, publishes_views
+from src.replication import Replicator, Standby, replicates_changes, FAILOVER_TIMEOUT
+from src import snapshot
+from src.tiering import ColdStore, Sweeper, TieredGames, thaw_game, HOT_GAMES, IDLE_TIMEOUT
+from src.tracing import Tracer, TracedLock, traced, DISPATCH, LOGIC, SAMPLE_RATE, SLOW_MS
+from src.shmtransport import ShmPump, DEFAULT_CHANNELS
+from src.spectator import GameBroadcaster, publishes_changes, DEFAULT_QUEUE_SIZE, MAX_QUEUE_SIZE
+from src.game import GamePool, VersionClock
 from src.enums import Move, Result, MatchStatus
 
+BOT_MOVES = [move.value for move in Move]
+
+
+def holds_lobby_lock(method):
+    """
+    Decorator for the GameServer methods that change the games or the players: the call, and the publication of its
+    changes, run holding the lobby lock, so the writes of the worker threads never see a game half-changed by another
+    one (e.g. a player moved by the matchmaker while the opponent moves). The reads go to the read views instead.
+
+    Args:
+        method (callable): The method.
+
+    Returns:
+        callable: The decorated method.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lobby_lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def server_call(kind, writes=False, per_player=True):
+    """
+    Decorator for the exposed GameServer methods, applying the layers of a call in a fixed order: the dispatch span of
+    the trace, the rate limiter, for the writes the lobby lock and the publication of the changes (to the spectators,
+    to the standby and to the read views), and the span of the logic.
+
+    Args:
+        kind (str): READ, WRITE or BULK, the budget charged by the rate limiter.
+        writes (bool, optional): Flag telling that the method changes the games or the players, so its changes are
+            published after the call. Defaults to False.
+        per_player (bool, optional): Flag telling that the first positional argument is a player (see rate_limited).
+            Defaults to True.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(method):
+        method = traced(LOGIC)(method)
+        if writes:
+            method = holds_lobby_lock(publishes_changes(replicates_changes(publishes_views(method))))
+        return traced(DISPATCH)(rate_limited(kind, per_player)(method))
+
+    return decorator
+
 
 @Pyro5.api.expose
 class GameServer(object):
@@ -13,20 +85,90 @@ class GameServer(object):
     Handles game creation, player registration, player choices, game state, etc.
 
     Attributes:
-        games (defaultdict(Game)): A dictionary to track ongoing games.
-        players_game (defaultdict(int)): A dictionary to track players and their corresponding games.
-        players_score (defaultdict(int)): A dictionary to track scores of the players.
+        games (TieredGames): The ongoing games, keyed by the game id as a string; the idle ones are kept serialized
+            and faulted back in on access.
+        game_pool (GamePool): The games removed from the server, reused by the new ones.
+        players (PlayerTable): The ids and the names of the registered players.
+        players_game (dict): A dictionary to track players (by id) and their corresponding games.
+        players_score (defaultdict(int)): A dictionary to track scores of the players (by id).
+        game_ids (IdCounter): The generator of the identifiers of the new games.
+        version_clock (VersionClock): The clock versioning the changes seen by the players, shared by all the games.
+        registry_versions (dict): The version of the last change of the registry fields of each player, keyed by
+            (field, player_id).
+        metrics (Metrics): The registry of the server metrics.
+        rate_limiter (RateLimiter or None): Admission control in front of the exposed methods, None to disable it.
+        spectators (GameBroadcaster): The fan-out of the changes of the games to their spectators.
+        history (HistoryStore): The records of the finished rounds and series.
+        analytics (Analytics): The statistics of the players, aggregated from the same records as the history.
+        ratings (EloRatings): The ratings of the players, updated when a series ends.
+        waiting (WaitingIndex): The games waiting for a second player, indexed by the rating of the waiting player.
+        lobby_size (int or None): The players admitted to wait for an opponent, None for an unbounded lobby.
+        lobby_overflow (str): What happens to a player arriving when the lobby is full: REJECT or BOT.
+        max_bots (int): The games against a bot open at most with the BOT policy.
+        bots (set): The ids of the bots playing against the players turned away from the full lobby.
+        pairing_rate (PairingRate): The waiting players paired per second, for the wait estimates.
+        lobby_lock (TracedLock): Serializes the writes, the moves of the players between the games and the evictions
+            (a reentrant lock).
+        read_views (ReadViews): The state read by the players, published after every change.
+        replication (ChangeLog or None): The changes not yet sent to the standby server, None if no standby is
+            connected.
+        memory (MemoryProfiler or None): The memory instrumentation, None if not enabled.
+        tracer (Tracer or None): The tracer of the requests, recording their dispatch, lock wait and logic spans;
+            None if not enabled.
     """
 
-    def __init__(self):
+    def __init__(self, rate_limiter=None, history=None, waiting=None, cold_store=None, hot_games=HOT_GAMES,
+                 idle_timeout=IDLE_TIMEOUT, lobby_size=None, lobby_overflow=REJECT, max_bots=LOBBY_BOTS):
         """
         Initialize a new instance of the GameServer.
+
+        Args:
+            rate_limiter (RateLimiter, optional): Admission control in front of the exposed methods. Defaults to None
+                (no limit); main() enables it.
+            history (HistoryStore, optional): The records of the finished rounds and series. Defaults to an
+                in-memory store.
+            waiting (WaitingIndex, optional): The index of the waiting games. Defaults to an index with the default
+                rating gaps.
+            cold_store (ColdStore, optional): The store of the evicted games. Defaults to an in-memory store.
+            hot_games (int, optional): The maximum number of games kept as objects. Defaults to HOT_GAMES.
+            idle_timeout (float, optional): The seconds without access after which a game is evicted. Defaults to
+                IDLE_TIMEOUT.
+            lobby_size (int, optional): The players admitted to wait for an opponent. Defaults to None (unbounded);
+                main() bounds it.
+            lobby_overflow (str, optional): REJECT or BOT. Defaults to REJECT.
+            max_bots (int, optional): The games against a bot open at most. Defaults to LOBBY_BOTS.
         """
-        self.games = defaultdict(Game)  # Dizionario per tenere traccia delle partite
-        self.players_game = defaultdict(
-            int)  # Dizionario per tenere traccia dei giocatori e delle partite a cui sono registrati
+        self.metrics = Metrics()
+        self.rate_limiter = rate_limiter
+        if rate_limiter is not None and rate_limiter.metrics is None:
+            rate_limiter.metrics = self.metrics
+        # Partite in corso: le inattive sono serializzate e ricaricate al primo accesso
+        self.games = TieredGames(self._thaw_game, cold_store, hot_games, idle_timeout)
+        self.game_pool = GamePool()  # Partite rimosse, riutilizzate dalle nuove
+        self.players = PlayerTable()  # Id e nomi dei giocatori registrati
+        self.players_game = {}  # Dizionario per tenere traccia dei giocatori e delle partite a cui sono registrati
+        self.game_ids = IdCounter()  # Identificatori delle nuove partite
         self.players_score = defaultdict(int)  # Dizionario per tenere traccia dei punteggi dei giocatori
-
+        self.version_clock = VersionClock()  # Orologio delle versioni condiviso da tutte le partite
+        self.registry_versions = {}  # Versione dell'ultima modifica dei campi del registro dei giocatori
+        self.spectators = GameBroadcaster()  # Spettatori delle partite
+        self.history = history if history is not None else HistoryStore()  # Storico dei match e delle serie
+        self.analytics = Analytics()  # Statistiche dei giocatori
+        self.ratings = EloRatings()  # Punteggi Elo dei giocatori
+        self.waiting = waiting if waiting is not None else WaitingIndex()  # Partite in attesa di un avversario
+        self.lobby_lock = TracedLock(threading.RLock(), "lobby")  # Serializza scritture e spostamenti dei giocatori
+        self.lobby_size = lobby_size  # Giocatori ammessi in attesa di un avversario
+        self.lobby_overflow = lobby_overflow  # Cosa succede a chi arriva con la lobby piena
+        self.max_bots = max_bots  # Partite contro un bot aperte al massimo
+        self.bots = set()  # Bot che giocano contro i giocatori respinti dalla lobby
+        self.pairing_rate = PairingRate()  # Giocatori in attesa accoppiati al secondo
+        self._bot_rng = random.Random()  # Mosse dei bot
+        self.read_views = ReadViews()  # Stato letto dai giocatori, ripubblicato a ogni modifica
+        self.replication = None  # Modifiche da inviare al server di riserva, se collegato
+        self.memory = None  # Strumentazione della memoria, se abilitata
+        self.tracer = None  # Tracciamento delle richieste, se abilitato
+
+    @server_call(WRITE)
     def create_game(self):
         """
         Create a new game and return its identifier.
@@ -34,336 +176,1174 @@ class GameServer(object):
         Returns:
             int: The identifier of the new game.
         """
-        # Crea una partita con un game_id che non e' già presente nel dizionario self.games
-        game_id = 1
-        while str(game_id) in self.games:
-            game_id += 1
+        # Crea una partita con un nuovo game_id: gli id non vengono riutilizzati
+        game_id = next(self.game_ids)
 
-        game = Game()
+        game = self.game_pool.acquire(self.version_clock, self.players)
         self.games[str(game_id)] = game
         game.game_id = game_id
 
-        print(f'Nuova partita creata con id {game_id}')
-        print(f'Partite attive: {self.games}')
+        print(f'Nuova partita creata con id {game_id}, partite attive: {len(self.games)}')
 
         return game
 
-    def add_player_to_game(self, player_name, old_match_id=None):
+    @server_call(WRITE, writes=True)
+    def add_player_to_game(self, player, old_match_id=None):
         """
         Add a player to an available game or create a new game.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
             old_match_id (int, optional): The identifier of the old match, if any. Defaults to None.
         """
-        game = self.find_available_game(player_name, old_match_id)
+        player_id = self.players.resolve(player)
+        rating = self.ratings.rating(self.players.name(player_id))
+        exclude = (int(old_match_id),) if old_match_id is not None else ()
+        with self.lobby_lock:
+            while True:
+                game_id, gap = self.waiting.claim(rating, exclude)
+                if game_id is None:
+                    break
+                game = self.games.get(str(game_id))
+                if game is not None and len(game.players) == 1:
+                    break
+                # the index lost track of a change of the game: it is re-indexed, or dropped if it is gone
+                if game is not None:
+                    self._update_waiting(game)
+
+            if game_id is None:
+                new_game = self.create_game()
+                new_game.players.append(player_id)
+                new_game.scores[player_id] = 0
+                new_game.moves[player_id] = None
+                self.players_game[player_id] = new_game.game_id
+                self.waiting.add(new_game.game_id, rating)
+                print(f"Giocatore {self.players.name(player_id)} inserito in un nuovo game.")
+                # the player is in a different game: the clients resynchronize all the fields
+                self.registry_versions[("game_id", player_id)] = self.version_clock.tick()
+            else:
+                print(f"Nuova partita disponibile trovata: {game_id}, differenza di punteggio {gap:.0f}")
+                self._seat(game, player_id)
+                self.pairing_rate.record()
+                self.metrics.incr("matchmaking.paired")
+                self.metrics.incr("matchmaking.gap_total", round(gap))
+
+    def _seat(self, game, player_id):
+        """
+        Seats a player in a game with a waiting player and starts the match.
+
+        Args:
+            game (Game): The game, with one player.
+            player_id (int): The id of the player.
+        """
+        game.players.append(player_id)
+        game.scores[player_id] = 0
+        game.moves[player_id] = None
+        self.players_game[player_id] = game.game_id
+        print(f"Giocatore {self.players.name(player_id)} inserito in un game disponibile.")
+        game.match_status = MatchStatus.ONGOING
+        game.touch("match_status")
+        game.touch("opponent_name")
+        # the player is in a different game: the clients resynchronize all the fields
+        self.registry_versions[("game_id", player_id)] = self.version_clock.tick()
+
+    def _admit(self, player_id):
+        """
+        Admission control of a player arriving in the lobby: a player whom a waiting player accepts, or who finds
+        room in the lobby, is admitted; otherwise the overflow policy applies. Called with the lobby lock held, before
+        the player is seated.
+
+        Args:
+            player_id (int): The id of the player.
+
+        Raises:
+            LobbyFullError: If the lobby is full and the player cannot play against a bot.
+
+        Returns:
+            bool: True if the player must play against a bot, False if the player joins the lobby.
+        """
+        if self.lobby_size is None or len(self.waiting) < self.lobby_size:
+            return False
+        if self.waiting.find(self.ratings.rating(self.players.name(player_id))) is not None:
+            return False
+        if self.lobby_overflow == BOT and len(self.bots) < self.max_bots:
+            return True
+        self.metrics.incr("lobby.rejected")
+        rate = self.pairing_rate.rate()
+        # the rejected players compete for the next free places: they retry once the players waiting now are paired
+        retry_after = estimated_wait(len(self.waiting), rate) if rate > 0 else LOBBY_RETRY
+        raise LobbyFullError(f"The lobby is full ({len(self.waiting)} players waiting)", retry_after)
+
+    def _seat_against_bot(self, player_id):
+        """
+        Seats a player turned away from the full lobby in a new game against a bot, which never waits in the lobby:
+        the bot plays once the player has moved and follows the rematches of the player (see _bot_turn).
 
-        if game is None:
-            new_game = self.create_game()
-            new_game.players.append(player_name)
-            new_game.scores[player_name] = 0
-            new_game.moves[player_name] = None
-            self.players_game[player_name] = new_game.game_id
-            print(f"Giocatore {player_name} inserito in un nuovo game.")
+        Args:
+            player_id (int): The id of the player.
+        """
+        game = self.create_game()
+        bot_id = self.players.add(f"{BOT_PREFIX}{game.game_id}")  # the game ids are not reused
+        self.bots.add(bot_id)
+        game.players.append(bot_id)
+        game.scores[bot_id] = 0
+        game.moves[bot_id] = None
+        self.players_game[bot_id] = game.game_id
+        print(f"Lobby piena: giocatore {self.players.name(player_id)} inserito in una partita contro un bot.")
+        self._seat(game, player_id)
+        self.metrics.incr("lobby.bot_games")
+        log = self.replication
+        if log is not None:
+            log.mark((bot_id,), (game.game_id,))
+
+    def _bot_of(self, game):
+        """
+        Gets the bot of a game. The bots are recognized by their name, so the ones restored from a snapshot or by a
+        standby keep playing.
+
+        Args:
+            game (Game): The game.
+
+        Returns:
+            int or None: The id of the bot, None if both players are people.
+        """
+        for player_id in game.players:
+            if self.players.name(player_id).startswith(BOT_PREFIX):
+                return player_id
+        return None
+
+    def _bot_turn(self, game, bot_id):
+        """
+        Lets the bot of a game follow its opponent: it moves once the opponent has moved, is ready for the next
+        match as soon as a match is over, and accepts the rematch requested by the opponent.
+
+        Args:
+            game (Game): The game.
+            bot_id (int): The id of the bot.
+
+        Returns:
+            bool: True if the move of the bot decided the match.
+        """
+        decided = False
+        status = game.match_status
+        if status != MatchStatus.OVER and status != MatchStatus.SERIES_OVER and game.moves[bot_id] is None and \
+                any(game.moves[player_id] is not None for player_id in game.players if player_id != bot_id):
+            decided = game.make_choice(bot_id, self._bot_rng.choice(BOT_MOVES))
+        if game.match_status == MatchStatus.OVER and game.moves[bot_id] is not None:
+            game.reset_state_after_single_match(bot_id)
+        elif game.match_status == MatchStatus.SERIES_OVER and game.rematch_counter == 1:
+            game.request_rematch(bot_id)
+        return decided
+
+    def _dismiss_bot(self, game):
+        """
+        Unregisters the bot of a game its opponent has left, so the bot never waits in the lobby.
+
+        Args:
+            game (Game): The game, after the opponent of the bot left it.
+        """
+        bot_id = self._bot_of(game)
+        if bot_id is None:
+            return
+        game.remove_player(bot_id)
+        del self.players_game[bot_id]
+        self.players_score.pop(bot_id, None)
+        self.registry_versions.pop(("game_id", bot_id), None)
+        self.players.remove(bot_id)
+        self.bots.discard(bot_id)
+        self.read_views.drop((bot_id,))
+        log = self.replication
+        if log is not None:
+            log.mark((bot_id,), (game.game_id,))
+
+    def _update_waiting(self, game):
+        """
+        Adds a game to the waiting index if it has one player, removes it otherwise.
+
+        Args:
+            game (Game): The game, after a player joined or left it.
+        """
+        if len(game.players) == 1:
+            self.waiting.add(game.game_id, self.ratings.rating(game.name_of(game.players[0])))
         else:
-            game.players.append(player_name)
-            game.scores[player_name] = 0
-            game.moves[player_name] = None
-            self.players_game[player_name] = game.game_id
-            print(f"Giocatore {player_name} inserito in un game disponibile.")
-            game.match_status = MatchStatus.ONGOING
+            self.waiting.remove(game.game_id)
+
+    def _game_of(self, player_id):
+        """
+        Looks up the game of a player. The games are never created by a lookup: a player without a game, or whose
+        game has been removed (and possibly reused by a new game) fails fast.
+
+        Args:
+            player_id (int): The id of the player.
 
-        # Stampa i dizionari per scopi di debugging
-        self.players_game = {k: v for k, v in sorted(self.players_game.items(), key=lambda item: item[1])}
-        print(f"players_game: {self.players_game}")
+        Raises:
+            GameNotFoundError: If the player is not in a game.
 
+        Returns:
+            Game: The game of the player.
+        """
+        game_id = self.players_game.get(player_id)
+        game = self.games.get(str(game_id)) if game_id is not None else None
+        if game is None or player_id not in game.players:
+            raise GameNotFoundError(f'Player {player_id} is not in a game.', game_id)
+        return game
+
+    def _view_of(self, player_id):
+        """
+        Gets the view of a player published after the last change, without waiting for the writers; only a view
+        dropped with an evicted game waits for them, while the game is faulted back in.
+
+        Args:
+            player_id (int): The id of the player.
+
+        Raises:
+            GameNotFoundError: If the player is not in a game.
+
+        Returns:
+            PlayerView: The view of the player.
+        """
+        view = self.read_views.get(player_id)
+        if view is None:
+            # the game has been evicted: it is faulted back in and its views are published again, once no writer is
+            # moving the player
+            with self.lobby_lock:
+                view = self.read_views.get(player_id)
+                if view is None:
+                    self.read_views.publish(self, self._game_of(player_id))
+                    view = self.read_views.get(player_id)
+            if view is None:
+                raise GameNotFoundError(f'Player {player_id} is not in a game.', self.players_game.get(player_id))
+        return view
+
+    def _thaw_game(self, data):
+        """
+        Rebuilds a game faulted back in from the cold store.
+
+        Args:
+            data (bytes): The serialized game.
+
+        Returns:
+            Game: The game.
+        """
+        return thaw_game(data, self.version_clock, self.players)
+
+    def _evict_idle_games(self):
+        """
+        Moves the idle games to the cold store, and the least recently used ones beyond the hot-set size, in batches.
+        The watched games stay hot; the polling spectators that stopped polling are dropped first. Run periodically
+        by the Sweeper.
+
+        Returns:
+            int: The number of evicted games.
+        """
+        self.spectators.expire_idle()
+        evicted = 0
+        while True:
+            with self.lobby_lock:  # a game is not serialized while a write changes it
+                games = self.games.evict(lambda game_id: self.spectators.subscribers(game_id) > 0)
+                self.read_views.drop(player_id for game in games for player_id in game.players)
+            evicted += len(games)
+            if not games:
+                break
+        if evicted:
+            self.metrics.incr("tiering.evicted", evicted)
+        return evicted
+
+    def _remove_game(self, game):
+        """
+        Removes an empty game from the server and gives it back to the pool.
+
+        Args:
+            game (Game): The game, without players.
+        """
+        del self.games[str(game.game_id)]
+        self.game_pool.release(game)
+
+    def _pair_waiting(self):
+        """
+        Pairs the players left waiting whose accepted rating gaps have grown enough: the player who has waited less
+        moves to the game of the other one. Run periodically by the Matchmaker.
+
+        Returns:
+            int: The number of pairs.
+        """
+        with self.lobby_lock:
+            pairs = self.waiting.pairs()
+            for game_id, other_id, gap in pairs:
+                game, other = self.games.get(str(game_id)), self.games.get(str(other_id))
+                if game is None or other is None or len(game.players) != 1 or len(other.players) != 1:
+                    for stale in (game, other):
+                        if stale is not None:
+                            self._update_waiting(stale)
+                    continue
+                player_id = other.players[0]
+                self._remove_game(other)
+                print(f"Partita {other_id} unita alla partita {game_id}, differenza di punteggio {gap:.0f}")
+                self._seat(game, player_id)
+                self.read_views.publish(self, game)
+                log = self.replication
+                if log is not None:
+                    log.mark((player_id,), (game_id, other_id))
+                self.pairing_rate.record(2)
+                self.metrics.incr("matchmaking.paired")
+                self.metrics.incr("matchmaking.paired_late")
+                self.metrics.incr("matchmaking.gap_total", round(gap))
+        if pairs:
+            self.spectators.publish_changes(self.games)
+        return len(pairs)
+
+    @server_call(WRITE, writes=True)
     def register_player(self, player_name):
         """
         Registers a player to a specified game.
 
         Args:
             player_name (str): The name of the player.
+
+        Raises:
+            ValueError: If a player with the same name already exists, or the name is reserved to the bots.
+            LobbyFullError: If the lobby is full and the overflow policy rejects the player, who is not registered.
+
+        Returns:
+            int: The id of the player, to send in the later calls in place of the name.
+        """
+        if isinstance(player_name, str) and player_name.startswith(BOT_PREFIX):
+            raise ValueError(f"The names starting with {BOT_PREFIX!r} are reserved to the bots.")
+        with self.lobby_lock:
+            player_id = self.players.add(player_name)
+            try:
+                against_bot = self._admit(player_id)
+            except LobbyFullError:
+                self.players.remove(player_id)
+                raise
+            self.players_score[player_id] = 0
+            self.registry_versions[("general_score", player_id)] = self.version_clock.tick()
+
+            if against_bot:
+                self._seat_against_bot(player_id)
+            else:
+                self.add_player_to_game(player_id)
+        return player_id
+
+    @server_call(READ)
+    def is_registered(self, player):
+        """
+        Checks if a player is registered on the server.
+
+        Args:
+            player (int or str): The id of the player, or the name.
+
+        Returns:
+            bool: True if the player is registered, False otherwise.
+        """
+        return player in self.players
+
+    @server_call(READ)
+    def get_load(self):
         """
-        if player_name in self.players_game:
-            raise ValueError(f'Player with name {player_name} already exists. Please choose another name.')
-        self.players_score[player_name] = 0
+        Gets the load of the server, published in the name server to balance the clients across the instances.
 
-        self.add_player_to_game(player_name)
+        Returns:
+            int: The number of registered players.
+        """
+        return self._load()
+
+    def _load(self):
+        """
+        Counts the registered players, the load published in the name server. The registration refreshes it through
+        this method, not through get_load, so the refresh is never shed by the rate limiter when the server is
+        overloaded, which is when the clients need it most.
+
+        Returns:
+            int: The number of registered players.
+        """
+        return len(self.players_game)
 
-    def find_available_game(self, player_name, old_match_id=None):
+    @server_call(READ)
+    def find_available_game(self, player, old_match_id=None):
         """
-        Finds an available game (with only one registered player).
+        Finds an available game (with only one registered player) for a player: the one whose waiting player has the
+        closest rating, within the gap accepted after their wait (see WaitingIndex). The game is not reserved.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
             old_match_id (int, optional): The identifier of the old match, if any. Defaults to None.
 
         Returns:
             Game or None: The Game object of the available game if present, None otherwise.
         """
+        player_id = self.players.key(player)
+        player_name = self.players.name(player_id) if player_id in self.players else player
+        exclude = (int(old_match_id),) if old_match_id is not None else ()
+        game_id = self.waiting.find(self.ratings.rating(player_name), exclude)
+        return self.games.get(str(game_id)) if game_id is not None else None
+
+    @server_call(READ)
+    def get_lobby_status(self, player=None):
+        """
+        Gets the state of the lobby, the players waiting for an opponent, and the place of a player in it. The wait
+        is estimated from the pairings of the last RATE_WINDOW seconds (see estimated_wait).
 
-        # game_id viene convertito in stringa perche' il dizionario self.games ha come chiavi stringhe
-        if old_match_id is not None:
-            old_match_id = str(old_match_id)
-
-        for game_id, game in self.games.items():
-            if len(game.players) == 1 and player_name not in game.players:
-                if old_match_id is not None and game_id == old_match_id:
-                    print(f"Partita disponibile trovata: {game_id} ma è la stessa partita di prima.")
-                    continue  # Skip the current game if it has the same ID as the old_match_id
-                else:
-                    print(f'game_id: {game_id}, old_game_id: {old_match_id}')
-                    print(f"Nuova partita disponibile trovata: {game_id}")
-                    return game
-        return None
+        Args:
+            player (int or str, optional): The id of the player, or the name. Defaults to None (the lobby only).
 
-    def make_choice(self, player_name, choice):
+        Returns:
+            dict: The players "waiting", the "capacity" of the lobby (None if unbounded) and the "pairing_rate" (waiting
+            players paired per second); for a waiting player, the "position" (1 for the player waiting longest), the
+            seconds "waited" and the "estimated_wait" in seconds (None until a pairing has been seen). The last
+            three are None for a player who is not waiting.
+        """
+        rate = self.pairing_rate.rate()
+        status = {"waiting": len(self.waiting), "capacity": self.lobby_size, "pairing_rate": rate,
+                  "position": None, "waited": None, "estimated_wait": None}
+        game_id = self.players_game.get(self.players.resolve(player)) if player is not None else None
+        position = self.waiting.position(game_id) if game_id is not None else None
+        if position is not None:
+            status["position"] = position
+            status["waited"] = self.waiting.waited(game_id)
+            status["estimated_wait"] = estimated_wait(position, rate)
+        return status
+
+    @server_call(WRITE, writes=True)
+    def make_choice(self, player, choice):
         """
         Registers a player's move choice in the current game.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
             choice (str): The move choice made by the player.
 
         Returns:
             bool: True if both player's moves have been registered and the winner is determined, False otherwise.
         """
 
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        game.make_choice(player_name, choice)
+        player_id = self.players.resolve(player)
+        game = self._game_of(player_id)
+        decided = game.make_choice(player_id, choice)
+        bot_id = self._bot_of(game)
+        if bot_id is not None:
+            # the matches against a bot are not recorded: they would rate the bots and grow the statistics
+            return self._bot_turn(game, bot_id) or decided
+        if decided:
+            self._record(round_record(game))
+            if game.match_status == MatchStatus.SERIES_OVER:
+                self._record(series_record(game))
+        return decided
+
+    def _record(self, record):
+        """
+        Appends a round or series record to the history and counts it in the statistics of the players.
 
-    def get_game_state(self, player_name):
+        Args:
+            record (dict): The record.
+        """
+        self.history.append(record)
+        self.analytics.record(record)
+        self.ratings.record(record)
+        log = self.replication
+        if log is not None:
+            log.record(record)
+
+    @server_call(READ)
+    def get_game_state(self, player):
         """
         Gets the current game state for a specific player.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
 
         Returns:
             str or None: The current game state ("Winner", "Loser", "Draw") if available, None otherwise.
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        return game.get_player_state(player_name)
+        player_id = self.players.resolve(player)
+        return self._view_of(player_id).game.get_player_state(player_id)
 
-    def rematch(self, player_name):
+    @server_call(WRITE, writes=True)
+    def rematch(self, player):
         """
         Handles a rematch request from a player.
 
         Args:
-            player_name (str): The name of the player requesting the rematch.
+            player (int or str): The id of the player requesting the rematch, or the name.
 
         Returns:
             bool: True if the rematch was requested successfully, False otherwise.
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
+        player_id = self.players.resolve(player)
+        game = self._game_of(player_id)
 
         # controlla che in partita ci siano due giocatori, se no ritorna NONE
         if len(game.players) != 2:
             return None
         else:
-            return game.request_rematch(player_name)
-
-    def new_match(self, player_name):
+            game.request_rematch(player_id)
+            bot_id = self._bot_of(game)
+            if bot_id is not None:
+                self._bot_turn(game, bot_id)
+            return True
+
+    @server_call(WRITE, writes=True)
+    def new_match(self, player):
         """
         Handles a new match request from a player.
 
         Args:
-            player_name (str): The name of the player requesting the new match.
+            player (int or str): The id of the player requesting the new match, or the name.
         """
 
-        print(f"Giocatore {player_name} ha richiesto un nuovo match.")
+        player_id = self.players.resolve(player)
+        print(f"Giocatore {self.players.name(player_id)} ha richiesto un nuovo match.")
 
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        old_match_id = game.game_id
-        game.request_new_match(player_name)
+        with self.lobby_lock:
+            game = self._game_of(player_id)
+            old_match_id = game.game_id
+            game.request_new_match(player_id)
+            self._dismiss_bot(game)
+            self._update_waiting(game)  # the opponent, if any, waits for a new one
 
-        self.add_player_to_game(player_name, old_match_id)
+            self.add_player_to_game(player_id, old_match_id)
 
-        if len(game.players) == 0:
-            del self.games[str(game_id)]
-            print(f"Partita {game_id} rimossa.")
-            print(f"Partite attive: {self.games}")
-
-        # sort self.players_game by game_id
-        self.players_game = {k: v for k, v in sorted(self.players_game.items(), key=lambda item: item[1])}
-        print(f"players_game: {self.players_game}")
+            if len(game.players) == 0:
+                self._remove_game(game)
+                print(f"Partita {old_match_id} rimossa.")
 
         # it prints the player and the game he's registered to
-        print(f"player_name: {player_name}, registered to game: {self.players_game[player_name]}")
+        print(f"player_name: {self.players.name(player_id)}, registered to game: {self.players_game[player_id]}")
 
-    def get_match_status(self, player_name):
+    @server_call(READ)
+    def get_match_status(self, player):
         """
         Gets the rematch status for a specific game.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
 
         Returns:
             str or None: The rematch status ("REMATCH") if available, None otherwise.
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        return game.get_match_status()
+        player_id = self.players.resolve(player)
+        return self._view_of(player_id).game.get_match_status()
 
-    def get_score(self, player_name):
+    @server_call(READ)
+    def get_score(self, player):
         """
         Gets the current score of a specific player.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
 
         Returns:
             int: The current score of the player.
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        return game.get_score(player_name)
+        player_id = self.players.resolve(player)
+        return self._view_of(player_id).game.get_score(player_id)
 
-    def get_game(self, player_name):
+    @server_call(READ)
+    def get_game(self, player):
         """
          Retrieves the current game of a specific player.
 
          Args:
-             player_name (str): The name of the player.
+             player (int or str): The id of the player, or the name.
 
          Returns:
              Game: The game instance associated with the player.
          """
-        return self.games[str(self.players_game[player_name])]
+        return self._game_of(self.players.resolve(player))
 
-    def reset_state_after_single_match(self, player_name):
+    @server_call(WRITE, writes=True)
+    def reset_state_after_single_match(self, player):
         """
         Resets the game state after a single match.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        return game.reset_state_after_single_match(player_name)
-
-    def get_winner_of_series(self, player_name):
+        player_id = self.players.resolve(player)
+        game = self._game_of(player_id)
+        game.reset_state_after_single_match(player_id)
+        bot_id = self._bot_of(game)
+        if bot_id is not None:
+            self._bot_turn(game, bot_id)  # the bot answers a move made before the player was ready
+
+    @server_call(READ)
+    def get_winner_of_series(self, player):
         """
         Gets the winner of the series of games.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
 
         Returns:
             str: The name of the winning player.
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        # return game.get_winner_of_series()
-        return game.get_winner_of_series()
+        player_id = self.players.resolve(player)
+        return self._view_of(player_id).game.get_winner_of_series()
 
-    def update_general_score(self, player_name):
+    @server_call(WRITE, writes=True)
+    def update_general_score(self, player):
         """
-        Updates the general score of the player.
+        Updates the general score of the player. The update is idempotent: a win is counted once even if the client
+        repeats the call (e.g. after a rejected or lost call).
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
+        player_id = self.players.resolve(player)
+        game = self._game_of(player_id)
         game_winner = game.get_winner_of_series()
 
         print(f"game_winner: {game_winner}")
 
-        if game_winner == player_name:
-            self.players_score[player_name] += 1
+        if game_winner == self.players.name(player_id) and not game.winner_rewarded:
+            self.players_score[player_id] += 1
+            game.winner_rewarded = True
+            self.registry_versions[("general_score", player_id)] = self.version_clock.tick()
 
-    def get_general_score(self, player_name):
+    @server_call(READ)
+    def get_general_score(self, player):
         """
         Gets the general score of the player.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
 
         Returns:
             int: The general score of the player.
         """
-        return self.players_score[player_name]
+        return self._view_of(self.players.resolve(player)).general_score
 
-    def get_num_of_match(self, player_name):
+    @server_call(READ)
+    def get_changes_since(self, player, version):
+        """
+        Gets the fields seen by a player (game state, match status, winner of the series, number of the match,
+        opponent name, score and general score) that changed after a version. The client keeps the fields in a
+        cache and sends back the version it got, so a poll without changes returns an empty dictionary.
+
+        Args:
+            player (int or str): The id of the player, or the name.
+            version (int): The last version received by the player, 0 to get all the fields.
+
+        Returns:
+            dict: The new "version" and the "changes", a dictionary of the changed fields and their values.
+        """
+        player_id = self.players.resolve(player)
+        view = self._view_of(player_id)
+        if view.moved_at > version:
+            version = 0  # the player moved to another game, the versions of the old game are meaningless
+
+        changes = view.game.get_changes_since(player_id, version)
+        if version == 0 or view.scored_at > version:
+            changes["general_score"] = view.general_score
+        return {"version": view.version, "changes": changes}
+
+    @server_call(READ)
+    def get_num_of_match(self, player):
         """
         Gets the number of the ongoing match in the series.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
 
         Returns:
             int: The number of the ongoing match.
         """
 
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        return game.get_num_of_match()
+        player_id = self.players.resolve(player)
+        return self._view_of(player_id).game.get_num_of_match()
 
-    def get_opponent_name(self, player_name):
+    @server_call(READ)
+    def get_opponent_name(self, player):
         """
         Gets the name of the opponent.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
 
         Returns:
             str: The name of the opponent player.
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        return game.get_opponent_name(player_name)
+        player_id = self.players.resolve(player)
+        return self._view_of(player_id).game.get_opponent_name(player_id)
 
-    def unregister_player(self, player_name):
+    @server_call(WRITE, writes=True)
+    def unregister_player(self, player):
         """
         Unregisters a player from the game.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
+        """
+        player_id = self.players.resolve(player)
+        with self.lobby_lock:
+            game = self._game_of(player_id)
+            game_id = game.game_id
+            game.remove_player(player_id)
+            self._dismiss_bot(game)
+            self._update_waiting(game)
+            del self.players_game[player_id]
+            if len(game.players) == 0:  # if there are no more players in the game, remove the game
+                self._remove_game(game)
+                print(f"Partita {game_id} rimossa.")
+        del self.players_score[player_id]  # the id is not reused
+        player_name = self.players.remove(player_id)
+        self.registry_versions.pop(("game_id", player_id), None)
+        self.registry_versions.pop(("general_score", player_id), None)
+        if self.rate_limiter is not None:
+            self.rate_limiter.forget(player_id)
+            self.rate_limiter.forget(player_name)  # the registration call is limited by name
+        print(f"Giocatore {player_name} rimosso dalla partita {game_id}.")
+
+    @server_call(READ)
+    def get_games(self):
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        game.remove_player(player_name)
-        del self.players_game[player_name]
-        print(f"Giocatore {player_name} rimosso dalla partita.")
-        print(f"players_game: {self.players_game}")
-        if len(game.players) == 0:  # if there are no more players in the game, remove the game
-            del self.games[str(game_id)]
-            print(f"Partita {game_id} rimossa.")
-            print(f"Partite attive: {self.games}")
+        Gets the ongoing games, for the spectators to choose one.
 
-    def reset_after_left(self, player_name):
+        Returns:
+            list: For each game, a dictionary with the "game_id", the "players", the "match_status" and the number of
+            "spectators".
+        """
+        return [{"game_id": game.game_id, "players": game.player_names(), "match_status": game.match_status,
+                 "spectators": self.spectators.subscribers(game_id)}
+                for game_id, game in list(self.games.items())]
+
+    @server_call(WRITE, per_player=False)
+    def subscribe_spectator(self, game_id, callback=None, max_queue=DEFAULT_QUEUE_SIZE):
+        """
+        Subscribes a spectator to a game. The changes of the game are published once to all its spectators, which
+        either poll them with poll_spectator() or receive them on a callback object.
+
+        Args:
+            game_id (int): The identifier of the game.
+            callback (Pyro5.api.Proxy, optional): Callback object of the spectator, with a oneway
+                game_updated(subscription_id, events) method. Defaults to None (the spectator polls).
+            max_queue (int, optional): Number of events the spectator can lag behind before its events are
+                coalesced. Defaults to DEFAULT_QUEUE_SIZE, at most MAX_QUEUE_SIZE.
+
+        Raises:
+            GameNotFoundError: If the game does not exist.
+
+        Returns:
+            dict: The "subscription_id" and the current "view" of the game.
+        """
+        with self.lobby_lock:  # the game is not evicted between the lookup and the subscription that pins it
+            game = self.games.get(str(game_id))
+            if game is None:
+                raise GameNotFoundError(f'Game {game_id} does not exist.', game_id)
+            subscription = self.spectators.subscribe(str(game_id), game, min(max_queue, MAX_QUEUE_SIZE), callback)
+        print(f"Spettatore {subscription.subscription_id} iscritto alla partita {game_id}.")
+        return {"subscription_id": subscription.subscription_id, "view": game.spectator_view()}
+
+    @server_call(READ, per_player=False)
+    def poll_spectator(self, subscription_id):
+        """
+        Gets the events of the watched game not yet received by a polling spectator.
+
+        Args:
+            subscription_id (int): The identifier of the subscription.
+
+        Raises:
+            KeyError: If the subscription does not exist.
+
+        Returns:
+            dict: The "events", oldest first, and a "closed" flag, True if the game is over and the subscription has
+            been removed.
+        """
+        return self.spectators.poll(subscription_id)
+
+    @server_call(WRITE, per_player=False)
+    def unsubscribe_spectator(self, subscription_id):
+        """
+        Removes the subscription of a spectator.
+
+        Args:
+            subscription_id (int): The identifier of the subscription.
+        """
+        self.spectators.unsubscribe(subscription_id)
+
+    @server_call(BULK, per_player=False)
+    def execute_batch(self, ops, stop_on_error=False):
+        """
+        Runs an ordered list of operations in one request, e.g. a move followed by the read of the new state, or the
+        registration of many test players. The batch is admitted as a whole, charging one token per operation to the
+        bulk budget of the connection; the operations run as nested calls, traced but not limited again.
+
+        Args:
+            ops (list): The operations, each a [method, args] or [method, args, kwargs] list.
+            stop_on_error (bool, optional): Flag to stop at the first failed operation. Defaults to False.
+
+        Raises:
+            ValueError: If the batch has more than MAX_BATCH_OPS operations.
+
+        Returns:
+            list: The outcome of each operation run, a {"result": value} or {"error": name, "args": list} dictionary.
+        """
+        self.metrics.incr("batch.calls")
+        self.metrics.incr("batch.ops", len(ops))
+        return run_batch(self, ops, stop_on_error)
+
+    @server_call(READ, per_player=False)
+    def export_history(self, after=0, kinds=None, batch_size=EXPORT_BATCH):
+        """
+        Exports the records of the finished rounds and series following a cursor. The result is a generator that
+        Pyro5 streams to the client a batch at a time, so neither side holds the whole history.
+
+        Args:
+            after (int, optional): The cursor, i.e. the "seq" of the last record already exported. Defaults to 0.
+            kinds (list, optional): The kinds of records to export ("round", "series"). Defaults to all.
+            batch_size (int, optional): Maximum number of records of a batch. Defaults to EXPORT_BATCH.
+
+        Returns:
+            generator: The batches of records (lists of dictionaries), in sequence order.
+        """
+        return self.history.batches(after, kinds, batch_size)
+
+    @server_call(READ)
+    def get_player_stats(self, player):
+        """
+        Gets the statistics of a player, read from the aggregates kept up to date at every round: the counters of
+        the moves, of the results and of the series, the win rate, the current streak and the rates of the last
+        rounds.
+
+        Args:
+            player (int or str): The id of the player, or the name; by name the statistics of a player who is no
+                longer registered can be read too.
+
+        Returns:
+            dict or None: The statistics (see PlayerStats.to_dict), None if the player has never finished a round.
+        """
+        player_name = player if isinstance(player, str) else self.players.name(self.players.resolve(player))
+        stats = self.analytics.get(player_name)
+        if stats is not None:
+            stats["rating"] = self.ratings.rating(player_name)
+            stats["rated_series"] = self.ratings.series_played(player_name)
+        return stats
+
+    @server_call(READ)
+    def get_server_metrics(self):
+        """
+        Gets the metrics of the server.
+
+        Returns:
+            dict: The uptime in seconds and the values of the counters and of the gauges.
+        """
+        self.metrics.set_gauge("players", len(self.players_game))
+        self.metrics.set_gauge("games", len(self.games))
+        self.metrics.set_gauge("games.hot", self.games.hot_count())
+        self.metrics.set_gauge("games.cold", len(self.games.store))
+        self.metrics.set_gauge("games.cold_bytes", self.games.store.size)
+        self.metrics.set_gauge("tiering.faults", self.games.faults)
+        self.metrics.set_gauge("game_pool.idle", len(self.game_pool))
+        self.metrics.set_gauge("game_pool.created", self.game_pool.created)
+        self.metrics.set_gauge("game_pool.reused", self.game_pool.reused)
+        self.metrics.set_gauge("spectators", self.spectators.subscription_count())
+        self.metrics.set_gauge("history.last_seq", self.history.last_seq)
+        self.metrics.set_gauge("analytics.players", len(self.analytics))
+        self.metrics.set_gauge("matchmaking.waiting", len(self.waiting))
+        self.metrics.set_gauge("matchmaking.pairing_rate", self.pairing_rate.rate())
+        self.metrics.set_gauge("lobby.bots", len(self.bots))
+        self.metrics.set_gauge("spectator_events.published", self.spectators.published)
+        self.metrics.set_gauge("spectator_events.delivered", self.spectators.delivered)
+        self.metrics.set_gauge("spectators.expired", self.spectators.expired)
+        if self.rate_limiter is not None:
+            self.metrics.set_gauge("overloaded", self.rate_limiter.overloaded())
+        return self.metrics.snapshot()
+
+    def _memory_profiler(self):
+        """
+        Gets the memory instrumentation of the server.
+
+        Raises:
+            RuntimeError: If the memory instrumentation is not enabled.
+        """
+        if self.memory is None:
+            raise RuntimeError("memory instrumentation not enabled (--memory-report or --trace-memory)")
+        return self.memory
+
+    @server_call(READ)
+    def get_memory_report(self):
+        """
+        Measures the structures of the server: the live counts and the approximate bytes of the games, of
+        players_game, of players_score and of the per-game containers, and the memory traced by tracemalloc.
+
+        Raises:
+            RuntimeError: If the memory instrumentation is not enabled.
+
+        Returns:
+            dict: The report (see MemoryProfiler.report).
+        """
+        return self._memory_profiler().report()
+
+    @server_call(READ)
+    def take_memory_snapshot(self):
+        """
+        Takes a tracemalloc snapshot of the allocations of the server, starting the tracing if needed.
+
+        Raises:
+            RuntimeError: If the memory instrumentation is not enabled.
+
+        Returns:
+            int: The id of the snapshot.
+        """
+        return self._memory_profiler().take_snapshot()
+
+    @server_call(READ)
+    def diff_memory_snapshots(self, first, second=None, top=DIFF_TOP):
+        """
+        Compares two tracemalloc snapshots by the source line of the allocations.
+
+        Args:
+            first (int): The id of the older snapshot.
+            second (int, optional): The id of the newer snapshot. Defaults to None (the allocations now).
+            top (int, optional): The number of lines returned. Defaults to DIFF_TOP.
+
+        Raises:
+            RuntimeError: If the memory instrumentation is not enabled.
+            KeyError: If a snapshot has been dropped or never taken.
+
+        Returns:
+            list: The lines that grew the most (see MemoryProfiler.diff).
+        """
+        return self._memory_profiler().diff(first, second, top)
+
+    @server_call(READ)
+    def stop_memory_tracing(self):
+        """
+        Stops tracing the allocations of the server and drops the snapshots taken.
+
+        Raises:
+            RuntimeError: If the memory instrumentation is not enabled.
+        """
+        self._memory_profiler().stop_tracing()
+
+    @server_call(WRITE, writes=True)
+    def reset_after_left(self, player):
         """
         Resets the game after a player leaves.
 
         Args:
-            player_name (str): The name of the player.
+            player (int or str): The id of the player, or the name.
         """
-        game_id = self.players_game[player_name]
-        game = self.games[str(game_id)]
-        return game.reset_after_left(player_name)
+        player_id = self.players.resolve(player)
+        game = self._game_of(player_id)
+        return game.reset_after_left(player_id)
+
+
+def load_config(path):
+    """
+    Loads a server configuration file: a JSON object whose keys are the long command line options, without the
+    leading dashes (e.g. {"servertype": "multiplex", "port": 55894}).
+
+    Args:
+        path (str): The configuration file.
+
+    Returns:
+        dict: The options, keyed by their argparse destination.
+    """
+    with open(path) as file:
+        config = json.load(file)
+    return {key.replace("-", "_"): value for key, value in config.items()}
 
 
-def main():
+def configure_pyro(args):
     """
-    Main function for the GameServer.
+    Applies the runtime options of the server to the Pyro5 configuration. Must be called before the daemon is
+    created.
+
+    Args:
+        args (argparse.Namespace): The parsed options.
     """
-    daemon = Pyro5.api.Daemon()
+    Pyro5.config.SERVERTYPE = args.servertype
+    Pyro5.config.THREADPOOL_SIZE = args.threads
+    Pyro5.config.THREADPOOL_SIZE_MIN = min(args.threads_min, args.threads)
+    Pyro5.config.MAX_MESSAGE_SIZE = args.max_message_size
+    Pyro5.config.COMMTIMEOUT = args.comm_timeout
+    Pyro5.config.POLLTIMEOUT = args.poll_timeout
 
-    game_server = GameServer()
 
-    Pyro5.api.Daemon.serveSimple(
-        {
-            game_server: "MorraCinese.game"
-        },
-        port=55894,
-        ns=False)
+def stop_on_signal(signum, frame):
+    """
+    Signal handler that stops the server as Ctrl-C does.
+    """
+    raise KeyboardInterrupt(f"signal {signum}")
 
-    daemon.requestLoop()
+
+def main(argv=None):
+    """
+    Main function for the GameServer. The options can also be read from a JSON configuration file (--config); the
+    options given on the command line take precedence.
+    """
+    config_parser = argparse.ArgumentParser(add_help=False)
+    config_parser.add_argument("--config", default=None, help="JSON configuration file of the server")
+    config_args, _ = config_parser.parse_known_args(argv)
+
+    parser = argparse.ArgumentParser(description="Morra Cinese game server.", parents=[config_parser])
+    parser.add_argument("--host", default="localhost", help="host name or address to bind to")
+    parser.add_argument("--port", type=int, default=55894, help="port to bind to")
+    parser.add_argument("--unix-socket", default=None, help="bind to this Unix domain socket instead of host/port")
+    parser.add_argument("--servertype", choices=["thread", "multiplex"], default=Pyro5.config.SERVERTYPE,
+                        help="thread pool or multiplexed (select) server")
+    parser.add_argument("--threads", type=int, default=Pyro5.config.THREADPOOL_SIZE,
+                        help="maximum number of worker threads of the thread pool server")
+    parser.add_argument("--threads-min", type=int, default=Pyro5.config.THREADPOOL_SIZE_MIN,
+                        help="number of worker threads started with the thread pool server")
+    parser.add_argument("--max-message-size", type=int, default=Pyro5.config.MAX_MESSAGE_SIZE,
+                        help="maximum size in bytes of a message")
+    parser.add_argument("--comm-timeout", type=float, default=Pyro5.config.COMMTIMEOUT,
+                        help="timeout in seconds of the socket operations, 0 for none")
+    parser.add_argument("--poll-timeout", type=float, default=Pyro5.config.POLLTIMEOUT,
+                        help="interval in seconds at which the server loop checks if it must stop")
+    parser.add_argument("--ns", action="store_true", help="register the instance in the Pyro5 name server")
+    parser.add_argument("--ns-host", default=None, help="host of the name server (default: broadcast lookup)")
+    parser.add_argument("--ns-port", type=int, default=None, help="port of the name server")
+    parser.add_argument("--instance", default=None,
+                        help="name of the instance in the name server (default: MorraCinese.game.<host>:<port>)")
+    parser.add_argument("--history", default=None,
+                        help="NDJSON file of the finished rounds and series (default: kept in memory)")
+    parser.add_argument("--snapshot", default=None,
+                        help="snapshot file of the games and the scores: restored at startup if it exists, written "
+                             "at shutdown")
+    parser.add_argument("--match-gap", type=float, default=BASE_GAP,
+                        help="rating gap accepted between two players at once")
+    parser.add_argument("--match-gap-growth", type=float, default=GAP_GROWTH,
+                        help="widening of the accepted rating gap per second of wait")
+    parser.add_argument("--match-interval", type=float, default=MATCH_INTERVAL,
+                        help="seconds between two passes pairing the players left waiting")
+    parser.add_argument("--lobby-size", type=int, default=LOBBY_SIZE,
+                        help="players admitted to wait for an opponent, 0 for no limit")
+    parser.add_argument("--lobby-overflow", choices=OVERFLOW_POLICIES, default=REJECT,
+                        help="what happens to a player arriving when the lobby is full: rejected with a retry delay, "
+                             "or seated against a bot of the server")
+    parser.add_argument("--lobby-bots", type=int, default=LOBBY_BOTS,
+                        help="games against a bot open at most with --lobby-overflow bot; the arrivals beyond are "
+                             "rejected")
+    parser.add_argument("--shm", default=None,
+                        help="also serve the bots on this host through the shared memory segment with this name")
+    parser.add_argument("--shm-channels", type=int, default=DEFAULT_CHANNELS,
+                        help="channels of the shared memory segment, one per client process")
+    parser.add_argument("--replication-listen", default=None,
+                        help="stream the changes to a standby server connecting to this host:port or Unix socket")
+    parser.add_argument("--standby", default=None,
+                        help="run as the standby of the primary replicating on this host:port or Unix socket; the "
+                             "server starts serving when the primary is lost")
+    parser.add_argument("--failover-timeout", type=float, default=FAILOVER_TIMEOUT,
+                        help="seconds without the primary after which the standby takes over")
+    parser.add_argument("--hot-games", type=int, default=HOT_GAMES,
+                        help="games kept in memory as objects; the least recently used beyond are serialized")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT,
+                        help="seconds without access after which a game is serialized")
+    parser.add_argument("--cold-store", default=None,
+                        help="file of the serialized games (default: in memory); emptied at startup")
+    parser.add_argument("--memory-report", type=float, nargs="?", const=REPORT_INTERVAL, default=None,
+                        metavar="SECONDS",
+                        help="export a report of the memory of the server structures with the metrics at this "
+                             "interval, and enable the memory RPCs (snapshots on demand)")
+    parser.add_argument("--trace-memory", type=int, default=None, metavar="FRAMES",
+                        help="trace the allocations with tracemalloc from the start, recording this many frames")
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="write sampled traces of the requests (dispatch, lock wait, logic) to this NDJSON file")
+    parser.add_argument("--trace-sample", type=float, default=SAMPLE_RATE,
+                        help="fraction of the requests traced; use the rate of the clients to follow their calls")
+    parser.add_argument("--trace-slow", type=float, default=SLOW_MS,
+                        help="milliseconds over which a request is traced even if not sampled")
+    parser.add_argument("--no-rate-limit", action="store_true", help="disable the admission control")
+    parser.add_argument("--read-rate", type=float, default=20, help="read calls per second allowed to a player")
+    parser.add_argument("--write-rate", type=float, default=5, help="write calls per second allowed to a player")
+    parser.add_argument("--global-rate", type=float, default=5000, help="calls per second allowed to the server")
+    parser.add_argument("--bulk-rate", type=float, default=5000,
+                        help="operations per second allowed to the batches of a connection")
+    if config_args.config is not None:
+        config = load_config(config_args.config)
+        unknown = set(config) - set(vars(parser.parse_args([])))
+        if unknown:
+            parser.error(f"unknown options in {config_args.config}: {', '.join(sorted(unknown))}")
+        parser.set_defaults(**config)
+    args = parser.parse_args(argv)
+
+    configure_pyro(args)
+    rate_limiter = None
+    if not args.no_rate_limit:
+        rate_limiter = RateLimiter(read_rate=args.read_rate, read_burst=2 * args.read_rate,
+                                   write_rate=args.write_rate, write_burst=2 * args.write_rate,
+                                   global_rate=args.global_rate, global_burst=2 * args.global_rate,
+                                   bulk_rate=args.bulk_rate, bulk_burst=2 * args.bulk_rate)
+    waiting = WaitingIndex(base_gap=args.match_gap, growth=args.match_gap_growth)
+    game_server = GameServer(rate_limiter, HistoryStore(args.history), waiting, ColdStore(args.cold_store),
+                             args.hot_games, args.idle_timeout, args.lobby_size or None, args.lobby_overflow,
+                             args.lobby_bots)
+    if game_server.history.last_seq:
+        counted = game_server.analytics.rebuild(game_server.history.records())
+        game_server.ratings.rebuild(game_server.history.records())
+        print(f"Statistiche dei giocatori ricostruite da {counted} record dello storico")
+    if args.snapshot is not None and os.path.exists(args.snapshot):
+        restored = snapshot.load(game_server, args.snapshot)
+        print(f"Ripristinate {restored['games']} partite e {restored['players']} giocatori da {args.snapshot} "
+              f"in {restored['seconds']:.2f} s")
+    if args.memory_report is not None or args.trace_memory is not None:
+        game_server.memory = MemoryProfiler(game_server, args.trace_memory or TRACE_FRAMES)
+        if args.trace_memory is not None:
+            game_server.memory.start_tracing()
+    if args.trace is not None:
+        game_server.tracer = Tracer(args.trace, "server", args.trace_sample, args.trace_slow)
+    # a deploy stops the server with SIGTERM: it must unwind like Ctrl-C, so the snapshot is written
+    signal.signal(signal.SIGTERM, stop_on_signal)
+
+    try:
+        if args.standby is not None:
+            standby = Standby(game_server, args.standby, args.failover_timeout)
+            if hasattr(signal, "SIGUSR1"):
+                # a planned switch: the primary is stopped, then the standby is told to take over
+                signal.signal(signal.SIGUSR1, lambda signum, frame: standby.promote())
+            print(f"Server di riserva del primario {args.standby}")
+            waited = standby.follow()
+            print(f"Il server di riserva subentra al primario: {len(game_server.players)} giocatori, "
+                  f"{len(game_server.games)} partite, {waited:.2f} s dalla perdita del primario")
+
+        with Pyro5.api.Daemon(host=args.host, port=args.port, unixsocket=args.unix_socket) as daemon:
+            uri = daemon.register(game_server, OBJECT_NAME)
+            print(f"Server pronto ({args.servertype}): {uri}")
+
+            registration = None
+            if args.ns:
+                name = args.instance or f"{OBJECT_NAME}.{args.host}:{daemon.locationStr.rsplit(':', 1)[-1]}"
+                registration = ServerRegistration(name, uri, game_server._load, args.ns_host,
+                                                  args.ns_port).start()
+            matchmaker = Matchmaker(game_server._pair_waiting, args.match_interval).start()
+            sweeper = Sweeper(game_server._evict_idle_games).start()
+            reporter = None
+            if args.memory_report is not None:
+                reporter = MemoryReporter(game_server.memory, game_server.metrics, args.memory_report).start()
+            pump = replicator = None
+            if args.replication_listen is not None:
+                replicator = Replicator(game_server, args.replication_listen).start()
+                print(f"Replicazione in ascolto su {args.replication_listen}")
+            if args.shm is not None:
+                pump = ShmPump(game_server, args.shm, args.shm_channels).start()
+                print(f"Memoria condivisa pronta: {args.shm} ({args.shm_channels} canali)")
+
+            try:
+                daemon.requestLoop()
+            finally:
+                if pump is not None:
+                    pump.stop()
+                matchmaker.stop()
+                sweeper.stop()
+                if reporter is not None:
+                    reporter.stop()
+                if replicator is not None:
+                    replicator.stop()  # after the last changes
+                if registration is not None:
+                    registration.stop()
+    finally:
+        # the daemon is closed: no call is changing the state while it is saved
+        game_server.history.close()
+        if args.snapshot is not None:
+            saved = snapshot.save(game_server, args.snapshot)
+            print(f"Salvate {saved['games']} partite e {saved['players']} giocatori in {args.snapshot} "
+                  f"in {saved['seconds']:.2f} s")
+        game_server.games.store.close()
+        if game_server.tracer is not None:
+            game_server.tracer.close()
 
 
 if __name__ == "__main__":
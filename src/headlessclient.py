@@ -0,0 +1,375 @@
+# headlessclient.py
+
+import argparse
+import asyncio
+import random
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.clientcore import ClientCore, ClientListener, RESET_DELAY
+from src.connection import ProxyPool, PooledServer
+from src.discovery import POLICIES, make_resolver
+from src.enums import Move
+from src.errors import LobbyFullError, RateLimitExceeded
+
+_STARTED_AT = time.perf_counter()  # Used to report the startup time of the headless client
+
+SERVER_URI = "PYRO:MorraCinese.game@localhost:55894"
+POLLING_INTERVAL = 1  # Polling interval in seconds
+MAX_FAILED_TICKS = 5  # Consecutive failed ticks after which a headless client gives up
+
+
+def attach_to_thread(core):
+    """
+    Prepares the calling thread to drive a core: a plain Pyro5 proxy is claimed by the thread, while with a
+    PooledServer the session of the player is resumed by the pool whenever the thread's connection is re-established.
+
+    Args:
+        core (ClientCore): The core that the calling thread is going to drive.
+    """
+    if isinstance(core.server, PooledServer):
+        core.server.pool.add_session_hook(core.resume_session)
+    else:
+        core.server._pyroClaimOwnership()
+
+
+class BotListener(ClientListener):
+    """
+    A ClientListener that plays on its own: it makes a random move as soon as a match starts and asks for a rematch
+    (or a new match) when the series is over. It stops after a given number of series.
+
+    Attributes:
+        core (ClientCore): The core driven by the bot. Set by HeadlessClient.
+        series_to_play (int or None): Number of series to play before leaving, None to play forever.
+        series_played (int): Number of series played so far.
+        rematch_probability (float): Probability of asking for a rematch instead of a new match.
+        verbose (bool): Flag to print the events of the game.
+        done (threading.Event): Set when the bot has finished playing.
+    """
+
+    def __init__(self, series_to_play=None, rematch_probability=1.0, verbose=True, rng=None):
+        """
+        Initialize the BotListener.
+
+        Args:
+            series_to_play (int, optional): Number of series to play before leaving. Defaults to None (forever).
+            rematch_probability (float, optional): Probability of asking for a rematch. Defaults to 1.0.
+            verbose (bool, optional): Flag to print the events of the game. Defaults to True.
+            rng (random.Random, optional): Random generator used for moves and rematch choices.
+        """
+        self.core = None
+        self.series_to_play = series_to_play
+        self.series_played = 0
+        self.rematch_probability = rematch_probability
+        self.verbose = verbose
+        self.rng = rng if rng is not None else random.Random()
+        self.done = threading.Event()
+
+    def log(self, message):
+        """
+        Prints a message prefixed by the player's name if the bot is verbose.
+
+        Args:
+            message (str): The message to print.
+        """
+        if self.verbose:
+            print(f"[{self.core.player_name}] {message}")
+
+    def play(self):
+        """
+        Makes a random move if no move has been made yet.
+        """
+        if not self.core.made_move:
+            self.core.make_choice(self.rng.choice(list(Move)).value)
+
+    def on_match_started(self, opponent_name):
+        self.play()
+
+    def on_rematch_started(self):
+        self.play()
+
+    def on_move_made(self, choice):
+        self.log(f"Your move: {choice}")
+
+    def on_round_over(self, result, winner_of_series):
+        if winner_of_series is None:
+            self.log(f"Result: {result}")
+        else:
+            self.log(f"Winner of the series: {winner_of_series}")
+
+    def retrying(self, function, attempts=5):
+        """
+        Calls a function of the core, waiting and trying again while the server rejects it for rate limiting.
+        The decisions taken in the callbacks are not repeated by the core, so they must not be lost.
+
+        Args:
+            function (callable): The function to call.
+            attempts (int, optional): Maximum number of attempts. Defaults to 5.
+
+        Returns:
+            The value returned by the function.
+        """
+        for attempt in range(attempts):
+            try:
+                return function()
+            except RateLimitExceeded as e:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(e.retry_after)
+
+    def on_rematch_available(self):
+        self.series_played += 1
+        if self.series_to_play is not None and self.series_played >= self.series_to_play:
+            self.retrying(self.core.unregister)
+            return
+        if self.rng.random() < self.rematch_probability and self.retrying(self.core.request_rematch):
+            self.log("Rematch requested.")
+        else:
+            self.retrying(self.core.request_new_match)
+            self.log("New match requested.")
+
+    def on_opponent_left(self, opponent_name, awarded_win):
+        self.log("Your opponent left the match.")
+        self.on_rematch_available()
+
+    def on_general_score_changed(self, general_score):
+        self.log(f"General score: {general_score}")
+
+    def on_unregistered(self, timed_out):
+        self.log("Time to make a move is over." if timed_out else "Unregistered.")
+        self.done.set()
+
+
+class HeadlessClient:
+    """
+    Front-end that drives a ClientCore without any user interface, either in the calling thread (run) or in a
+    background thread (start). Since a Pyro5 proxy can be used only by the thread that owns it, the proxy is claimed
+    by the thread that runs the client; a PooledServer can be shared by many clients instead.
+
+    Attributes:
+        core (ClientCore): The client logic.
+        interval (float): Polling interval in seconds.
+        thread (threading.Thread or None): The background thread, if started with start().
+    """
+
+    def __init__(self, player_name, server, listener=None, interval=POLLING_INTERVAL, reset_delay=RESET_DELAY):
+        """
+        Initialize the HeadlessClient.
+
+        Args:
+            player_name (str): The name of the player.
+            server (Pyro5.api.Proxy or PooledServer): The game server object.
+            listener (ClientListener, optional): The listener of the core events. Defaults to a BotListener.
+            interval (float, optional): Polling interval in seconds. Defaults to POLLING_INTERVAL.
+            reset_delay (float, optional): Delay in seconds before a new round starts. Defaults to RESET_DELAY.
+        """
+        listener = listener if listener is not None else BotListener()
+        self.core = ClientCore(player_name, server, listener, reset_delay=reset_delay)
+        listener.core = self.core
+        self.interval = interval
+        self.thread = None
+        self._stop = threading.Event()
+
+    def run(self):
+        """
+        Registers the player, waiting while the lobby of the server is full, and advances the client until it is
+        unregistered or stopped. A failed tick is logged and the next one tries again; the client gives up if the
+        registration fails or after MAX_FAILED_TICKS failed ticks in a row. However the client ends, the done event
+        of its listener (see BotListener) is set.
+        """
+        try:
+            attach_to_thread(self.core)
+            while not self.core.registered and not self._stop.is_set():
+                try:
+                    self.core.register()
+                except LobbyFullError as e:
+                    print(f"{self.core.player_name}: {e}")
+                    self._stop.wait(e.retry_after)
+            failures = 0
+            while self.core.registered and not self._stop.is_set():
+                try:
+                    self.core.tick()
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    if failures >= MAX_FAILED_TICKS:
+                        raise
+                    print(f"{self.core.player_name}: {type(e).__name__} {e}")
+                self._stop.wait(self.interval)
+        except Exception as e:
+            print(f"{self.core.player_name} stopped: {type(e).__name__} {e}")
+        finally:
+            done = getattr(self.core.listener, "done", None)
+            if done is not None:
+                done.set()
+
+    def start(self):
+        """
+        Runs the client in a background thread.
+
+        Returns:
+            threading.Thread: The started thread.
+        """
+        self.thread = threading.Thread(target=self.run, name=f"client-{self.core.player_name}", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self, unregister=True):
+        """
+        Stops the client.
+
+        Args:
+            unregister (bool, optional): Flag to unregister the player from the server. Defaults to True.
+        """
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join()
+        if unregister and self.core.registered:
+            attach_to_thread(self.core)
+            self.core.unregister()
+
+
+class AsyncHeadlessClient:
+    """
+    Front-end that drives a ClientCore from an asyncio event loop. The blocking Pyro5 calls are executed by a single
+    worker thread, which owns the proxy, so the event loop is never blocked by the network.
+
+    Attributes:
+        core (ClientCore): The client logic.
+        interval (float): Polling interval in seconds.
+        executor (ThreadPoolExecutor): The single thread running the calls of the core.
+    """
+
+    def __init__(self, player_name, server, listener=None, interval=POLLING_INTERVAL, reset_delay=RESET_DELAY):
+        """
+        Initialize the AsyncHeadlessClient.
+
+        Args:
+            player_name (str): The name of the player.
+            server (Pyro5.api.Proxy or PooledServer): The game server object.
+            listener (ClientListener, optional): The listener of the core events. Defaults to a BotListener.
+            interval (float, optional): Polling interval in seconds. Defaults to POLLING_INTERVAL.
+            reset_delay (float, optional): Delay in seconds before a new round starts. Defaults to RESET_DELAY.
+        """
+        listener = listener if listener is not None else BotListener()
+        self.core = ClientCore(player_name, server, listener, reset_delay=reset_delay)
+        listener.core = self.core
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"client-{player_name}")
+
+    async def call(self, function, *args):
+        """
+        Runs a function of the core in the worker thread.
+
+        Args:
+            function (callable): The function to run.
+            *args: The arguments of the function.
+
+        Returns:
+            The value returned by the function.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def run(self):
+        """
+        Registers the player, waiting while the lobby of the server is full, and advances the client until it is
+        unregistered.
+        """
+        await self.call(attach_to_thread, self.core)
+        try:
+            while not self.core.registered:
+                try:
+                    await self.call(self.core.register)
+                except LobbyFullError as e:
+                    print(f"{self.core.player_name}: {e}")
+                    await asyncio.sleep(e.retry_after)
+            while self.core.registered:
+                await self.call(self.core.tick)
+                await asyncio.sleep(self.interval)
+        finally:
+            if self.core.registered:
+                await self.call(self.core.unregister)
+            self.executor.shutdown(wait=False)
+
+
+def report_startup(label):
+    """
+    Prints the time elapsed since the module was imported and the peak resident memory of the process.
+
+    Args:
+        label (str): What has been reached, e.g. "registered".
+    """
+    elapsed = time.perf_counter() - _STARTED_AT
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Headless client {label} in {elapsed * 1000:.1f} ms (peak RSS {peak_rss:.1f} MB).")
+
+
+def main(argv=None):
+    """
+    Main function to start one or more headless bot players.
+    """
+    parser = argparse.ArgumentParser(description="Headless Morra Cinese bot client.")
+    parser.add_argument("--name", default=f"Bot {random.randint(1, 10000)}", help="name of the (first) player")
+    parser.add_argument("--bots", type=int, default=1, help="number of bot players to run in this process")
+    parser.add_argument("--series", type=int, default=None, help="number of series to play before leaving")
+    parser.add_argument("--uri", default=SERVER_URI, help="URI of the game server")
+    parser.add_argument("--ns", action="store_true", help="pick a server instance registered in the name server")
+    parser.add_argument("--ns-host", default=None, help="host of the name server (default: broadcast lookup)")
+    parser.add_argument("--ns-port", type=int, default=None, help="port of the name server")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="least-loaded",
+                        help="policy used to pick a server instance")
+    parser.add_argument("--interval", type=float, default=POLLING_INTERVAL, help="polling interval in seconds")
+    parser.add_argument("--reset-delay", type=float, default=RESET_DELAY,
+                        help="delay in seconds before a new round starts")
+    parser.add_argument("--max-connections", type=int, default=None,
+                        help="maximum number of connections opened by the process (default: one per bot)")
+    parser.add_argument("--asyncio", action="store_true", help="run the bots in an asyncio event loop")
+    parser.add_argument("--quiet", action="store_true", help="do not print the events of the game")
+    args = parser.parse_args(argv)
+
+    names = [args.name] if args.bots == 1 else [f"{args.name} #{i + 1}" for i in range(args.bots)]
+    report_startup("started")
+
+    max_connections = args.max_connections or args.bots
+
+    def make_pool(player_name=None, connections=max_connections):
+        target = args.uri if not args.ns else make_resolver(args.policy, player_name, args.ns_host, args.ns_port)
+        return ProxyPool(target, connections)
+
+    if args.ns and POLICIES[args.policy].uses_player_name:
+        # each bot is bound to the instance its name hashes to
+        servers = {name: make_pool(name, 1).server for name in names}
+    else:
+        shared_server = make_pool().server
+        servers = {name: shared_server for name in names}
+
+    if args.asyncio:
+        async def play_all():
+            clients = [AsyncHeadlessClient(name, servers[name],
+                                           BotListener(args.series, verbose=not args.quiet), args.interval,
+                                           args.reset_delay)
+                       for name in names]
+            await asyncio.gather(*(client.run() for client in clients))
+
+        asyncio.run(play_all())
+        return
+
+    clients = [HeadlessClient(name, servers[name], BotListener(args.series, verbose=not args.quiet),
+                              args.interval, args.reset_delay)
+               for name in names]
+    for client in clients:
+        client.start()
+    try:
+        for client in clients:
+            client.core.listener.done.wait()
+    except KeyboardInterrupt:
+        for client in clients:
+            client.stop()
+        sys.exit()
+
+
+if __name__ == "__main__":
+    main()
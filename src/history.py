@@ -0,0 +1,211 @@
+# history.py
+
+import bisect
+import json
+import os
+import threading
+import time
+
+ROUND = "round"  # A decided match of a series
+SERIES = "series"  # A finished series
+KINDS = (ROUND, SERIES)
+
+INDEX_INTERVAL = 1000  # Number of records between two entries of the offset index of a history file
+MAX_MEMORY_RECORDS = 100000  # Number of records kept by an in-memory history before the oldest are dropped
+EXPORT_BATCH = 500  # Number of records sent in one item of an export stream
+
+
+def round_record(game, now=None):
+    """
+    Builds the record of the last decided match of a game.
+
+    Args:
+        game (Game): The game, just after Game.make_choice() returned True.
+        now (float, optional): The time of the record. Defaults to time.time().
+
+    Returns:
+        dict: The record, without its sequence number.
+    """
+    record = {"type": ROUND, "time": now if now is not None else time.time(), "game_id": game.game_id,
+              "players": game.player_names()}
+    record.update(game.last_round)
+    return record
+
+
+def series_record(game, now=None):
+    """
+    Builds the record of the finished series of a game.
+
+    Args:
+        game (Game): The game, whose series is over.
+        now (float, optional): The time of the record. Defaults to time.time().
+
+    Returns:
+        dict: The record, without its sequence number.
+    """
+    return {"type": SERIES, "time": now if now is not None else time.time(), "game_id": game.game_id,
+            "players": game.player_names(), "scores": dict(game.last_round["scores"]),
+            "num_of_match": game.last_round["num_of_match"], "winner": game.winner}
+
+
+class HistoryStore:
+    """
+    Append-only store of the finished rounds and series. Every record takes the next sequence number ("seq"),
+    which is the cursor used to resume an export. The records are kept in an NDJSON file, with a sparse index of the
+    offsets that lets a reader seek close to a cursor, or in memory if no file is given; the in-memory store only
+    keeps the last max_records records.
+
+    Attributes:
+        path (str or None): The NDJSON file of the records, None for an in-memory store.
+        max_records (int): Number of records kept by an in-memory store.
+        last_seq (int): The sequence number of the last record, 0 if the store is empty.
+    """
+
+    def __init__(self, path=None, max_records=MAX_MEMORY_RECORDS, read_only=False):
+        """
+        Initialize the HistoryStore, indexing the existing records of the file.
+
+        Args:
+            path (str, optional): The NDJSON file of the records. Defaults to None (in memory).
+            max_records (int, optional): Number of records kept in memory. Defaults to MAX_MEMORY_RECORDS.
+            read_only (bool, optional): Flag to open the file only for reading, e.g. while a server writes it.
+                Defaults to False.
+        """
+        self.path = path
+        self.max_records = max_records
+        self.last_seq = 0
+        self._lock = threading.Lock()
+        self._records = []  # in-memory records
+        self._first_seq = 1  # sequence number of self._records[0]
+        self._index = []  # (seq, offset) of every INDEX_INTERVAL-th record of the file
+        self._file = None
+        if path is not None:
+            self._load_index(truncate=not read_only)
+            if not read_only:
+                self._file = open(path, "ab")
+
+    def _load_index(self, truncate):
+        """
+        Scans the file once to rebuild the offset index and the last sequence number, truncating a last record
+        left incomplete by a crash if truncate is set.
+        """
+        if not os.path.exists(self.path):
+            return
+        offset = 0
+        with open(self.path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # incomplete record
+                seq = json.loads(line)["seq"]
+                if seq % INDEX_INTERVAL == 1:
+                    self._index.append((seq, offset))
+                self.last_seq = seq
+                offset += len(line)
+        if truncate and offset != os.path.getsize(self.path):
+            with open(self.path, "r+b") as file:
+                file.truncate(offset)
+
+    def append(self, record):
+        """
+        Appends a record, giving it the next sequence number.
+
+        Args:
+            record (dict): The record.
+
+        Returns:
+            int: The sequence number of the record.
+        """
+        with self._lock:
+            self.last_seq += 1
+            record = dict(record, seq=self.last_seq)
+            if self._file is None:
+                self._records.append(record)
+                if len(self._records) > self.max_records:
+                    dropped = len(self._records) - self.max_records // 2
+                    del self._records[:dropped]
+                    self._first_seq += dropped
+            else:
+                if self.last_seq % INDEX_INTERVAL == 1:
+                    self._index.append((self.last_seq, self._file.tell()))
+                self._file.write(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+                self._file.flush()
+            return self.last_seq
+
+    def batches(self, after=0, kinds=None, batch_size=EXPORT_BATCH):
+        """
+        Reads the records following a cursor, a batch at a time, without loading the whole history: only one batch
+        is in memory. The records appended while reading are included.
+
+        Args:
+            after (int, optional): The cursor, i.e. the sequence number of the last record already read. Defaults to
+                0 (from the start).
+            kinds (list, optional): The kinds of records to read (ROUND, SERIES). Defaults to all.
+            batch_size (int, optional): Maximum number of records of a batch. Defaults to EXPORT_BATCH.
+
+        Yields:
+            list: The next records, in sequence order.
+        """
+        kinds = set(kinds) if kinds else set(KINDS)
+        source = self._read_memory(after) if self.path is None else self._read_file(after)
+        batch = []
+        for record in source:
+            if record["type"] in kinds:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def records(self, after=0, kinds=None):
+        """
+        Reads the records following a cursor, one at a time.
+
+        Args:
+            after (int, optional): The cursor. Defaults to 0 (from the start).
+            kinds (list, optional): The kinds of records to read. Defaults to all.
+
+        Yields:
+            dict: The next record.
+        """
+        for batch in self.batches(after, kinds):
+            yield from batch
+
+    def _read_memory(self, after):
+        """
+        Reads the in-memory records following a cursor.
+        """
+        seq = after + 1
+        while True:
+            with self._lock:
+                position = max(0, seq - self._first_seq)
+                chunk = self._records[position:position + EXPORT_BATCH]
+            if not chunk:
+                return
+            yield from chunk
+            seq = chunk[-1]["seq"] + 1
+
+    def _read_file(self, after):
+        """
+        Reads the records of the file following a cursor, seeking to the closest indexed offset.
+        """
+        with self._lock:
+            position = bisect.bisect_right(self._index, (after + 1, float("inf"))) - 1
+            offset = self._index[position][1] if position >= 0 else 0
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    return  # a record being written
+                record = json.loads(line)
+                if record["seq"] > after:
+                    yield record
+
+    def close(self):
+        """
+        Closes the file of the store.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
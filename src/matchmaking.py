@@ -0,0 +1,591 @@
+# matchmaking.py
+
+import bisect
+import math
+import threading
+import time
+
+from src.history import SERIES
+
+INITIAL_RATING = 1500.0  # Rating of a player who has not finished a series yet
+K_FACTOR = 32  # Maximum change of a rating after a series
+PROVISIONAL_K = 64  # K factor of the first PROVISIONAL_SERIES series of a player, whose rating is still uncertain
+PROVISIONAL_SERIES = 10
+
+BUCKET_WIDTH = 50  # Width of the rating buckets of the waiting index
+MIN_ARRIVALS = 64  # Arrival numbers handed out by the waiting index before it numbers the waiting games again
+BASE_GAP = 100  # Rating gap accepted for a player who has just started waiting
+GAP_GROWTH = 50  # Widening of the accepted gap per second of wait
+MAX_GAP = math.inf  # Largest accepted gap; with an infinite value every waiting player is eventually paired
+MATCH_INTERVAL = 1.0  # Interval in seconds between two passes of the Matchmaker
+
+LOBBY_SIZE = 1000  # Players waiting for an opponent admitted by main(); the arrivals beyond meet the overflow policy
+LOBBY_BOTS = 1000  # Games against a bot opened by main() with the BOT policy; the arrivals beyond are rejected
+RATE_WINDOW = 60  # Seconds of pairings over which the pairing rate is measured
+LOBBY_RETRY = 5  # Seconds after which a rejected player retries while no pairing has been seen
+REJECT = "reject"  # Overflow policy: the arrival is rejected with a LobbyFullError
+BOT = "bot"  # Overflow policy: the arrival plays against a bot of the server, out of the lobby
+OVERFLOW_POLICIES = (REJECT, BOT)
+BOT_PREFIX = "[bot] "  # Prefix of the names of the bots, reserved to them
+
+
+def expected_score(rating, opponent_rating):
+    """
+    Gets the expected score of a player against an opponent (1 for a sure win, 0.5 for an even series).
+
+    Args:
+        rating (float): The rating of the player.
+        opponent_rating (float): The rating of the opponent.
+
+    Returns:
+        float: The expected score.
+    """
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+class EloRatings:
+    """
+    The Elo ratings of the players, updated when a series ends. A series counts as one game: 1 point to the winner,
+    0.5 to each player of a drawn series. The players are identified by name, as in the history records, so the
+    ratings can be rebuilt from the history like the statistics.
+
+    Attributes:
+        initial (float): The rating of a new player.
+    """
+
+    def __init__(self, initial=INITIAL_RATING):
+        """
+        Initialize the EloRatings, without players.
+
+        Args:
+            initial (float, optional): The rating of a new player. Defaults to INITIAL_RATING.
+        """
+        self.initial = initial
+        self._ratings = {}  # name -> [rating, number of series]
+        self._lock = threading.Lock()
+
+    def rating(self, player_name):
+        """
+        Gets the rating of a player.
+
+        Args:
+            player_name (str): The name of the player.
+
+        Returns:
+            float: The rating, initial for a player who has not finished a series.
+        """
+        entry = self._ratings.get(player_name)
+        return entry[0] if entry is not None else self.initial
+
+    def series_played(self, player_name):
+        """
+        Gets the number of series counted in the rating of a player.
+
+        Args:
+            player_name (str): The name of the player.
+
+        Returns:
+            int: The number of series.
+        """
+        entry = self._ratings.get(player_name)
+        return entry[1] if entry is not None else 0
+
+    def record(self, record):
+        """
+        Updates the ratings of the players of a finished series; the other records are ignored.
+
+        Args:
+            record (dict): A history record (see history.series_record).
+        """
+        if record["type"] != SERIES or len(record["players"]) != 2:
+            return
+        first, second = record["players"]
+        if record["winner"] == first:
+            score = 1.0
+        elif record["winner"] == second:
+            score = 0.0
+        else:
+            score = 0.5
+        with self._lock:
+            entries = [self._ratings.setdefault(name, [self.initial, 0]) for name in (first, second)]
+            expected = expected_score(entries[0][0], entries[1][0])
+            changes = (score - expected, expected - score)
+            for entry, change in zip(entries, changes):
+                k = PROVISIONAL_K if entry[1] < PROVISIONAL_SERIES else K_FACTOR
+                entry[0] += k * change
+                entry[1] += 1
+
+    def entries(self):
+        """
+        Gets the ratings, e.g. to send them to a standby server.
+
+        Returns:
+            dict: The [rating, number of series] of each player, keyed by name.
+        """
+        with self._lock:
+            return {name: list(entry) for name, entry in self._ratings.items()}
+
+    def load(self, entries):
+        """
+        Replaces the ratings with the ones returned by entries().
+
+        Args:
+            entries (dict): The [rating, number of series] of each player, keyed by name.
+        """
+        with self._lock:
+            self._ratings = {name: list(entry) for name, entry in entries.items()}
+
+    def rebuild(self, records):
+        """
+        Replaces the ratings with the ones resulting from a sequence of records, e.g. HistoryStore.records().
+
+        Args:
+            records (iterable): The records, in sequence order.
+        """
+        with self._lock:
+            self._ratings = {}
+        for record in records:
+            self.record(record)
+
+    def __len__(self):
+        return len(self._ratings)
+
+
+def allowed_gap(waited, base_gap=BASE_GAP, growth=GAP_GROWTH, max_gap=MAX_GAP):
+    """
+    Gets the rating gap accepted for a player who has waited for an opponent.
+
+    Args:
+        waited (float): The seconds waited.
+        base_gap (float, optional): The gap accepted at once. Defaults to BASE_GAP.
+        growth (float, optional): The widening per second of wait. Defaults to GAP_GROWTH.
+        max_gap (float, optional): The largest gap. Defaults to MAX_GAP.
+
+    Returns:
+        float: The accepted gap.
+    """
+    return min(max_gap, base_gap + growth * waited)
+
+
+def estimated_wait(position, rate):
+    """
+    Estimates the wait of a player in the lobby: the players are paired by rating, not in order of arrival, so it
+    is the time for as many waiting players as the ones ahead at the recent pairing rate.
+
+    Args:
+        position (int): The place of the player, 1 for the player waiting longest.
+        rate (float): The waiting players paired per second (see PairingRate).
+
+    Returns:
+        float or None: The seconds, None if no pairing has been seen recently.
+    """
+    return position / rate if rate > 0 else None
+
+
+class PairingRate:
+    """
+    The rate at which the waiting players leave the lobby with an opponent, over the last `window` seconds. The
+    pairings are counted in one-second buckets, so the memory does not grow with the rate.
+
+    Attributes:
+        window (int): The seconds measured.
+        clock (callable): The clock of the pairings.
+    """
+
+    def __init__(self, window=RATE_WINDOW, clock=time.monotonic):
+        """
+        Initialize the PairingRate, without pairings.
+
+        Args:
+            window (int, optional): The seconds measured. Defaults to RATE_WINDOW.
+            clock (callable, optional): The clock of the pairings. Defaults to time.monotonic.
+        """
+        self.window = window
+        self.clock = clock
+        self._counts = [0] * window  # pairings of each second, in a ring
+        self._seconds = [None] * window  # the second counted by each bucket
+        self._started = clock()
+        self._lock = threading.Lock()
+
+    def record(self, players=1):
+        """
+        Counts waiting players paired now.
+
+        Args:
+            players (int, optional): The number of waiting players paired, 2 when two waiting players are paired
+                together. Defaults to 1.
+        """
+        second = int(self.clock())
+        slot = second % self.window
+        with self._lock:
+            if self._seconds[slot] != second:
+                self._seconds[slot] = second
+                self._counts[slot] = 0
+            self._counts[slot] += players
+
+    def rate(self):
+        """
+        Gets the waiting players paired per second, over the window (or the time since the start, if shorter).
+
+        Returns:
+            float: The rate.
+        """
+        now = self.clock()
+        oldest = int(now) - self.window
+        with self._lock:
+            paired = sum(count for second, count in zip(self._seconds, self._counts)
+                         if second is not None and second > oldest)
+        return paired / max(1.0, min(self.window, now - self._started))
+
+
+class WaitingIndex:
+    """
+    Index of the games waiting for a second player, bucketed by the rating of the waiting player. A search looks at
+    the buckets closest to a rating first and stops as soon as the remaining buckets are farther than the closest
+    game found or the largest gap accepted, so its cost depends on the spread of the ratings, not on the number of
+    waiting games. Within a bucket the games are sorted by rating, and the search walks outwards from the rating.
+
+    Attributes:
+        bucket_width (float): The width of a bucket.
+        base_gap (float): The gap accepted for a player who has just started waiting.
+        growth (float): The widening of the accepted gap per second of wait.
+        max_gap (float): The largest accepted gap.
+        clock (callable): The clock of the wait times.
+    """
+
+    def __init__(self, bucket_width=BUCKET_WIDTH, base_gap=BASE_GAP, growth=GAP_GROWTH, max_gap=MAX_GAP,
+                 clock=time.monotonic):
+        """
+        Initialize an empty WaitingIndex.
+
+        Args:
+            bucket_width (float, optional): The width of a bucket. Defaults to BUCKET_WIDTH.
+            base_gap (float, optional): The gap accepted at once. Defaults to BASE_GAP.
+            growth (float, optional): The widening per second of wait. Defaults to GAP_GROWTH.
+            max_gap (float, optional): The largest gap. Defaults to MAX_GAP.
+            clock (callable, optional): The clock of the wait times. Defaults to time.monotonic.
+        """
+        self.bucket_width = bucket_width
+        self.base_gap = base_gap
+        self.growth = growth
+        self.max_gap = max_gap
+        self.clock = clock
+        self._buckets = {}  # bucket -> [(rating, game_id)], sorted
+        self._entries = {}  # game_id -> (rating, since, bucket), in order of arrival
+        self._reached = {}  # game_id -> the gap accepted at the last search of the game by pairs()
+        self._numbers = {}  # game_id -> arrival number
+        self._arrivals = [0] * (MIN_ARRIVALS + 1)  # Fenwick tree of the waiting games by arrival number
+        self._next_number = 0
+        self._lowest, self._highest = 0, -1  # the lowest and the highest bucket in use
+        self._lock = threading.Lock()
+
+    def gap(self, waited):
+        """
+        Gets the rating gap accepted after a wait.
+
+        Args:
+            waited (float): The seconds waited.
+
+        Returns:
+            float: The accepted gap.
+        """
+        return allowed_gap(waited, self.base_gap, self.growth, self.max_gap)
+
+    def add(self, game_id, rating):
+        """
+        Adds a waiting game. A game already waiting keeps its rating and its wait time.
+
+        Args:
+            game_id (int): The identifier of the game.
+            rating (float): The rating of the waiting player.
+        """
+        with self._lock:
+            if game_id in self._entries:
+                return
+            if self._next_number == len(self._arrivals) - 1:
+                self._renumber()
+            since = self.clock()
+            bucket = int(rating // self.bucket_width)
+            entries = self._buckets.get(bucket)
+            if entries is None:
+                if not self._buckets:
+                    self._lowest = self._highest = bucket
+                self._lowest, self._highest = min(self._lowest, bucket), max(self._highest, bucket)
+                entries = self._buckets[bucket] = []
+            bisect.insort(entries, (rating, game_id))
+            self._entries[game_id] = (rating, since, bucket)
+            self._reached[game_id] = 0
+            self._numbers[game_id] = self._next_number
+            self._count(self._next_number, 1)
+            self._next_number += 1
+
+    def remove(self, game_id):
+        """
+        Removes a game, e.g. because its waiting player left or was paired.
+
+        Args:
+            game_id (int): The identifier of the game.
+
+        Returns:
+            bool: True if the game was waiting, False otherwise.
+        """
+        with self._lock:
+            return self._remove(game_id)
+
+    def _remove(self, game_id):
+        entry = self._entries.pop(game_id, None)
+        if entry is None:
+            return False
+        del self._reached[game_id]
+        self._count(self._numbers.pop(game_id), -1)
+        rating, _, bucket = entry
+        entries = self._buckets[bucket]
+        del entries[bisect.bisect_left(entries, (rating, game_id))]
+        if not entries:
+            del self._buckets[bucket]
+            if not self._buckets:
+                self._lowest, self._highest = 0, -1
+            elif bucket == self._lowest:
+                while self._lowest not in self._buckets:
+                    self._lowest += 1
+            elif bucket == self._highest:
+                while self._highest not in self._buckets:
+                    self._highest -= 1
+        return True
+
+    def _count(self, number, delta):
+        index = number + 1
+        while index < len(self._arrivals):
+            self._arrivals[index] += delta
+            index += index & -index
+
+    def _renumber(self):
+        """
+        Numbers the waiting games again from 0 in order of arrival, in a tree with room for as many arrivals again,
+        so the tree follows the size of the lobby rather than the number of arrivals.
+        """
+        waiting = len(self._entries)
+        size = max(MIN_ARRIVALS, 2 * waiting)
+        tree = [0] + [1] * waiting + [0] * (size - waiting)
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                tree[parent] += tree[index]
+        self._numbers = {game_id: number for number, game_id in enumerate(self._entries)}
+        self._arrivals, self._next_number = tree, waiting
+
+    def _search(self, rating, waited, now, exclude):
+        """
+        Finds the closest waiting game whose gap accepts a rating: the accepted gap is the one of whichever player
+        has waited longer.
+
+        Returns:
+            tuple: The identifier of the game and the rating gap, (None, None) if no game accepts the rating.
+        """
+        if not self._entries:
+            return None, None
+        oldest_since = next(iter(self._entries.values()))[1]
+        accepted = self.gap(waited)
+        best, best_gap = None, self.gap(max(waited, now - oldest_since))  # no pair can be farther than this
+        own = int(rating // self.bucket_width)
+        ring = 0
+        while own - ring >= self._lowest or own + ring <= self._highest:
+            if (ring - 1) * self.bucket_width > best_gap:  # the buckets of this ring are all farther
+                break
+            for bucket in (own,) if ring == 0 else (own - ring, own + ring):
+                entries = self._buckets.get(bucket)
+                if entries:
+                    game_id, gap = self._nearest(entries, rating, accepted, best_gap, now, exclude)
+                    if game_id is not None:
+                        best, best_gap = game_id, gap
+            ring += 1
+        return (best, best_gap) if best is not None else (None, None)
+
+    def _nearest(self, entries, rating, accepted, bound, now, exclude):
+        """
+        Finds the game of a bucket closest to a rating, within a bound, whose gap accepts the rating: the games are
+        visited in order of distance, walking outwards from the rating.
+
+        Returns:
+            tuple: The identifier of the game and the rating gap, (None, None) if no game of the bucket is found.
+        """
+        above = bisect.bisect_left(entries, (rating,))
+        below = above - 1
+        while below >= 0 or above < len(entries):
+            lower = rating - entries[below][0] if below >= 0 else math.inf
+            upper = entries[above][0] - rating if above < len(entries) else math.inf
+            if lower <= upper:
+                gap, game_id = lower, entries[below][1]
+                below -= 1
+            else:
+                gap, game_id = upper, entries[above][1]
+                above += 1
+            if gap > bound:
+                break
+            if game_id not in exclude and (gap <= accepted or gap <= self.gap(now - self._entries[game_id][1])):
+                return game_id, gap
+        return None, None
+
+    def _widened(self, rating, searched, gap):
+        """
+        Tells if a waiting game lies at a distance from a rating between the gap of the last search and the current
+        one, i.e. if a new search may accept a game the last one could not.
+        """
+        width = self.bucket_width
+        for low, high in ((rating - gap, rating - searched), (rating + searched, rating + gap)):
+            low, high = max(low, self._lowest * width), min(high, (self._highest + 1) * width)
+            for bucket in range(int(low // width), int(high // width) + 1):
+                entries = self._buckets.get(bucket)
+                if entries and bisect.bisect_right(entries, (high, math.inf)) > bisect.bisect_left(entries, (low,)):
+                    return True
+        return False
+
+    def find(self, rating, exclude=()):
+        """
+        Finds the closest waiting game accepting a player who has just arrived, without removing it.
+
+        Args:
+            rating (float): The rating of the player.
+            exclude (collection, optional): Identifiers of the games to skip. Defaults to none.
+
+        Returns:
+            int or None: The identifier of the game, None if no waiting game accepts the player.
+        """
+        with self._lock:
+            return self._search(rating, 0, self.clock(), exclude)[0]
+
+    def claim(self, rating, exclude=()):
+        """
+        Finds the closest waiting game accepting a player who has just arrived and removes it, so that no other
+        player can be paired with it.
+
+        Args:
+            rating (float): The rating of the player.
+            exclude (collection, optional): Identifiers of the games to skip. Defaults to none.
+
+        Returns:
+            tuple: The identifier of the game and the rating gap, (None, None) if no waiting game accepts the player.
+        """
+        with self._lock:
+            game_id, gap = self._search(rating, 0, self.clock(), exclude)
+            if game_id is not None:
+                self._remove(game_id)
+            return game_id, gap
+
+    def pairs(self):
+        """
+        Pairs the waiting games whose accepted gaps have grown enough, longest waiting first, and removes them. A
+        game is searched again only if its accepted gap has grown to reach some waiting game since its last search:
+        the games arrived within reach were paired on arrival, and a pair is found by the game that has waited
+        longer.
+
+        Returns:
+            list: The (game_id, other_game_id, gap) of each pair; game_id is the game that has waited longer.
+        """
+        with self._lock:
+            now = self.clock()
+            result = []
+            for game_id in list(self._entries):
+                entry = self._entries.get(game_id)
+                if entry is None:
+                    continue  # already paired
+                rating, since, _ = entry
+                reach = self.gap(now - since)
+                if not self._widened(rating, self._reached[game_id], reach):
+                    continue
+                other, gap = self._search(rating, now - since, now, (game_id,))
+                if other is not None:
+                    self._remove(game_id)
+                    self._remove(other)
+                    result.append((game_id, other, gap))
+                else:
+                    self._reached[game_id] = reach
+            return result
+
+    def waited(self, game_id):
+        """
+        Gets how long the player of a waiting game has waited.
+
+        Args:
+            game_id (int): The identifier of the game.
+
+        Returns:
+            float or None: The seconds waited, None if the game is not waiting.
+        """
+        entry = self._entries.get(game_id)
+        return self.clock() - entry[1] if entry is not None else None
+
+    def position(self, game_id):
+        """
+        Gets the place of a waiting game in the order of arrival, counting the waiting games arrived before it in a
+        Fenwick tree of the arrival numbers.
+
+        Args:
+            game_id (int): The identifier of the game.
+
+        Returns:
+            int or None: 1 for the game waiting longest, None if the game is not waiting.
+        """
+        with self._lock:
+            number = self._numbers.get(game_id)
+            if number is None:
+                return None
+            index, position = number + 1, 0
+            while index:
+                position += self._arrivals[index]
+                index &= index - 1
+            return position
+
+    def __contains__(self, game_id):
+        return game_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Matchmaker:
+    """
+    Background thread that periodically pairs the players left waiting, once their accepted rating gap has grown:
+    without it two players too far apart would wait until a third player arrives.
+
+    Attributes:
+        pair (callable): Function without arguments pairing the waiting players, e.g. GameServer.pair_waiting.
+        interval (float): Interval in seconds between two passes.
+    """
+
+    def __init__(self, pair, interval=MATCH_INTERVAL):
+        """
+        Initialize the Matchmaker.
+
+        Args:
+            pair (callable): Function without arguments pairing the waiting players.
+            interval (float, optional): Interval in seconds between two passes. Defaults to MATCH_INTERVAL.
+        """
+        self.pair = pair
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="matchmaker", daemon=True)
+
+    def start(self):
+        """
+        Starts the passes.
+
+        Returns:
+            Matchmaker: The matchmaker itself.
+        """
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.pair()
+            except Exception as e:  # a failed pass must not stop the next ones
+                print(f"Errore del matchmaking: {e!r}")
+
+    def stop(self):
+        """
+        Stops the passes.
+        """
+        self._stop.set()
+        self._thread.join()
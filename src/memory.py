@@ -0,0 +1,316 @@
+# memory.py
+
+import enum
+import sys
+import threading
+import tracemalloc
+import types
+from collections import OrderedDict, deque
+
+REPORT_INTERVAL = 60  # Seconds between two summaries exported with the server metrics
+SAMPLE_GAMES = 1000  # Maximum number of hot games measured to estimate the size of all of them
+TRACE_FRAMES = 1  # Frames of the traceback recorded for every allocation traced
+MAX_SNAPSHOTS = 4  # tracemalloc snapshots kept for the diffs; the oldest is dropped beyond
+DIFF_TOP = 20  # Lines of a snapshot diff returned by default
+GAME_CONTAINERS = ("players", "moves", "results", "scores", "versions")  # Per-game containers measured
+
+# objects shared by many structures, never followed by deep_size
+_NOT_FOLLOWED = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType,
+                 enum.Enum)
+# allocations of the instrumentation itself, left out of the snapshots
+_SNAPSHOT_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__),
+                     tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                     tracemalloc.Filter(False, "<unknown>"))
+
+
+def deep_size(obj, seen=None):
+    """
+    Approximates the bytes of an object and of the objects it references through containers and instance
+    attributes. An object referenced twice is counted once; classes, modules, functions and enum members are not
+    followed.
+
+    Args:
+        obj (object): The object.
+        seen (set, optional): The ids of the objects already counted, e.g. objects shared with other structures
+            that must not be counted. Updated with the objects counted. Defaults to None (an empty set).
+
+    Returns:
+        int: The approximate size in bytes.
+    """
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _NOT_FOLLOWED):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__"):
+            stack.append(vars(current))
+    return size
+
+
+def _stray_keys(name, container, players):
+    """
+    Counts the entries of a per-game container that belong to no player of the game, e.g. left behind by a player
+    who left or created by a lookup on a defaultdict.
+    """
+    if name == "players":
+        return 0
+    if name == "versions":
+        return sum(1 for _, player_id in list(container) if player_id is not None and player_id not in players)
+    return sum(1 for player_id in list(container) if player_id not in players)
+
+
+def game_sizes(games, shared=()):
+    """
+    Measures the per-game containers (see GAME_CONTAINERS) of some games.
+
+    Args:
+        games (list): The games.
+        shared (tuple, optional): Objects referenced by the games but shared with the rest of the server, e.g. the
+            version clock and the player table, not counted. Defaults to ().
+
+    Returns:
+        dict: The bytes of the games, and the entries, the bytes and the stray entries of every container.
+    """
+    containers = {name: {"entries": 0, "bytes": 0, "stray": 0} for name in GAME_CONTAINERS}
+    total = 0
+    for game in games:
+        seen = {id(obj) for obj in shared}
+        size = sys.getsizeof(game) + deep_size(vars(game), seen)  # the containers are counted in it too
+        total += size
+        players = set(game.players)
+        for name in GAME_CONTAINERS:
+            container = getattr(game, name)
+            containers[name]["entries"] += len(container)
+            containers[name]["bytes"] += deep_size(container, {id(obj) for obj in shared})
+            containers[name]["stray"] += _stray_keys(name, container, players)
+    return {"bytes": total, "containers": containers}
+
+
+def structure_report(server, sample=SAMPLE_GAMES):
+    """
+    Measures the structures of a game server that grow with the players and the games: the live counts and the
+    approximate bytes of the games, of players_game and of players_score, and of the per-game containers. The hot
+    games are measured on a sample of at most `sample` games and the figures scaled to all of them; the cold games
+    are counted with their serialized size.
+
+    Args:
+        server (GameServer): The server.
+        sample (int, optional): Maximum number of hot games measured. Defaults to SAMPLE_GAMES.
+
+    Returns:
+        dict: The figures of every structure.
+    """
+    games = server.games
+    hot = games.hot_count()
+    sampled = games.sample_hot(sample)
+    measured = game_sizes(sampled, (server.version_clock, server.players))
+    scale = hot / len(sampled) if sampled else 0
+    containers = {name: {key: round(value * scale) for key, value in figures.items()}
+                  for name, figures in measured["containers"].items()}
+
+    players_game = dict(server.players_game)
+    players_score = dict(server.players_score)
+    return {
+        "games": {"count": hot + len(games.store), "hot": hot, "cold": len(games.store), "sampled": len(sampled),
+                  "bytes": round(measured["bytes"] * scale) + games.store.size, "cold_bytes": games.store.size},
+        "players_game": {"count": len(players_game), "bytes": deep_size(players_game)},
+        "players_score": {"count": len(players_score), "bytes": deep_size(players_score),
+                          "orphans": sum(1 for player_id in players_score if player_id not in players_game)},
+        "game_containers": containers,
+    }
+
+
+def _stat_row(stat):
+    frame = stat.traceback[0]
+    return {"file": frame.filename, "line": frame.lineno, "size": stat.size, "size_diff": stat.size_diff,
+            "count": stat.count, "count_diff": stat.count_diff}
+
+
+class MemoryProfiler:
+    """
+    Opt-in memory instrumentation of a game server: reports of the size of its structures (see structure_report),
+    exported as gauges of the server metrics, and tracemalloc snapshots taken and compared on demand. Tracing the
+    allocations slows every call down, so it only runs when asked for (see start_tracing and take_snapshot).
+
+    Attributes:
+        server (GameServer): The instrumented server.
+        frames (int): Frames of the traceback recorded for every allocation traced.
+        max_snapshots (int): The number of snapshots kept.
+        reports (int): The number of reports computed.
+    """
+
+    def __init__(self, server, frames=TRACE_FRAMES, max_snapshots=MAX_SNAPSHOTS):
+        """
+        Initialize the MemoryProfiler.
+
+        Args:
+            server (GameServer): The instrumented server.
+            frames (int, optional): Frames of the traceback recorded per allocation. Defaults to TRACE_FRAMES.
+            max_snapshots (int, optional): The number of snapshots kept. Defaults to MAX_SNAPSHOTS.
+        """
+        self.server = server
+        self.frames = frames
+        self.max_snapshots = max_snapshots
+        self.reports = 0
+        self._snapshots = OrderedDict()  # snapshot id -> tracemalloc.Snapshot, oldest first
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def start_tracing(self):
+        """
+        Starts tracing the allocations, if not already traced.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop_tracing(self):
+        """
+        Stops tracing the allocations and drops the snapshots taken.
+        """
+        with self._lock:
+            self._snapshots.clear()
+        tracemalloc.stop()
+
+    def report(self):
+        """
+        Measures the structures of the server and the memory traced.
+
+        Returns:
+            dict: The structures (see structure_report) and, while tracing, the current and peak bytes traced.
+        """
+        report = {"structures": structure_report(self.server), "traced": None}
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            report["traced"] = {"current": current, "peak": peak}
+        self.reports += 1
+        return report
+
+    def export(self, metrics):
+        """
+        Computes a report and sets its figures as gauges of the server metrics ("memory.<structure>.<figure>").
+
+        Args:
+            metrics (Metrics): The registry of the server metrics.
+        """
+        report = self.report()
+        for structure, figures in report["structures"].items():
+            if structure == "game_containers":
+                for name, container in figures.items():
+                    for figure, value in container.items():
+                        metrics.set_gauge(f"memory.game.{name}.{figure}", value)
+            else:
+                for figure, value in figures.items():
+                    metrics.set_gauge(f"memory.{structure}.{figure}", value)
+        if report["traced"] is not None:
+            metrics.set_gauge("memory.traced.current", report["traced"]["current"])
+            metrics.set_gauge("memory.traced.peak", report["traced"]["peak"])
+
+    def take_snapshot(self):
+        """
+        Takes a snapshot of the traced allocations, starting the tracing if needed: the first snapshot is then
+        almost empty, and the next ones show what has been allocated since.
+
+        Returns:
+            int: The id of the snapshot, to be passed to diff().
+        """
+        self.start_tracing()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def diff(self, first, second=None, top=DIFF_TOP):
+        """
+        Compares two snapshots by the source line of the allocations.
+
+        Args:
+            first (int): The id of the older snapshot.
+            second (int, optional): The id of the newer snapshot. Defaults to None (a snapshot taken now, not kept).
+            top (int, optional): The number of lines returned. Defaults to DIFF_TOP.
+
+        Raises:
+            KeyError: If a snapshot has been dropped or never taken.
+
+        Returns:
+            list: The lines that grew the most, as dictionaries with the file, the line, the size and the count of
+                the allocations and their difference from the first snapshot.
+        """
+        with self._lock:
+            older = self._snapshots[first]
+            newer = self._snapshots[second] if second is not None else None
+        if newer is None:
+            newer = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        return [_stat_row(stat) for stat in newer.compare_to(older, "lineno")[:top]]
+
+    def snapshot_ids(self):
+        """
+        Gets the ids of the snapshots kept.
+
+        Returns:
+            list: The ids, oldest first.
+        """
+        with self._lock:
+            return list(self._snapshots)
+
+
+class MemoryReporter:
+    """
+    Background thread that periodically exports the memory report of the server with its metrics.
+
+    Attributes:
+        profiler (MemoryProfiler): The instrumentation of the server.
+        metrics (Metrics): The registry of the server metrics.
+        interval (float): Interval in seconds between two reports.
+    """
+
+    def __init__(self, profiler, metrics, interval=REPORT_INTERVAL):
+        """
+        Initialize the MemoryReporter.
+
+        Args:
+            profiler (MemoryProfiler): The instrumentation of the server.
+            metrics (Metrics): The registry of the server metrics.
+            interval (float, optional): Interval in seconds between two reports. Defaults to REPORT_INTERVAL.
+        """
+        self.profiler = profiler
+        self.metrics = metrics
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="memory-reporter", daemon=True)
+
+    def start(self):
+        """
+        Starts the reports.
+
+        Returns:
+            MemoryReporter: The reporter itself.
+        """
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.profiler.export(self.metrics)
+            except Exception as e:  # a failed report must not stop the next ones
+                print(f"Errore del rapporto sulla memoria: {e!r}")
+
+    def stop(self):
+        """
+        Stops the reports.
+        """
+        self._stop.set()
+        self._thread.join()
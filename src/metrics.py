@@ -0,0 +1,71 @@
+# metrics.py
+
+import threading
+import time
+
+
+class Metrics:
+    """
+    A thread-safe registry of the server metrics: monotonically increasing counters and gauges that hold the last
+    value set. The components of the server (rate limiter, matchmaking, ...) share the same registry, which is
+    exported by GameServer.get_server_metrics.
+
+    Attributes:
+        started_at (float): Time at which the registry was created (time.time).
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        self.started_at = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, amount=1):
+        """
+        Increments a counter.
+
+        Args:
+            name (str): The name of the counter.
+            amount (int, optional): The increment. Defaults to 1.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        """
+        Sets the value of a gauge.
+
+        Args:
+            name (str): The name of the gauge.
+            value (int or float): The value of the gauge.
+        """
+        self._gauges[name] = value
+
+    def get(self, name, default=0):
+        """
+        Gets the value of a counter or of a gauge.
+
+        Args:
+            name (str): The name of the metric.
+            default (int, optional): Value returned if the metric does not exist. Defaults to 0.
+
+        Returns:
+            int or float: The value of the metric.
+        """
+        if name in self._counters:
+            return self._counters[name]
+        return self._gauges.get(name, default)
+
+    def snapshot(self):
+        """
+        Gets a copy of all the metrics.
+
+        Returns:
+            dict: The uptime in seconds and the values of the counters and of the gauges.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+        return {"uptime": time.time() - self.started_at, "counters": counters, "gauges": dict(self._gauges)}
@@ -0,0 +1,178 @@
+# multitableclient.py
+
+import Pyro5.errors
+import argparse
+import sys
+from PyQt6 import QtGui
+from PyQt6.QtWidgets import QApplication, QMessageBox
+from PyQt6.QtCore import QTimer
+from src.batch import Batch
+from src.clientcore import TablePoller
+from src.connection import ProxyPool, CONNECT_ERRORS
+from src.discovery import POLICIES, make_resolver
+from src.gameclient import GameClient, MARGIN, WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_TITLE, SERVER_URI
+from src.rpcworker import RpcWorker
+from src.tracing import Tracer, SAMPLE_RATE, SLOW_MS
+
+DEFAULT_SEATS = 4  # Number of seats opened by default
+
+
+class MultiTableClient:
+    """
+    Qt front-end hosting many seats in one process, each a GameClient window playing its own game. The seats share
+    one connection and one timer: every poll refreshes all of them with a single batch request (see TablePoller), so
+    the cost of a seat is one operation of the batch instead of a timer, a request and a connection of its own.
+    The poll loop and the calls of all the seats run on one RpcWorker, which owns the connection.
+
+    Attributes:
+        server (PooledServer): The game server object shared by the seats.
+        seats (list): The GameClient of every seat.
+        worker (RpcWorker): The thread running the calls of all the seats.
+        poller (TablePoller): The shared poll loop of the seats, run on the worker thread.
+        polling_timer (QTimer): Timer object that periodically runs the poll loop.
+    """
+    POLLING_INTERVAL = GameClient.POLLING_INTERVAL  # Polling interval in seconds
+
+    def __init__(self, server, tracer=None):
+        """
+        Initialize the MultiTableClient without seats.
+
+        Args:
+            server (PooledServer): The game server object shared by the seats.
+            tracer (Tracer, optional): The tracer of the calls of the worker. Defaults to None (no tracing).
+        """
+        self.server = server
+        self.seats = []
+        self.worker = RpcWorker(tracer)
+        self.poller = TablePoller(server, self.seat_failed)
+        self.polling_timer = QTimer()
+        self.polling_timer.timeout.connect(self.poll)
+        self.polling_timer.start(self.POLLING_INTERVAL * 1000)
+
+    def add_seat(self, player_name, player_id):
+        """
+        Opens the window of a registered player and adds it to the poll loop.
+
+        Args:
+            player_name (str): The name of the player.
+            player_id (int): The id returned by the registration.
+
+        Returns:
+            GameClient: The seat.
+        """
+        client = GameClient(player_name, self.server, player_id, polling=False, worker=self.worker)
+        # the connection belongs to the worker thread, so are its session hooks and the poll loop
+        self.worker.submit(self.server.pool.add_session_hook, client.core.resume_session)
+        self.worker.submit(self.poller.add, client.core)
+        self.seats.append(client)
+        client.gui.setWindowTitle(f"{WINDOW_TITLE} - {player_name}")
+        return client
+
+    def poll(self):
+        """
+        Advances all the seats on the worker. The poll is skipped while the previous one is still running.
+        """
+        self.worker.submit(self.poller.poll, key=self.poller, callback=self.poll_done)
+
+    def poll_done(self, result, error):
+        """
+        Callback of a poll run on the worker. A lost connection that cannot be re-established is reported on every
+        seat instead of being raised into the Qt event loop; the next poll tries again.
+
+        Args:
+            result (None): The result of the poll.
+            error (Exception or None): The exception raised by the poll, None if it succeeded.
+        """
+        if isinstance(error, Pyro5.errors.CommunicationError):
+            for client in self.seats:
+                client.connection_lost(error)
+        elif error is not None:
+            print(f"Poll of the seats failed: {type(error).__name__} {error}")
+
+    def seat_failed(self, core, error):
+        """
+        Reports the failed tick of a seat on its window, so the other seats keep playing. Called by the poller on the
+        worker thread: the report is forwarded to the GUI thread.
+
+        Args:
+            core (ClientCore): The core of the seat.
+            error (Exception): The exception raised by the tick.
+        """
+        core.listener.forward("tick_failed", error)
+
+    def tile(self, geometry):
+        """
+        Places the windows of the seats in a grid filling the screen from the top left corner.
+
+        Args:
+            geometry (QRect): The available geometry of the screen.
+        """
+        columns = max(1, (geometry.width() - 2 * MARGIN) // WINDOW_WIDTH)
+        for index, client in enumerate(self.seats):
+            row, column = divmod(index, columns)
+            client.gui.setGeometry(geometry.x() + MARGIN + column * WINDOW_WIDTH,
+                                   geometry.y() + MARGIN + row * WINDOW_HEIGHT, WINDOW_WIDTH, WINDOW_HEIGHT)
+
+
+def main(argv=None):
+    """
+    Main function to start the multi-table client: registers the players of all the seats in one batch and opens a
+    window for each of them.
+    """
+    parser = argparse.ArgumentParser(description="Morra Cinese client playing many tables at once.")
+    parser.add_argument("--seats", type=int, default=DEFAULT_SEATS, help="number of games played at once")
+    parser.add_argument("--name", default="Table", help="prefix of the player names, numbered by seat")
+    parser.add_argument("--uri", default=SERVER_URI, help="URI of the game server")
+    parser.add_argument("--ns", action="store_true", help="pick a server instance registered in the name server")
+    parser.add_argument("--ns-host", default=None, help="host of the name server (default: broadcast lookup)")
+    parser.add_argument("--ns-port", type=int, default=None, help="port of the name server")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="least-loaded",
+                        help="policy used to pick the server instance shared by the seats")
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="write sampled traces of the calls (queue, round trip, delivery) to this NDJSON file")
+    parser.add_argument("--trace-sample", type=float, default=SAMPLE_RATE, help="fraction of the calls traced")
+    parser.add_argument("--trace-slow", type=float, default=SLOW_MS,
+                        help="milliseconds over which a call is traced even if not sampled")
+    args = parser.parse_args(argv)
+    tracer = Tracer(args.trace, "client", args.trace_sample, args.trace_slow) if args.trace is not None else None
+
+    app = QApplication([])
+
+    # all the seats share one connection, so one instance is picked for all of them (by the name prefix, for the
+    # policies hashing the player name)
+    target = args.uri if not args.ns else make_resolver(args.policy, args.name, args.ns_host, args.ns_port)
+    server = ProxyPool(target, max_connections=1, tracer=tracer).server
+    names = [f"{args.name} #{i + 1}" for i in range(args.seats)]
+    batch = Batch(server)
+    for name in names:
+        batch.register_player(name)
+    try:
+        player_ids = batch.execute()
+    except CONNECT_ERRORS as e:
+        QMessageBox.critical(None, "Connection Error", f"Cannot reach the game server: {e}")
+        sys.exit(1)
+    server.pool.release()  # the only connection slot goes to the worker thread
+
+    client = MultiTableClient(server, tracer)
+    for name, player_id in zip(names, player_ids):
+        if isinstance(player_id, Exception):
+            print(f"Registration of {name} failed: {player_id}")
+            continue
+        client.add_seat(name, player_id)
+    if not client.seats:
+        QMessageBox.critical(None, "Registration Error", "No player could be registered.")
+        client.worker.stop()
+        sys.exit(1)
+
+    app.aboutToQuit.connect(client.worker.stop)
+    if tracer is not None:
+        app.aboutToQuit.connect(tracer.close)  # after the worker has stopped
+    client.tile(QtGui.QGuiApplication.primaryScreen().availableGeometry())
+    for seat in client.seats:
+        seat.gui.show()
+
+    sys.exit(app.exec())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# players.py
+
+import sys
+import threading
+
+
+class IdCounter:
+    """
+    Hands out increasing integer ids, like itertools.count, and tells the last one handed out, so a snapshot can
+    save it and a restored server never hands out the id of a removed player or game again.
+
+    Attributes:
+        last (int): The last id handed out, one less than the first id if none.
+    """
+
+    def __init__(self, first=1):
+        """
+        Initialize the IdCounter.
+
+        Args:
+            first (int, optional): The first id handed out. Defaults to 1.
+        """
+        self.last = first - 1
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            self.last += 1
+            return self.last
+
+
+class PlayerTable:
+    """
+    The registry of the player ids. register_player hands out a small integer id that the client sends in the later
+    calls; the server indexes all the per-player structures (games, moves, scores, versions) by that id, and the name
+    is kept only here, interned, for display. The ids are not reused, so a stale id never refers to another player.
+
+    Attributes:
+        next_id (IdCounter): The generator of the new ids.
+    """
+
+    def __init__(self, first_id=1):
+        """
+        Initialize an empty PlayerTable.
+
+        Args:
+            first_id (int, optional): The first id handed out. Defaults to 1.
+        """
+        self.next_id = IdCounter(first_id)
+        self._names = {}  # id -> name
+        self._ids = {}  # name -> id
+
+    def add(self, player_name, player_id=None):
+        """
+        Adds a player.
+
+        Args:
+            player_name (str): The name of the player.
+            player_id (int, optional): The id of the player, e.g. when restoring a snapshot. Defaults to a new id.
+
+        Raises:
+            ValueError: If a player with the same name already exists.
+
+        Returns:
+            int: The id of the player.
+        """
+        if player_name in self._ids:
+            raise ValueError(f'Player with name {player_name} already exists. Please choose another name.')
+        if player_id is None:
+            player_id = next(self.next_id)
+        player_name = sys.intern(player_name)
+        self._names[player_id] = player_name
+        self._ids[player_name] = player_id
+        return player_id
+
+    def remove(self, player_id):
+        """
+        Removes a player.
+
+        Args:
+            player_id (int): The id of the player.
+
+        Returns:
+            str: The name of the player.
+        """
+        player_name = self._names.pop(player_id)
+        del self._ids[player_name]
+        return player_name
+
+    def resolve(self, player):
+        """
+        Gets the id of a player from the id itself or from the name, which the clients written before the ids still
+        send.
+
+        Args:
+            player (int or str): The id or the name of the player.
+
+        Raises:
+            KeyError: If the player is not registered.
+
+        Returns:
+            int: The id of the player.
+        """
+        if isinstance(player, str):
+            return self._ids[player]
+        if player not in self._names:
+            raise KeyError(player)
+        return player
+
+    def key(self, player):
+        """
+        Gets the key of a player for the rate limiter: the id of a registered player, whether the call names it by
+        id or by name, the argument itself otherwise.
+
+        Args:
+            player (int or str): The id or the name of the player.
+
+        Returns:
+            int or str: The key.
+        """
+        if isinstance(player, str):
+            return self._ids.get(player, player)
+        return player
+
+    def name(self, player_id):
+        """
+        Gets the name of a player.
+
+        Args:
+            player_id (int): The id of the player.
+
+        Returns:
+            str: The name of the player.
+        """
+        return self._names[player_id]
+
+    def items(self):
+        """
+        Gets the players.
+
+        Returns:
+            list: The (id, name) pairs.
+        """
+        return list(self._names.items())
+
+    def __contains__(self, player):
+        if isinstance(player, str):
+            return player in self._ids
+        return player in self._names
+
+    def __len__(self):
+        return len(self._names)
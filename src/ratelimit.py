@@ -0,0 +1,295 @@
+# ratelimit.py
+
+import functools
+import threading
+import time
+
+import Pyro5.api
+
+from src.errors import RateLimitExceeded
+
+READ = "read"  # Calls that only read the state of the server
+WRITE = "write"  # Calls that change the state of the server
+BULK = "bulk"  # Batches of calls, charged one token per operation
+
+MAX_IDLE_BUCKETS = 10000  # Number of buckets above which the full (idle) ones are dropped
+
+
+class TokenBucket:
+    """
+    A token bucket: it holds up to capacity tokens and is refilled at rate tokens per second. A call is admitted if
+    it can take a token from the bucket.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum number of tokens, i.e. the allowed burst.
+        tokens (float): Tokens available at the last update.
+        updated (float): Time of the last update.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity, now):
+        """
+        Initialize a full TokenBucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): Maximum number of tokens.
+            now (float): The current time.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        """
+        Adds the tokens accumulated since the last update.
+
+        Args:
+            now (float): The current time.
+        """
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now, cost=1):
+        """
+        Gets the time to wait before cost tokens are available.
+
+        Args:
+            now (float): The current time.
+            cost (float, optional): Number of tokens needed. Defaults to 1.
+
+        Returns:
+            float: The time to wait in seconds, 0 if the tokens are available now.
+        """
+        self.refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost=1):
+        """
+        Takes tokens from the bucket. wait_time() must have returned 0 just before.
+
+        Args:
+            cost (float, optional): Number of tokens to take. Defaults to 1.
+        """
+        self.tokens -= cost
+
+    def is_full(self, now):
+        """
+        Tells if the bucket is full, i.e. it is in the same state as a new bucket and can be dropped.
+
+        Args:
+            now (float): The current time.
+
+        Returns:
+            bool: True if the bucket is full, False otherwise.
+        """
+        self.refill(now)
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """
+    Admission control for the calls to the GameServer. Each call takes a token from the bucket of its player and
+    from the bucket of its connection, with separate budgets for read and write calls, and from a global bucket
+    shared by all the calls. A batch takes one token per operation from the bulk budget of its connection and from
+    the global bucket. When the global bucket drops below the overload threshold the server is overloaded and read
+    calls and batches are shed first, so moves and joins keep being served. A rejected call raises
+    RateLimitExceeded with a hint of when to retry; nothing else is done for it.
+
+    Attributes:
+        budgets (dict): For each kind of call (READ, WRITE, BULK), the (rate, burst) of a player's bucket.
+        connection_budgets (dict): For each kind of call, the (rate, burst) of a connection's bucket.
+        global_budget (tuple): The (rate, burst) of the global bucket.
+        overload_threshold (float): Fraction of the global burst below which read calls are shed.
+        metrics (Metrics or None): The registry where admitted and rejected calls are counted.
+    """
+
+    def __init__(self, read_rate=20, read_burst=40, write_rate=5, write_burst=10, connection_factor=4,
+                 global_rate=5000, global_burst=10000, overload_threshold=0.2, metrics=None, clock=time.monotonic,
+                 bulk_rate=5000, bulk_burst=10000):
+        """
+        Initialize the RateLimiter.
+
+        Args:
+            read_rate (float, optional): Read calls per second allowed to a player. Defaults to 20.
+            read_burst (float, optional): Burst of read calls allowed to a player. Defaults to 40.
+            write_rate (float, optional): Write calls per second allowed to a player. Defaults to 5.
+            write_burst (float, optional): Burst of write calls allowed to a player. Defaults to 10.
+            connection_factor (float, optional): The budgets of a connection are the ones of a player multiplied by
+                this factor, since a connection may be shared by a few players. Defaults to 4.
+            global_rate (float, optional): Calls per second allowed to the whole server. Defaults to 5000.
+            global_burst (float, optional): Burst of calls allowed to the whole server. Defaults to 10000.
+            overload_threshold (float, optional): Fraction of the global burst below which read calls are shed.
+                Defaults to 0.2.
+            metrics (Metrics, optional): The registry where admitted and rejected calls are counted.
+            clock (callable, optional): Monotonic clock. Defaults to time.monotonic.
+            bulk_rate (float, optional): Operations per second allowed to the batches of a connection. Defaults to
+                5000.
+            bulk_burst (float, optional): Burst of operations allowed to the batches of a connection. Defaults to
+                10000.
+        """
+        self.budgets = {READ: (read_rate, read_burst), WRITE: (write_rate, write_burst)}
+        self.connection_budgets = {kind: (rate * connection_factor, burst * connection_factor)
+                                   for kind, (rate, burst) in self.budgets.items()}
+        # the batches are sent by bot and admin clients, one connection each: the bulk budget is not shared
+        self.budgets[BULK] = self.connection_budgets[BULK] = (bulk_rate, bulk_burst)
+        self.global_budget = (global_rate, global_burst)
+        self.overload_threshold = overload_threshold
+        self.metrics = metrics
+        self.clock = clock
+        self._buckets = {}
+        self._global = TokenBucket(global_rate, global_burst, clock())
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _bucket(self, key, budget, now):
+        """
+        Gets the bucket of a key, creating it if needed.
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_IDLE_BUCKETS:
+                self._drop_idle_buckets(now)
+            bucket = self._buckets[key] = TokenBucket(*budget, now)
+        return bucket
+
+    def _drop_idle_buckets(self, now):
+        """
+        Drops the buckets that are full: they would be recreated identical on the next call of their owner.
+        """
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if not bucket.is_full(now)}
+
+    def overloaded(self):
+        """
+        Tells if the server is overloaded, i.e. the global bucket is below the overload threshold.
+
+        Returns:
+            bool: True if the server is overloaded, False otherwise.
+        """
+        with self._lock:
+            self._global.refill(self.clock())
+            return self._global.tokens < self._global.capacity * self.overload_threshold
+
+    def admit(self, kind, player_name=None, connection=None, cost=1):
+        """
+        Admits a call or rejects it.
+
+        Args:
+            kind (str): READ, WRITE or BULK.
+            player_name (int or str, optional): The player the call is made for (its id, or its name if it is not
+                registered yet), if any.
+            connection (tuple, optional): The address of the client connection, if any.
+            cost (int, optional): The tokens taken from each bucket, the number of operations of a batch. A call
+                costing more than a full bucket waits for the bucket to be full. Defaults to 1.
+
+        Raises:
+            RateLimitExceeded: If the call exceeds one of the budgets.
+        """
+        with self._lock:
+            now = self.clock()
+            buckets = [self._global]
+            reserve = 0
+            if kind != WRITE:
+                # reads and batches are shed first: they must leave the reserve of the global bucket to the writes
+                reserve = self._global.capacity * self.overload_threshold
+            if player_name is not None:
+                buckets.append(self._bucket(("player", player_name, kind), self.budgets[kind], now))
+            if connection is not None:
+                buckets.append(self._bucket(("connection", connection, kind), self.connection_budgets[kind], now))
+
+            costs = [min(cost, self._global.capacity - reserve)]
+            costs += [min(cost, bucket.capacity) for bucket in buckets[1:]]
+            wait = max([self._global.wait_time(now, costs[0] + reserve)] +
+                       [bucket.wait_time(now, bucket_cost) for bucket, bucket_cost in zip(buckets[1:], costs[1:])])
+            if wait == 0:
+                for bucket, bucket_cost in zip(buckets, costs):
+                    bucket.take(bucket_cost)
+
+        if self.metrics is not None:
+            self.metrics.incr(f"calls.{kind}.{'admitted' if wait == 0 else 'rejected'}")
+        if wait > 0:
+            raise RateLimitExceeded(f"Too many {kind} calls", wait)
+
+    def forget(self, player_name):
+        """
+        Drops the buckets of a player who left the server.
+
+        Args:
+            player_name (int or str): The id or the name of the player.
+        """
+        with self._lock:
+            for kind in self.budgets:
+                self._buckets.pop(("player", player_name, kind), None)
+
+    def enter(self):
+        """
+        Marks the start of a call in the calling thread.
+
+        Returns:
+            bool: True if this is the outermost call, the only one that is rate limited.
+        """
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        return depth == 0
+
+    def leave(self):
+        """
+        Marks the end of a call in the calling thread.
+        """
+        self._local.depth -= 1
+
+
+def current_connection():
+    """
+    Gets the address of the client connection of the Pyro5 call being served by the calling thread.
+
+    Returns:
+        tuple or None: The address of the client, None if the call does not come from Pyro5.
+    """
+    return getattr(Pyro5.api.current_context, "client_sock_addr", None)
+
+
+def rate_limited(kind, per_player=True):
+    """
+    Decorator for the GameServer methods: the call is admitted by the server's rate_limiter (if any) before running.
+    Only the outermost call is limited, so a method calling other limited methods pays once. The player is the
+    first positional argument, its id or its name, which share the same budget once the player is registered. A
+    BULK call costs one token per operation of its first argument (or of its "ops" keyword argument).
+
+    Args:
+        kind (str): READ, WRITE or BULK.
+        per_player (bool, optional): Flag telling that the first positional argument is a player. Defaults to True;
+            False for the methods whose first argument is another id (game, subscription, cursor).
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            limiter = self.rate_limiter
+            if limiter is None:
+                return method(self, *args, **kwargs)
+            outermost = limiter.enter()
+            try:
+                if outermost:
+                    player = None
+                    if per_player and args and isinstance(args[0], (str, int)):
+                        player = self.players.key(args[0])
+                    cost = 1
+                    if kind == BULK:
+                        cost = max(1, len(args[0] if args else kwargs.get("ops", ())))
+                    limiter.admit(kind, player, current_connection(), cost)
+                return method(self, *args, **kwargs)
+            finally:
+                limiter.leave()
+
+        wrapper.rate_limit_kind = kind
+        return wrapper
+
+    return decorator
@@ -0,0 +1,238 @@
+# readviews.py
+
+import functools
+import threading
+from collections import namedtuple
+
+from src.game import PLAYER_FIELDS, GAME_FIELDS
+
+
+class GameSnapshot(namedtuple("GameSnapshot", ("game_id", "players", "names", "results", "scores", "match_status",
+                                               "winner", "game_series", "versions"))):
+    """
+    Immutable copy of the fields of a game seen by its players, with the same getters as Game. A snapshot is never
+    modified: a change of the game publishes a new one, so a reader holding a snapshot sees a consistent state
+    without any lock.
+
+    Attributes:
+        game_id (int): The identifier of the game.
+        players (tuple): The ids of the players.
+        names (tuple): The names of the players, in the same order.
+        results (dict): The result of the last match of each player; never modified.
+        scores (dict): The score of the series of each player; never modified.
+        match_status (MatchStatus): The status of the match.
+        winner (str or None): The winner of the series.
+        game_series (int): The number of the match in the series.
+        versions (dict): The version of the last change of each field, as in Game; never modified.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, game):
+        """
+        Copies the fields of a game.
+
+        Args:
+            game (Game): The game.
+
+        Returns:
+            GameSnapshot: The snapshot.
+        """
+        players = tuple(game.players)
+        return cls(game.game_id, players, tuple(game.name_of(player) for player in players),
+                   {player: game.results[player] for player in players},
+                   {player: game.scores[player] for player in players},
+                   game.match_status, game.winner, game.game_series, dict(game.versions))
+
+    def get_player_state(self, player_id):
+        """
+        Gets the result of the last match of a player (see Game.get_player_state).
+        """
+        return self.results.get(player_id)
+
+    def get_score(self, player_id):
+        """
+        Gets the score of the series of a player (see Game.get_score).
+        """
+        return self.scores.get(player_id, 0)
+
+    def get_match_status(self):
+        """
+        Gets the status of the match (see Game.get_match_status).
+        """
+        return self.match_status
+
+    def get_winner_of_series(self):
+        """
+        Gets the winner of the series (see Game.get_winner_of_series).
+        """
+        return self.winner
+
+    def get_num_of_match(self):
+        """
+        Gets the number of the match in the series (see Game.get_num_of_match).
+        """
+        return self.game_series
+
+    def get_opponent_name(self, player_id):
+        """
+        Gets the name of the opponent of a player (see Game.get_opponent_name).
+        """
+        if len(self.players) != 2 or player_id not in self.players:
+            return None
+        return self.names[1] if player_id == self.players[0] else self.names[0]
+
+    def get_field(self, field, player_id):
+        """
+        Gets the value of a versioned field as seen by a player (see Game.get_field).
+        """
+        if field == "game_state":
+            return self.get_player_state(player_id)
+        if field == "score":
+            return self.get_score(player_id)
+        if field == "match_status":
+            return self.get_match_status()
+        if field == "winner_of_series":
+            return self.get_winner_of_series()
+        if field == "num_of_match":
+            return self.get_num_of_match()
+        return self.get_opponent_name(player_id)
+
+    def get_changes_since(self, player_id, version):
+        """
+        Gets the fields seen by a player that changed after a version (see Game.get_changes_since).
+        """
+        if version == 0:
+            return {field: self.get_field(field, player_id) for field in PLAYER_FIELDS + GAME_FIELDS}
+        return {field: self.get_field(field, player_id)
+                for (field, owner), changed in self.versions.items()
+                if changed > version and (owner is None or owner == player_id)}
+
+
+PlayerView = namedtuple("PlayerView", ("game", "general_score", "version", "moved_at", "scored_at"))
+PlayerView.__doc__ = """
+    What a player reads from the server, published as one immutable value: the snapshot of their game, their
+    general score, the version of the clock before the snapshot was taken and the versions of the last move to
+    another game and of the last change of the general score.
+"""
+
+
+class ReadViews:
+    """
+    The read side of the server: the PlayerView of every seated player, replaced as a whole after each change of
+    their game, their seat or their general score. The read RPCs take the view of the player with one dictionary
+    lookup and never wait for the writers, which serialize among themselves only to publish.
+
+    The views follow the calls decorated with publishes_views; a change made outside them (the matchmaker, a standby
+    taking over) must publish the views itself. The views of an evicted game are dropped with it (see TieredGames)
+    and published again by the next read, like the ones of the games of a restored snapshot.
+    """
+
+    def __init__(self):
+        """
+        Initialize the ReadViews without views.
+        """
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def get(self, player_id):
+        """
+        Gets the view of a player.
+
+        Args:
+            player_id (int): The id of the player.
+
+        Returns:
+            PlayerView or None: The view, None if the player has no game.
+        """
+        return self._views.get(player_id)
+
+    def publish(self, server, game):
+        """
+        Publishes the views of the players of a game.
+
+        Args:
+            server (GameServer): The game server.
+            game (Game): The game.
+        """
+        with self._lock:
+            self._publish(server, game)
+
+    def _publish(self, server, game):
+        # the version is read first: a change made while the snapshot is taken is sent again by the next view
+        current = server.version_clock.current
+        snapshot = GameSnapshot.of(game)
+        registry = server.registry_versions
+        for player_id in snapshot.players:
+            self._views[player_id] = PlayerView(snapshot, server.players_score.get(player_id, 0), current,
+                                                registry.get(("game_id", player_id), 0),
+                                                registry.get(("general_score", player_id), 0))
+
+    def refresh(self, server, players, game_ids):
+        """
+        Publishes the views of the games a call has changed and drops the views of the players left without a game.
+
+        Args:
+            server (GameServer): The game server.
+            players (iterable): The ids of the players of the call.
+            game_ids (iterable): The ids of the games of the players before and after the call; None is skipped.
+        """
+        with self._lock:
+            for game_id in set(game_ids):
+                game = server.games.get(str(game_id)) if game_id is not None else None
+                if game is not None:
+                    self._publish(server, game)
+            for player_id in players:
+                if player_id not in server.players_game:
+                    self._views.pop(player_id, None)
+
+    def drop(self, players):
+        """
+        Drops the views of players, e.g. of a game evicted from the hot table: their next read publishes them again.
+
+        Args:
+            players (iterable): The ids of the players.
+        """
+        with self._lock:
+            for player_id in players:
+                self._views.pop(player_id, None)
+
+    def publish_all(self, server):
+        """
+        Replaces all the views with the ones of the games of the server, e.g. after a restore.
+
+        Args:
+            server (GameServer): The game server.
+        """
+        with self._lock:
+            self._views = {}
+            for game in list(server.games.values()):
+                self._publish(server, game)
+
+    def __len__(self):
+        return len(self._views)
+
+
+def publishes_views(method):
+    """
+    Decorator for the GameServer methods that change the state seen by a player: after the call the views of the
+    game they were in before the call and of the game they are in after it are published again. The first argument
+    of the method is the player, by id or by name.
+
+    Args:
+        method (callable): The method.
+
+    Returns:
+        callable: The decorated method.
+    """
+    @functools.wraps(method)
+    def wrapper(self, player, *args, **kwargs):
+        before = self.players.key(player)
+        game_before = self.players_game.get(before)
+        try:
+            return method(self, player, *args, **kwargs)
+        finally:
+            after = self.players.key(player)
+            self.read_views.refresh(self, (before, after), (game_before, self.players_game.get(after)))
+
+    return wrapper
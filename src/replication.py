@@ -0,0 +1,528 @@
+# replication.py
+
+import functools
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+from src.enums import MatchStatus
+from src.game import Game
+from src.players import IdCounter
+
+BATCH_INTERVAL = 0.01  # Seconds between two batches of changes sent by the primary
+FULL_SYNC_CHUNK = 2000  # Players or games per frame of a full synchronization
+FAILOVER_TIMEOUT = 2.0  # Seconds without the primary after which a standby takes over
+RECONNECT_INTERVAL = 0.1  # Seconds between two connection attempts of a standby
+POLL_INTERVAL = 0.5  # Seconds between two checks of the stop and promotion requests while blocked on a socket
+_FRAME = struct.Struct(">I")  # length of a frame
+
+
+def parse_address(address):
+    """
+    Parses the address of the replication socket: a path (containing a "/") for a Unix domain socket, host:port
+    otherwise.
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        tuple: The socket family and the address in the form expected by the socket module.
+    """
+    if "/" in address:
+        return socket.AF_UNIX, address
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "localhost", int(port))
+
+
+def _receive_exactly(conn, size):
+    chunks = []
+    while size:
+        chunk = conn.recv(size)
+        if not chunk:
+            raise ConnectionError("connection closed by the primary")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def receive_frame(conn):
+    """
+    Reads a frame.
+
+    Raises:
+        ConnectionError: If the connection is closed.
+
+    Returns:
+        dict: The frame.
+    """
+    size, = _FRAME.unpack(_receive_exactly(conn, _FRAME.size))
+    return json.loads(_receive_exactly(conn, size))
+
+
+def player_row(server, player_id):
+    """
+    Gets the replicated state of a registered player.
+
+    Returns:
+        list: The id, the name, the general score and the game id of the player.
+    """
+    return [player_id, server.players.name(player_id), server.players_score.get(player_id, 0),
+            server.players_game.get(player_id)]
+
+
+def game_row(game):
+    """
+    Gets the replicated state of a game; the per-player fields are aligned with the players.
+
+    Returns:
+        list: The fields of the game.
+    """
+    players = list(game.players)
+    status = game.match_status
+    return [game.game_id, players, [game.moves.get(player) for player in players],
+            [game.results.get(player) for player in players], [game.scores.get(player, 0) for player in players],
+            game.game_series, game.rematch_counter, game.ready_to_play_again, game.winner_rewarded,
+            status.value if status is not None else None, game.winner, game.last_round]
+
+
+def restore_game(row, clock, players):
+    """
+    Builds a game from its replicated state.
+
+    Args:
+        row (list): The fields of the game (see game_row).
+        clock (VersionClock): The version clock of the server.
+        players (PlayerTable): The player table of the server.
+
+    Returns:
+        Game: The game.
+    """
+    (game_id, player_ids, moves, results, scores, game_series, rematch_counter, ready_to_play_again,
+     winner_rewarded, status, winner, last_round) = row
+    game = Game(clock, players)
+    game.game_id = game_id
+    for player, move, result, score in zip(player_ids, moves, results, scores):
+        game.players.append(player)
+        game.moves[player] = move
+        game.results[player] = result
+        game.scores[player] = score
+    game.game_series = game_series
+    game.rematch_counter = rematch_counter
+    game.ready_to_play_again = ready_to_play_again
+    game.winner_rewarded = winner_rewarded
+    game.match_status = MatchStatus(status) if status is not None else None
+    game.winner = winner
+    game.last_round = last_round
+    return game
+
+
+class ChangeLog:
+    """
+    The players and the games changed since the last batch, and the history records appended meanwhile. Only the
+    identifiers are kept: the batch carries the state they have when it is sent, so a player or a game changed many
+    times between two batches is sent once.
+    """
+
+    def __init__(self):
+        self._players = set()
+        self._games = set()
+        self._records = []
+        self._lock = threading.Lock()
+
+    def mark(self, players=(), games=()):
+        """
+        Marks players and games as changed.
+
+        Args:
+            players (iterable): The ids of the players; the other values (e.g. the name of a player who is not
+                registered) are ignored.
+            games (iterable): The ids of the games; None is ignored.
+        """
+        with self._lock:
+            self._players.update(player for player in players if isinstance(player, int))
+            self._games.update(game for game in games if game is not None)
+
+    def record(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def take(self):
+        """
+        Takes the changes marked so far.
+
+        Returns:
+            tuple: The ids of the players, the ids of the games and the records.
+        """
+        with self._lock:
+            changes = self._players, self._games, self._records
+            self._players, self._games, self._records = set(), set(), []
+            return changes
+
+    def put_back(self, players, games, records):
+        """
+        Gives back changes that could not be sent, ahead of the ones marked meanwhile.
+        """
+        with self._lock:
+            self._players.update(players)
+            self._games.update(games)
+            self._records[:0] = records
+
+
+def replicates_changes(method):
+    """
+    Decorator for the GameServer methods that change the state of a player: when a standby is connected, the
+    player, the game they were in before the call and the game they are in after it are marked as changed. The first
+    argument of the method is the player, by id or by name.
+
+    Args:
+        method (callable): The method.
+
+    Returns:
+        callable: The decorated method.
+    """
+    @functools.wraps(method)
+    def wrapper(self, player, *args, **kwargs):
+        # looked up even when no standby is connected: one may connect while the call is running
+        before = self.players.key(player)
+        game_before = self.players_game.get(before)
+        try:
+            return method(self, player, *args, **kwargs)
+        finally:
+            log = self.replication
+            if log is not None:
+                after = self.players.key(player)
+                log.mark((before, after), (game_before, self.players_game.get(after)))
+
+    return wrapper
+
+
+class Replicator:
+    """
+    Primary side of the warm standby: listens on a local socket for a standby and streams the changes of the server
+    to it, asynchronously, every BATCH_INTERVAL seconds. When a standby connects the whole state is sent first; then
+    each batch carries the current state of the players and games changed since the previous one, and the history
+    records appended meanwhile. The calls of the players only mark what they changed, the rows are built and sent
+    by the replication thread.
+
+    Attributes:
+        server (GameServer): The game server.
+        address (str): The address of the replication socket.
+        interval (float): Seconds between two batches.
+        batches (int): Number of batches sent.
+        sent_bytes (int): Number of bytes sent.
+    """
+
+    def __init__(self, server, address, interval=BATCH_INTERVAL):
+        """
+        Initialize the Replicator and bind the replication socket.
+
+        Args:
+            server (GameServer): The game server.
+            address (str): host:port, or the path of a Unix domain socket.
+            interval (float, optional): Seconds between two batches. Defaults to BATCH_INTERVAL.
+        """
+        self.server = server
+        self.address = address
+        self.interval = interval
+        self.batches = 0
+        self.sent_bytes = 0
+        family, bind_address = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.unlink(bind_address)
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(bind_address)
+        self._listener.listen(1)
+        self._listener.settimeout(POLL_INTERVAL)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="replicator", daemon=True)
+
+    def start(self):
+        """
+        Starts waiting for a standby.
+
+        Returns:
+            Replicator: The replicator itself.
+        """
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            log = self.server.replication = ChangeLog()
+            print(f"Standby collegato su {self.address}")
+            try:
+                conn.setblocking(True)
+                self._stream(conn, log)
+            except OSError as e:
+                print(f"Standby scollegato: {e!r}")
+            finally:
+                self.server.replication = None
+                conn.close()
+
+    def _stream(self, conn, log):
+        self._send(conn, self._full_sync_start())
+        for frame in self._full_sync_rows():
+            self._send(conn, frame)
+        self._send(conn, {"sync_end": True, "version": self.server.version_clock.current})
+        while not self._stop.wait(self.interval):
+            self._send_changes(conn, log)
+        # the changes of the last calls, then the standby is told to wait for the primary instead of taking over
+        self._send_changes(conn, log)
+        self._send(conn, {"stopping": True})
+
+    def _send(self, conn, frame):
+        data = json.dumps(frame, separators=(",", ":")).encode("utf-8")
+        conn.sendall(_FRAME.pack(len(data)) + data)
+        self.batches += 1
+        self.sent_bytes += _FRAME.size + len(data)
+
+    def _full_sync_start(self):
+        return {"sync_start": True, "ratings": self.server.ratings.entries()}
+
+    def _full_sync_rows(self):
+        server = self.server
+        player_ids = [player_id for player_id, _ in server.players.items()]
+        games = list(server.games.values())
+        for start in range(0, len(player_ids), FULL_SYNC_CHUNK):
+            rows = []
+            for player_id in player_ids[start:start + FULL_SYNC_CHUNK]:
+                try:
+                    rows.append(player_row(server, player_id))
+                except KeyError:
+                    pass  # unregistered meanwhile: the change is marked and sent later
+            yield {"players": rows}
+        for start in range(0, len(games), FULL_SYNC_CHUNK):
+            yield {"games": [game_row(game) for game in games[start:start + FULL_SYNC_CHUNK]]}
+
+    def _send_changes(self, conn, log):
+        players, games, records = log.take()
+        if not (players or games or records):
+            return
+        server = self.server
+        try:
+            frame = {"players": [], "removed_players": [], "games": [], "removed_games": [], "records": records,
+                     "version": server.version_clock.current}
+            for player_id in players:
+                if player_id in server.players:
+                    frame["players"].append(player_row(server, player_id))
+                else:
+                    frame["removed_players"].append(player_id)
+            for game_id in games:
+                game = server.games.get(str(game_id))
+                if game is not None:
+                    frame["games"].append(game_row(game))
+                else:
+                    frame["removed_games"].append(game_id)
+        except (KeyError, RuntimeError):
+            # a call changed the player or the game while its row was read: it is sent with the next batch
+            log.put_back(players, games, records)
+            return
+        self._send(conn, frame)
+
+    def stop(self):
+        """
+        Sends the last changes, tells the standby that the primary is stopping and closes the socket.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._listener.close()
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.unlink(bind_address)
+
+
+class Standby:
+    """
+    Standby side of the warm standby: applies the stream of a primary to its own GameServer, which serves no calls
+    meanwhile. When the connection to the primary is lost and cannot be opened again within failover_timeout
+    seconds, follow() returns and the server takes over. A primary stopping cleanly (e.g. a restart with a
+    snapshot) says so first, and the standby then waits for it to come back; promote() makes it take over anyway.
+
+    Attributes:
+        server (GameServer): The game server of the standby.
+        address (str): The address of the replication socket of the primary.
+        failover_timeout (float): Seconds without the primary after which the standby takes over.
+        synced (bool): True once a full synchronization has been received.
+        frames (int): Number of frames applied.
+        lost_at (float or None): Time (time.monotonic) at which the connection to the primary was lost.
+    """
+
+    def __init__(self, server, address, failover_timeout=FAILOVER_TIMEOUT):
+        """
+        Initialize the Standby.
+
+        Args:
+            server (GameServer): The game server of the standby, without players.
+            address (str): host:port, or the path of a Unix domain socket.
+            failover_timeout (float, optional): Seconds without the primary after which the standby takes over.
+                Defaults to FAILOVER_TIMEOUT.
+        """
+        self.server = server
+        self.address = address
+        self.failover_timeout = failover_timeout
+        self.synced = False
+        self.frames = 0
+        self.lost_at = None
+        self._primary_stopping = False
+        self._version = 0
+        self._max_player_id = 0
+        self._max_game_id = 0
+        self._seen = None  # (players, games) received during a full synchronization
+        self._promote = threading.Event()
+
+    def promote(self):
+        """
+        Makes the standby take over as soon as possible, e.g. for a planned switch after the primary has stopped.
+        Safe to call from a signal handler.
+        """
+        self._promote.set()
+
+    def follow(self):
+        """
+        Applies the stream of the primary until the standby must take over, then prepares the server to serve the
+        calls.
+
+        Returns:
+            float: The seconds between the loss of the primary and the end of the take-over (0 after promote()).
+        """
+        family, address = parse_address(self.address)
+        while not self._promote.is_set():
+            conn = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                conn.settimeout(POLL_INTERVAL)
+                conn.connect(address)
+            except OSError:
+                conn.close()
+                if self._must_take_over():
+                    break
+                self._promote.wait(RECONNECT_INTERVAL)
+                continue
+            print(f"Collegato al primario {self.address}")
+            try:
+                self._receive(conn)
+            except (OSError, ValueError) as e:
+                print(f"Connessione al primario persa: {e!r}")
+            finally:
+                conn.close()
+            self.lost_at = time.monotonic()
+        self._take_over()
+        return time.monotonic() - self.lost_at if self.lost_at is not None and not self._promote.is_set() else 0.0
+
+    def _must_take_over(self):
+        return (self.synced and not self._primary_stopping and self.lost_at is not None
+                and time.monotonic() - self.lost_at >= self.failover_timeout)
+
+    def _receive(self, conn):
+        while not self._promote.is_set():
+            try:
+                header = conn.recv(_FRAME.size, socket.MSG_PEEK)
+            except socket.timeout:
+                continue
+            if not header:
+                raise ConnectionError("connection closed by the primary")
+            conn.settimeout(None)  # a frame is read whole
+            try:
+                frame = receive_frame(conn)
+            finally:
+                conn.settimeout(POLL_INTERVAL)
+            self.apply(frame)
+
+    def apply(self, frame):
+        """
+        Applies a frame of the primary to the server.
+
+        Args:
+            frame (dict): The frame.
+        """
+        server = self.server
+        if frame.get("sync_start"):
+            self._primary_stopping = False  # the primary is back
+            self._seen = (set(), set())
+            server.ratings.load(frame["ratings"])
+        for player_id in frame.get("removed_players", ()):
+            self._remove_player(player_id)
+        for game_id in frame.get("removed_games", ()):
+            server.games.pop(str(game_id), None)
+            self._max_game_id = max(self._max_game_id, game_id)
+        for row in frame.get("players", ()):
+            self._apply_player(row)
+        for row in frame.get("games", ()):
+            game = restore_game(row, server.version_clock, server.players)
+            server.games[str(game.game_id)] = game
+            self._max_game_id = max(self._max_game_id, game.game_id)
+            if self._seen is not None:
+                self._seen[1].add(str(game.game_id))
+        for record in frame.get("records", ()):
+            server._record(record)
+        self._version = frame.get("version", self._version)
+        if frame.get("sync_end"):
+            self._sweep()
+            self.synced = True
+            print(f"Sincronizzati {len(server.players)} giocatori e {len(server.games)} partite")
+        if frame.get("stopping"):
+            self._primary_stopping = True
+            print("Il primario si sta fermando: attendo che torni")
+        self.frames += 1
+
+    def _apply_player(self, row):
+        server = self.server
+        player_id, player_name, general_score, game_id = row
+        if player_id not in server.players:
+            if player_name in server.players:
+                # the name belonged to a player who left while the standby was not connected
+                self._remove_player(server.players.resolve(player_name))
+            server.players.add(player_name, player_id)
+        server.players_score[player_id] = general_score
+        if game_id is None:
+            server.players_game.pop(player_id, None)
+        else:
+            server.players_game[player_id] = game_id
+        self._max_player_id = max(self._max_player_id, player_id)
+        if self._seen is not None:
+            self._seen[0].add(player_id)
+
+    def _remove_player(self, player_id):
+        server = self.server
+        if player_id in server.players:
+            server.players.remove(player_id)
+        server.players_score.pop(player_id, None)
+        server.players_game.pop(player_id, None)
+        self._max_player_id = max(self._max_player_id, player_id)
+
+    def _sweep(self):
+        """
+        Ends a full synchronization: what the primary did not send is gone.
+        """
+        players, games = self._seen
+        self._seen = None
+        for player_id, _ in self.server.players.items():
+            if player_id not in players:
+                self._remove_player(player_id)
+        for game_id in [game_id for game_id in self.server.games if game_id not in games]:
+            del self.server.games[game_id]
+
+    def _take_over(self):
+        """
+        Prepares the server to serve the calls: the versions move past the ones of the primary, the clients
+        resynchronize all their fields and the players without an opponent start waiting again.
+        """
+        server = self.server
+        restored_version = server.version_clock.restore(self._version)
+        server.players.next_id = IdCounter(self._max_player_id + 1)
+        server.game_ids = IdCounter(self._max_game_id + 1)
+        for game in server.games.values():
+            game.version = restored_version
+            if len(game.players) == 1:
+                server.waiting.add(game.game_id, server.ratings.rating(game.name_of(game.players[0])))
+        server.registry_versions.update({("game_id", player): restored_version for player in server.players_game})
+        server.read_views.publish_all(server)
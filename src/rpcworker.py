@@ -0,0 +1,218 @@
+# rpcworker.py
+
+import time
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+from src.clientcore import ClientListener
+from src.tracing import QUEUE, DELIVER
+
+STOP_TIMEOUT = 5  # Seconds the GUI waits at exit for the calls still queued on the worker
+
+
+class _Runner(QObject):
+    """
+    The object living on the thread of an RpcWorker: runs the submitted calls and reports their outcome.
+    """
+    completed = pyqtSignal(object, object, object, object, object, float)  # key, callback, result, error, trace, time
+
+    def __init__(self, tracer):
+        super().__init__()
+        self.tracer = tracer
+
+    @pyqtSlot(object, object, object, object, object)
+    def run(self, function, args, key, callback, trace):
+        if trace is None:
+            try:
+                result, error = function(*args), None
+            except Exception as e:  # reported to the callback on the GUI thread
+                result, error = None, e
+            self.completed.emit(key, callback, result, error, None, 0.0)
+            return
+        trace.span(QUEUE, function.__name__, trace.started, time.perf_counter() - trace.started)
+        with self.tracer.activate(trace):
+            try:
+                result, error = function(*args), None
+            except Exception as e:
+                result, error = None, e
+        self.completed.emit(key, callback, result, error, trace, time.perf_counter())
+
+
+class RpcWorker(QObject):
+    """
+    Runs the calls to the game server on a QThread of its own, so the Qt event loop never waits for the network. The
+    GUI submits a function with a callback; the worker runs the functions one after the other, in the order they were
+    submitted, and the callback is invoked on the GUI thread with the result or the exception.
+
+    A call submitted with a key is coalesced: while a call with the same key is queued or running, submitting another
+    one is a no-op, so a slow server delays the periodic refreshes instead of accumulating a backlog of them.
+
+    A Pyro5 proxy belongs to one thread: the functions must use a PooledServer (which connects the worker thread on
+    its first call) or a proxy claimed on the worker thread, and the session hooks of the pool must be registered by
+    a function run on the worker (see ProxyPool.add_session_hook).
+
+    With a tracer, every call is a trace: the time it waits for the worker, the remote calls it makes (which carry
+    its correlation id, see ProxyPool) and the time its result waits for the Qt event loop.
+
+    Attributes:
+        thread (QThread): The thread running the calls.
+        tracer (Tracer or None): The tracer of the calls, None to disable it.
+        calls (int): The number of calls completed.
+        coalesced (int): The number of calls dropped because one with the same key was pending.
+    """
+    _submitted = pyqtSignal(object, object, object, object, object)  # function, args, key, callback, trace
+
+    def __init__(self, tracer=None):
+        """
+        Initialize the RpcWorker and start its thread. It must be created on the GUI thread.
+
+        Args:
+            tracer (Tracer, optional): The tracer of the calls. Defaults to None (no tracing).
+        """
+        super().__init__()
+        self.tracer = tracer
+        self.calls = 0
+        self.coalesced = 0
+        self._pending = set()  # keys of the coalesced calls queued or running
+        self.thread = QThread()
+        self._runner = _Runner(tracer)
+        self._runner.moveToThread(self.thread)
+        self._submitted.connect(self._runner.run)
+        self._runner.completed.connect(self._deliver)
+        self.thread.start()
+
+    def submit(self, function, *args, key=None, callback=None):
+        """
+        Queues a call on the worker thread. Must be called on the GUI thread.
+
+        Args:
+            function (callable): The function to run on the worker thread.
+            *args: The arguments of the function.
+            key (hashable, optional): The key of a coalesced call. Defaults to None (the call is always queued).
+            callback (callable, optional): Function called on the GUI thread with the result and the exception (None
+                if the call succeeded). Defaults to None (an exception is printed).
+
+        Returns:
+            bool: False if the call has been coalesced with a pending one, True otherwise.
+        """
+        if key is not None:
+            if key in self._pending:
+                self.coalesced += 1
+                return False
+            self._pending.add(key)
+        self._submitted.emit(function, args, key, callback, self.tracer.begin() if self.tracer is not None else None)
+        return True
+
+    def pending(self, key):
+        """
+        Tells if a coalesced call is queued or running.
+
+        Args:
+            key (hashable): The key of the call.
+
+        Returns:
+            bool: True if the call has not completed yet.
+        """
+        return key in self._pending
+
+    @pyqtSlot(object, object, object, object, object, float)
+    def _deliver(self, key, callback, result, error, trace, completed_at):
+        self._pending.discard(key)
+        self.calls += 1
+        if trace is not None:
+            method = trace.spans[0][1]  # the name of the function, recorded by the queue span
+            trace.span(DELIVER, method, completed_at, time.perf_counter() - completed_at)
+            self.tracer.finish(trace)
+        if callback is not None:
+            callback(result, error)
+        elif error is not None:
+            print(f"Call to the game server failed: {type(error).__name__} {error}")
+
+    @pyqtSlot()
+    def stop(self, timeout=STOP_TIMEOUT):
+        """
+        Runs the calls already submitted, then stops the thread. The callbacks of the last calls are not invoked if
+        the Qt event loop is not running anymore.
+
+        Args:
+            timeout (float, optional): Maximum time to wait for the thread in seconds. Defaults to STOP_TIMEOUT.
+
+        Returns:
+            bool: True if the thread has stopped within the timeout.
+        """
+        if not self.thread.isRunning():
+            return True
+        self._submitted.emit(self.thread.quit, (), None, None, None)
+        return self.thread.wait(int(timeout * 1000))
+
+
+class ListenerBridge(QObject, ClientListener):
+    """
+    The ClientListener of a core driven by an RpcWorker: the hooks, called by the core on the worker thread, are
+    forwarded through a queued signal and invoked on the listener on the GUI thread, in the order they were called.
+
+    Attributes:
+        listener (ClientListener): The listener updating the GUI.
+    """
+    _event = pyqtSignal(str, object)  # name of the method, arguments
+
+    def __init__(self, listener):
+        """
+        Initialize the ListenerBridge. It must be created on the GUI thread.
+
+        Args:
+            listener (ClientListener): The listener updating the GUI.
+        """
+        super().__init__()
+        self.listener = listener
+        self._event.connect(self._dispatch)
+
+    def forward(self, method, *args):
+        """
+        Calls a method of the listener on the GUI thread, e.g. to report an error raised on the worker thread.
+
+        Args:
+            method (str): The name of the method.
+            *args: The arguments of the method.
+        """
+        self._event.emit(method, args)
+
+    @pyqtSlot(str, object)
+    def _dispatch(self, method, args):
+        getattr(self.listener, method)(*args)
+
+    def on_match_started(self, opponent_name):
+        self.forward("on_match_started", opponent_name)
+
+    def on_move_made(self, choice):
+        self.forward("on_move_made", choice)
+
+    def on_round_over(self, result, winner_of_series):
+        self.forward("on_round_over", result, winner_of_series)
+
+    def on_rematch_available(self):
+        self.forward("on_rematch_available")
+
+    def on_rematch_unavailable(self):
+        self.forward("on_rematch_unavailable")
+
+    def on_waiting(self, position, estimated_wait):
+        self.forward("on_waiting", position, estimated_wait)
+
+    def on_opponent_left(self, opponent_name, awarded_win):
+        self.forward("on_opponent_left", opponent_name, awarded_win)
+
+    def on_new_round(self, num_of_match, new_match, score):
+        self.forward("on_new_round", num_of_match, new_match, score)
+
+    def on_score_changed(self, score):
+        self.forward("on_score_changed", score)
+
+    def on_general_score_changed(self, general_score):
+        self.forward("on_general_score_changed", general_score)
+
+    def on_rematch_started(self):
+        self.forward("on_rematch_started")
+
+    def on_unregistered(self, timed_out):
+        self.forward("on_unregistered", timed_out)
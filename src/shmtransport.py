@@ -0,0 +1,501 @@
+# shmtransport.py
+
+import os
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from src.batch import error_from_outcome
+from src.enums import MatchStatus, Move, Result
+
+MAGIC = b"MORRASHM"  # Marker at the start of a segment
+LAYOUT_VERSION = 1  # Version of the layout of the records, checked when a client attaches
+DEFAULT_CHANNELS = 16  # Number of channels of a segment: one per client process (or thread)
+DEFAULT_CAPACITY = 16  # Number of records of a ring
+RECORD_SIZE = 256  # Size in bytes of a slot of a ring
+TEXT_SIZE = 200  # Size in bytes of the text of a record (player name, error message)
+INDEX_SIZE = 64  # The head and the tail of a ring are on separate cache lines
+SPIN_POLLS = 2000  # Empty polls, each yielding the CPU, before the waiting side starts sleeping
+IDLE_SLEEP = 0.0002  # Sleep in seconds between two polls once the spinning is over
+CALL_TIMEOUT = 5.0  # Seconds a client waits for a response before giving up
+
+HEADER = struct.Struct("<8sHII")  # magic, layout version, channels, capacity
+INDEX = struct.Struct("<Q")
+# seq, operation, player id, argument, length of the text, text
+REQUEST = struct.Struct(f"<QBqqH{TEXT_SIZE}s")
+# seq, status, value, version, match status, game state, score, number of the match, general score, retry after,
+# length of the text, text
+RESPONSE = struct.Struct(f"<QBqqbbhhqdH{TEXT_SIZE}s")
+
+# operations
+OP_REGISTER = 1
+OP_UNREGISTER = 2
+OP_MAKE_CHOICE = 3
+OP_STATE = 4
+OP_RESET = 5
+OP_REMATCH = 6
+OP_NEW_MATCH = 7
+
+# operations without arguments other than the player, and the GameServer methods running them
+PLAYER_OPS = {
+    OP_UNREGISTER: "unregister_player",
+    OP_RESET: "reset_state_after_single_match",
+    OP_REMATCH: "rematch",
+    OP_NEW_MATCH: "new_match",
+}
+
+# status of a response
+STATUS_NONE = 0  # the operation returned None
+STATUS_VALUE = 1  # the operation returned the integer in value
+STATUS_STATE = 2  # the fields of the player are in the response
+STATUS_ERROR = 3  # the text is the name and the message of the exception
+
+# yields the CPU to the other side, which may be waiting to run on the same core
+yield_cpu = getattr(os, "sched_yield", lambda: time.sleep(0))
+
+_created = set()  # names of the segments created by a pump of this process
+
+# codes of the fields, 0 for None
+MOVES = [None] + [move.value for move in Move]
+MATCH_STATUSES = [None] + [status.value for status in MatchStatus]
+GAME_STATES = [None] + [result.value for result in Result]
+
+
+def encode_text(*parts):
+    """
+    Encodes the text of a record: the parts joined by NUL characters, truncated to TEXT_SIZE bytes.
+
+    Args:
+        *parts (str or None): The parts; None is encoded as an empty part.
+
+    Returns:
+        tuple: The length of the text and its bytes.
+    """
+    data = "\0".join(part or "" for part in parts).encode()[:TEXT_SIZE]
+    return len(data), data
+
+
+def decode_text(length, data):
+    """
+    Decodes the text of a record.
+
+    Args:
+        length (int): The length of the text.
+        data (bytes): The text field.
+
+    Returns:
+        list: The parts of the text.
+    """
+    return data[:length].decode(errors="ignore").split("\0")
+
+
+class Ring:
+    """
+    Single-producer single-consumer ring of fixed-size records in a shared memory buffer. The producer writes a
+    record and then advances the head, the consumer reads it and then advances the tail: each index is written by
+    one side only, so no lock is needed between the processes.
+
+    Attributes:
+        buf (memoryview): The shared memory buffer.
+        offset (int): The offset of the ring in the buffer.
+        capacity (int): The number of records.
+    """
+
+    def __init__(self, buf, offset, capacity):
+        """
+        Initialize a Ring on an area of a buffer.
+
+        Args:
+            buf (memoryview): The shared memory buffer.
+            offset (int): The offset of the ring in the buffer.
+            capacity (int): The number of records.
+        """
+        self.buf = buf
+        self.offset = offset
+        self.capacity = capacity
+        self._head = offset
+        self._tail = offset + INDEX_SIZE
+        self._slots = offset + 2 * INDEX_SIZE
+
+    @staticmethod
+    def size(capacity):
+        """
+        Gets the size in bytes of a ring.
+
+        Args:
+            capacity (int): The number of records.
+
+        Returns:
+            int: The size.
+        """
+        return 2 * INDEX_SIZE + capacity * RECORD_SIZE
+
+    def head(self):
+        """
+        Gets the number of records written since the ring was created.
+
+        Returns:
+            int: The head index.
+        """
+        return INDEX.unpack_from(self.buf, self._head)[0]
+
+    def full(self):
+        return self.head() - INDEX.unpack_from(self.buf, self._tail)[0] >= self.capacity
+
+    def put(self, record, *values):
+        """
+        Writes a record, if the ring is not full.
+
+        Args:
+            record (struct.Struct): The layout of the record.
+            *values: The fields of the record.
+
+        Returns:
+            bool: True if the record was written, False if the ring is full.
+        """
+        if self.full():
+            return False
+        head = self.head()
+        record.pack_into(self.buf, self._slots + head % self.capacity * RECORD_SIZE, *values)
+        INDEX.pack_into(self.buf, self._head, head + 1)
+        return True
+
+    def get(self, record):
+        """
+        Reads the oldest record, if any.
+
+        Args:
+            record (struct.Struct): The layout of the record.
+
+        Returns:
+            tuple or None: The fields of the record, None if the ring is empty.
+        """
+        tail = INDEX.unpack_from(self.buf, self._tail)[0]
+        if tail == INDEX.unpack_from(self.buf, self._head)[0]:
+            return None
+        values = record.unpack_from(self.buf, self._slots + tail % self.capacity * RECORD_SIZE)
+        INDEX.pack_into(self.buf, self._tail, tail + 1)
+        return values
+
+
+def channel_rings(buf, channel, capacity):
+    """
+    Gets the request and the response rings of a channel of a segment.
+
+    Returns:
+        tuple: The request ring and the response ring.
+    """
+    offset = INDEX_SIZE + channel * 2 * Ring.size(capacity)  # the header fills the first cache line
+    return Ring(buf, offset, capacity), Ring(buf, offset + Ring.size(capacity), capacity)
+
+
+def segment_size(channels, capacity):
+    return INDEX_SIZE + channels * 2 * Ring.size(capacity)
+
+
+class ShmPump:
+    """
+    Server side of the shared-memory transport, for bots and simulators running on the same host as the server: a
+    thread polls the request rings of the channels and applies the requests to the same GameServer the Pyro5 daemon
+    serves, through its regular methods (rate limiting, history and spectators included), then writes the responses.
+    Only the core operations of a bot have a fixed-size record: register, unregister, make_choice, the state query
+    and the resets between the rounds and the series; everything else goes through Pyro5.
+
+    Attributes:
+        server (GameServer): The game server.
+        name (str): The name of the shared memory segment.
+        channels (int): The number of channels.
+        capacity (int): The number of records of a ring.
+    """
+
+    def __init__(self, server, name, channels=DEFAULT_CHANNELS, capacity=DEFAULT_CAPACITY):
+        """
+        Initialize the ShmPump and create the shared memory segment. A segment left behind by a server that did not
+        stop cleanly is replaced.
+
+        Args:
+            server (GameServer): The game server.
+            name (str): The name of the segment.
+            channels (int, optional): The number of channels. Defaults to DEFAULT_CHANNELS.
+            capacity (int, optional): The number of records of a ring. Defaults to DEFAULT_CAPACITY.
+        """
+        self.server = server
+        self.name = name
+        self.channels = channels
+        self.capacity = capacity
+        size = segment_size(channels, capacity)
+        try:
+            self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            print(f"Rimosso il segmento di memoria condivisa {name} rimasto da un'esecuzione precedente")
+            self._shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _created.add(name)
+        self._shm.buf[:size] = bytes(size)
+        HEADER.pack_into(self._shm.buf, 0, MAGIC, LAYOUT_VERSION, channels, capacity)
+        self._rings = [channel_rings(self._shm.buf, channel, capacity) for channel in range(channels)]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="shm-pump", daemon=True)
+
+    def start(self):
+        """
+        Starts polling the channels.
+
+        Returns:
+            ShmPump: The pump itself.
+        """
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        idle = 0
+        while not self._stop.is_set():
+            served = 0
+            for requests, responses in self._rings:
+                served += self._serve(requests, responses)
+            if served:
+                idle = 0
+            else:
+                # a short spin keeps the latency low under load, the sleep frees the CPU when the bots are idle
+                idle += 1
+                if idle < SPIN_POLLS:
+                    yield_cpu()
+                else:
+                    time.sleep(IDLE_SLEEP)
+
+    def _serve(self, requests, responses):
+        """
+        Serves the pending requests of a channel, as long as the response ring has room.
+
+        Returns:
+            int: The number of requests served.
+        """
+        served = 0
+        while not responses.full():
+            request = requests.get(REQUEST)
+            if request is None:
+                break
+            responses.put(RESPONSE, *self._dispatch(*request))
+            served += 1
+        if served:
+            self.server.metrics.incr("shm.calls", served)
+        return served
+
+    def _dispatch(self, seq, op, player, argument, length, text):
+        """
+        Runs a request on the server.
+
+        Returns:
+            tuple: The fields of the response.
+        """
+        value = version = general_score = 0
+        match_status = game_state = score = num_of_match = 0
+        retry_after = 0.0
+        response_text = b""
+        try:
+            if op == OP_REGISTER:
+                status, value = STATUS_VALUE, self.server.register_player(decode_text(length, text)[0])
+            elif op == OP_MAKE_CHOICE:
+                if not 0 < argument < len(MOVES):
+                    raise ValueError(f"Unknown move code {argument}")
+                status, value = STATUS_VALUE, int(self.server.make_choice(player, MOVES[argument]))
+            elif op == OP_STATE:
+                state = self.server.get_changes_since(player, 0)
+                fields = state["changes"]
+                status, version = STATUS_STATE, state["version"]
+                status_value = fields["match_status"]
+                match_status = MATCH_STATUSES.index(MatchStatus(status_value).value if status_value else None)
+                game_state = GAME_STATES.index(fields["game_state"])
+                score, num_of_match = fields["score"], fields["num_of_match"]
+                general_score = fields["general_score"]
+                length, response_text = encode_text(fields["opponent_name"], fields["winner_of_series"])
+            elif op in PLAYER_OPS:
+                result = getattr(self.server, PLAYER_OPS[op])(player)
+                status = STATUS_NONE if result is None else STATUS_VALUE
+                value = int(result or 0)
+            else:
+                raise ValueError(f"Unknown operation {op}")
+        except Exception as e:
+            self.server.metrics.incr("shm.errors")
+            status = STATUS_ERROR
+            retry_after = float(getattr(e, "retry_after", 0.0))
+            message = getattr(e, "message", None) or (str(e.args[0]) if e.args else "")
+            length, response_text = encode_text(type(e).__name__, message)
+        if status != STATUS_STATE and status != STATUS_ERROR:
+            length = 0
+        return (seq, status, value, version, match_status, game_state, score, num_of_match, general_score,
+                retry_after, length, response_text)
+
+    def stop(self):
+        """
+        Stops polling and removes the shared memory segment.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._rings = []
+        self._shm.close()
+        self._shm.unlink()
+        _created.discard(self.name)
+
+
+class ShmClient:
+    """
+    Client side of the shared-memory transport, for simulators and benchmarks calling the server directly. It has
+    only the methods of the GameServer carried by the transport, with the same arguments and results; it is not a
+    stand-in for the server object of a ClientCore, which also needs execute_batch, is_registered and
+    get_lobby_status. get_changes_since always returns all the fields, as for version 0. A channel serves one client
+    at a time: every client process (or thread) uses its own channel.
+
+    Attributes:
+        name (str): The name of the shared memory segment.
+        channel (int): The channel of the client.
+        timeout (float): Seconds a call waits for its response.
+    """
+
+    def __init__(self, name, channel=0, timeout=CALL_TIMEOUT):
+        """
+        Initialize the ShmClient and attach it to the segment of a running server.
+
+        Args:
+            name (str): The name of the segment (the --shm option of the server).
+            channel (int, optional): The channel of the client. Defaults to 0.
+            timeout (float, optional): Seconds a call waits for its response. Defaults to CALL_TIMEOUT.
+
+        Raises:
+            FileNotFoundError: If no server has created the segment.
+            ValueError: If the segment has another layout or does not have the channel.
+        """
+        self.name = name
+        self.channel = channel
+        self.timeout = timeout
+        self._shm = shared_memory.SharedMemory(name)
+        if name not in _created:
+            # the segment belongs to the server: the resource tracker must not remove it when the client exits
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        magic, layout, channels, capacity = HEADER.unpack_from(self._shm.buf, 0)
+        if magic != MAGIC or layout != LAYOUT_VERSION:
+            self._shm.close()
+            raise ValueError(f"Segment {name} is not a shared-memory transport of layout {LAYOUT_VERSION}.")
+        if not 0 <= channel < channels:
+            self._shm.close()
+            raise ValueError(f"Segment {name} has channels 0-{channels - 1}, got {channel}.")
+        self._requests, self._responses = channel_rings(self._shm.buf, channel, capacity)
+        self._seq = self._requests.head()
+
+    def _wait(self, poll):
+        polls = 0
+        deadline = None
+        while True:
+            result = poll()
+            if result is not None and result is not False:
+                return result
+            polls += 1
+            if polls < SPIN_POLLS:
+                yield_cpu()
+                continue
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + self.timeout
+            elif now > deadline:
+                raise TimeoutError(f"No response from the server on {self.name}, channel {self.channel}.")
+            time.sleep(IDLE_SLEEP)
+
+    def _call(self, op, player=0, argument=0, text=b"", length=0):
+        """
+        Sends a request and waits for its response; the responses of the calls abandoned by a previous client of
+        the channel are skipped.
+
+        Raises:
+            TimeoutError: If the server does not respond within timeout.
+            Exception: The exception raised by the operation on the server.
+
+        Returns:
+            tuple: The fields of the response.
+        """
+        self._seq += 1
+        seq = self._seq
+        self._wait(lambda: self._requests.put(REQUEST, seq, op, player, argument, length, text))
+
+        def response():
+            record = self._responses.get(RESPONSE)
+            return record if record is not None and record[0] == seq else None
+
+        record = self._wait(response)
+        if record[1] == STATUS_ERROR:
+            name, message = (decode_text(record[10], record[11]) + [""])[:2]
+            args = [message, record[9]] if record[9] else [message]
+            raise error_from_outcome({"error": name, "args": args})
+        return record
+
+    def register_player(self, player_name):
+        """
+        Registers a player (see GameServer.register_player).
+
+        Raises:
+            ValueError: If the name is longer than TEXT_SIZE bytes, or already taken.
+
+        Returns:
+            int: The id of the player.
+        """
+        if len(player_name.encode()) > TEXT_SIZE:
+            raise ValueError(f"A name sent through shared memory can be at most {TEXT_SIZE} bytes long.")
+        length, text = encode_text(player_name)
+        return self._call(OP_REGISTER, text=text, length=length)[2]
+
+    def unregister_player(self, player):
+        self._call(OP_UNREGISTER, player)
+
+    def make_choice(self, player, choice):
+        """
+        Registers the move of a player (see GameServer.make_choice).
+
+        Returns:
+            bool: True if both moves have been registered and the winner is determined, False otherwise.
+        """
+        return bool(self._call(OP_MAKE_CHOICE, player, MOVES.index(choice))[2])
+
+    def reset_state_after_single_match(self, player):
+        self._call(OP_RESET, player)
+
+    def rematch(self, player):
+        """
+        Requests a rematch (see GameServer.rematch).
+
+        Returns:
+            bool or None: The result of GameServer.rematch.
+        """
+        record = self._call(OP_REMATCH, player)
+        return bool(record[2]) if record[1] == STATUS_VALUE else None
+
+    def new_match(self, player):
+        self._call(OP_NEW_MATCH, player)
+
+    def get_changes_since(self, player, version=0):
+        """
+        Gets all the fields seen by a player (see GameServer.get_changes_since); the version is ignored.
+
+        Returns:
+            dict: The "version" and the "changes", with every field.
+        """
+        record = self._call(OP_STATE, player)
+        opponent_name, winner_of_series = (decode_text(record[10], record[11]) + [""])[:2]
+        return {"version": record[3], "changes": {
+            "game_state": GAME_STATES[record[5]],
+            "score": record[6],
+            "match_status": MATCH_STATUSES[record[4]],
+            "winner_of_series": winner_of_series or None,
+            "num_of_match": record[7],
+            "opponent_name": opponent_name or None,
+            "general_score": record[8],
+        }}
+
+    def close(self):
+        """
+        Detaches the client from the segment.
+        """
+        self._requests = self._responses = None
+        self._shm.close()
@@ -0,0 +1,437 @@
+# snapshot.py
+
+import gc
+import itertools
+import mmap
+import os
+import pickle
+import struct
+import time
+from array import array
+
+from src.players import IdCounter, PlayerTable
+
+MAGIC = b"MCSNAP01"  # First bytes of a snapshot file
+ALIGNMENT = 8  # The buffers of a snapshot file start at multiples of this offset
+_TABLE_ENTRY = struct.Struct("<QQ")  # (offset, length) of a buffer
+_COUNT = struct.Struct("<Q")
+
+
+class _CodeTable:
+    """
+    Maps the values of a column (moves, results, ...) to small integer codes, in order of appearance.
+    """
+
+    def __init__(self):
+        self.values = [None]
+        self._codes = {None: 0}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def capture(server):
+    """
+    Captures the state of a game server in a columnar layout: one array per field of the games, of the players and
+    of the ratings, plus the lists of the names and the statistics of the players. The arrays are sent out-of-band
+    by pickle protocol 5, so they are written to the snapshot file as raw buffers.
+
+    Args:
+        server (GameServer): The game server. It should not be serving calls, or the snapshot may mix the states
+            before and after a call.
+
+    Returns:
+        dict: The state.
+    """
+    games = list(server.games.values())
+    moves, results, statuses = _CodeTable(), _CodeTable(), _CodeTable()
+    columns = {name: array(typecode) for name, typecode in (
+        ("game_id", "q"), ("players", "B"), ("game_series", "h"), ("rematch_counter", "b"),
+        ("ready_to_play_again", "b"), ("winner_rewarded", "b"), ("match_status", "B"),
+        ("player", "q"), ("move", "H"), ("result", "H"), ("score", "q"))}
+    winners = []
+    for game in games:
+        columns["game_id"].append(game.game_id)
+        columns["players"].append(len(game.players))
+        columns["game_series"].append(game.game_series)
+        columns["rematch_counter"].append(game.rematch_counter)
+        columns["ready_to_play_again"].append(game.ready_to_play_again)
+        columns["winner_rewarded"].append(game.winner_rewarded)
+        columns["match_status"].append(statuses.code(game.match_status))
+        winners.append(game.winner)
+        for player in game.players:
+            columns["player"].append(player)
+            columns["move"].append(moves.code(game.moves.get(player)))
+            columns["result"].append(results.code(game.results.get(player)))
+            columns["score"].append(game.scores.get(player, 0))
+
+    players = server.players.items()
+    columns["player_id"] = array("q", (player_id for player_id, _ in players))
+    columns["general_score"] = array("q", (server.players_score.get(player_id, 0) for player_id, _ in players))
+    ratings = server.ratings.entries()
+    columns["rating"] = array("d", (rating for rating, _ in ratings.values()))
+    columns["rated_series"] = array("q", (series for _, series in ratings.values()))
+    return {
+        "created_at": time.time(),
+        # the counters, not the largest ids in use: the ids of the removed games and players are not handed out again
+        "next_game_id": server.game_ids.last + 1,
+        "next_player_id": server.players.next_id.last + 1,
+        "version": server.version_clock.current,
+        "moves": moves.values,
+        "results": results.values,
+        "match_statuses": [status.value if status is not None else None for status in statuses.values],
+        "names": [name for _, name in players],
+        "winners": winners,
+        "rated_names": list(ratings),
+        "analytics": server.analytics.state(),
+        "columns": {name: pickle.PickleBuffer(column) for name, column in columns.items()},
+        "typecodes": {name: column.typecode for name, column in columns.items()},
+    }
+
+
+def save(server, path):
+    """
+    Writes a snapshot of the state of a game server. The file is written next to the target and renamed, so a crash
+    never leaves a truncated snapshot.
+
+    Layout: MAGIC, the number of buffers, the (offset, length) of each buffer, the length of the pickle, the pickle
+    (protocol 5) and the buffers, aligned to ALIGNMENT.
+
+    Args:
+        server (GameServer): The game server.
+        path (str): The snapshot file.
+
+    Returns:
+        dict: The number of "games" and "players" saved and the "seconds" taken.
+    """
+    started = time.perf_counter()
+    state = capture(server)
+    buffers = []
+    header = pickle.dumps(state, protocol=5, buffer_callback=buffers.append)
+
+    offset = len(MAGIC) + _COUNT.size + len(buffers) * _TABLE_ENTRY.size + _COUNT.size + len(header)
+    table = []
+    for buffer in buffers:
+        offset += -offset % ALIGNMENT
+        length = buffer.raw().nbytes
+        table.append((offset, length))
+        offset += length
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(MAGIC)
+        file.write(_COUNT.pack(len(buffers)))
+        for entry in table:
+            file.write(_TABLE_ENTRY.pack(*entry))
+        file.write(_COUNT.pack(len(header)))
+        file.write(header)
+        for (offset, _), buffer in zip(table, buffers):
+            file.write(b"\0" * (offset - file.tell()))
+            file.write(buffer.raw())
+        file.flush()
+        os.fsync(file.fileno())
+    store = server.games.store
+    if isinstance(store, SnapshotStore) and store.maps(path):
+        store.materialize()  # the mapped file is replaced: the games not faulted in yet move to the cold store
+    os.replace(temporary, path)
+    return {"games": len(state["winners"]), "players": len(state["names"]),
+            "seconds": time.perf_counter() - started}
+
+
+def load(server, path):
+    """
+    Restores the state of a game server from a snapshot: the registry of the players with their general scores,
+    ratings and statistics, and the games. The file is memory-mapped and the games are not built at once: they are
+    put in front of the cold store of the server (see SnapshotStore) and faulted in from the mapped columns on their
+    first access, like the evicted games, so a restore only costs the rebuild of the registry.
+
+    The per-field versions of the delta sync are not saved: every player is marked as moved to another game, so the
+    clients resynchronize all their fields once. The ratings and the statistics rebuilt from a history (--history)
+    are kept, since the history is more recent than the snapshot.
+
+    Args:
+        server (GameServer): A game server without games.
+        path (str): The snapshot file.
+
+    Raises:
+        ValueError: If the file is not a snapshot.
+
+    Returns:
+        dict: The number of "games" and "players" restored and the "seconds" taken.
+    """
+    started = time.perf_counter()
+    store = SnapshotStore(path, server.games.store)
+    # millions of entries are created at once: the cyclic collector would scan them over and over
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        _restore(server, store)
+    except BaseException:
+        store.release()
+        raise
+    finally:
+        if collecting:
+            gc.enable()
+    return {"games": len(store.state["winners"]), "players": len(store.state["names"]),
+            "seconds": time.perf_counter() - started}
+
+
+def _restore(server, store):
+    """
+    Rebuilds the registry of a server, its ratings and statistics from the columns of a snapshot, and puts the games
+    of the snapshot in front of its cold store.
+    """
+    state, columns = store.state, store.columns
+    clock = server.version_clock
+    # one conversion per column: iterating a list is much cheaper than iterating a memoryview
+    player_ids = columns["player_id"].tolist()
+    players = PlayerTable(state["next_player_id"])
+    for player_id, name in zip(player_ids, state["names"]):
+        players.add(name, player_id)
+    restored_version = clock.restore(state["version"])
+
+    game_ids = columns["game_id"].tolist()
+    counts = columns["players"].tolist()
+    slots = list(itertools.accumulate(counts, initial=0))
+    seated = columns["player"].tolist()
+    store.index(game_ids, slots, restored_version)
+
+    server.players = players
+    server.games.store = store
+    server.players_game.update(zip(seated, itertools.chain.from_iterable(map(itertools.repeat, game_ids, counts))))
+    server.players_score.update(zip(player_ids, columns["general_score"].tolist()))
+    server.game_ids = IdCounter(state["next_game_id"])
+    if not server.history.last_seq and "rated_names" in state:
+        server.ratings.load({name: [rating, series] for name, rating, series in zip(
+            state["rated_names"], columns["rating"].tolist(), columns["rated_series"].tolist())})
+        server.analytics.load(state["analytics"])
+    for game_id, first, count in zip(game_ids, slots, counts):
+        if count == 1:  # the players waiting for an opponent start waiting again, with their rating
+            server.waiting.add(game_id, server.ratings.rating(players.name(seated[first])))
+    # the clients resynchronize all their fields, as if they had moved to another game; the views of the games are
+    # published as the games are faulted in (see GameServer._view_of)
+    server.registry_versions.update({("game_id", player): restored_version for player in seated})
+
+
+class SnapshotStore:
+    """
+    The games of a restored snapshot not accessed yet, read on demand from the columns of the memory-mapped file, in
+    front of the ColdStore of the server. It has the interface of a ColdStore, so TieredGames faults a restored game
+    in on its first access as it does for an evicted one, and the evicted games go to the ColdStore behind. The file
+    stays mapped until every restored game has been faulted in or removed.
+
+    Attributes:
+        path (str): The snapshot file.
+        store (ColdStore): The store of the games evicted since the restore.
+        state (dict): The state saved by capture(), whose columns are read in place from the file.
+        columns (dict): The columns, as memoryviews of the mapped file.
+    """
+
+    def __init__(self, path, store):
+        """
+        Initialize the SnapshotStore, mapping the file; index() gives it the games.
+
+        Args:
+            path (str): The snapshot file.
+            store (ColdStore): The store of the evicted games.
+
+        Raises:
+            ValueError: If the file is not a snapshot.
+        """
+        self.path = path
+        self.store = store
+        self.state = None
+        self.columns = {}
+        self._rows = {}  # game id -> index of its row in the columns of the games
+        self._slots = []  # index in the columns of the players of the first player of each row, and of the end
+        self._version = 0  # the version of the restored games
+        self._buffers = []
+        self._file = open(path, "rb")
+        self._mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mapped)
+        try:
+            if bytes(self._view[:len(MAGIC)]) != MAGIC:
+                raise ValueError(f"{path} is not a snapshot file")
+            position = len(MAGIC)
+            count, = _COUNT.unpack_from(self._mapped, position)
+            position += _COUNT.size
+            table = [_TABLE_ENTRY.unpack_from(self._mapped, position + i * _TABLE_ENTRY.size) for i in range(count)]
+            position += count * _TABLE_ENTRY.size
+            header_length, = _COUNT.unpack_from(self._mapped, position)
+            position += _COUNT.size
+            self._buffers = [self._view[offset:offset + length] for offset, length in table]
+            self.state = pickle.loads(self._view[position:position + header_length], buffers=self._buffers)
+            self.columns = {name: memoryview(column).cast(self.state["typecodes"][name])
+                            for name, column in self.state["columns"].items()}
+        except BaseException:
+            self.release()
+            raise
+
+    def index(self, game_ids, slots, version):
+        """
+        Sets the games served by the store.
+
+        Args:
+            game_ids (list): The id of the game of each row.
+            slots (list): The index of the first player of each row in the columns of the players, and of the end.
+            version (int): The version of the restored games.
+        """
+        self._rows = {str(game_id): index for index, game_id in enumerate(game_ids)}
+        self._slots = slots
+        self._version = version
+        if not self._rows:
+            self.release()
+
+    def _freeze(self, index):
+        """
+        Serializes the game of a row like tiering.freeze_game, with no field versions.
+        """
+        columns, state = self.columns, self.state
+        first, end = self._slots[index], self._slots[index + 1]
+        row = [columns["game_id"][index], columns["player"][first:end].tolist(),
+               [state["moves"][code] for code in columns["move"][first:end]],
+               [state["results"][code] for code in columns["result"][first:end]],
+               columns["score"][first:end].tolist(), columns["game_series"][index], columns["rematch_counter"][index],
+               columns["ready_to_play_again"][index], bool(columns["winner_rewarded"][index]),
+               state["match_statuses"][columns["match_status"][index]], state["winners"][index], None]
+        return pickle.dumps((row, [], self._version), pickle.HIGHEST_PROTOCOL)
+
+    def _drop(self, game_id):
+        if self._rows.pop(game_id, None) is not None and not self._rows:
+            self.release()  # every restored game has left the file
+
+    def put(self, game_id, data):
+        """
+        Stores a serialized game in the ColdStore.
+
+        Args:
+            game_id (str): The identifier of the game.
+            data (bytes): The serialized game.
+        """
+        self._drop(game_id)
+        self.store.put(game_id, data)
+
+    def take(self, game_id):
+        """
+        Removes a serialized game from the store.
+
+        Args:
+            game_id (str): The identifier of the game.
+
+        Raises:
+            KeyError: If the game is not in the store.
+
+        Returns:
+            bytes: The serialized game.
+        """
+        data = self.peek(game_id)
+        self.discard(game_id)
+        return data
+
+    def peek(self, game_id):
+        """
+        Reads a serialized game, leaving it in the store.
+
+        Args:
+            game_id (str): The identifier of the game.
+
+        Raises:
+            KeyError: If the game is not in the store.
+
+        Returns:
+            bytes: The serialized game.
+        """
+        if game_id in self.store:
+            return self.store.peek(game_id)
+        return self._freeze(self._rows[game_id])
+
+    def discard(self, game_id):
+        """
+        Removes a game from the store, if present.
+
+        Args:
+            game_id (str): The identifier of the game.
+        """
+        self.store.discard(game_id)
+        self._drop(game_id)
+
+    def ids(self):
+        """
+        Gets the identifiers of the stored games.
+
+        Returns:
+            list: The identifiers.
+        """
+        return self.store.ids() + list(self._rows)
+
+    @property
+    def size(self):
+        """
+        int: The bytes of the evicted games, and of the mapped file while it serves games.
+        """
+        return self.store.size + (len(self._mapped) if self._mapped is not None else 0)
+
+    @property
+    def compactions(self):
+        """
+        int: The number of times the file of the ColdStore has been compacted.
+        """
+        return self.store.compactions
+
+    def maps(self, path):
+        """
+        Tells if the store still maps a file.
+
+        Args:
+            path (str): The file.
+
+        Returns:
+            bool: True if the file is mapped by the store.
+        """
+        return self._mapped is not None and os.path.abspath(path) == os.path.abspath(self.path)
+
+    def materialize(self):
+        """
+        Moves the games not faulted in yet to the ColdStore and unmaps the file, e.g. before the file is replaced.
+        """
+        for game_id, index in list(self._rows.items()):
+            self.store.put(game_id, self._freeze(index))
+        self._rows = {}
+        self.release()
+
+    def release(self):
+        """
+        Unmaps the file. The games not faulted in yet are lost: see materialize().
+        """
+        self._rows = {}
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        if self.state is not None:
+            for column in self.state.pop("columns", {}).values():
+                column.release()
+        for buffer in self._buffers:
+            buffer.release()
+        self._buffers = []
+        if self._mapped is not None:
+            self._view.release()
+            self._mapped.close()
+            self._file.close()
+            self._mapped = None
+
+    def close(self):
+        """
+        Unmaps the file and closes the ColdStore.
+        """
+        self.release()
+        self.store.close()
+
+    def __contains__(self, game_id):
+        return game_id in self._rows or game_id in self.store
+
+    def __len__(self):
+        return len(self._rows) + len(self.store)
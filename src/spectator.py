@@ -0,0 +1,505 @@
+# spectator.py
+
+import argparse
+import functools
+import itertools
+import threading
+import time
+from collections import deque
+
+import Pyro5.api
+import Pyro5.errors
+
+from src.errors import RateLimitExceeded
+
+DEFAULT_QUEUE_SIZE = 16  # Number of events a subscriber can lag behind before its events are coalesced
+MAX_QUEUE_SIZE = 256  # Upper bound of the queue size a spectator can ask for
+CALLBACK_TIMEOUT = 1.0  # Timeout in seconds of a push to a spectator callback
+POLLING_INTERVAL = 0.5  # Interval in seconds between two polls of a polling spectator
+SUBSCRIPTION_TTL = 60  # Seconds without a poll after which a polling subscription is dropped
+
+
+class SubscriberQueue:
+    """
+    The bounded queue of the events not yet delivered to a spectator. Every event is a full view of the game, so
+    when a slow spectator lets the queue fill up the newest event replaces the last queued one: the spectator skips
+    intermediate states but always receives the latest one, and the memory used per spectator is bounded.
+
+    Attributes:
+        max_size (int): Maximum number of queued events.
+        coalesced (int): Number of events that replaced a queued one.
+    """
+    __slots__ = ("max_size", "coalesced", "_events")
+
+    def __init__(self, max_size=DEFAULT_QUEUE_SIZE):
+        """
+        Initialize an empty SubscriberQueue.
+
+        Args:
+            max_size (int, optional): Maximum number of queued events. Defaults to DEFAULT_QUEUE_SIZE.
+        """
+        self.max_size = max(1, max_size)
+        self.coalesced = 0
+        self._events = deque()
+
+    def put(self, event):
+        """
+        Queues an event, coalescing it with the last queued one if the queue is full.
+
+        Args:
+            event (dict): The event.
+        """
+        if len(self._events) >= self.max_size:
+            self._events[-1] = event
+            self.coalesced += 1
+        else:
+            self._events.append(event)
+
+    def drain(self):
+        """
+        Takes all the queued events.
+
+        Returns:
+            list: The events, oldest first.
+        """
+        events = list(self._events)
+        self._events.clear()
+        return events
+
+    def __len__(self):
+        return len(self._events)
+
+
+class Subscription:
+    """
+    A spectator subscribed to a game.
+
+    Attributes:
+        subscription_id (int): Identifier of the subscription.
+        game_id (str): Identifier of the watched game.
+        queue (SubscriberQueue): The events not yet delivered.
+        callback (Pyro5.api.Proxy or None): The spectator's callback object for push delivery, None for polling.
+        closed (bool): Flag set when the game is over and no more events will be published.
+        polled_at (float): Time of the subscription or of its last poll.
+    """
+    __slots__ = ("subscription_id", "game_id", "queue", "callback", "closed", "polled_at")
+
+    def __init__(self, subscription_id, game_id, max_queue, callback=None, now=0.0):
+        self.subscription_id = subscription_id
+        self.game_id = game_id
+        self.queue = SubscriberQueue(max_queue)
+        self.callback = callback
+        self.closed = False
+        self.polled_at = now
+
+
+class GameBroadcaster:
+    """
+    Fan-out of the game changes to the spectators. Each change is published once: the view of the game is built
+    once and queued by reference to every subscriber, so the cost of a change is O(subscribers) however often the
+    spectators look at the game. Spectators either poll their queue (poll) or receive the events on a callback
+    object, pushed by a single dispatcher thread with oneway calls. A polling spectator that stops polling is dropped
+    after ttl seconds (expire_idle), so it does not keep its game watched forever.
+
+    Attributes:
+        published (int): Number of events published.
+        delivered (int): Number of events delivered to spectators.
+        expired (int): Number of polling subscriptions dropped because they stopped polling.
+        ttl (float): Seconds without a poll after which a polling subscription is dropped.
+    """
+
+    def __init__(self, ttl=SUBSCRIPTION_TTL, clock=time.monotonic):
+        """
+        Initialize the GameBroadcaster.
+
+        Args:
+            ttl (float, optional): Seconds without a poll after which a polling subscription is dropped. Defaults to
+                SUBSCRIPTION_TTL.
+            clock (callable, optional): Monotonic clock used for the time of the polls.
+        """
+        self.published = 0
+        self.delivered = 0
+        self.expired = 0
+        self.ttl = ttl
+        self.clock = clock
+        self._subscriptions = {}
+        self._by_game = {}
+        self._games = {}  # watched Game objects, to tell a removed game from a new one with the same id
+        self._published_versions = {}
+        self._last_views = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._ready = deque()  # push subscriptions with pending events
+        self._ready_set = set()
+        self._wakeup = threading.Condition(self._lock)
+        self._dispatcher = None
+
+    def watched_games(self):
+        """
+        Gets the games with at least one spectator.
+
+        Returns:
+            list: The identifiers of the watched games.
+        """
+        return list(self._by_game)
+
+    def subscribers(self, game_id):
+        """
+        Gets the number of spectators of a game.
+
+        Args:
+            game_id (str): Identifier of the game.
+
+        Returns:
+            int: The number of spectators.
+        """
+        return len(self._by_game.get(game_id, ()))
+
+    def subscription_count(self):
+        """
+        Gets the number of subscriptions.
+
+        Returns:
+            int: The number of subscriptions.
+        """
+        return len(self._subscriptions)
+
+    def subscribe(self, game_id, game, max_queue=DEFAULT_QUEUE_SIZE, callback=None):
+        """
+        Subscribes a spectator to a game.
+
+        Args:
+            game_id (str): Identifier of the game.
+            game (Game): The game.
+            max_queue (int, optional): Maximum number of queued events. Defaults to DEFAULT_QUEUE_SIZE.
+            callback (Pyro5.api.Proxy, optional): Callback object with a game_updated(subscription_id, events)
+                method for push delivery. Defaults to None (the spectator polls).
+
+        Returns:
+            Subscription: The new subscription.
+        """
+        with self._lock:
+            subscription = Subscription(next(self._ids), game_id, max_queue, callback, self.clock())
+            self._subscriptions[subscription.subscription_id] = subscription
+            self._by_game.setdefault(game_id, {})[subscription.subscription_id] = subscription
+            self._games[game_id] = game
+            if callback is not None and self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="spectator-dispatcher",
+                                                    daemon=True)
+                self._dispatcher.start()
+        return subscription
+
+    def unsubscribe(self, subscription_id):
+        """
+        Removes a subscription.
+
+        Args:
+            subscription_id (int): Identifier of the subscription.
+        """
+        with self._lock:
+            self._remove(subscription_id)
+
+    def _remove(self, subscription_id):
+        """
+        Removes a subscription. The lock must be held.
+        """
+        subscription = self._subscriptions.pop(subscription_id, None)
+        if subscription is None:
+            return
+        game_subscriptions = self._by_game.get(subscription.game_id)
+        if game_subscriptions is not None:
+            game_subscriptions.pop(subscription_id, None)
+            if not game_subscriptions:
+                self._forget_game(subscription.game_id)
+
+    def _forget_game(self, game_id):
+        """
+        Forgets a game without spectators. The lock must be held.
+        """
+        self._by_game.pop(game_id, None)
+        self._games.pop(game_id, None)
+        self._published_versions.pop(game_id, None)
+        self._last_views.pop(game_id, None)
+
+    def publish(self, game_id, event, closed=False):
+        """
+        Publishes an event to all the spectators of a game.
+
+        Args:
+            game_id (str): Identifier of the game.
+            event (dict): The event, shared by all the subscribers: it must not be modified afterwards.
+            closed (bool, optional): Flag to indicate that this is the last event of the game. Defaults to False.
+        """
+        with self._lock:
+            self._publish(game_id, event, closed)
+
+    def _publish(self, game_id, event, closed=False):
+        """
+        Publishes an event to all the spectators of a game. The lock must be held.
+        """
+        game_subscriptions = self._by_game.get(game_id)
+        if not game_subscriptions:
+            return
+        self.published += 1
+        for subscription in game_subscriptions.values():
+            subscription.queue.put(event)
+            subscription.closed = closed
+            if subscription.callback is not None and subscription.subscription_id not in self._ready_set:
+                self._ready_set.add(subscription.subscription_id)
+                self._ready.append(subscription.subscription_id)
+        if closed:
+            # the subscriptions are dropped from the game; they live until their last events are delivered
+            self._forget_game(game_id)
+        if self._ready:
+            self._wakeup.notify()
+
+    def publish_changes(self, games):
+        """
+        Publishes the view of the watched games that changed since their last event, and a closing event for the
+        watched games that have been removed. Games without spectators cost nothing. The published versions are
+        compared and updated under the lock, so two threads publishing at once send each change once.
+
+        Args:
+            games (dict): The games of the server, keyed by game id.
+        """
+        if not self._games:
+            return
+        with self._lock:
+            for game_id, game in list(self._games.items()):
+                if games.get(game_id) is not game:
+                    self._publish(game_id, {"game_id": int(game_id), "closed": True}, closed=True)
+                elif game.version > self._published_versions.get(game_id, 0):
+                    self._published_versions[game_id] = game.version
+                    view = game.spectator_view()
+                    last_view = self._last_views.get(game_id)
+                    if last_view is not None and dict(last_view, version=view["version"]) == view:
+                        continue  # the change is not visible to the spectators
+                    self._last_views[game_id] = view
+                    self._publish(game_id, view)
+
+    def expire_idle(self):
+        """
+        Drops the polling subscriptions not polled for ttl seconds, e.g. of a spectator that crashed.
+
+        Returns:
+            int: The number of dropped subscriptions.
+        """
+        with self._lock:
+            deadline = self.clock() - self.ttl
+            idle = [subscription_id for subscription_id, subscription in self._subscriptions.items()
+                    if subscription.callback is None and subscription.polled_at < deadline]
+            for subscription_id in idle:
+                self._remove(subscription_id)
+            self.expired += len(idle)
+        return len(idle)
+
+    def poll(self, subscription_id):
+        """
+        Takes the events queued for a polling spectator.
+
+        Args:
+            subscription_id (int): Identifier of the subscription.
+
+        Raises:
+            KeyError: If the subscription does not exist.
+
+        Returns:
+            dict: The "events" and a "closed" flag, True if the game is over and the subscription has been removed.
+        """
+        with self._lock:
+            subscription = self._subscriptions[subscription_id]
+            subscription.polled_at = self.clock()
+            events = subscription.queue.drain()
+            self.delivered += len(events)
+            if subscription.closed:
+                self._remove(subscription_id)
+            return {"events": events, "closed": subscription.closed}
+
+    def _dispatch_loop(self):
+        """
+        Body of the dispatcher thread: pushes the pending events to the callbacks of the spectators.
+        """
+        while True:
+            with self._lock:
+                while not self._ready:
+                    self._wakeup.wait()
+                subscription_id = self._ready.popleft()
+                self._ready_set.discard(subscription_id)
+                subscription = self._subscriptions.get(subscription_id)
+                if subscription is None:
+                    continue
+                events = subscription.queue.drain()
+                closed = subscription.closed
+                if closed:
+                    self._remove(subscription_id)
+
+            try:
+                callback = subscription.callback
+                callback._pyroClaimOwnership()
+                callback._pyroTimeout = CALLBACK_TIMEOUT
+                callback.game_updated(subscription_id, events)
+                self.delivered += len(events)
+            except (Pyro5.errors.CommunicationError, Pyro5.errors.NamingError) as e:
+                print(f"Spettatore {subscription_id} non raggiungibile, iscrizione rimossa: {e}")
+                self.unsubscribe(subscription_id)
+                continue
+            if closed:
+                callback._pyroRelease()
+
+
+def publishes_changes(method):
+    """
+    Decorator for the GameServer methods that change the games: after the call the changes of the watched games
+    are published to their spectators.
+
+    Args:
+        method (callable): The method.
+
+    Returns:
+        callable: The decorated method.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.spectators.publish_changes(self.games)
+
+    return wrapper
+
+
+def format_event(event):
+    """
+    Formats an event of a watched game for printing.
+
+    Args:
+        event (dict): The event.
+
+    Returns:
+        str: The formatted event.
+    """
+    if event.get("closed"):
+        return f"Game {event['game_id']} is over."
+    score = " - ".join(f"{player} {score}" for player, score in event["scores"].items())
+    text = f"Game {event['game_id']}, match {event['num_of_match']}: {score} [{event['match_status']}]"
+    if event["moves"]:
+        text += " moves: " + ", ".join(f"{player} {move}" for player, move in event["moves"].items())
+    if event["winner_of_series"] is not None:
+        text += f" winner of the series: {event['winner_of_series']}"
+    return text
+
+
+class SpectatorCallback:
+    """
+    Callback object of a spectator receiving the events by push. Subclass it and override on_events(); the object
+    must be registered in a Pyro5 daemon of the spectator.
+    """
+
+    @Pyro5.api.expose
+    @Pyro5.api.oneway
+    def game_updated(self, subscription_id, events):
+        """
+        Receives the events of the watched game.
+
+        Args:
+            subscription_id (int): Identifier of the subscription.
+            events (list): The events, oldest first.
+        """
+        self.on_events(subscription_id, events)
+
+    def on_events(self, subscription_id, events):
+        """
+        Handles the events of the watched game. Prints them by default.
+
+        Args:
+            subscription_id (int): Identifier of the subscription.
+            events (list): The events, oldest first.
+        """
+        for event in events:
+            print(format_event(event))
+
+
+class _WatchCallback(SpectatorCallback):
+    """
+    Callback used by watch(): prints the events and signals the end of the game.
+    """
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def on_events(self, subscription_id, events):
+        super().on_events(subscription_id, events)
+        if any(event.get("closed") for event in events):
+            self.closed.set()
+
+
+def watch(server, game_id, push=False, callback_host="localhost", interval=POLLING_INTERVAL):
+    """
+    Watches a game until it is over, printing its events.
+
+    Args:
+        server (Pyro5.api.Proxy): Proxy of the game server.
+        game_id (int): Identifier of the game.
+        push (bool, optional): Receive the events on a callback object instead of polling. Defaults to False.
+        callback_host (str, optional): Host the callback daemon binds to, reachable by the server. Defaults to
+            "localhost".
+        interval (float, optional): Polling interval in seconds. Defaults to POLLING_INTERVAL.
+    """
+    if push:
+        callback = _WatchCallback()
+        with Pyro5.api.Daemon(host=callback_host) as daemon:
+            daemon.register(callback)
+            threading.Thread(target=daemon.requestLoop, args=(lambda: not callback.closed.is_set(),),
+                             daemon=True).start()
+            subscription = server.subscribe_spectator(game_id, callback=callback)
+            print(format_event(subscription["view"]))
+            try:
+                callback.closed.wait()
+            finally:
+                server.unsubscribe_spectator(subscription["subscription_id"])
+        return
+
+    subscription = server.subscribe_spectator(game_id)
+    print(format_event(subscription["view"]))
+    try:
+        while True:
+            try:
+                result = server.poll_spectator(subscription["subscription_id"])
+            except RateLimitExceeded as e:
+                time.sleep(e.retry_after)
+                continue
+            for event in result["events"]:
+                print(format_event(event))
+            if result["closed"]:
+                return
+            time.sleep(interval)
+    finally:
+        server.unsubscribe_spectator(subscription["subscription_id"])
+
+
+def main(argv=None):
+    """
+    Main function to watch a game, or to list the games if no game is given.
+    """
+    parser = argparse.ArgumentParser(description="Morra Cinese spectator.")
+    parser.add_argument("game_id", type=int, nargs="?", default=None, help="identifier of the game to watch")
+    parser.add_argument("--uri", default="PYRO:MorraCinese.game@localhost:55894", help="URI of the game server")
+    parser.add_argument("--push", action="store_true", help="receive the events on a callback instead of polling")
+    parser.add_argument("--callback-host", default="localhost", help="host the callback daemon binds to")
+    parser.add_argument("--interval", type=float, default=POLLING_INTERVAL, help="polling interval in seconds")
+    args = parser.parse_args(argv)
+
+    with Pyro5.api.Proxy(args.uri) as server:
+        if args.game_id is None:
+            for game in server.get_games():
+                print(f"Game {game['game_id']}: {', '.join(game['players'])} [{game['match_status']}] "
+                      f"{game['spectators']} spectator(s)")
+            return
+        try:
+            watch(server, args.game_id, args.push, args.callback_host, args.interval)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+# tiering.py
+
+import itertools
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from src.replication import game_row, restore_game
+
+HOT_GAMES = 10000  # Maximum number of games kept as objects before the least recently used are evicted
+IDLE_TIMEOUT = 300  # Seconds without any access after which a game is evicted
+MIN_IDLE = 1  # Seconds since the last access under which a game is never evicted, even over the hot-set size
+SWEEP_INTERVAL = 5  # Seconds between two passes evicting the idle games
+SWEEP_BATCH = 1000  # Maximum number of games evicted by a pass under the lock
+COMPACT_MIN = 1 << 20  # Bytes of holes under which the file of a cold store is never compacted
+
+
+def freeze_game(game):
+    """
+    Serializes a game for the cold store: its replicated state (see game_row) and the versions of its fields.
+
+    Args:
+        game (Game): The game.
+
+    Returns:
+        bytes: The serialized game.
+    """
+    return pickle.dumps((game_row(game), list(game.versions.items()), game.version), pickle.HIGHEST_PROTOCOL)
+
+
+def thaw_game(data, clock, players):
+    """
+    Rebuilds a game serialized by freeze_game.
+
+    Args:
+        data (bytes): The serialized game.
+        clock (VersionClock): The version clock of the server.
+        players (PlayerTable): The player table of the server.
+
+    Returns:
+        Game: The game, with the versions of its fields.
+    """
+    row, versions, version = pickle.loads(data)
+    game = restore_game(row, clock, players)
+    game.versions = dict(versions)
+    game.version = version
+    return game
+
+
+class ColdStore:
+    """
+    The serialized games evicted from the hot table, in memory or, with a path, appended to a file whose offsets are
+    indexed in memory. A game taken back leaves a hole in the file; the file is compacted once the holes outweigh
+    the stored games. The file only holds the games of the running server: it is emptied when the store is opened
+    (the snapshot is what survives a restart).
+
+    Attributes:
+        path (str or None): The file of the serialized games, None for an in-memory store.
+        size (int): The bytes of the serialized games held.
+        compactions (int): The number of times the file has been compacted.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize an empty ColdStore.
+
+        Args:
+            path (str, optional): The file of the serialized games. Defaults to None (in memory).
+        """
+        self.path = path
+        self.size = 0
+        self.compactions = 0
+        self._data = {}  # game id -> serialized game (in memory) or (offset, length) in the file
+        self._file = open(path, "w+b") if path is not None else None
+        self._end = 0  # offset of the end of the file
+        self._holes = 0  # bytes of the file no longer used
+
+    def put(self, game_id, data):
+        """
+        Stores a serialized game.
+
+        Args:
+            game_id (str): The identifier of the game.
+            data (bytes): The serialized game.
+        """
+        self.discard(game_id)
+        if self._file is None:
+            self._data[game_id] = data
+        else:
+            os.pwrite(self._file.fileno(), data, self._end)
+            self._data[game_id] = (self._end, len(data))
+            self._end += len(data)
+        self.size += len(data)
+
+    def take(self, game_id):
+        """
+        Removes a serialized game from the store.
+
+        Args:
+            game_id (str): The identifier of the game.
+
+        Raises:
+            KeyError: If the game is not in the store.
+
+        Returns:
+            bytes: The serialized game.
+        """
+        data = self.peek(game_id)
+        self.discard(game_id)
+        return data
+
+    def peek(self, game_id):
+        """
+        Reads a serialized game, leaving it in the store.
+
+        Args:
+            game_id (str): The identifier of the game.
+
+        Raises:
+            KeyError: If the game is not in the store.
+
+        Returns:
+            bytes: The serialized game.
+        """
+        entry = self._data[game_id]
+        if self._file is None:
+            return entry
+        offset, length = entry
+        return os.pread(self._file.fileno(), length, offset)
+
+    def discard(self, game_id):
+        """
+        Removes a game from the store, if present.
+
+        Args:
+            game_id (str): The identifier of the game.
+        """
+        entry = self._data.pop(game_id, None)
+        if entry is None:
+            return
+        length = len(entry) if self._file is None else entry[1]
+        self.size -= length
+        if self._file is not None:
+            self._holes += length
+            if self._holes > COMPACT_MIN and self._holes > self.size:
+                self._compact()
+
+    def _compact(self):
+        """
+        Rewrites the file with the stored games only.
+        """
+        entries = {game_id: self.peek(game_id) for game_id in self._data}
+        self._file.truncate(0)
+        self._data, self._end, self._holes, self.size = {}, 0, 0, 0
+        for game_id, data in entries.items():
+            self.put(game_id, data)
+        self.compactions += 1
+
+    def ids(self):
+        """
+        Gets the identifiers of the stored games.
+
+        Returns:
+            list: The identifiers.
+        """
+        return list(self._data)
+
+    def close(self):
+        """
+        Closes and removes the file of the store, if any.
+        """
+        if self._file is not None:
+            self._file.close()
+            os.remove(self.path)
+            self._file = None
+            self._data = {}
+            self.size = 0
+
+    def __contains__(self, game_id):
+        return game_id in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredGames(MutableMapping):
+    """
+    The games of a server, keyed by the game id as a string: a hot table of Game objects, in least recently used
+    order, and a ColdStore of the serialized games evicted by evict(). Reading a cold game faults it back into the
+    hot table, so the callers use it as a dictionary.
+
+    Iterating the values or the items (e.g. to save a snapshot) does not fault the cold games in: they are thawed as
+    detached copies, which must not be modified.
+
+    Attributes:
+        thaw (callable): Function rebuilding a game from its serialized form.
+        store (ColdStore): The evicted games.
+        hot_size (int): The maximum number of hot games; the least recently used beyond it are evicted.
+        idle_timeout (float): The seconds without access after which a game is evicted.
+        clock (callable): Monotonic clock of the accesses.
+        faults (int): The number of games faulted back in.
+        evictions (int): The number of games evicted.
+    """
+
+    def __init__(self, thaw, store=None, hot_size=HOT_GAMES, idle_timeout=IDLE_TIMEOUT, clock=time.monotonic):
+        """
+        Initialize an empty TieredGames.
+
+        Args:
+            thaw (callable): Function rebuilding a game from the bytes of freeze_game.
+            store (ColdStore, optional): The store of the evicted games. Defaults to an in-memory store.
+            hot_size (int, optional): The maximum number of hot games. Defaults to HOT_GAMES.
+            idle_timeout (float, optional): The seconds without access after which a game is evicted. Defaults to
+                IDLE_TIMEOUT.
+            clock (callable, optional): Monotonic clock of the accesses. Defaults to time.monotonic.
+        """
+        self.thaw = thaw
+        self.store = store if store is not None else ColdStore()
+        self.hot_size = hot_size
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.faults = 0
+        self.evictions = 0
+        self._hot = OrderedDict()  # game id -> game, least recently used first
+        self._accessed = {}  # game id -> time of the last access
+        self._lock = threading.RLock()
+
+    def __getitem__(self, game_id):
+        with self._lock:
+            game = self._hot.get(game_id)
+            if game is None:
+                game = self.thaw(self.store.take(game_id))
+                self._hot[game_id] = game
+                self.faults += 1
+            else:
+                self._hot.move_to_end(game_id)
+            self._accessed[game_id] = self.clock()
+            return game
+
+    def __setitem__(self, game_id, game):
+        with self._lock:
+            self.store.discard(game_id)
+            self._hot[game_id] = game
+            self._hot.move_to_end(game_id)
+            self._accessed[game_id] = self.clock()
+
+    def __delitem__(self, game_id):
+        with self._lock:
+            if game_id in self._hot:
+                del self._hot[game_id]
+                del self._accessed[game_id]
+            else:
+                self.store.take(game_id)
+
+    def __contains__(self, game_id):
+        return game_id in self._hot or game_id in self.store
+
+    def __iter__(self):
+        with self._lock:
+            game_ids = list(self._hot) + self.store.ids()
+        return iter(game_ids)
+
+    def __len__(self):
+        return len(self._hot) + len(self.store)
+
+    def items(self):
+        for game_id in list(self):
+            with self._lock:
+                game = self._hot.get(game_id)
+                data = self.store.peek(game_id) if game is None and game_id in self.store else None
+            if game is None and data is None:
+                continue  # removed meanwhile
+            yield game_id, game if game is not None else self.thaw(data)
+
+    def values(self):
+        return (game for _, game in self.items())
+
+    def is_hot(self, game_id):
+        """
+        Tells if a game is in the hot table.
+
+        Args:
+            game_id (str): The identifier of the game.
+
+        Returns:
+            bool: True if the game is hot.
+        """
+        return game_id in self._hot
+
+    def hot_count(self):
+        """
+        Gets the number of hot games.
+
+        Returns:
+            int: The number of hot games.
+        """
+        return len(self._hot)
+
+    def sample_hot(self, limit):
+        """
+        Gets some hot games without touching their last access, e.g. to measure them.
+
+        Args:
+            limit (int): The maximum number of games.
+
+        Returns:
+            list: The most recently used hot games, at most limit.
+        """
+        with self._lock:
+            return list(itertools.islice(reversed(self._hot.values()), limit))
+
+    def evict(self, pinned=None, limit=SWEEP_BATCH):
+        """
+        Moves to the cold store the games not accessed for idle_timeout seconds, and the least recently used ones
+        beyond hot_size that have not been accessed for MIN_IDLE seconds.
+
+        Args:
+            pinned (callable, optional): Function telling if a game (by id) must stay hot, e.g. a watched game.
+                Defaults to None (no game is pinned).
+            limit (int, optional): The maximum number of games evicted. Defaults to SWEEP_BATCH.
+
+        Returns:
+            list: The evicted games, detached from the table.
+        """
+        evicted = []
+        with self._lock:
+            now = self.clock()
+            excess = len(self._hot) - self.hot_size
+            for game_id in list(self._hot):
+                if len(evicted) >= limit:
+                    break
+                idle = now - self._accessed[game_id]
+                if idle < MIN_IDLE or (idle < self.idle_timeout and excess <= 0):
+                    break  # the games after it have been accessed later
+                if pinned is not None and pinned(game_id):
+                    continue
+                game = self._hot.pop(game_id)
+                del self._accessed[game_id]
+                self.store.put(game_id, freeze_game(game))
+                evicted.append(game)
+                excess -= 1
+            self.evictions += len(evicted)
+        return evicted
+
+
+class Sweeper:
+    """
+    Background thread that periodically evicts the idle games from the hot table.
+
+    Attributes:
+        sweep (callable): Function without arguments evicting the idle games, e.g. GameServer._evict_idle_games.
+        interval (float): Interval in seconds between two passes.
+    """
+
+    def __init__(self, sweep, interval=SWEEP_INTERVAL):
+        """
+        Initialize the Sweeper.
+
+        Args:
+            sweep (callable): Function without arguments evicting the idle games.
+            interval (float, optional): Interval in seconds between two passes. Defaults to SWEEP_INTERVAL.
+        """
+        self.sweep = sweep
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="sweeper", daemon=True)
+
+    def start(self):
+        """
+        Starts the passes.
+
+        Returns:
+            Sweeper: The sweeper itself.
+        """
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:  # a failed pass must not stop the next ones
+                print(f"Errore dell'evizione delle partite: {e!r}")
+
+    def stop(self):
+        """
+        Stops the passes.
+        """
+        self._stop.set()
+        self._thread.join()
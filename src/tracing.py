@@ -0,0 +1,342 @@
+# tracing.py
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import Pyro5.api
+
+SAMPLE_RATE = 0.01  # Fraction of the traces written
+SLOW_MS = 500  # Milliseconds over which a trace is written even if not sampled
+DISPATCH = "dispatch"  # Span of a call on the server, from the outermost decorator to the return
+LOGIC = "logic"  # Span of the body of a server method, lock waits included
+LOCK_WAIT = "lock_wait"  # Span of the wait for a contended lock on the server
+RTT = "rtt"  # Span of a remote call seen by the client, from the request to the response
+QUEUE = "queue"  # Span of a client call waiting on the RPC worker before running
+DELIVER = "deliver"  # Span of the result of a client call waiting for the Qt event loop
+
+_local = threading.local()  # the trace active on the thread
+
+
+class Trace:
+    """
+    The spans of one interaction, identified by the correlation id carried by its remote calls: a server request,
+    or on the client a call submitted to the RPC worker with the remote calls it makes.
+
+    Attributes:
+        trace_id (uuid.UUID): The correlation id.
+        spans (list): The spans recorded, as (name, method, start, seconds) with start on time.perf_counter.
+        started (float): The time.perf_counter at which the trace began.
+        wall (float): The time.time at which the trace began, to place the spans on a clock shared by the processes.
+    """
+
+    def __init__(self, trace_id):
+        """
+        Initialize an empty Trace.
+
+        Args:
+            trace_id (uuid.UUID): The correlation id.
+        """
+        self.trace_id = trace_id
+        self.spans = []
+        self.started = time.perf_counter()
+        self.wall = time.time()
+
+    def span(self, name, method, start, seconds):
+        """
+        Records a span.
+
+        Args:
+            name (str): The kind of span (DISPATCH, LOGIC, LOCK_WAIT, RTT, QUEUE, DELIVER).
+            method (str): The method called.
+            start (float): The time.perf_counter at which the span began.
+            seconds (float): The duration of the span.
+        """
+        self.spans.append((name, method, start, seconds))
+
+    def duration(self):
+        """
+        Gets the time from the beginning of the trace to the end of its last span.
+
+        Returns:
+            float: The seconds.
+        """
+        return max((start + seconds for _, _, start, seconds in self.spans), default=self.started) - self.started
+
+
+class Tracer:
+    """
+    Writes sampled traces to a local NDJSON file, one span per line, in the same format on the client and on the
+    server, so the files of both sides can be merged to follow one interaction (see main):
+
+        {"trace": "<correlation id>", "side": "client", "span": "rtt", "method": "execute_batch",
+         "start": <time.time>, "ms": <duration>, "pid": <process id>}
+
+    The sampling is decided by the correlation id, so a client and a server with the same sample_rate keep the same
+    traces (and a trace kept at a rate is kept at any higher rate). A trace slower than slow_ms is written anyway.
+
+    Attributes:
+        path (str): The file of the traces.
+        side (str): "client" or "server".
+        sample_rate (float): Fraction of the traces written.
+        slow_ms (float or None): Milliseconds over which a trace is written even if not sampled, None to write the
+            sampled traces only.
+        written (int): The number of traces written.
+    """
+
+    def __init__(self, path, side, sample_rate=SAMPLE_RATE, slow_ms=SLOW_MS):
+        """
+        Initialize the Tracer, appending to the file.
+
+        Args:
+            path (str): The file of the traces.
+            side (str): "client" or "server".
+            sample_rate (float, optional): Fraction of the traces written. Defaults to SAMPLE_RATE.
+            slow_ms (float, optional): Milliseconds over which a trace is always written. Defaults to SLOW_MS.
+        """
+        self.path = path
+        self.side = side
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.written = 0
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def sampled(self, trace_id):
+        """
+        Tells if a trace is sampled.
+
+        Args:
+            trace_id (uuid.UUID): The correlation id.
+
+        Returns:
+            bool: True if the trace is written whatever its duration.
+        """
+        return trace_id.int % 1000000 < self.sample_rate * 1000000
+
+    def begin(self, trace_id=None):
+        """
+        Begins a trace.
+
+        Args:
+            trace_id (uuid.UUID, optional): The correlation id. Defaults to None (a new one).
+
+        Returns:
+            Trace: The trace.
+        """
+        return Trace(trace_id if trace_id is not None else uuid.uuid4())
+
+    @contextlib.contextmanager
+    def activate(self, trace):
+        """
+        Makes a trace the active trace of the calling thread: the spans recorded on the thread go to it, and the
+        remote calls made through Pyro5 carry its correlation id.
+
+        Args:
+            trace (Trace): The trace.
+        """
+        previous = getattr(_local, "trace", None), Pyro5.api.current_context.correlation_id
+        _local.trace = trace
+        Pyro5.api.current_context.correlation_id = trace.trace_id
+        try:
+            yield trace
+        finally:
+            _local.trace, Pyro5.api.current_context.correlation_id = previous
+
+    def finish(self, trace):
+        """
+        Ends a trace, writing its spans if it is sampled or slow.
+
+        Args:
+            trace (Trace): The trace.
+        """
+        if not self.sampled(trace.trace_id) and (self.slow_ms is None or trace.duration() * 1000 < self.slow_ms):
+            return
+        trace_id = str(trace.trace_id)
+        lines = [json.dumps({"trace": trace_id, "side": self.side, "span": name, "method": method,
+                             "start": round(trace.wall + start - trace.started, 6), "ms": round(seconds * 1000, 3),
+                             "pid": self._pid}) + "\n" for name, method, start, seconds in trace.spans]
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.writelines(lines)
+            self._file.flush()
+            self.written += 1
+
+    def close(self):
+        """
+        Closes the file of the traces.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def current_trace():
+    """
+    Gets the active trace of the calling thread.
+
+    Returns:
+        Trace or None: The trace, None if no trace is active.
+    """
+    return getattr(_local, "trace", None)
+
+
+def traced(span):
+    """
+    Decorator for the GameServer methods: records a span of the call in the trace of the request, if the server
+    has a tracer. The outermost traced call of a thread begins the trace, with the correlation id sent by the client
+    (Pyro5 makes up one if the client sent none), and writes it when it returns.
+
+    Args:
+        span (str): DISPATCH for the outermost decorator of a method, LOGIC for the innermost.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            tracer = self.tracer
+            if tracer is None:
+                return method(self, *args, **kwargs)
+            trace = current_trace()
+            if trace is not None:
+                started = time.perf_counter()
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    trace.span(span, method.__name__, started, time.perf_counter() - started)
+            trace = tracer.begin(Pyro5.api.current_context.correlation_id)
+            with tracer.activate(trace):
+                started = time.perf_counter()
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    trace.span(span, method.__name__, started, time.perf_counter() - started)
+                    tracer.finish(trace)
+
+        return wrapper
+
+    return decorator
+
+
+class TracedLock:
+    """
+    A lock that records the waits for it in the active trace of the thread. Only the contended acquisitions are
+    recorded.
+
+    Attributes:
+        name (str): The name of the lock, the "method" of its spans.
+    """
+
+    def __init__(self, lock, name):
+        """
+        Initialize the TracedLock.
+
+        Args:
+            lock (threading.Lock or threading.RLock): The lock.
+            name (str): The name of the lock.
+        """
+        self._lock = lock
+        self.name = name
+
+    def acquire(self, blocking=True, timeout=-1):
+        trace = current_trace()
+        if trace is None:
+            return self._lock.acquire(blocking, timeout)
+        if self._lock.acquire(False):
+            return True
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        trace.span(LOCK_WAIT, self.name, started, time.perf_counter() - started)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def load_traces(paths):
+    """
+    Reads the spans of trace files, grouped by trace.
+
+    Args:
+        paths (list): The files written by the Tracers of the clients and of the servers.
+
+    Returns:
+        dict: The spans of every trace (by correlation id), sorted by start.
+    """
+    traces = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    span = json.loads(line)
+                    traces[span["trace"]].append(span)
+    for spans in traces.values():
+        spans.sort(key=lambda span: span["start"])
+    return traces
+
+
+def format_trace(trace_id, spans):
+    """
+    Formats the spans of a trace as a timeline, relative to the start of the first span.
+
+    Args:
+        trace_id (str): The correlation id.
+        spans (list): The spans, sorted by start.
+
+    Returns:
+        str: The timeline.
+    """
+    origin = spans[0]["start"]
+    end = max(span["start"] + span["ms"] / 1000 for span in spans)
+    lines = [f"trace {trace_id}: {(end - origin) * 1000:.1f} ms"]
+    for span in spans:
+        lines.append(f"  +{(span['start'] - origin) * 1000:9.1f} ms {span['ms']:9.1f} ms  {span['side']:<6} "
+                     f"{span['span']:<9} {span['method']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """
+    Merges the trace files of clients and servers and prints the timeline of the slowest traces, or of one trace.
+    """
+    parser = argparse.ArgumentParser(description="Reconstructs traces from the files of clients and servers.")
+    parser.add_argument("files", nargs="+", help="trace files (--trace of the client and of the server)")
+    parser.add_argument("--trace", default=None, help="correlation id of the trace to print")
+    parser.add_argument("--slowest", type=int, default=5, help="number of slowest traces to print")
+    args = parser.parse_args(argv)
+
+    traces = load_traces(args.files)
+    if args.trace is not None:
+        selected = [args.trace] if args.trace in traces else []
+    else:
+        def duration(trace_id):
+            spans = traces[trace_id]
+            return max(span["start"] + span["ms"] / 1000 for span in spans) - spans[0]["start"]
+
+        selected = sorted(traces, key=duration, reverse=True)[:args.slowest]
+    if not selected:
+        print("No trace found.")
+    for trace_id in selected:
+        print(format_trace(trace_id, traces[trace_id]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# test_batch.py
+
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from src.batch import Batch, MAX_BATCH_OPS, is_batchable
+from src.errors import RateLimitExceeded
+from src.gameserver import GameServer
+from src.ratelimit import RateLimiter
+
+CONNECTION = ("127.0.0.1", 50000)  # The address of the client connection of the calls
+
+
+class BatchTest(unittest.TestCase):
+    """
+    A batch is admitted as a whole against the bulk budget of its connection, so the default rate limiter lets a
+    batch of MAX_BATCH_OPS registrations through, while the same calls sent one at a time are rejected.
+    """
+
+    def setUp(self):
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+        self.now = 0.0
+        self.server = GameServer(rate_limiter=RateLimiter(clock=lambda: self.now))
+        connection = mock.patch("src.ratelimit.current_connection", return_value=CONNECTION)
+        connection.start()
+        self.addCleanup(connection.stop)
+
+    def tearDown(self):
+        self.output.__exit__(None, None, None)
+
+    def test_large_batch_runs_with_the_default_limits(self):
+        ops = [["register_player", [f"player {i}"]] for i in range(MAX_BATCH_OPS)]
+        outcomes = self.server.execute_batch(ops)
+        self.assertEqual([outcome for outcome in outcomes if "error" in outcome], [])
+        self.assertEqual(len(self.server.players_game), MAX_BATCH_OPS)
+
+    def test_single_calls_spend_the_write_budget_of_the_connection(self):
+        with self.assertRaises(RateLimitExceeded):
+            for i in range(1000):
+                self.server.register_player(f"player {i}")
+
+    def test_batch_over_the_bulk_budget_is_rejected_before_running(self):
+        self.server.execute_batch([["get_load", []]] * 8000)
+        with self.assertRaises(RateLimitExceeded):
+            self.server.execute_batch([["register_player", [f"player {i}"]] for i in range(5000)])
+        self.assertEqual(len(self.server.players_game), 0)
+        self.now += 1
+        self.assertEqual(len(self.server.execute_batch([["register_player", ["Alice"]]])), 1)
+
+    def test_registration_steps_do_not_run_in_a_batch(self):
+        alice = self.server.register_player("Alice")
+        games = len(self.server.games)
+        outcomes = self.server.execute_batch([["add_player_to_game", [alice]], ["create_game", []]])
+        self.assertEqual([outcome["error"] for outcome in outcomes], ["ValueError", "ValueError"])
+        self.assertEqual(len(self.server.games), games)
+        self.assertFalse(is_batchable(self.server, "execute_batch"))
+        self.assertTrue(is_batchable(self.server, "register_player"))
+
+
+class RejectingServer:
+    """
+    Server rejecting the first batch it receives.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def execute_batch(self, ops, stop_on_error=False):
+        self.batches.append(ops)
+        if len(self.batches) == 1:
+            raise RateLimitExceeded("Too many bulk calls", 0)
+        return [{"result": len(op[1])} for op in ops]
+
+
+class BatchClientTest(unittest.TestCase):
+    """
+    The Batch helper sends a rejected chunk again.
+    """
+
+    def test_rejected_chunk_is_sent_again(self):
+        server = RejectingServer()
+        batch = Batch(server, chunk_size=2)
+        for i in range(3):
+            batch.register_player(f"player {i}")
+        self.assertEqual(batch.execute(), [1, 1, 1])
+        self.assertEqual([len(ops) for ops in server.batches], [2, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+# test_connection.py
+
+import contextlib
+import io
+import unittest
+
+import Pyro5.errors
+
+from src.clientcore import ClientCore
+from src.connection import ProxyPool, is_retriable
+
+
+class FakeProxy:
+    """
+    Stand-in for the proxy of a thread: records the calls and loses the connection on the first ones.
+    """
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def _pyroRelease(self):
+        pass
+
+    def __getattr__(self, method):
+        def call(*args):
+            self.calls.append((method, args))
+            if self.failures:
+                self.failures -= 1
+                raise Pyro5.errors.ConnectionClosedError("connection lost")
+            return args
+
+        return call
+
+
+class FakePool(ProxyPool):
+    """
+    ProxyPool whose connections are the given proxies, one per (re)connection.
+    """
+
+    def __init__(self, *proxies):
+        super().__init__("PYRO:test@localhost:1")
+        self.proxies = list(proxies)
+
+    def proxy(self):
+        connection = self._connection()
+        if connection.proxy is None:
+            connection.proxy = self.proxies.pop(0)
+        return connection.proxy
+
+
+class ProxyPoolRetryTest(unittest.TestCase):
+    """
+    A call lost with the connection is sent again only if it is a read and the session survived the reconnection.
+    """
+
+    def call(self, pool, method, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return pool.call(method, *args)
+
+    def test_read_is_retried_on_the_new_connection(self):
+        lost, new = FakeProxy(failures=1), FakeProxy()
+        pool = FakePool(lost, new)
+        self.assertEqual(self.call(pool, "get_changes_since", 7, 0), (7, 0))
+        self.assertEqual(new.calls, [("get_changes_since", (7, 0))])
+        self.assertEqual(pool.reconnections, 1)
+
+    def test_write_is_not_retried(self):
+        for method in ("rematch", "reset_state_after_single_match", "register_player", "new_match",
+                       "unregister_player"):
+            with self.subTest(method=method):
+                lost, new = FakeProxy(failures=1), FakeProxy()
+                pool = FakePool(lost, new)
+                with self.assertRaises(Pyro5.errors.CommunicationError):
+                    self.call(pool, method, 7)
+                self.assertEqual(new.calls, [])
+                self.assertEqual(pool.reconnections, 1)
+
+    def test_batch_is_retried_only_if_made_of_reads(self):
+        reads = [["get_changes_since", [7, 0]], ["get_score", [7]]]
+        self.assertTrue(is_retriable("execute_batch", (reads,), {}))
+        self.assertTrue(is_retriable("execute_batch", (), {"ops": reads}))
+        self.assertFalse(is_retriable("execute_batch", ([["rematch", [7]], *reads], True), {}))
+
+    def test_read_is_not_retried_once_the_session_is_replaced(self):
+        lost, new = FakeProxy(failures=1), FakeProxy()
+        pool = FakePool(lost, new)
+        pool.add_session_hook(lambda: True)
+        with self.assertRaises(Pyro5.errors.CommunicationError):
+            self.call(pool, "get_changes_since", 7, 0)
+        self.assertEqual(new.calls, [])
+
+    def test_read_is_retried_when_the_session_survived(self):
+        lost, new = FakeProxy(failures=1), FakeProxy()
+        pool = FakePool(lost, new)
+        hooks = []
+        pool.add_session_hook(lambda: hooks.append("resumed") or False)
+        self.assertEqual(self.call(pool, "get_score", 7), (7,))
+        self.assertEqual(hooks, ["resumed"])
+
+
+class FakeServer:
+    """
+    Game server restarted without the session of the player: the player is registered again under a new id.
+    """
+
+    def __init__(self, registered):
+        self.registered = registered
+        self.next_id = 42
+
+    def is_registered(self, player):
+        return self.registered
+
+    def register_player(self, player_name):
+        self.registered = True
+        return self.next_id
+
+
+class ResumeSessionTest(unittest.TestCase):
+    """
+    ClientCore.resume_session tells the pool whether the session has been replaced.
+    """
+
+    def test_lost_session_is_replaced(self):
+        core = ClientCore("Alice", FakeServer(registered=False))
+        core.player_id, core.registered = 7, True
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertTrue(core.resume_session())
+        self.assertEqual(core.player_id, 42)
+
+    def test_live_session_is_kept(self):
+        core = ClientCore("Alice", FakeServer(registered=True))
+        core.player_id, core.registered = 7, True
+        self.assertFalse(core.resume_session())
+        self.assertEqual(core.player_id, 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+# test_game.py
+
+import contextlib
+import io
+import unittest
+
+from src.enums import MatchStatus
+from src.game import Game
+
+
+class RequestsOncePerPlayerTest(unittest.TestCase):
+    """
+    The ready and rematch requests of a player count once, so one player cannot start the next match alone.
+    """
+
+    def setUp(self):
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+        self.game = Game()
+        self.game.register_player("a")
+        self.game.register_player("b")
+
+    def tearDown(self):
+        self.output.__exit__(None, None, None)
+
+    def play(self, move_a="rock", move_b="scissors"):
+        self.game.make_choice("a", move_a)
+        self.game.make_choice("b", move_b)
+
+    def finish_series(self):
+        while self.game.match_status != MatchStatus.SERIES_OVER:
+            self.play()
+            if self.game.match_status == MatchStatus.OVER:
+                self.game.reset_state_after_single_match("a")
+                self.game.reset_state_after_single_match("b")
+
+    def test_repeated_ready_request_counts_once(self):
+        self.play()
+        self.game.reset_state_after_single_match("a")
+        self.game.reset_state_after_single_match("a")
+        self.assertEqual(self.game.ready_to_play_again, 1)
+        self.assertEqual(self.game.match_status, MatchStatus.OVER)
+        self.game.reset_state_after_single_match("b")
+        self.assertEqual(self.game.match_status, MatchStatus.ONGOING)
+
+    def test_ready_request_without_a_match_over_is_ignored(self):
+        self.game.reset_state_after_single_match("a")
+        self.assertEqual(self.game.ready_to_play_again, 0)
+
+    def test_repeated_rematch_request_counts_once(self):
+        self.finish_series()
+        self.game.request_rematch("b")
+        self.game.request_rematch("b")
+        self.assertEqual(self.game.rematch_counter, 1)
+        self.assertEqual(self.game.match_status, MatchStatus.SERIES_OVER)
+        self.assertEqual(self.game.scores["a"], 3)
+        self.game.request_rematch("a")
+        self.assertEqual(self.game.match_status, MatchStatus.REMATCH)
+        self.assertEqual((self.game.scores["a"], self.game.scores["b"]), (0, 0))
+
+    def test_rematch_request_in_the_middle_of_a_series_is_ignored(self):
+        self.play()
+        self.game.request_rematch("a")
+        self.assertEqual(self.game.rematch_counter, 0)
+        self.assertEqual(self.game.scores["a"], 1)
+
+    def test_move_before_the_opponent_is_ready_waits_for_its_next_move(self):
+        self.play()
+        self.game.reset_state_after_single_match("a")
+        self.assertFalse(self.game.make_choice("a", "paper"))
+        self.assertEqual(self.game.scores["a"], 1)
+        self.game.reset_state_after_single_match("b")
+        self.assertTrue(self.game.make_choice("b", "scissors"))
+        self.assertEqual((self.game.scores["a"], self.game.scores["b"]), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
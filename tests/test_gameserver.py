@@ -0,0 +1,287 @@
+# test_gameserver.py
+
+import contextlib
+import io
+import threading
+import unittest
+
+from src.enums import MatchStatus, Result
+from src.errors import GameNotFoundError, LobbyFullError, RateLimitExceeded
+from src.game import PLAYER_FIELDS, GAME_FIELDS
+from src.gameserver import GameServer
+from src.matchmaking import BOT, BOT_PREFIX, LOBBY_RETRY, REJECT
+from src.ratelimit import RateLimiter, WRITE
+
+
+class QuietTestCase(unittest.TestCase):
+    """
+    Test case silencing the prints of the server.
+    """
+
+    def setUp(self):
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+
+    def tearDown(self):
+        self.output.__exit__(None, None, None)
+
+
+class LoadTest(QuietTestCase):
+    """
+    The load published in the name server is refreshed even when the rate limiter sheds the reads.
+    """
+
+    def test_load_is_read_when_the_reads_are_shed(self):
+        limiter = RateLimiter(global_rate=0.001, global_burst=10, overload_threshold=0.5)
+        server = GameServer(rate_limiter=limiter)
+        server.register_player("Alice")
+        server.register_player("Bob")
+        while not limiter.overloaded():
+            limiter.admit(WRITE)
+        with self.assertRaises(RateLimitExceeded):
+            server.get_load()
+        self.assertEqual(server._load(), 2)
+
+
+class ChangesSinceTest(QuietTestCase):
+    """
+    get_changes_since returns every field for version 0, and then only the fields changed since the given version.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.server = GameServer()
+        self.alice = self.server.register_player("Alice")
+        self.bob = self.server.register_player("Bob")
+
+    def play(self):
+        self.server.make_choice(self.alice, "rock")
+        self.server.make_choice(self.bob, "scissors")
+
+    def test_version_zero_returns_every_field(self):
+        changes = self.server.get_changes_since(self.alice, 0)["changes"]
+        self.assertEqual(set(changes), set(PLAYER_FIELDS + GAME_FIELDS) | {"general_score"})
+        self.assertEqual(changes["opponent_name"], "Bob")
+
+    def test_poll_without_changes_is_empty(self):
+        version = self.server.get_changes_since(self.alice, 0)["version"]
+        self.assertEqual(self.server.get_changes_since(self.alice, version), {"version": version, "changes": {}})
+
+    def test_only_the_changed_fields_are_returned(self):
+        version = self.server.get_changes_since(self.alice, 0)["version"]
+        self.play()
+        result = self.server.get_changes_since(self.alice, version)
+        self.assertGreater(result["version"], version)
+        self.assertEqual(result["changes"]["score"], 1)
+        self.assertEqual(result["changes"]["game_state"], Result.WIN.value)
+        self.assertNotIn("opponent_name", result["changes"])
+        self.assertNotIn("general_score", result["changes"])
+
+    def test_general_score_is_returned_once_changed(self):
+        for _ in range(3):
+            self.play()
+            self.server.reset_state_after_single_match(self.alice)
+            self.server.reset_state_after_single_match(self.bob)
+        version = self.server.get_changes_since(self.alice, 0)["version"]
+        self.server.update_general_score(self.alice)
+        self.assertEqual(self.server.get_changes_since(self.alice, version)["changes"]["general_score"], 1)
+        self.assertNotIn("general_score", self.server.get_changes_since(self.bob, version)["changes"])
+
+
+class ReadViewsTest(QuietTestCase):
+    """
+    Every write publishes the views of the players it changed, so the reads, served from the views, see it at once.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.server = GameServer()
+        self.alice = self.server.register_player("Alice")
+        self.bob = self.server.register_player("Bob")
+
+    def view(self, player_id):
+        return self.server.read_views.get(player_id)
+
+    def test_registration_publishes_the_views_of_the_game(self):
+        self.assertEqual(self.view(self.alice).game.get_opponent_name(self.alice), "Bob")
+        self.assertEqual(self.server.get_opponent_name(self.bob), "Alice")
+
+    def test_move_publishes_the_new_state(self):
+        first = self.view(self.alice)
+        self.server.make_choice(self.alice, "rock")
+        self.server.make_choice(self.bob, "scissors")
+        self.assertIsNot(self.view(self.alice), first)
+        self.assertEqual(first.game.get_score(self.alice), 0)
+        self.assertEqual(self.view(self.alice).game.get_score(self.alice), 1)
+        self.assertEqual(self.server.get_score(self.alice), 1)
+        self.assertEqual(self.server.get_game_state(self.bob), Result.LOSE.value)
+
+    def test_general_score_is_published(self):
+        for _ in range(3):
+            self.server.make_choice(self.alice, "rock")
+            self.server.make_choice(self.bob, "scissors")
+            self.server.reset_state_after_single_match(self.alice)
+            self.server.reset_state_after_single_match(self.bob)
+        self.server.update_general_score(self.alice)
+        self.assertEqual(self.view(self.alice).general_score, 1)
+        self.assertEqual(self.server.get_general_score(self.alice), 1)
+
+    def test_view_of_a_player_who_left_is_dropped(self):
+        self.server.unregister_player(self.bob)
+        self.assertIsNone(self.view(self.bob))
+        self.assertIsNone(self.server.get_opponent_name(self.alice))
+
+    def test_dropped_view_is_published_by_the_next_read(self):
+        self.server.make_choice(self.alice, "paper")
+        self.server.make_choice(self.bob, "rock")
+        self.server.read_views.drop((self.alice, self.bob))
+        self.assertEqual(self.server.get_score(self.alice), 1)
+        self.assertIsNotNone(self.view(self.bob))
+
+
+class AdmissionTest(QuietTestCase):
+    """
+    A full lobby still admits the players a waiting player accepts; the others are rejected or play against a bot.
+    """
+
+    def server(self, policy, max_bots=1):
+        server = GameServer(lobby_size=2, lobby_overflow=policy, max_bots=max_bots)
+        server.ratings.load({"Alice": [1000, 0], "Bob": [2000, 0], "Carol": [3000, 0], "Dave": [1050, 0]})
+        server.register_player("Alice")
+        server.register_player("Bob")  # too far from Alice: the lobby is full
+        self.assertEqual(len(server.waiting), 2)
+        return server
+
+    def test_full_lobby_admits_a_player_a_waiting_player_accepts(self):
+        server = self.server(REJECT)
+        dave = server.register_player("Dave")
+        self.assertEqual(server.get_opponent_name(dave), "Alice")
+        self.assertEqual(len(server.waiting), 1)
+
+    def test_reject_policy_turns_the_player_away(self):
+        server = self.server(REJECT)
+        with self.assertRaises(LobbyFullError) as raised:
+            server.register_player("Carol")
+        self.assertEqual(raised.exception.retry_after, LOBBY_RETRY)
+        self.assertFalse(server.is_registered("Carol"))
+        self.assertEqual(len(server.waiting), 2)
+
+    def test_bot_policy_seats_the_player_against_a_bot(self):
+        server = self.server(BOT)
+        carol = server.register_player("Carol")
+        self.assertTrue(server.get_opponent_name(carol).startswith(BOT_PREFIX))
+        self.assertEqual((len(server.bots), len(server.waiting)), (1, 2))
+        with self.assertRaises(LobbyFullError):
+            server.register_player("Erin")  # no bot left
+
+    def test_lobby_status_gives_the_place_in_the_queue(self):
+        server = self.server(REJECT)
+        self.assertEqual(server.get_lobby_status("Bob")["position"], 2)
+        server.register_player("Dave")
+        self.assertEqual(server.get_lobby_status("Bob")["position"], 1)
+
+
+class SpectatorTest(QuietTestCase):
+    """
+    A subscription pins its game in the hot table, so the spectator keeps receiving its changes.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.server = GameServer(idle_timeout=0)
+        self.alice = self.server.register_player("Alice")
+        self.bob = self.server.register_player("Bob")
+        self.game_id = self.server.players_game[self.alice]
+
+    def test_watched_game_is_not_evicted(self):
+        subscription_id = self.server.subscribe_spectator(self.game_id)["subscription_id"]
+        self.assertEqual(self.server._evict_idle_games(), 0)
+        self.server.make_choice(self.alice, "rock")
+        polled = self.server.poll_spectator(subscription_id)
+        self.assertFalse(polled["closed"])
+        self.assertEqual([event["game_id"] for event in polled["events"]], [self.game_id])
+
+    def test_game_is_not_evicted_between_lookup_and_subscription(self):
+        lookup = self.server.games.get
+        sweeps = []
+
+        def get(game_id, default=None):
+            game = lookup(game_id, default)
+            # the Sweeper runs now: it waits for the subscription, or evicts the game still unwatched
+            sweeper = threading.Thread(target=lambda: sweeps.append(self.server._evict_idle_games()))
+            sweeper.start()
+            sweeper.join(0.2)
+            sweeps.append(sweeper)
+            return game
+
+        self.server.games.get = get
+        subscription_id = self.server.subscribe_spectator(self.game_id)["subscription_id"]
+        del self.server.games.get
+        sweeps[0].join()
+        self.assertEqual(sweeps[1:], [0])
+        self.server.make_choice(self.alice, "rock")
+        self.assertFalse(self.server.poll_spectator(subscription_id)["closed"])
+
+
+class StrictLookupTest(QuietTestCase):
+    """
+    A lookup of a missing game fails fast with GameNotFoundError and never creates a game.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.server = GameServer()
+        self.alice = self.server.register_player("Alice")
+        self.bob = self.server.register_player("Bob")
+
+    def test_unregistered_player_is_not_found(self):
+        games = len(self.server.games)
+        for call in (lambda: self.server.make_choice("Nobody", "rock"), lambda: self.server.rematch(12345),
+                     lambda: self.server.get_changes_since("Nobody", 0)):
+            with self.assertRaises(KeyError):
+                call()
+        self.assertEqual(len(self.server.games), games)
+
+    def test_removed_game_is_not_created_again(self):
+        game_id = self.server.players_game[self.alice]
+        self.server.read_views.drop((self.alice,))
+        del self.server.games[str(game_id)]
+        games = len(self.server.games)
+        for call in (lambda: self.server.make_choice(self.alice, "rock"),
+                     lambda: self.server.get_changes_since(self.alice, 0)):
+            with self.assertRaises(GameNotFoundError) as raised:
+                call()
+            self.assertEqual(raised.exception.game_id, game_id)
+        self.assertNotIn(str(game_id), self.server.games)
+        self.assertEqual(len(self.server.games), games)
+
+    def test_stale_game_id_is_not_found(self):
+        with self.assertRaises(GameNotFoundError):
+            self.server.subscribe_spectator(12345)
+        self.assertNotIn("12345", self.server.games)
+
+
+class GamePoolTest(QuietTestCase):
+    """
+    A removed game goes back to the pool and is handed out again as a new, empty game.
+    """
+
+    def test_removed_game_is_reused_empty(self):
+        server = GameServer()
+        alice, bob = server.register_player("Alice"), server.register_player("Bob")
+        game_id = server.players_game[alice]
+        server.make_choice(alice, "rock")
+        server.make_choice(bob, "scissors")
+        server.unregister_player(alice)
+        server.unregister_player(bob)
+        self.assertNotIn(str(game_id), server.games)
+        self.assertEqual(len(server.game_pool), 1)
+        carol = server.register_player("Carol")
+        game = server.games[str(server.players_game[carol])]
+        self.assertEqual((server.game_pool.reused, len(server.game_pool)), (1, 0))
+        self.assertGreater(game.game_id, game_id)
+        self.assertEqual((game.players, dict(game.scores), game.match_status), ([carol], {carol: 0}, MatchStatus.NONE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# test_history.py
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from src.export import last_cursor, write_records
+from src.gameserver import GameServer
+from src.history import HistoryStore, ROUND, SERIES, INDEX_INTERVAL
+
+
+def fill(store, count):
+    """
+    Appends count round records and a series record after every tenth.
+    """
+    for i in range(1, count + 1):
+        store.append({"type": ROUND, "game_id": 1, "num_of_match": i, "players": ["Alice", "Bob"]})
+        if i % 10 == 0:
+            store.append({"type": SERIES, "game_id": 1, "players": ["Alice", "Bob"], "winner": "Alice"})
+
+
+class HistoryStoreTest(unittest.TestCase):
+    """
+    The records are read in batches following a cursor, from memory or from the file, also after a restart.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "history.ndjson")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_cursor_resumes_after_the_last_record_read(self):
+        for store in (HistoryStore(), HistoryStore(self.path)):
+            with self.subTest(path=store.path):
+                fill(store, 30)
+                first = [record["seq"] for batch in store.batches(batch_size=7) for record in batch]
+                self.assertEqual(first, list(range(1, store.last_seq + 1)))
+                self.assertEqual([record["seq"] for record in store.records(after=20)], list(range(21, 34)))
+                store.close()
+
+    def test_batches_are_bounded_and_filtered_by_kind(self):
+        store = HistoryStore()
+        fill(store, 30)
+        batches = list(store.batches(kinds=[SERIES], batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+        self.assertTrue(all(record["type"] == SERIES for batch in batches for record in batch))
+
+    def test_file_is_indexed_again_after_a_restart(self):
+        store = HistoryStore(self.path)
+        fill(store, INDEX_INTERVAL + 100)
+        last_seq = store.last_seq
+        store.close()
+        with open(self.path, "ab") as file:
+            file.write(b'{"type": "round", "seq"')  # a record cut by a crash
+        store = HistoryStore(self.path)
+        self.assertEqual(store.last_seq, last_seq)
+        self.assertEqual([record["seq"] for record in store.records(after=last_seq - 3)],
+                         [last_seq - 2, last_seq - 1, last_seq])
+        self.assertEqual(store.append({"type": ROUND, "players": []}), last_seq + 1)
+        store.close()
+
+
+class ExportTest(unittest.TestCase):
+    """
+    An export appends to its output file and resumes from the cursor of the last record written.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = HistoryStore()
+        fill(self.store, 20)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def export(self, path, output_format):
+        cursor = last_cursor(path, output_format)
+        with open(path, "a", newline="") as output:
+            write_records(self.store.records(after=cursor), output, output_format, header=cursor == 0)
+        return cursor
+
+    def test_export_resumes_from_the_last_cursor(self):
+        for output_format in ("ndjson", "csv"):
+            with self.subTest(output_format=output_format):
+                path = os.path.join(self.directory.name, f"export.{output_format}")
+                self.assertEqual(self.export(path, output_format), 0)
+                last_seq = self.store.last_seq
+                fill(self.store, 5)
+                self.assertEqual(self.export(path, output_format), last_seq)
+                self.assertEqual(last_cursor(path, output_format), self.store.last_seq)
+                with open(path) as output:
+                    rows = output.read().splitlines()
+                self.assertEqual(len(rows), self.store.last_seq + (output_format == "csv"))
+
+    def test_header_only_csv_has_no_cursor(self):
+        path = os.path.join(self.directory.name, "export.csv")
+        with open(path, "w", newline="") as output:
+            write_records([], output, "csv")
+        self.assertEqual(last_cursor(path, "csv"), 0)
+
+    def test_server_exports_the_rounds_and_the_series(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            server = GameServer()
+            alice, bob = server.register_player("Alice"), server.register_player("Bob")
+            for _ in range(3):
+                server.make_choice(alice, "rock")
+                server.make_choice(bob, "scissors")
+                server.reset_state_after_single_match(alice)
+                server.reset_state_after_single_match(bob)
+        records = [record for batch in server.export_history() for record in batch]
+        self.assertEqual([record["type"] for record in records], [ROUND, ROUND, ROUND, SERIES])
+        self.assertEqual([record["type"] for batch in server.export_history(after=3) for record in batch], [SERIES])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# test_matchmaking.py
+
+import unittest
+
+from src.matchmaking import WaitingIndex
+
+
+class WaitingIndexTest(unittest.TestCase):
+    """
+    A player is paired with the closest waiting game whose gap accepts it, at once or once the gaps have grown.
+    """
+
+    def setUp(self):
+        self.now = 0.0
+        self.index = WaitingIndex(bucket_width=50, base_gap=100, growth=50, max_gap=400, clock=lambda: self.now)
+
+    def test_claim_takes_the_closest_game_of_a_bucket(self):
+        self.index.add(1, 1510)
+        self.index.add(2, 1540)
+        self.index.add(3, 1460)
+        self.assertEqual(self.index.claim(1545), (2, 5))
+        self.assertEqual(self.index.claim(1470), (3, 10))
+        self.assertEqual(self.index.claim(1470), (1, 40))
+        self.assertEqual(len(self.index), 0)
+
+    def test_claim_takes_the_closest_game_across_buckets(self):
+        self.index.add(1, 1420)
+        self.index.add(2, 1555)
+        self.assertEqual(self.index.claim(1499), (2, 56))
+
+    def test_claim_skips_the_games_out_of_reach_and_excluded(self):
+        self.index.add(1, 1700)
+        self.index.add(2, 1590)
+        self.assertEqual(self.index.claim(1500, exclude=(2,)), (None, None))
+        self.assertEqual(self.index.claim(1500), (2, 90))
+        self.assertIn(1, self.index)
+
+    def test_claim_accepts_the_gap_of_a_game_that_has_waited(self):
+        self.index.add(1, 1700)
+        self.now = 3  # the gap of the waiting game is now 250
+        self.assertEqual(self.index.claim(1500), (1, 200))
+
+    def test_pairs_waits_for_the_gaps_to_grow(self):
+        self.index.add(1, 1000)
+        self.index.add(2, 1290)
+        self.index.add(3, 2000)
+        self.assertEqual(self.index.pairs(), [])
+        self.now = 3
+        self.assertEqual(self.index.pairs(), [])
+        self.now = 4  # the gap of the games is now 300
+        self.assertEqual(self.index.pairs(), [(1, 2, 290)])
+        self.now = 100
+        self.assertEqual(self.index.pairs(), [])
+        self.assertIn(3, self.index)
+
+    def test_pairs_finds_a_game_arrived_between_two_passes(self):
+        self.index.add(1, 1000)
+        self.now = 1
+        self.assertEqual(self.index.pairs(), [])
+        self.index.add(2, 1180)
+        self.now = 2  # the gap of the first game reaches the second only now
+        self.assertEqual(self.index.pairs(), [(1, 2, 180)])
+
+    def test_bounds_follow_the_removals(self):
+        for game_id, rating in enumerate((1000, 1500, 2000), 1):
+            self.index.add(game_id, rating)
+        self.index.remove(1)
+        self.index.remove(3)
+        self.assertEqual(self.index.claim(1450), (2, 50))
+        self.assertEqual(self.index.claim(1450), (None, None))
+        self.index.add(4, 900)
+        self.assertEqual(self.index.claim(950), (4, 50))
+
+    def test_position_counts_the_games_waiting_longer(self):
+        for game_id in range(1, 201):
+            self.index.add(game_id, 1000 + 5 * game_id)
+            if game_id % 3:
+                self.index.remove(game_id - 1)  # the tree is numbered again as the games come and go
+        waiting = [game_id for game_id in range(1, 201) if game_id in self.index]
+        self.assertEqual([self.index.position(game_id) for game_id in waiting], list(range(1, len(waiting) + 1)))
+        self.assertIsNone(self.index.position(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
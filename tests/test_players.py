@@ -0,0 +1,64 @@
+# test_players.py
+
+import contextlib
+import io
+import unittest
+
+from src.gameserver import GameServer
+from src.players import PlayerTable
+
+
+class PlayerTableTest(unittest.TestCase):
+    """
+    A player is named by its id or, by the clients written before the ids, by its name.
+    """
+
+    def setUp(self):
+        self.players = PlayerTable()
+        self.alice = self.players.add("Alice")
+        self.bob = self.players.add("Bob")
+
+    def test_id_and_name_resolve_to_the_id(self):
+        self.assertEqual((self.players.resolve(self.alice), self.players.resolve("Alice")), (self.alice, self.alice))
+        self.assertEqual(self.players.name(self.bob), "Bob")
+        self.assertNotEqual(self.alice, self.bob)
+
+    def test_unknown_player_is_not_resolved(self):
+        for player in ("Carol", self.bob + 1):
+            with self.subTest(player=player):
+                with self.assertRaises(KeyError):
+                    self.players.resolve(player)
+
+    def test_rate_limiter_key_is_the_id_of_a_registered_player(self):
+        self.assertEqual(self.players.key("Alice"), self.alice)
+        self.assertEqual(self.players.key(self.alice), self.alice)
+        self.assertEqual(self.players.key("Carol"), "Carol")
+
+    def test_ids_of_removed_players_are_not_reused(self):
+        self.assertEqual(self.players.remove(self.bob), "Bob")
+        self.assertNotIn("Bob", self.players)
+        self.assertGreater(self.players.add("Bob"), self.bob)
+
+    def test_names_are_unique(self):
+        with self.assertRaises(ValueError):
+            self.players.add("Alice")
+
+
+class ServerPlayerIdTest(unittest.TestCase):
+    """
+    The server answers the same to a call naming the player by id or by name.
+    """
+
+    def test_calls_by_id_and_by_name_agree(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            server = GameServer()
+            alice = server.register_player("Alice")
+            server.register_player("Bob")
+            server.make_choice("Alice", "rock")
+        self.assertEqual(server.get_opponent_name(alice), server.get_opponent_name("Alice"))
+        self.assertEqual(server.get_changes_since(alice, 0), server.get_changes_since("Alice", 0))
+        self.assertTrue(server.is_registered(alice) and server.is_registered("Alice"))
+
+
+if __name__ == "__main__":
+    unittest.main()
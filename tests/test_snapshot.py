@@ -0,0 +1,93 @@
+# test_snapshot.py
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from src import snapshot
+from src.gameserver import GameServer
+
+
+class SnapshotTest(unittest.TestCase):
+    """
+    A snapshot restores the players, their scores, ratings and statistics, and the games, faulted in on their first
+    access; the ids of the removed games and players are not handed out again.
+    """
+
+    def setUp(self):
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "server.snap")
+        self.server = GameServer()
+        self.alice = self.server.register_player("Alice")
+        self.bob = self.server.register_player("Bob")
+        self.carol = self.server.register_player("Carol")
+        self.game_id = self.server.players_game[self.alice]
+        for _ in range(3):
+            self.server.make_choice(self.alice, "rock")
+            self.server.make_choice(self.bob, "scissors")
+            self.server.reset_state_after_single_match(self.alice)
+            self.server.reset_state_after_single_match(self.bob)
+        self.server.update_general_score(self.alice)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.output.__exit__(None, None, None)
+
+    def restore(self, server=None):
+        if server is not None:
+            snapshot.save(server, self.path)
+        restored = GameServer()
+        snapshot.load(restored, self.path)
+        self.addCleanup(restored.games.store.close)
+        return restored
+
+    def test_games_players_and_scores_are_restored(self):
+        restored = self.restore(self.server)
+        self.assertEqual(dict(restored.players_game), dict(self.server.players_game))
+        self.assertEqual(restored.get_general_score(self.alice), 1)
+        self.assertEqual(restored.get_opponent_name(self.alice), "Bob")
+        game, original = restored.games[str(self.game_id)], self.server.games[str(self.game_id)]
+        self.assertEqual((game.scores, game.match_status), (original.scores, original.match_status))
+        self.assertEqual(restored.players.resolve("Carol"), self.carol)
+
+    def test_ids_are_not_reused_after_a_restore(self):
+        self.server.register_player("Dave")  # Carol's opponent
+        erin = self.server.register_player("Erin")
+        last_game = self.server.players_game[erin]
+        self.server.unregister_player(erin)
+        restored = self.restore(self.server)
+        frank = restored.register_player("Frank")
+        self.assertGreater(frank, erin)
+        self.assertGreater(restored.players_game[frank], last_game)
+
+    def test_ratings_and_statistics_are_restored(self):
+        restored = self.restore(self.server)
+        self.assertEqual(restored.ratings.entries(), self.server.ratings.entries())
+        self.assertEqual(restored.get_player_stats("Alice"), self.server.get_player_stats("Alice"))
+
+    def test_games_are_faulted_in_on_their_first_access(self):
+        restored = self.restore(self.server)
+        self.assertEqual(restored.games.hot_count(), 0)
+        self.assertEqual(len(restored.games), len(self.server.games))
+        restored.make_choice(self.carol, "rock")
+        self.assertTrue(restored.games.is_hot(str(restored.players_game[self.carol])))
+        self.assertFalse(restored.games.is_hot(str(self.game_id)))
+        self.assertEqual(restored.get_score(self.alice), self.server.get_score(self.alice))
+        self.assertTrue(restored.games.is_hot(str(self.game_id)))
+
+    def test_snapshot_is_saved_over_the_file_it_was_restored_from(self):
+        restored = self.restore(self.server)
+        restored.make_choice(self.carol, "paper")
+        snapshot.save(restored, self.path)
+        self.assertEqual(restored.get_score(self.alice), self.server.get_score(self.alice))
+        again = self.restore()
+        self.assertEqual(dict(again.players_game), dict(self.server.players_game))
+        self.assertEqual(again.games[str(self.game_id)].scores, self.server.games[str(self.game_id)].scores)
+
+
+if __name__ == "__main__":
+    unittest.main()
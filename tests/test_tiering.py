@@ -0,0 +1,89 @@
+# test_tiering.py
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from src.gameserver import GameServer
+from src.tiering import ColdStore, MIN_IDLE
+
+
+class ColdStoreTest(unittest.TestCase):
+    """
+    A ColdStore keeps the serialized games in memory or in a file, and hands them back unchanged.
+    """
+
+    def test_games_are_taken_back_unchanged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for store in (ColdStore(), ColdStore(os.path.join(directory, "cold.bin"))):
+                with self.subTest(path=store.path):
+                    store.put("1", b"first")
+                    store.put("2", b"second game")
+                    store.put("1", b"first again")
+                    self.assertEqual((len(store), store.size), (2, len(b"first again") + len(b"second game")))
+                    self.assertEqual(store.peek("2"), b"second game")
+                    self.assertEqual(store.take("1"), b"first again")
+                    self.assertNotIn("1", store)
+                    store.discard("2")
+                    self.assertEqual((len(store), store.size), (0, 0))
+                    with self.assertRaises(KeyError):
+                        store.take("2")
+                    store.close()
+
+
+class EvictionTest(unittest.TestCase):
+    """
+    The idle games leave the hot table for the cold store and are faulted back in, unchanged, by the next access.
+    """
+
+    def setUp(self):
+        self.output = contextlib.redirect_stdout(io.StringIO())
+        self.output.__enter__()
+        self.now = 0.0
+        self.server = GameServer(hot_games=1, idle_timeout=10)
+        self.server.games.clock = lambda: self.now
+        self.alice = self.server.register_player("Alice")
+        self.bob = self.server.register_player("Bob")
+        self.server.make_choice(self.alice, "rock")
+        self.server.make_choice(self.bob, "scissors")
+        self.game_id = str(self.server.players_game[self.alice])
+
+    def tearDown(self):
+        self.output.__exit__(None, None, None)
+
+    def test_idle_game_is_evicted_and_faulted_in(self):
+        self.now += 5
+        self.assertEqual(self.server._evict_idle_games(), 0)
+        self.now += 10
+        self.assertEqual(self.server._evict_idle_games(), 1)
+        self.assertFalse(self.server.games.is_hot(self.game_id))
+        self.assertIsNone(self.server.read_views.get(self.alice))
+        self.assertEqual(self.server.get_score(self.alice), 1)
+        self.assertTrue(self.server.games.is_hot(self.game_id))
+        self.assertEqual(self.server.games.faults, 1)
+        self.server.reset_state_after_single_match(self.alice)
+        self.server.reset_state_after_single_match(self.bob)
+        self.server.make_choice(self.alice, "rock")
+        self.server.make_choice(self.bob, "scissors")
+        self.assertEqual(self.server.get_score(self.alice), 2)
+
+    def test_least_recently_used_game_is_evicted_beyond_the_hot_size(self):
+        carol = self.server.register_player("Carol")
+        self.now += MIN_IDLE
+        self.server.games[self.game_id]  # the game of Carol is now the least recently used
+        self.assertEqual(self.server._evict_idle_games(), 1)
+        self.assertTrue(self.server.games.is_hot(self.game_id))
+        self.assertFalse(self.server.games.is_hot(str(self.server.players_game[carol])))
+
+    def test_values_do_not_fault_the_cold_games_in(self):
+        self.now += 10
+        self.server._evict_idle_games()
+        games = list(self.server.games.values())
+        self.assertEqual([game.scores[self.alice] for game in games], [1])
+        self.assertEqual((self.server.games.hot_count(), self.server.games.faults), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()